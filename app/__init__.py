@@ -1,13 +1,10 @@
 from flask import Flask, request, render_template, session, make_response, current_app
 from flask_security import Security, SQLAlchemyUserDatastore, current_user
 from .utils import db, mail
-from .utils.initial_banks import import_initial_banks
 from .main.models import UserModel, RoleModel
-from flask_security.utils import hash_password
 from config import config
 from app.auth.forms import ExtendedConfirmRegisterForm, ExtendedLoginForm, ExtendedRegisterForm
 from flask_wtf.csrf import CSRFProtect,CSRFError, generate_csrf
-from .admin import init_admin
 from .main.models import user_datastore
 import logging
 import os
@@ -17,7 +14,7 @@ from flask_babel import Babel
 from datetime import timedelta
 import uuid
 import secrets
-from .utils.logging_config import setup_logger
+from .utils.logging_config import setup_logger, parse_sample_rates
 from functools import wraps
 
 # Load environment variables
@@ -99,14 +96,16 @@ def create_app(config_name):
     
     # Create Flask application
     app = Flask(__name__)
+    config[config_name].validate()
     app.config.from_object(config[config_name])
 
     app.config['BABEL_DEFAULT_LOCALE'] = 'en'
     app.config['BABEL_DEFAULT_TIMEZONE'] = 'UTC'
     babel.init_app(app)
     
-    # Setup logging
-    setup_logger()
+    # Setup logging, once per process
+    setup_logger(level=app.config['LOG_LEVEL'], json_logs=app.config['LOG_JSON'],
+                 sample_rates=parse_sample_rates(app.config['LOG_SAMPLE_RATES']), log_dir=app.config['LOG_DIR'])
     
     # Load environment variables into config
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY',secrets.token_hex(32))
@@ -197,8 +196,10 @@ def create_app(config_name):
     # Initialize Flask-Migrate
     migrate = Migrate(app, db)
     
-    # Initialize Flask-Admin
-    admin = init_admin(app, db)
+    # Initialize Flask-Admin, imported only when enabled
+    if app.config.get('ADMIN_ENABLED', True):
+        from .admin import init_admin
+        admin = init_admin(app, db)
     
     # Register blueprints
     from .main.routes import main as main_blueprint
@@ -217,63 +218,28 @@ def create_app(config_name):
     app.register_blueprint(api_bp, url_prefix='/api/v1')
     from app.errors.handlers import errors as errors_blueprint
     app.register_blueprint(errors_blueprint)
+
+    # Sample memory and GC stats every few requests
+    from .utils.memory import init_memory_telemetry
+    init_memory_telemetry(app)
+
+    # Trace requests, views, API resources, SQL and outbound HTTP; after the blueprints
+    from .utils.tracing import init_tracing
+    init_tracing(app)
+
+    # Register maintenance CLI commands
+    from app.cli import tabpay_cli
+    app.cli.add_command(tabpay_cli)
     
     
-    with app.app_context():
-        db.create_all()
+    # Schema, roles, superusers and banks come from `flask tabpay bootstrap`
+    if app.config.get('BOOTSTRAP_ON_START'):
+        from .utils.bootstrap import bootstrap
+        with app.app_context():
+            bootstrap()
 
-      
-        # Create roles
-        roles = [
-            ('SuperUser', 'System Administrator'),
-            ('Administrator', 'Account Owner and Umbrella creator'),
-            ('Chairman', 'Block chairman'),
-            ('Secretary', 'Block secretary'),
-            ('Member', 'Regular member'),
-            ('Treasurer', 'Block Treasurer')
-        ]
-        
-        for role_name, description in roles:
-            user_datastore.find_or_create_role(name=role_name, description=description)
-        
-        # Create Superusers from environment variables
-        def get_superusers_from_env():
-            superusers = []
-            i = 1
-            while True:
-                email = os.getenv(f'SUPERUSER_{i}_EMAIL')
-                if not email:
-                    break
-        
-                superusers.append({
-                    'email': email,
-                    'password': os.getenv(f'SUPERUSER_{i}_PASSWORD'),
-                    'id_number': int(os.getenv(f'SUPERUSER_{i}_ID')),
-                    'full_name': os.getenv(f'SUPERUSER_{i}_NAME'),
-                    'phone_number': os.getenv(f'SUPERUSER_{i}_PHONE')
-                })
-                i += 1
-            return superusers
+    # Drain the M-Pesa callback outbox in the background, unless MPESA_CALLBACK_WORKERS is 0
+    from .services.callbacks import start_workers
+    start_workers(app)
 
-        superusers = get_superusers_from_env()
-        
-        for user_data in superusers:
-            if not user_datastore.find_user(email=user_data['email']):
-                hashed_password = hash_password(user_data['password'])
-                user_datastore.create_user(
-                    email=user_data['email'],
-                    password=hashed_password,
-                    id_number=user_data['id_number'],
-                    full_name=user_data['full_name'],
-                    phone_number=user_data['phone_number'],
-                    roles=[user_datastore.find_role('SuperUser')],
-                    is_approved=True
-                )
-                print(f"Created superuser: {user_data['email']}")
-        
-        db.session.commit()
-        print('All superusers created successfully')
-       
-    import_initial_banks(app)
-     # Initialize debug CSRF if in debug mode
     return app
\ No newline at end of file
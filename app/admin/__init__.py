@@ -1,6 +1,6 @@
 from flask import Flask
 from .base import CustomAdmin, SecureModelView
-from .views import UserAdminView, RoleAdminView, UmbrellaAdminView
+from .views import UserAdminView, RoleAdminView, UmbrellaAdminView, PerformanceView
 
 
 
@@ -14,6 +14,7 @@ def init_admin(app: Flask, db):
     admin.add_view(UserAdminView(UserModel, db.session, name='Users', menu_icon_type="fa", menu_icon_value='fa-users'))
     admin.add_view(RoleAdminView(RoleModel, db.session, name='Roles', menu_icon_type="fa", menu_icon_value='fa-user-shield'))
     admin.add_view(UmbrellaAdminView(UmbrellaModel, db.session, name='Umbrellas', menu_icon_type="fa", menu_icon_value='fa-umbrella'))
+    admin.add_view(PerformanceView(name='Performance', endpoint='perf', url='perf', menu_icon_type="fa", menu_icon_value='fa-tachometer-alt'))
 
 
     
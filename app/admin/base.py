@@ -1,4 +1,4 @@
-from flask_admin import Admin, AdminIndexView
+from flask_admin import Admin, AdminIndexView, BaseView
 from flask_admin.contrib.sqla import ModelView
 from flask_wtf import FlaskForm
 from flask_security import current_user
@@ -42,6 +42,21 @@ class SecureBaseView(AdminIndexView):
         return True
 
 
+class SecureView(BaseView):
+    """A custom admin page open to superusers only"""
+
+    def is_accessible(self):
+        return (current_user.is_active and
+                current_user.is_authenticated and
+                current_user.has_role('SuperUser'))
+
+    def _handle_view(self, name, **kwargs):
+        if not self.is_accessible():
+            if current_user.is_authenticated:
+                abort(403)
+            return redirect(url_for('security.login', next=request.url))
+
+
 class SecureModelView(ModelView):
     form_base_class = SecureForm
     
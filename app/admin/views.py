@@ -1,10 +1,13 @@
-from .base import SecureModelView
+from .base import SecureModelView, SecureView
 from flask_security import current_user
 from flask import flash, redirect, url_for, abort, request, current_app
 from flask_wtf.csrf import validate_csrf
 from flask_admin.actions import action
 import traceback
 from flask_admin import expose
+from ..services import hierarchy
+from ..utils.http_client import pool_stats
+from ..utils.tracing import get_tracer
 
 class UserAdminView(SecureModelView):
     list_template = 'admin/model/mylist.html'
@@ -304,3 +307,21 @@ class UmbrellaAdminView(SecureModelView):
         if not current_user.has_role('SuperUser'):
             abort(403)
         return super().on_model_change(form, model, is_created)
+
+    def after_model_change(self, form, model, is_created):
+        # Pages read umbrellas from the hierarchy cache
+        hierarchy.invalidate_umbrella(model.id, created_by=model.created_by)
+        return super().after_model_change(form, model, is_created)
+
+
+class PerformanceView(SecureView):
+    """
+    Request latency percentiles per route, from the traces of this worker,
+    and connection reuse of its outbound HTTP pool
+    """
+
+    @expose('/')
+    def index(self):
+        return self.render('admin/perf.html', routes=get_tracer().summary(), pools=pool_stats(),
+                           tracing_enabled=current_app.config.get('TRACING_ENABLED', True),
+                           window=current_app.config.get('TRACE_ROUTE_WINDOW'))
@@ -1,26 +1,31 @@
-from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from datetime import datetime, timedelta, timezone
-from flask import Blueprint, jsonify, request
-from flask_security import current_user
-from werkzeug.exceptions import HTTPException
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+from flask import Blueprint, Response, current_app, jsonify, make_response, request, stream_with_context, url_for
+from flask_security import current_user, auth_required, roles_accepted
+from werkzeug.exceptions import HTTPException, NotFound
 from flask_restful import Api, Resource, marshal_with, marshal, abort
+from flask_restful.utils import unpack
+from flask_restful.representations.json import output_json
 from ..main.models import (
     UserModel, CommunicationModel, PaymentModel, BankModel, 
-    BlockModel, UmbrellaModel, ZoneModel, MeetingModel, 
-    RoleModel, roles_users, member_blocks, member_zones
+    BlockModel, UmbrellaModel, ZoneModel, MeetingModel, RoleModel
 )
 from .serializers import (
-    get_user_fields, user_args, communication_fields,
+    get_user_fields, user_args, user_page_args, communication_fields,
     communication_args, payment_fields, payment_args, 
-    payment_update_args, bank_fields, bank_args, block_fields, 
+    payment_update_args, stk_bulk_args, contribution_stats_args, contribution_report_args, bank_fields, bank_args, block_fields, 
+    payment_export_args, member_export_args,
     block_args, umbrella_fields, umbrella_args, zone_fields, 
     zone_args, meeting_fields, meeting_args, role_args, role_fields
 )
-from ..utils import db, save_picture
-from ..utils.msisdn_hashed import find_user_by_hashed_msisdn
+from ..utils import db
+from ..utils import tracing
+from ..utils.memory import get_memory_monitor
+from ..utils.logging_config import LazyJson
+from ..services import ServiceError, callbacks, contributions, exports, hierarchy, meetings, payments, users, versions
+import hashlib
 import logging
-import json
-from sqlalchemy.orm import joinedload
+import msgspec
 
 # Configure logger
 logger = logging.getLogger('mpesa')
@@ -28,6 +33,27 @@ logger = logging.getLogger('mpesa')
 api_bp = Blueprint('api', __name__)
 api = Api(api_bp)
 
+json_encoder = msgspec.json.Encoder()
+
+
+@api.representation('application/json')
+def output_msgspec(data, code, headers=None):
+    """
+    Encode responses with msgspec, several times faster than ``json.dumps``
+    on large listings. Debug mode and ``RESTFUL_JSON`` settings keep
+    flask_restful's encoder, as does anything msgspec cannot encode.
+    """
+    if current_app.debug or current_app.config.get('RESTFUL_JSON'):
+        return output_json(data, code, headers)
+    try:
+        dumped = json_encoder.encode(data) + b"\n"
+    except (TypeError, msgspec.EncodeError):
+        return output_json(data, code, headers)
+
+    resp = make_response(dumped, code)
+    resp.headers.extend(headers or {})
+    return resp
+
 def handle_error(self, e):
     db.session.rollback()
 
@@ -57,6 +83,54 @@ class BaseResource(Resource):
     model = None
     fields = None
     args = None
+    # Tables a listing is read from, the model's own by default; see dispatch_request
+    versioned_tables = None
+
+    def dispatch_request(self, *args, **kwargs):
+        """Record each resource method as a span of the request's trace"""
+        with tracing.span(f'{type(self).__name__}.{request.method.lower()}'):
+            return self.conditional_dispatch(*args, **kwargs)
+
+    def conditional_dispatch(self, *args, **kwargs):
+        """
+        Answer conditional GETs of a listing from the versions of the tables
+        it reads: a 304 is returned before anything is queried or marshalled
+        while none of them has been written.
+        """
+        if request.method not in ('GET', 'HEAD') or kwargs.get('id') or self.model is None:
+            return super().dispatch_request(*args, **kwargs)
+
+        tables = self.versioned_tables or (self.model.__tablename__,)
+        table_versions = versions.table_versions(tables)
+        token = '|'.join(
+            [request.full_path, str(current_user.get_id())]
+            + [f'{table}:{version}' for table, (version, _) in sorted(table_versions.items())]
+        )
+        etag = hashlib.md5(token.encode()).hexdigest()
+        modified = [updated_at for _, updated_at in table_versions.values() if updated_at]
+        last_modified = max(modified) if len(modified) == len(tables) else None
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = bool(last_modified and request.if_modified_since
+                                and last_modified <= request.if_modified_since.replace(tzinfo=None))
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = super().dispatch_request(*args, **kwargs)
+            if not isinstance(response, Response):
+                data, code, headers = unpack(response)
+                response = api.make_response(data, code, headers=headers)
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
 
     def get(self, id=None):
         if self.fields is None:
@@ -78,6 +152,7 @@ class BaseResource(Resource):
             new_item = self.model(**args)
             db.session.add(new_item)
             db.session.commit()
+            self.changed(new_item)
             return marshal(new_item, self.fields), 201
         except Exception as e:
             return self.handle_error(e)
@@ -92,6 +167,7 @@ class BaseResource(Resource):
                 if value is not None:
                     setattr(item, key, value)
             db.session.commit()
+            self.changed(item)
             return marshal(item, self.fields), 200
         except Exception as e:
             return self.handle_error(e)
@@ -101,11 +177,16 @@ class BaseResource(Resource):
             item = self.model.query.get_or_404(id)
             db.session.delete(item)
             db.session.commit()
+            self.changed(item)
             items = self.model.query.all()
             return marshal(items, self.fields), 200
         except Exception as e:
             return self.handle_error(e)
 
+    def changed(self, item):
+        """Called with each item created, updated or deleted, once committed"""
+        pass
+
     def handle_error(self, e):
         db.session.rollback()
 
@@ -126,323 +207,80 @@ class UsersResource(BaseResource):
     model = UserModel
     fields = get_user_fields()
     args = user_args
+    versioned_tables = ('users', 'roles', 'roles_users', 'member_blocks', 'member_zones', 'blocks', 'zones', 'banks')
 
     def get(self, id=None):
         try:
             if id:
-                user = self.model.query.get_or_404(id)
-
-                if user.zone_id:
-                    user.zone_name = ZoneModel.query.filter_by(id=user.zone_id).first().name if user.zone_id else None
-
-                if user.bank_id:
-                    user.bank_name = BankModel.query.filter_by(id=user.bank_id).first().name if user.bank_id else None
-
+                user = users.get_user(id)
                 if not user:
-                    return {"message": "User not found"}, 404
-                return marshal(user, self.fields), 200
+                    raise NotFound()
+                return user, 200
 
             # Check for query parameters: role, id_number, umbrella_id, and zone_id
-            role_name = request.args.get('role')
             id_number = request.args.get('id_number')
-            umbrella_id = request.args.get('umbrella_id')
-            zone_id = request.args.get('zone_id')
-
-            # Fetch user by id_number if provided
             if id_number:
-                user = self.model.query.filter_by(id_number=id_number).first()
+                user = users.get_user_by_id_number(id_number)
                 if not user:
                     return {"message": "User not found"}, 404
-                return marshal(user, self.fields), 200
-
-            # Fetch users by role and zone_id
-            if role_name and zone_id:
-                users = (
-                    self.model.query
-                    .join(UserModel.roles)
-                    .filter(RoleModel.name == role_name, UserModel.zone_id == zone_id)
-                    .all()
-                )
-                return marshal(users, self.fields), 200
-
-            # Fetch users by role and umbrella_id if both are provided
-            if role_name and umbrella_id:
-                users = (
-                    self.model.query
-                    .join(UserModel.roles)
-                    .join(UserModel.block_memberships)
-                    .filter(RoleModel.name == role_name)
-                    .filter(BlockModel.parent_umbrella_id == umbrella_id)
-                    .all()
-                )
-                return marshal(users, self.fields), 200
-            # Fetch users by role, zone_id, and umbrella_id
-            if role_name and zone_id and umbrella_id:
-                users = (
-                    self.model.query
-                    .join(UserModel.roles)
-                    .join(UserModel.block_memberships)
-                    .filter(RoleModel.name == role_name)
-                    .filter(UserModel.zone_id == zone_id)
-                    .filter(BlockModel.parent_umbrella_id == umbrella_id)
-                    .all()
-                )
-                return marshal(users, self.fields), 200
-
-            # Fetch users by role if role_name is provided (without umbrella or zone)
-            if role_name:
-                users = self.model.query.join(UserModel.roles).filter(RoleModel.name == role_name).all()
-                return marshal(users, self.fields), 200
-
-            # Fetch all users if no filters are provided
-            users = self.model.query.all()
-            for user in users:
-                if user.zone_id:
-                    user.zone_name = ZoneModel.query.filter_by(id=user.zone_id).first().name if user.zone_id else None
-
-                if user.bank_id:
-                    bank = BankModel.query.get(user.bank_id)
-                    if bank:
-                        user.bank_name = bank.name
-            return marshal(users, self.fields), 200
+                return user, 200
+
+            filters = {
+                'role': request.args.get('role'),
+                'umbrella_id': request.args.get('umbrella_id'),
+                'zone_id': request.args.get('zone_id')
+            }
+            paging = user_page_args.parse_args()
+            if not any(value is not None for value in paging.values()):
+                return users.list_users(**filters), 200
+
+            result = users.paginate_users(**filters, **paging)
+            result['next'] = None
+            if result['next_cursor']:
+                query = {key: value for key, value in request.args.items() if key not in ('cursor', 'page')}
+                result['next'] = url_for(request.endpoint, **query, cursor=result['next_cursor'])
+            return result, 200
 
         except Exception as e:
             return self.handle_error(e)
 
-
     def post(self):
         try:
-            # Parse arguments
             args = self.args.parse_args()
-
-            # Validate umbrella
-            umbrella = UmbrellaModel.query.get(args['umbrella_id'])
-            if not umbrella:
-                return {"message": "Umbrella does not exist."}, 400
-
-            # Validate zone
-            zone = ZoneModel.query.get(args['zone_id'])
-            if not zone:
-                return {"message": "Zone does not exist."}, 400
-
-            # Validate block (parent of the zone)
-            block = BlockModel.query.get(zone.parent_block_id)
-            if not block:
-                return {"message": "Block associated with the zone does not exist."}, 400
-
-            # Check for duplicate user
-            existing_user = UserModel.query.filter(
-                (UserModel.id_number == args['id_number']) |
-                (UserModel.phone_number == args['phone_number']) |
-                (UserModel.acc_number == args['acc_number']),
-                UserModel.zone_id == args['zone_id'],
-                UserModel.umbrella_id == args['umbrella_id']
-            ).first()
-
-            if existing_user:
-                return {
-                    "message": "A member with this ID number, phone number, or account number already exists in this zone."
-                }, 400
-
-            # Create the new user
-            new_user = UserModel(
+            return users.create_member(
                 full_name=args['full_name'],
                 id_number=args['id_number'],
                 phone_number=args['phone_number'],
                 zone_id=args['zone_id'],
                 bank_id=args['bank_id'],
                 acc_number=args['acc_number'],
-                umbrella_id=args['umbrella_id']
-            )
-
-            # Add user to the session
-            db.session.add(new_user)
-            db.session.flush()  # Flush to assign an ID to the user
-
-            # Assign role if provided
-            if 'role_id' in args and args['role_id'] is not None:
-                role = RoleModel.query.get(args['role_id'])
-                if role:
-                    new_user.roles.append(role)
+                umbrella_id=args['umbrella_id'],
+                role_id=args.get('role_id')
+            ), 201
 
-        
-            # Insert user into the `member_blocks` table
-            stmt = member_blocks.insert().values(
-                user_id=new_user.id,
-                block_id=block.id,
-            )
-            db.session.execute(stmt)
-
-            # Add zone membership
-            stmt = member_zones.insert().values(
-                user_id=new_user.id,
-                zone_id=zone.id,
-            )
-            db.session.execute(stmt)
-
-            # Commit the session
-            db.session.commit()
-   
-            # Return the newly created user
-            return marshal(new_user, self.fields), 201
-
-        except IntegrityError as e:
-            # Handle duplicate entries
-            db.session.rollback()
-            return {
-                "message": "A member with this ID number, phone number, or account number already exists in this zone."
-            }, 400
+        except ServiceError as e:
+            return e.body, e.status_code
 
         except Exception as e:
-            # General exception handling
             db.session.rollback()
             return self.handle_error(e)
 
-
- 
-
     def patch(self, id):
         try:
-            args = self.args.parse_args() if 'multipart/form-data' not in request.content_type else {}
-
-            user = UserModel.query.get_or_404(id)
-            updated = False
-
-                        # Handle approval
-            if 'is_approved' in args and args['is_approved'] is not None:
-                if args['is_approved'] and not user.is_approved:
-                    user.approve(current_user)  # Assuming current_user is the approver
-                    updated = True
-                elif not args['is_approved'] and user.is_approved:
-                    user.unapprove()
-                    updated = True
-
-            # Update fields except 'is_approved', 'approval_date', and 'approved_by_id'
-            for key, value in args.items():
-                if value is not None and key not in ['is_approved', 'approval_date', 'approved_by_id', 'block_id']:
-                    setattr(user, key, value)
-                    updated = True
-
+            image_file = None
             if 'multipart/form-data' in request.content_type:
+                args = {}
                 if 'picture' in request.files:
                     image_file = request.files['picture']
-                    if image_file:
-                        saved_filename = save_picture(image_file)
-                        user.image_file = saved_filename
-                        updated = True
-                    else:
+                    if not image_file:
                         return {"message": "No image file provided."}, 400
             else:
-                unchanged_fields = []
-
-                for field in ['full_name', 'id_number', 'phone_number', 'zone_id', 'bank_id', 'acc_number', 'email','image_file']:
-                    if args[field] is not None and getattr(user, field) != args[field]:
-                        setattr(user, field, args[field])
-                        updated = True
-                    else:
-                        unchanged_fields.append(field)
-
-            # Check if block_id is provided to update block memberships
-                block_id = args.get('block_id')
-                if block_id is not None:
-                    block = BlockModel.query.get(block_id)
-                    if block:
-                        if block not in user.block_memberships:
-                            user.block_memberships.append(block)
-                            logger.info(f"Added block {block.id} to user's block memberships.")
-                            updated = True
-                        else:
-                            logger.info(f"User {user.id} is already a member of block {block.id}.")
-                    else:
-                        logger.warning(f"Block {block_id} not found.")
-                # Check if zone_id is provided to update zone memberships
-                zone_id = args.get('zone_id')
-                if zone_id is not None:
-                    zone = ZoneModel.query.get(zone_id)
-                    if zone:
-                        if zone not in user.zone_memberships:
-                            user.zone_memberships.append(zone)
-                            logger.info(f"Added zone {zone.id} to user's zone memberships.")
-                            updated = True
-                        else:
-                            logger.info(f"User {user.id} is already a member of zone {zone.id}.")
-                    else:
-                        logger.warning(f"Zone {zone_id} not found.")
-
-
-            role_id = args.get('role_id')
-            action = args.get('action')
-
-            if role_id is not None:
-                role = RoleModel.query.get(role_id)
-
-                if role:
-                    # Ensure Chairman, Secretary, and Treasurer are mutually exclusive
-                    if role_id == 3 and any(r.id in [4, 6] for r in user.roles):
-                        return {"message": "Cannot assign Chairman when the user is already a Secretary or Treasurer."}, 400
-
-                    elif role_id == 4 and any(r.id in [3, 6] for r in user.roles):
-                        return {"message": "Cannot assign Secretary when the user is already a Chairman or Treasurer."}, 400
-
-                    elif role_id == 6 and any(r.id in [3, 4] for r in user.roles):
-                        return {"message": "Cannot assign Treasurer when the user is already a Chairman or Secretary."}, 400
-
-                    # Handle Role Removal
-                    if action == 'remove':
-                        if role in user.roles:
-                            # Retrieve the block_id associated with the user's role
-                            role_assignment = db.session.query(roles_users).filter_by(user_id=user.id, role_id=role_id).first()
-                            if role_assignment:
-                                block_id = role_assignment.block_id  # Get the block_id
-
-                                # Remove the role from the user
-                                user.roles.remove(role)
-                                updated = True
-
-                                # Remove the block from the corresponding block list
-                                if block_id:
-                                    if role_id == 3:  # Chairman
-                                        user.chaired_blocks = [b for b in user.chaired_blocks if b.id != block_id]
-                                    elif role_id == 4:  # Secretary
-                                        user.secretary_blocks = [b for b in user.secretary_blocks if b.id != block_id]
-                                    elif role_id == 6:  # Treasurer
-                                        user.treasurer_blocks = [b for b in user.treasurer_blocks if b.id != block_id]
-
-                        else:
-                            return {"message": "User does not have this role"}, 400
-
-
-                    # Handle Role Addition
-                    elif action == 'add':
-                        if role in user.roles:
-                            return {"message": f"User already has the role '{role.name}'."}, 400
-                        else:
-                            user.roles.append(role)  # Add the role if it's not already assigned
-                            updated = True
-
-                    # Update Blocks Based on Role
-                    block_id = args.get('block_id')
-                    if block_id is not None:
-                        block = BlockModel.query.get(block_id)
-                        if block:
-                            if role_id == 3:  # Chairman
-                                if block not in user.chaired_blocks:
-                                    user.chaired_blocks.append(block)
-
-                            elif role_id == 4:  # Secretary
-                                if block not in user.secretary_blocks:
-                                    user.secretary_blocks.append(block)
-
-                            elif role_id == 5:  # Treasurer
-                                if block not in user.treasurer_blocks:
-                                    user.treasurer_blocks.append(block)
-             
-
-            if updated:
-                db.session.commit()
-                return marshal(user, self.fields), 200
-
-            return {"message": "No updates made to user."}, 400
+                args = self.args.parse_args()
+
+            return users.update_user(id, args, image_file=image_file, approver=current_user), 200
+
+        except ServiceError as e:
+            return e.body, e.status_code
 
         except Exception as e:
             return {"message": "An error occurred while updating the user."}, 500
@@ -460,83 +298,30 @@ class BanksResource(BaseResource):
     args = bank_args
 
 
-
-def normalize_phone_number(phone_number):
-        """Normalize phone number to remove country code or leading zeroes."""
-        if phone_number.startswith("+"):
-            phone_number = phone_number[1:]  # Remove the '+'
-        if phone_number.startswith("254"):
-            phone_number = phone_number[3:]  # Remove '254'
-        if phone_number.startswith("0"):
-            phone_number = phone_number[1:]  # Remove leading '0'
-        return phone_number
-
 class PaymentsResource(BaseResource):
     model = PaymentModel
     fields = payment_fields
     args = payment_args
+    versioned_tables = ('payments', 'users', 'blocks')
 
     def get(self, id=None):
-        """Get a single payment or list payments filtered by phone number and meeting"""
+        """Get a single payment or list payments filtered by phone number, meeting, payer, block or receipt"""
         try:
             if id:
                 return super().get(id)
 
-            # Extract query parameters
             phone_number = request.args.get('phone_number', None)
-            meeting_id = request.args.get('meeting_id', None)
-
             if phone_number:
-                normalized_phone = normalize_phone_number(phone_number)
-                logger.info(f"Searching for payments by normalized phone number: {normalized_phone} and meeting_id: {meeting_id}")
-
-                # Find the user by normalizing the phone number
-                users = UserModel.query.all()
-                matched_user = None
-                for user in users:
-                    user_phone = normalize_phone_number(user.phone_number)
-                    if user_phone == normalized_phone:
-                        matched_user = user
-                        break
-
-                if not matched_user:
-                    logger.warning(f"No user found for phone number: {phone_number} (normalized: {normalized_phone})")
-                    return {"message": "User not found for this phone number."}, 404
-
-                # Query payments made by this user, optionally filter by meeting_id
-                query = PaymentModel.query.filter_by(source_phone_number=phone_number)
-                if meeting_id:
-                    query = query.filter_by(meeting_id=meeting_id)
-
-                payments = query.all()
-
-                if not payments:
-                    logger.info(f"No payments found for phone number: {phone_number} and meeting_id: {meeting_id}")
-                    return {"message": "No payments found for this phone number and meeting."}, 404
-
-                # Associate the payment with the user, block, and meeting
-                payment_data = []
-                for payment in payments:
-                    block = BlockModel.query.get(payment.block_id)
-                    meeting = MeetingModel.query.get(payment.meeting_id)
-                    payment_data.append({
-                        "mpesa_id": payment.mpesa_id,
-                        "amount": payment.amount,
-                        "transaction_status": payment.transaction_status,
-                        "payer_id": matched_user.id,  # Payer ID
-                        "payer_full_name": f"{matched_user.first_name} {matched_user.last_name}",  # Payer Full Name
-                        "block_id": block.id if block else None,  # Block ID
-                        "block_name": block.name if block else "Unknown",  # Block Name
-                        "meeting_id": meeting.id if meeting else None,  # Meeting ID
-                        "payment_date": payment.payment_date,
-                        "status": "Contributed" if payment.transaction_status else "Pending"
-                    })
-
-                logger.info(f"Payments retrieved for phone number {phone_number} and meeting_id {meeting_id}: {payment_data}")
+                try:
+                    payment_data = payments.list_payments_by_phone(
+                        phone_number, meeting_id=request.args.get('meeting_id', None)
+                    )
+                except ServiceError as e:
+                    return e.body, e.status_code
                 return {"payments": payment_data}, 200
 
-            # Handle other queries for fetching all payments or specific payment by ID
-            return super().get()
+            filters = {key: request.args.get(key) for key in payments.PAYMENT_FILTERS}
+            return payments.list_payments(**filters), 200
         except Exception as e:
             logger.error(f"Error retrieving payment(s): {str(e)}", exc_info=True)
             return self.handle_error(e)
@@ -545,37 +330,7 @@ class PaymentsResource(BaseResource):
     def post(self):
         try:
             args = self.args.parse_args()
-            
-            # Create new payment with all fields
-            new_payment = self.model(
-                mpesa_id=args['mpesa_id'],
-                account_number=args['account_number'],
-                source_phone_number=args['source_phone_number'],
-                amount=args['amount'],
-                payment_date=args.get('payment_date', datetime.now(timezone.utc)),
-                transaction_status=args.get('transaction_status', False),
-                bank_id=args['bank_id'],
-                block_id=args['block_id'],
-                payer_id=args['payer_id'],
-                meeting_id=args.get('meeting_id'),
-                
-                # M-Pesa specific fields
-                transaction_type=args.get('transaction_type'),
-                business_short_code=args.get('business_short_code'),
-                invoice_number=args.get('invoice_number'),
-                org_account_balance=args.get('org_account_balance'),
-                third_party_trans_id=args.get('third_party_trans_id'),
-                first_name=args.get('first_name'),
-                middle_name=args.get('middle_name'),
-                last_name=args.get('last_name')
-            )
-            
-            db.session.add(new_payment)
-            db.session.commit()
-            
-            logger.info(f"Successfully created payment with ID: {new_payment.id}")
-            return marshal(new_payment, self.fields), 201
-            
+            return payments.create_payment(args), 201
         except Exception as e:
             logger.error(f"Error creating payment: {str(e)}", exc_info=True)
             db.session.rollback()
@@ -584,19 +339,10 @@ class PaymentsResource(BaseResource):
     def patch(self, id):
         """Update a payment"""
         try:
-            payment = db.session.get(PaymentModel, id)
-            if not payment:
+            if not db.session.get(PaymentModel, id):
                 abort(404, message=f"Payment with id {id} not found")
-                
             args = payment_update_args.parse_args()
-            
-            for key, value in args.items():
-                if value is not None:
-                    setattr(payment, key, value)
-            
-            db.session.commit()
-            logger.info(f"Successfully updated payment with ID: {id}")
-            return marshal(payment, payment_fields), 200
+            return payments.update_payment(id, args), 200
             
         except Exception as e:
             logger.error(f"Error updating payment with ID {id}: {str(e)}", exc_info=True)
@@ -605,14 +351,11 @@ class PaymentsResource(BaseResource):
     def delete(self, id):
         """Delete a payment"""
         try:
-            payment = db.session.get(PaymentModel, id)
-            if not payment:
-                abort(404, message=f"Payment with id {id} not found")
-                
-            db.session.delete(payment)
-            db.session.commit()
+            payments.delete_payment(id)
             return {"message": f"Payment with id {id} deleted successfully"}, 200
-            
+
+        except ServiceError as e:
+            abort(e.status_code, message=e.message)
         except Exception as e:
             logger.error(f"Error deleting payment with ID {id}: {str(e)}", exc_info=True)
             return handle_error(self, e)
@@ -633,32 +376,141 @@ class PaymentsResource(BaseResource):
             abort(500, message=error_message)
         return error_message
 
+class StkPushJobsResource(Resource):
+    """Start and poll bulk STK push requests to the members of a block or zone"""
+    method_decorators = [roles_accepted('SuperUser', 'Administrator'), auth_required()]
+
+    def get(self, job_id):
+        job = contributions.get_job(job_id, user=current_user)
+        if not job:
+            return {"success": False, "message": "Job not found"}, 404
+        return job, 200
+
+    def post(self):
+        args = stk_bulk_args.parse_args()
+        try:
+            hierarchy.scoped_umbrella_id(current_user, block_id=args['block_id'], zone_id=args.get('zone_id'))
+            job = contributions.request_block_contributions(
+                block_id=args['block_id'],
+                amount=args['amount'],
+                zone_id=args.get('zone_id'),
+                requested_by=current_user.id
+            )
+        except ServiceError as e:
+            return e.body, e.status_code
+        return job, 202
+
+
+class ContributionStatsResource(Resource):
+    """Contributed and pending member counts for a block, zone or meeting of the caller's umbrella"""
+    method_decorators = [roles_accepted('SuperUser', 'Administrator', 'Chairman', 'Secretary', 'Treasurer'),
+                         auth_required()]
+
+    def get(self):
+        args = contribution_stats_args.parse_args()
+        try:
+            hierarchy.scoped_umbrella_id(current_user, **args)
+            return contributions.contribution_stats(**args), 200
+        except ServiceError as e:
+            return e.body, e.status_code
+
+
+class ContributionReportResource(Resource):
+    """
+    Members of the caller's umbrella joined to what they paid, filtered by
+    meeting, host, block, zone and status
+    """
+    method_decorators = [roles_accepted('SuperUser', 'Administrator', 'Chairman', 'Secretary', 'Treasurer'),
+                         auth_required()]
+
+    def get(self):
+        args = contribution_report_args.parse_args()
+        try:
+            args['umbrella_id'] = hierarchy.scoped_umbrella_id(
+                current_user, umbrella_id=args['umbrella_id'], block_id=args['block_id'],
+                zone_id=args['zone_id'], meeting_id=args['meeting_id']
+            )
+        except ServiceError as e:
+            return e.body, e.status_code
+        return contributions.member_contribution_report(**args), 200
+
+
+class MemoryMetricsResource(Resource):
+    """This worker's sampled memory and garbage collector metrics, as JSON or Prometheus text"""
+    method_decorators = [roles_accepted('SuperUser'), auth_required()]
+
+    def get(self):
+        monitor = get_memory_monitor()
+        if request.args.get('format') == 'prometheus':
+            return Response(monitor.prometheus(), mimetype='text/plain; version=0.0.4')
+        if request.args.get('sample'):
+            monitor.sample()
+        return monitor.metrics(), 200
+
+
+def export_response(query, export_format, name):
+    """Stream ``query``'s rows as a ``name`` download"""
+    response = Response(
+        stream_with_context(exports.stream_rows(query, export_format)),
+        mimetype=exports.EXPORT_FORMATS[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{export_format}'
+    return response
+
+
+class PaymentExportResource(Resource):
+    """
+    Download payments filtered by umbrella, block, meeting and date range as
+    CSV or NDJSON, from the caller's own umbrella unless they are a SuperUser
+    """
+    method_decorators = [roles_accepted('SuperUser', 'Administrator', 'Chairman', 'Secretary', 'Treasurer'),
+                         auth_required()]
+
+    def get(self):
+        args = payment_export_args.parse_args()
+        export_format = args.pop('format')
+        try:
+            args['umbrella_id'] = hierarchy.scoped_umbrella_id(
+                current_user, umbrella_id=args['umbrella_id'], block_id=args['block_id'], meeting_id=args['meeting_id']
+            )
+        except ServiceError as e:
+            return e.body, e.status_code
+        return export_response(exports.payments_query(**args), export_format, 'payments')
+
+
+class MemberExportResource(Resource):
+    """Download the members of the caller's umbrella, or one of its blocks or zones, as CSV or NDJSON"""
+    method_decorators = [roles_accepted('SuperUser', 'Administrator', 'Chairman', 'Secretary', 'Treasurer'),
+                         auth_required()]
+
+    def get(self):
+        args = member_export_args.parse_args()
+        export_format = args.pop('format')
+        try:
+            args['umbrella_id'] = hierarchy.scoped_umbrella_id(current_user, **args)
+        except ServiceError as e:
+            return e.body, e.status_code
+        return export_response(exports.members_query(**args), export_format, 'members')
+
+
 class BlocksResource(BaseResource):
     model = BlockModel
     fields = block_fields
     args = block_args
 
-    def get(self, id=None):
-        if self.fields is None:
-            return {"success": False, "message": "Internal server error. Please contact support."}, 500
+    def changed(self, item):
+        hierarchy.invalidate_block(parent_umbrella_id=item.parent_umbrella_id)
 
+    def get(self, id=None):
         try:
             if id:
-                # Fetch block by ID
-                block = self.model.query.get_or_404(id)
-                return marshal(block, self.fields), 200
+                block = hierarchy.get_block(id)
+                if not block:
+                    raise NotFound()
+                return block, 200
 
             # Check for 'parent_umbrella_id' parameter to filter blocks
-            parent_umbrella_id = request.args.get('parent_umbrella_id')
-            query = self.model.query
-
-            if parent_umbrella_id:
-                # Filter blocks by parent umbrella ID
-                query = query.filter_by(parent_umbrella_id=parent_umbrella_id)
-
-            # Get all matching blocks
-            blocks = query.all()
-            return marshal(blocks, self.fields), 200
+            return hierarchy.list_blocks(request.args.get('parent_umbrella_id')), 200
 
         except Exception as e:
             return self.handle_error(e)
@@ -666,31 +518,14 @@ class BlocksResource(BaseResource):
     def post(self):
         try:
             args = self.args.parse_args()
-
-            # Generate unique initials for the block name
-            initials = BlockModel.block_initials(args['name'])
-
-            # Check for duplicates within the same umbrella
-            existing_block = self.model.query.filter_by(
-                name=args['name'],
-                parent_umbrella_id=args['parent_umbrella_id']
-            ).first()
-
-            if existing_block:
-                return {"success": False, "message": "Block with this name already exists under the specified umbrella."}, 400
-
-            # Create the new block
-            new_block = self.model(
+            return hierarchy.create_block(
                 name=args['name'],
                 parent_umbrella_id=args['parent_umbrella_id'],
-                created_by=args['created_by'],
-                initials=initials
-            )
-
-            db.session.add(new_block)
-            db.session.commit()
+                created_by=args['created_by']
+            ), 201
 
-            return marshal(new_block, self.fields), 201
+        except ServiceError as e:
+            return e.body, e.status_code
 
         except Exception as e:
             db.session.rollback()
@@ -702,27 +537,19 @@ class UmbrellasResource(BaseResource):
     fields = umbrella_fields
     args = umbrella_args
 
-    def get(self, id=None):
-        if self.fields is None:
-            return {"success": False, "message": "Internal server error. Please contact support."}, 500
+    def changed(self, item):
+        hierarchy.invalidate_umbrella(item.id, created_by=item.created_by)
 
+    def get(self, id=None):
         try:
             if id:
-                # If an umbrella ID is provided, return that specific umbrella
-                item = self.model.query.get_or_404(id)
-                return marshal(item, self.fields), 200
+                umbrella = hierarchy.get_umbrella(id)
+                if not umbrella:
+                    raise NotFound()
+                return umbrella, 200
 
             # Check for 'created_by' parameter in the request
-            created_by = request.args.get('created_by')
-            query = self.model.query
-
-            if created_by:
-                # Filter umbrellas based on the 'created_by' field
-                query = query.filter_by(created_by=created_by)
-
-            # Get all matching umbrellas
-            items = query.all()
-            return marshal(items, self.fields), 200
+            return hierarchy.list_umbrellas(request.args.get('created_by')), 200
 
         except Exception as e:
             return self.handle_error(e)
@@ -730,244 +557,115 @@ class UmbrellasResource(BaseResource):
     def post(self):
         try:
             args = self.args.parse_args()
-
-            # Generate unique initials based on the umbrella name
-            initials = UmbrellaModel.generate_unique_initials(args['name'])
-
-            # Create the new umbrella
-            new_umbrella = UmbrellaModel(
+            return hierarchy.create_umbrella(
                 name=args['name'],
                 location=args['location'],
-                created_by=args['created_by'],
-                initials=initials 
-            )
-
-            db.session.add(new_umbrella)
-            db.session.commit()
-
-            return marshal(new_umbrella, self.fields), 201
+                created_by=args['created_by']
+            ), 201
 
         except Exception as e:
             db.session.rollback()
             return self.handle_error(e)
 
+class UmbrellaTreeResource(Resource):
+    """The blocks of the caller's umbrella with their zones and member counts, in one query"""
+    method_decorators = [auth_required()]
+
+    def get(self, id):
+        try:
+            hierarchy.scoped_umbrella_id(current_user, umbrella_id=id)
+        except ServiceError as e:
+            return e.body, e.status_code
+        tree = hierarchy.load_umbrella_tree(id, member_counts=True)
+        if not tree:
+            return {"success": False, "message": "Umbrella not found"}, 404
+
+        # Clients revalidate with If-None-Match and get a 304 while the tree is unchanged
+        response = api.make_response(tree, 200)
+        response.add_etag()
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
 class RolesResource(BaseResource):
     model = RoleModel
     fields = role_fields
     args = role_args
 
 
+def parse_date_param(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
 class MeetingsResource(BaseResource):
     model = MeetingModel
     fields = meeting_fields
     args = meeting_args
+    # Meeting details name the block, zone, host and the host's bank
+    versioned_tables = ('meetings', 'blocks', 'zones', 'users', 'banks')
 
     def get(self, id=None):
         try:
-            # logging.info(f"Incoming request received: {request.url}")
-
             if id:
-                # logging.info(f"Fetching meeting with ID: {id}")
-                meeting = self.model.query.get_or_404(id)
-                if meeting.date < datetime.now():
-                    # logging.info("The meeting date has passed; setting meeting to None.")
-                    return {'message': 'No upcoming meeting available'}, 404
-                return marshal(meeting, self.fields), 200
-
+                try:
+                    meeting = meetings.get_meeting(id, upcoming_only=True)
+                except ServiceError as e:
+                    return e.body, e.status_code
+                if not meeting:
+                    raise NotFound()
+                return meeting, 200
 
             # Get 'organizer_id', 'start', and 'end' query parameters
             organizer_id = request.args.get('organizer_id')
             start_date = request.args.get('start')
             end_date = request.args.get('end')
+            has_range = bool(start_date and end_date)
 
-            # logging.info(f"Query parameters: organizer_id={organizer_id}, start={start_date}, end={end_date}")
-
-            # Check if both 'organizer_id' and date range are provided
-            if organizer_id and start_date and end_date:
-                # Convert string query params to datetime objects
+            if has_range:
                 try:
-                    start_date = datetime.strptime(start_date, '%Y-%m-%d')
-                    end_date = datetime.strptime(end_date, '%Y-%m-%d')
-                    # logging.info(f"Parsed start date: {start_date}, end date: {end_date}")
-
+                    start_date = parse_date_param(start_date)
+                    end_date = parse_date_param(end_date)
                 except ValueError:
-                    # logging.error(f"Invalid date format received: start={start_date}, end={end_date}")
-
                     return {'error': 'Invalid date format. Use YYYY-MM-DD.'}, 400
 
-                # Fetch meetings by organizer_id within the provided date range
-                meetings = MeetingModel.query.filter(MeetingModel.organizer_id == organizer_id,
-                                                     MeetingModel.date >= start_date,
-                                                     MeetingModel.date <= end_date).all()
-                # logging.info(f"Meetings found: {len(meetings)}")
-
-                if meetings:
-                    # Prepare details for all meetings within the date range
-                    meeting_details = []
-                    for meeting in meetings:
-                        host = meeting.host
-                        paybill_no = host.bank.paybill_no if host and host.bank else 'Unknown Paybill'
-                        acc_number = host.acc_number if host else 'Unknown Account'
-
-                        details = {
-                            'meeting_block': meeting.block.name if meeting.block else 'Unknown Block',
-                            'meeting_zone': meeting.zone.name if meeting.zone else 'Unknown Zone',
-                            'host': meeting.host.full_name if meeting.host else 'Unknown Host',
-                            'paybill_no': paybill_no,
-                            'acc_number': acc_number,
-                            'meeting_id':meeting.id,
-                            'when': meeting.date.strftime('%a, %d %b %Y %H:%M:%S'),
-                            'event_id': meeting.unique_id
-                        }
-                        meeting_details.append(details)
-                    # logging.info(f"Meeting details: {meeting_details}")
-
+            if organizer_id or has_range:
+                meeting_details = meetings.list_meeting_details(
+                    organizer_id=organizer_id,
+                    start=start_date if has_range else None,
+                    end=end_date if has_range else None
+                )
+                if meeting_details:
                     return meeting_details, 200
-                else:
+                if organizer_id and has_range:
                     return {'message': 'No meetings found for the organizer within the specified date range'}, 404
-
-            # If only 'organizer_id' is provided (no date range)
-            if organizer_id:
-                # Fetch all meetings by this organizer
-                meetings = MeetingModel.query.filter_by(organizer_id=organizer_id).all()
-
-                if meetings:
-                    meeting_details = []
-                    for meeting in meetings:
-                        host = meeting.host
-                        paybill_no = host.bank.paybill_no if host and host.bank else 'Unknown Paybill'
-                        acc_number = host.acc_number if host else 'Unknown Account'
-
-                        details = {
-                            'meeting_block': meeting.block.name if meeting.block else 'Unknown Block',
-                            'meeting_zone': meeting.zone.name if meeting.zone else 'Unknown Zone',
-                            'host': meeting.host.full_name if meeting.host else 'Unknown Host',
-                            'event_id': meeting.unique_id,
-                            'paybill_no': paybill_no,
-                            'acc_number': acc_number,
-                            'meeting_id':meeting.id,
-                            'when': meeting.date.strftime('%a, %d %b %Y %H:%M:%S')
-                        }
-                        meeting_details.append(details)
-
-                    return meeting_details, 200
-                else:
-                    # logging.warning(f"No meetings found for organizer_id={organizer_id} within date range.")
-
+                if organizer_id:
                     return {'message': 'No meetings found for this organizer'}, 404
-
-            # Check for 'start' and 'end' date filtering without 'organizer_id'
-            if start_date and end_date:
-                try:
-                    start_date = datetime.strptime(start_date, '%Y-%m-%d')
-                    end_date = datetime.strptime(end_date, '%Y-%m-%d')
-                except ValueError:
-                    return {'error': 'Invalid date format. Use YYYY-MM-DD.'}, 400
-
-                # Fetch meetings within the provided date range
-                meetings = MeetingModel.query.filter(MeetingModel.date >= start_date,
-                                                     MeetingModel.date <= end_date).all()
-
-                if meetings:
-
-                    meeting_details = []
-                    for meeting in meetings:
-                        host = meeting.host
-                        paybill_no = host.bank.paybill_no if host and host.bank else 'Unknown Paybill'
-                        acc_number = host.acc_number if host else 'Unknown Account'
-
-                        details = {
-                            'meeting_block': meeting.block.name if meeting.block else 'Unknown Block',
-                            'meeting_zone': meeting.zone.name if meeting.zone else 'Unknown Zone',
-                            'host': meeting.host.full_name if meeting.host else 'Unknown Host',
-                            'paybill_no': paybill_no,
-                            'acc_number': acc_number,
-                            'meeting_id':meeting.id,
-                            'event_id': meeting.unique_id,
-                            'when': meeting.date.strftime('%a, %d %b %Y %H:%M:%S')
-                        }
-                        meeting_details.append(details)
-
-                    return meeting_details, 200
-                else:
-                    return {'message': 'No meetings found within the specified date range'}, 404
+                return {'message': 'No meetings found within the specified date range'}, 404
 
             # If no parameters are provided, fetch all meetings
-            meetings = MeetingModel.query.all()
-            if meetings:
-                return marshal(meetings, self.fields), 200
+            all_meetings = meetings.list_meetings()
+            if all_meetings:
+                return all_meetings, 200
             else:
                 return {'message': 'No meetings found'}, 404
 
         except Exception as e:
-            # logging.error(f"Exception in MeetingsResource: {e}", exc_info=True)
-
             return self.handle_error(e)
 
 
     def post(self):
         try:
-            # Parse the request arguments
             args = self.args.parse_args()
-
-            block_id = args.get('block_id')
-            zone_id = args.get('zone_id')
-            date = args.get('date')
-            
-            if not block_id or not zone_id or not date:
-                return {'error': 'Block ID, Zone ID, and date are required'}, 400
-
-            # Convert the 'date' argument from string to a datetime object
-            try:
-                meeting_date = datetime.strptime(args['date'], '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                return {'error': 'Invalid date format, expected YYYY-MM-DD HH:MM:SS'}, 400
-            
-            block = BlockModel.query.get(block_id)
-            if not block:
-                return {'error': 'Block not found'}, 404
-            zone = ZoneModel.query.filter_by(id=zone_id, parent_block_id=block_id).first()
-            if not zone:
-                return {'error': 'Zone does not belong to the specified block'}, 400
-
-            umbrella_id = block.parent_umbrella_id
-            # Get the current week range (start and end of the week)
-            week_start = meeting_date - timedelta(days=meeting_date.weekday())
-            week_end = week_start + timedelta(days=6, hours=23, minutes=59, seconds=59)
-
-             # Check if there's already a meeting scheduled in any block for this week
-            existing_meeting = self.model.query.join(
-                BlockModel, self.model.block_id == BlockModel.id
-            ).filter(
-                MeetingModel.block_id == block_id,
-                MeetingModel.zone_id == zone_id,
-                BlockModel.parent_umbrella_id == block.parent_umbrella_id,
-                self.model.date >= week_start,
-                self.model.date <= week_end
-            ).first()
-
-            if existing_meeting:
-                return {
-                                'error': 'A meeting is already scheduled this week.',
-                                'block': block_id,
-                                'zone': zone_id,
-                                'umbrella': block.parent_umbrella_id
-                            }, 409
-            # Create the new meeting object with parsed date
-            new_meeting = self.model(
+            return meetings.create_meeting(
                 host_id=args['host_id'],
-                block_id=block_id,
-                zone_id=zone_id,
+                block_id=args.get('block_id'),
+                zone_id=args.get('zone_id'),
                 organizer_id=args['organizer_id'],
-                date=meeting_date
-            )
-
-            # Add and commit the new meeting to the database
-            db.session.add(new_meeting)
-            db.session.commit()
+                date=args.get('date')
+            ), 201
 
-            # Return the newly created meeting
-            return marshal(new_meeting, self.fields), 201
+        except ServiceError as e:
+            return e.body, e.status_code
 
         except Exception as e:
             return self.handle_error(e)
@@ -975,32 +673,12 @@ class MeetingsResource(BaseResource):
     def patch(self, id):
         try:
             args = self.args.parse_args()
-            meeting = self.model.query.get_or_404(id)
-
-            # Validate date if provided
-            if args.get('date'):
-                try:
-                    updated_date = datetime.strptime(args['date'], '%Y-%m-%d %H:%M:%S')
-                    if updated_date < datetime.now():
-                        return {'error': 'Meeting date must be in the future'}, 400
-                    args['date'] = updated_date
-                except ValueError:
-                    return {'error': 'Invalid date format, expected YYYY-MM-DD HH:MM:SS'}, 400
+            if not db.session.get(MeetingModel, id):
+                raise NotFound()
+            return meetings.update_meeting(id, args), 200
 
-            # Validate block and zone relationship if provided
-            if args.get('block_id') and args.get('zone_id'):
-                block = BlockModel.query.get(args['block_id'])
-                zone = ZoneModel.query.filter_by(id=args['zone_id'], parent_block_id=args['block_id']).first()
-                if not block or not zone:
-                    return {'error': 'Zone does not belong to the specified block'}, 400
-
-            # Update fields dynamically
-            for key, value in args.items():
-                if value is not None:
-                    setattr(meeting, key, value)
-
-            db.session.commit()
-            return marshal(meeting, self.fields), 200
+        except ServiceError as e:
+            return e.body, e.status_code
 
         except Exception as e:
             return self.handle_error(e)
@@ -1011,25 +689,27 @@ class ZonesResource(BaseResource):
     fields = zone_fields
     args = zone_args
 
+    def changed(self, item):
+        hierarchy.invalidate_block(item.parent_block_id)
+
     def get(self, id=None):
-        # logging.debug(f"Received GET request for zones. ID: {id}, Args: {request.args}")
         try:
             if id:
                 return super().get(id)
 
-            parent_block_id = request.args.get('parent_block_id')
-            # logging.debug(f"Parent block ID from query params: {parent_block_id}")
-
-            query = self.model.query
-            if parent_block_id:
-                query = query.filter_by(parent_block_id=parent_block_id)
+            return hierarchy.list_zones(request.args.get('parent_block_id')), 200
+        except Exception as e:
+            return self.handle_error(e)
 
-            zones = query.all()
-            # logging.debug(f"Found {len(zones)} zones")
-            result = marshal(zones, self.fields)
-            return result, 200
+    def post(self):
+        try:
+            args = self.args.parse_args()
+            return hierarchy.create_zone(
+                name=args['name'],
+                parent_block_id=args['parent_block_id'],
+                created_by=args['created_by']
+            ), 201
         except Exception as e:
-            # logging.error(f"Error in ZonesResource.get: {str(e)}", exc_info=True)
             return self.handle_error(e)
 
 class MpesaCallbackMixin(Resource):
@@ -1044,7 +724,7 @@ class MpesaCallbackMixin(Resource):
             # Get the raw request data
             if request.is_json:
                 data = request.get_json()
-                logger.info(f"Callback JSON data: {json.dumps(data, indent=2)}")
+                logger.info("Callback JSON data: %s", LazyJson(data))
             else:
                 data = request.form.to_dict()
                 logger.info(f"Callback form data: {data}")
@@ -1067,201 +747,24 @@ class MpesaValidationResource(MpesaCallbackMixin, BaseResource):
     
     def post(self):
         """Handle M-Pesa validation requests"""
-        try:
-            logger.info("Processing M-Pesa validation request")
-            data = request.get_json()
-            logger.info(f"Validation request data: {json.dumps(data, indent=2)}")
-            
-            # Store validation request
-            transaction = PaymentModel(
-                mpesa_id=data.get('TransID'),
-                account_number=data.get('BillRefNumber'),
-                source_phone_number=data.get('MSISDN'),
-                amount=float(data.get('TransAmount', 0)),
-                transaction_type=data.get('TransactionType'),
-                business_short_code=data.get('BusinessShortCode'),
-                transaction_status='pending'
-            )
-            db.session.add(transaction)
-            db.session.commit()
-            
-            logger.info(f"Stored validation request for TransID: {data.get('TransID')}")
-            
-            return {
-                "ResultCode": "0",
-                "ResultDesc": "Accepted"
-            }, 200
-            
-        except Exception as e:
-            logger.error(f"Error in validation request: {str(e)}", exc_info=True)
-            db.session.rollback()
-            return {
-                "ResultCode": "1",
-                "ResultDesc": "Internal server error"
-            }, 200
+        logger.info("Processing M-Pesa validation request")
+        return callbacks.enqueue('validation', request.get_json()), 200
 
 class MpesaConfirmationResource(MpesaCallbackMixin, BaseResource):
     model = PaymentModel
     
     def post(self):
         """Handle M-Pesa confirmation requests"""
-        try:
-            logger.info("Processing M-Pesa confirmation request")
-            data = request.get_json()
-            logger.info(f"Confirmation request data: {json.dumps(data, indent=2)}")
-
-            # Find matching user by MSISDN
-            msisdn = data.get('MSISDN')
-            bill_ref = data.get('BillRefNumber')
-            payer = find_user_by_hashed_msisdn(msisdn) if msisdn else None
-            logger.info(f"Found matching user: {payer.full_name if payer else 'None'} for MSISDN: {msisdn}")
-            # Safely get block_id
-            block_id = None
-            meeting_id = None
-            meeting_id = MeetingModel.query.filter_by(unique_id=bill_ref).first()
-              
-            # Fetch meeting using BillRefNumber
-            if bill_ref:
-                meeting = MeetingModel.query.filter_by(unique_id=bill_ref).first()
-                if meeting:
-                    meeting_id = meeting.id
-                    logger.info(f"Found meeting ID: {meeting_id} for BillRefNumber: {bill_ref}")
-                else:
-                    logger.warning(f"No meeting found for BillRefNumber: {bill_ref}")
-            if payer:
-                memberships = payer.block_memberships.all()
-                logger.debug(f"User {payer.full_name} has {len(memberships)} block memberships")
-                if memberships:
-                    block_id = memberships[0].id
-                    
-            
-            # Find existing transaction
-            transaction = PaymentModel.query.filter_by(
-                mpesa_id=data.get('TransID')
-            ).first()
-            
-            if transaction:
-                # Update transaction status
-                transaction.transaction_status = 'completed'
-                transaction.payment_date = datetime.strptime(
-                    data.get('TransTime', ''), 
-                    '%Y%m%d%H%M%S'
-                ).replace(tzinfo=timezone.utc)
-                transaction.first_name = data.get('FirstName')
-                transaction.middle_name = data.get('MiddleName')
-                transaction.last_name = data.get('LastName')
-                transaction.org_account_balance = data.get('OrgAccountBalance')
-
-                 # Update payer information if found
-                if payer:
-                    transaction.payer_id = payer.id
-                    transaction.block_id = payer.block_memberships[0].id if payer.block_memberships else None
-                
-                db.session.commit()
-                logger.info(f"Updated transaction status for TransID: {data.get('TransID')}")
-            else:
-                # Create new transaction record
-                transaction = PaymentModel(
-                    mpesa_id=data.get('TransID'),
-                    account_number=data.get('BillRefNumber'),
-                    source_phone_number=data.get('MSISDN'),
-                    amount=float(data.get('TransAmount', 0)),
-                    payment_date=datetime.strptime(
-                        data.get('TransTime', ''), 
-                        '%Y%m%d%H%M%S'
-                    ).replace(tzinfo=timezone.utc),
-                    transaction_type=data.get('TransactionType'),
-                    business_short_code=data.get('BusinessShortCode'),
-                    first_name=data.get('FirstName'),
-                    middle_name=data.get('MiddleName'),
-                    last_name=data.get('LastName'),
-                    org_account_balance=data.get('OrgAccountBalance'),
-                    transaction_status='completed',
-                    payer_id=payer.id if payer else None,
-                    block_id=block_id,
-                    meeting_id=meeting_id
-                )
-                db.session.add(transaction)
-                db.session.commit()
-                logger.info(f"Created new transaction record for TransID: {data.get('TransID')}")
-            
-            return {
-                "C2BPaymentConfirmationResult": "Success"
-            }, 200
-            
-        except Exception as e:
-            logger.error(f"Error in confirmation request: {str(e)}", exc_info=True)
-            db.session.rollback()
-            return {
-                "C2BPaymentConfirmationResult": "Success"
-            }, 200
+        logger.info("Processing M-Pesa confirmation request")
+        return callbacks.enqueue('confirmation', request.get_json()), 200
 
 class MpesaSTKCallbackResource(MpesaCallbackMixin, BaseResource):
     model = PaymentModel
     
     def post(self):
         """Handle M-Pesa STK push callbacks"""
-        try:
-            logger.info("Processing M-Pesa STK callback request")
-            data = request.get_json()
-            logger.info(f"STK callback data: {json.dumps(data, indent=2)}")
-            
-            # Extract callback data
-            callback_data = data.get("Body", {}).get("stkCallback", {})
-            merchant_request_id = callback_data.get("MerchantRequestID")
-            checkout_request_id = callback_data.get("CheckoutRequestID")
-            result_code = callback_data.get("ResultCode")
-            result_desc = callback_data.get("ResultDesc")
-            
-            logger.info(f"STK callback result: code={result_code}, desc={result_desc}")
-            logger.info(f"MerchantRequestID: {merchant_request_id}")
-            logger.info(f"CheckoutRequestID: {checkout_request_id}")
-            
-            # Find existing transaction
-            transaction = PaymentModel.query.filter_by(
-                merchant_request_id=merchant_request_id,
-                checkout_request_id=checkout_request_id
-            ).first()
-            
-            if transaction:
-                # Update transaction status based on result code
-                transaction.transaction_status = 'completed' if result_code == "0" else 'failed'
-                transaction.result_code = result_code
-                transaction.result_desc = result_desc
-                
-                if result_code == "0":
-                    # Extract payment details on success
-                    items = callback_data.get("CallbackMetadata", {}).get("Item", [])
-                    for item in items:
-                        name = item.get("Name")
-                        value = item.get("Value")
-                        
-                        if name == "Amount":
-                            transaction.amount = float(value)
-                        elif name == "MpesaReceiptNumber":
-                            transaction.mpesa_id = value
-                        elif name == "TransactionDate":
-                            transaction.payment_date = datetime.strptime(
-                                str(value), 
-                                '%Y%m%d%H%M%S'
-                            ).replace(tzinfo=timezone.utc)
-                        elif name == "PhoneNumber":
-                            transaction.source_phone_number = value
-                
-                db.session.commit()
-                logger.info(f"Updated STK transaction status: {transaction.transaction_status}")
-            
-            return {
-                "ResultCode": "0",
-                "ResultDesc": "Success"
-            }, 200
-            
-        except Exception as e:
-            logger.error(f"Error in STK callback: {str(e)}", exc_info=True)
-            return {
-                "ResultCode": "0",
-                "ResultDesc": "Success"
-            }, 200
+        logger.info("Processing M-Pesa STK callback request")
+        return callbacks.enqueue('stk', request.get_json()), 200
 
 # API routes
 api.add_resource(UsersResource, '/users/', '/users/<int:id>')
@@ -1270,9 +773,16 @@ api.add_resource(BanksResource, '/banks/', '/banks/<int:id>')
 api.add_resource(PaymentsResource, '/payments/', '/payments/<int:id>')
 api.add_resource(BlocksResource, '/blocks/', '/blocks/<int:id>')
 api.add_resource(UmbrellasResource, '/umbrellas/', '/umbrellas/<int:id>')
+api.add_resource(UmbrellaTreeResource, '/umbrellas/<int:id>/tree')
 api.add_resource(RolesResource, '/roles/', '/roles/<int:id>')
 api.add_resource(MeetingsResource, '/meetings/', '/meetings/<int:id>')
 api.add_resource(ZonesResource, '/zones/', '/zones/<int:id>')
 api.add_resource(MpesaValidationResource, '/payments/validation')
 api.add_resource(MpesaConfirmationResource, '/payments/confirmation')
 api.add_resource(MpesaSTKCallbackResource, '/payments/stk/callback', endpoint='stk_callback')
+api.add_resource(StkPushJobsResource, '/payments/stk/bulk', '/payments/stk/bulk/<string:job_id>')
+api.add_resource(ContributionStatsResource, '/payments/stats')
+api.add_resource(ContributionReportResource, '/payments/report')
+api.add_resource(PaymentExportResource, '/payments/export')
+api.add_resource(MemberExportResource, '/users/export')
+api.add_resource(MemoryMetricsResource, '/metrics/memory')
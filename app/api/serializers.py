@@ -178,6 +178,11 @@ user_args.add_argument('approved_by_id', type=int)
 
 
 
+user_page_args = reqparse.RequestParser()
+user_page_args.add_argument('per_page', type=int, location='args')
+user_page_args.add_argument('cursor', type=int, location='args', help='Cursor must be a user ID')
+user_page_args.add_argument('page', type=int, location='args')
+
 communication_args = reqparse.RequestParser()
 communication_args.add_argument('content', type=str, required=True, help='Content is required')
 communication_args.add_argument('member_id', type=int, required=True, help='Member ID is required')
@@ -219,6 +224,41 @@ payment_update_args.add_argument('transaction_status', type=str)
 payment_update_args.add_argument('org_account_balance', type=float)
 payment_update_args.add_argument('third_party_trans_id', type=str)
 
+stk_bulk_args = reqparse.RequestParser()
+stk_bulk_args.add_argument('block_id', type=int, required=True, help='Block ID is required')
+stk_bulk_args.add_argument('amount', type=int, required=True, help='Amount is required')
+stk_bulk_args.add_argument('zone_id', type=int)
+
+contribution_stats_args = reqparse.RequestParser()
+contribution_stats_args.add_argument('block_id', type=int, location='args')
+contribution_stats_args.add_argument('zone_id', type=int, location='args')
+contribution_stats_args.add_argument('meeting_id', type=int, location='args')
+
+contribution_report_args = reqparse.RequestParser()
+contribution_report_args.add_argument('meeting_id', type=int, location='args')
+contribution_report_args.add_argument('host_id', type=int, location='args')
+contribution_report_args.add_argument('umbrella_id', type=int, location='args')
+contribution_report_args.add_argument('block_id', type=int, location='args')
+contribution_report_args.add_argument('zone_id', type=int, location='args')
+contribution_report_args.add_argument('member_id', type=int, location='args')
+contribution_report_args.add_argument('status', type=str, location='args', choices=('Contributed', 'Pending'))
+
+payment_export_args = reqparse.RequestParser()
+payment_export_args.add_argument('umbrella_id', type=int, location='args')
+payment_export_args.add_argument('block_id', type=int, location='args')
+payment_export_args.add_argument('meeting_id', type=int, location='args')
+payment_export_args.add_argument('start', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args',
+                                 help='Start date must be YYYY-MM-DD')
+payment_export_args.add_argument('end', type=lambda x: datetime.strptime(x, '%Y-%m-%d').date(), location='args',
+                                 help='End date must be YYYY-MM-DD')
+payment_export_args.add_argument('format', type=str, location='args', choices=('csv', 'ndjson'), default='csv')
+
+member_export_args = reqparse.RequestParser()
+member_export_args.add_argument('umbrella_id', type=int, location='args')
+member_export_args.add_argument('block_id', type=int, location='args')
+member_export_args.add_argument('zone_id', type=int, location='args')
+member_export_args.add_argument('format', type=str, location='args', choices=('csv', 'ndjson'), default='csv')
+
 block_args = reqparse.RequestParser()
 block_args.add_argument('name', type=str, required=True, help='Block Name is required')
 block_args.add_argument('parent_umbrella_id', type=int, required=True, help='Parent Umbrella ID is required')
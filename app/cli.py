@@ -0,0 +1,83 @@
+import click
+from flask.cli import AppGroup
+
+tabpay_cli = AppGroup('tabpay', help='TabPay maintenance commands.')
+
+
+@tabpay_cli.command('bootstrap')
+@click.option('--banks-file', default='banks.json', show_default=True, help='Banks loaded into an empty database.')
+def bootstrap_command(banks_file):
+    """Create the schema, roles, superusers and initial banks."""
+    from .utils.bootstrap import bootstrap
+
+    counts = bootstrap(banks_file)
+    click.echo(f"Created {counts['roles']} roles, {counts['superusers']} superusers and {counts['banks']} banks")
+
+
+@tabpay_cli.command('rebuild-msisdn-hashes')
+def rebuild_msisdn_hashes_command():
+    """Backfill the precomputed MSISDN hash index for all users."""
+    from .utils.msisdn_hashed import rebuild_msisdn_hashes
+
+    count = rebuild_msisdn_hashes()
+    click.echo(f'Rebuilt MSISDN hashes for {count} users')
+
+
+@tabpay_cli.command('drain-callbacks')
+@click.option('--batch-size', default=100, show_default=True, help='Callbacks claimed per batch.')
+@click.option('--forever', is_flag=True, help='Keep polling for new callbacks until interrupted.')
+@click.option('--interval', default=1.0, show_default=True, help='Seconds to wait when the queue is empty.')
+def drain_callbacks_command(batch_size, forever, interval):
+    """Apply queued M-Pesa callbacks to payments."""
+    import time
+    from .services import callbacks
+    from .utils import db
+
+    total = 0
+    while True:
+        claimed = callbacks.drain(batch_size)
+        total += claimed
+        db.session.remove()
+        if not claimed:
+            if not forever:
+                break
+            time.sleep(interval)
+    click.echo(f'Processed {total} M-Pesa callbacks')
+
+
+@tabpay_cli.command('rebuild-contribution-summary')
+@click.option('--meeting-id', type=int, help='Only rebuild this meeting.')
+def rebuild_contribution_summary_command(meeting_id):
+    """Recompute the meeting contribution summary from payments."""
+    from .services import ledger
+
+    count = ledger.rebuild_summary(meeting_id)
+    click.echo(f'Rebuilt {count} contribution summary rows')
+
+
+@tabpay_cli.command('build-search-index')
+def build_search_index_command():
+    """Create the search index on an existing database and fill it."""
+    from .services import search
+
+    dialect = search.build_index()
+    click.echo(f'Built the {dialect} search index')
+
+
+@tabpay_cli.command('backfill-phone-e164')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows normalized per batch.')
+def backfill_phone_e164_command(batch_size):
+    """Fill the E.164 phone columns of existing users and payments."""
+    from .utils.phone import backfill_phone_e164
+
+    counts = backfill_phone_e164(batch_size)
+    click.echo(f"Backfilled E.164 phone numbers for {counts['users']} users and {counts['payments']} payments")
+
+
+@tabpay_cli.command('create-indexes')
+def create_indexes_command():
+    """Create model indexes missing from an existing database."""
+    from .utils.schema import create_missing_indexes
+
+    created = create_missing_indexes()
+    click.echo(f"Created {len(created)} indexes" + (f": {', '.join(created)}" if created else ""))
@@ -63,6 +63,11 @@ class PaymentForm(FlaskForm):
     bank = SelectField('Bank:', choices=[("", "Choose a Bank")], validators=[DataRequired(message="Bank field is required")])
     acc_number = StringField('A/C:', validators=[DataRequired(message="Account number is required.")], render_kw={'placeholder': 'xxxxxx'})
     submit = SubmitField('SEND PAYMENT')
+
+class BulkPaymentForm(FlaskForm):
+    block = SelectField('Select Block', choices=[("", "Choose a Block")], validators=[DataRequired(message="Block field is required.")])
+    amount = IntegerField('Amount to Send', validators=[DataRequired(message="Amount field is required."), NumberRange(min=1, message="Amount must be greater than zero.")])
+
 class ScheduleForm(FlaskForm):
     block = SelectField(
         'Select the relevant Block', 
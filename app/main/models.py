@@ -8,7 +8,9 @@ import uuid
 from datetime import datetime, timezone
 import string
 import random
+import hashlib
 from sqlalchemy import event
+from ..utils.phone import to_e164
 
 # Association tables
 member_blocks = db.Table('member_blocks',
@@ -62,6 +64,7 @@ class UserModel(db.Model, UserMixin):
     fs_uniquifier = db.Column(db.String(64), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     zone_id = db.Column(db.Integer, db.ForeignKey('zones.id'))
     umbrella_id = db.Column(db.Integer, db.ForeignKey('umbrellas.id'))
+    phone_e164 = db.Column(db.String(20), index=True)  # phone_number normalized, e.g. +254712345678
     __table_args__ = (db.UniqueConstraint('id_number', 'phone_number',acc_number, 'zone_id', name='uq_user_id_phone_acc_zone'),)
 
 
@@ -96,10 +99,11 @@ class UserModel(db.Model, UserMixin):
     roles = db.relationship('RoleModel', secondary=roles_users, backref=db.backref('users', lazy=True))
     messages = db.relationship('CommunicationModel', backref='author', lazy=True)
     payments = db.relationship('PaymentModel', backref='payer', lazy=True)
-    block_memberships = db.relationship('BlockModel',secondary=member_blocks,backref=db.backref('block_members', lazy='dynamic'),lazy='dynamic')
+    block_memberships = db.relationship('BlockModel',secondary=member_blocks,backref=db.backref('block_members', lazy='dynamic'))
     zone_memberships = db.relationship('ZoneModel', secondary=member_zones, backref=db.backref('zone_members', lazy=True))
     webauth = db.relationship('WebAuth', backref='user', uselist=False)
     hosted_meetings = db.relationship('MeetingModel', backref='host', foreign_keys='MeetingModel.host_id')
+    msisdn_hashes = db.relationship('MsisdnHashModel', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f"<User {self.full_name}>"
@@ -143,6 +147,38 @@ class UserModel(db.Model, UserMixin):
 
 
 
+class MsisdnHashModel(db.Model):
+    """Precomputed SHA-256 hashes of a user's phone number for C2B confirmation matching"""
+    __tablename__ = 'msisdn_hashes'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    msisdn_hash = db.Column(db.String(64), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<MsisdnHash {self.msisdn_hash[:8]} for user {self.user_id}>"
+
+    @staticmethod
+    def hashes_for(phone):
+        """Hash every phone number format Safaricom may have hashed for this number."""
+        if not phone:
+            return []
+        formats_to_try = [
+            phone,  # Original format
+            phone.lstrip('+'),  # Remove leading +
+            phone.lstrip('0'),  # Remove leading 0
+            '254' + phone.lstrip('+254').lstrip('0')  # Ensure 254 prefix
+        ]
+        # Preserve order while dropping formats that collapse to the same string
+        return [hashlib.sha256(phone_format.encode()).hexdigest() for phone_format in dict.fromkeys(formats_to_try)]
+
+@event.listens_for(UserModel.phone_number, 'set')
+def receive_phone_number_set(target, value, oldvalue, initiator):
+    """Keep the MSISDN hash index in sync whenever a user's phone number changes."""
+    if value == oldvalue:
+        return
+    target.msisdn_hashes = [MsisdnHashModel(msisdn_hash=msisdn_hash) for msisdn_hash in MsisdnHashModel.hashes_for(value)]
+    target.phone_e164 = to_e164(value)
+
 class WebAuth(db.Model):
     __tablename__ = 'webauth'
     id = db.Column(db.Integer, primary_key=True)
@@ -186,6 +222,14 @@ class BlockModel(db.Model):
     payments = db.relationship('PaymentModel', backref='block', lazy=True)
     meetings = db.relationship('MeetingModel', backref='block', lazy=True)
     initials = db.Column(db.String(10))
+    # Loaded only when asked for, e.g. with undefer()
+    member_count = db.column_property(
+        db.select(db.func.count(member_blocks.c.user_id))
+        .where(member_blocks.c.block_id == id)
+        .correlate_except(member_blocks)
+        .scalar_subquery(),
+        deferred=True
+    )
 
         # Role-specific relationships (Chairman, Secretary, Treasurer)
     chairman_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -215,6 +259,13 @@ class ZoneModel(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))  # User who created the zone
     creator = db.relationship('UserModel', primaryjoin="ZoneModel.created_by == UserModel.id", backref='created_zones')  # Access the creator
     meetings = db.relationship('MeetingModel', backref='zone', lazy=True)  # Meetings in the zone
+    member_count = db.column_property(
+        db.select(db.func.count(member_zones.c.user_id))
+        .where(member_zones.c.zone_id == id)
+        .correlate_except(member_zones)
+        .scalar_subquery(),
+        deferred=True
+    )
 
     # Members of the zone (users)
     members = db.relationship('UserModel', foreign_keys='UserModel.zone_id', backref='zone', lazy=True)
@@ -225,6 +276,12 @@ class ZoneModel(db.Model):
 
 class MeetingModel(db.Model):
     __tablename__ = 'meetings'
+    __table_args__ = (
+        db.Index('ix_meetings_organizer_date', 'organizer_id', 'date'),  # Meeting details by organizer
+        db.Index('ix_meetings_block_zone_date', 'block_id', 'zone_id', 'date'),  # One meeting per zone a week
+        db.Index('ix_meetings_host_id', 'host_id'),  # Reports by host
+        db.Index('ix_meetings_date', 'date'),  # Current meeting
+    )
     id = db.Column(db.Integer, primary_key=True)
     unique_id = db.Column(db.String(16), unique=True, nullable=False, index=True)
     host_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -266,11 +323,19 @@ class BankModel(db.Model):
 class PaymentModel(db.Model):
     """Model for storing payments including M-Pesa transactions"""
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_meeting_status', 'meeting_id', 'transaction_status'),  # Meeting totals and ledger
+        db.Index('ix_payments_payer_meeting', 'payer_id', 'meeting_id'),  # Member reports and stats
+        db.Index('ix_payments_block_meeting', 'block_id', 'meeting_id'),  # Block contributions
+        db.Index('ix_payments_stk_request', 'checkout_request_id', 'merchant_request_id'),  # STK callbacks
+        db.Index('ix_payments_payment_date', 'payment_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    mpesa_id = db.Column(db.String(255), nullable=False)  # TransID from M-Pesa
+    mpesa_id = db.Column(db.String(255), nullable=False, unique=True, index=True)  # TransID from M-Pesa
     account_number = db.Column(db.String(80), nullable=False)  # BillRefNumber
     source_phone_number = db.Column(db.String(80), nullable=False)  # MSISDN
+    phone_e164 = db.Column(db.String(20), index=True)  # Payer's number in E.164, also for hashed MSISDNs
     amount = db.Column(db.Integer, nullable=False)
     payment_date = db.Column(db.DateTime, default=db.func.current_timestamp())
     transaction_status = db.Column(db.String, default='Pending')
@@ -338,6 +403,106 @@ class PaymentModel(db.Model):
             'customer_name': self.customer_name
         }
 
+@event.listens_for(PaymentModel.source_phone_number, 'set')
+def receive_source_phone_number_set(target, value, oldvalue, initiator):
+    """Keep the E.164 number in step with the source number; hashed MSISDNs leave it as set by the caller."""
+    target.phone_e164 = to_e164(value) or target.phone_e164
+
+class MpesaCallbackModel(db.Model):
+    """Outbox of received M-Pesa callbacks waiting to be applied to payments"""
+    __tablename__ = 'mpesa_callbacks'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'dedupe_key', name='uq_mpesa_callback_kind_key'),
+        db.Index('ix_mpesa_callbacks_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # validation, confirmation, stk
+    dedupe_key = db.Column(db.String(100), nullable=False)  # TransID or CheckoutRequestID
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, processing, done, failed
+    claim_token = db.Column(db.String(32))
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.String(255))
+    received_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    claimed_at = db.Column(db.DateTime)
+    next_attempt_at = db.Column(db.DateTime)  # Failed callbacks wait until then to be retried
+    processed_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<MpesaCallback {self.kind} {self.dedupe_key} {self.status}>'
+
+class StkPushJobModel(db.Model):
+    """Progress of a bulk STK push request sent to the members of a block or zone"""
+    __tablename__ = 'stk_push_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), unique=True, nullable=False, default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    amount = db.Column(db.Integer, nullable=False)
+    block_id = db.Column(db.Integer, db.ForeignKey('blocks.id'), nullable=False)
+    zone_id = db.Column(db.Integer, db.ForeignKey('zones.id'), nullable=True)
+    meeting_id = db.Column(db.Integer, db.ForeignKey('meetings.id'), nullable=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    total = db.Column(db.Integer, default=0)
+    sent = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<StkPushJob {self.job_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'amount': self.amount,
+            'block_id': self.block_id,
+            'zone_id': self.zone_id,
+            'meeting_id': self.meeting_id,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'pending': max((self.total or 0) - (self.sent or 0) - (self.failed or 0), 0),
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class MeetingContributionSummaryModel(db.Model):
+    """Running count and total of completed payments per meeting, block and zone"""
+    __tablename__ = 'meeting_contribution_summary'
+
+    id = db.Column(db.Integer, primary_key=True)
+    meeting_id = db.Column(db.Integer, db.ForeignKey('meetings.id'), nullable=False)
+    # 0 when the payer's block or zone is not known, so the key stays unique
+    block_id = db.Column(db.Integer, nullable=False, default=0)
+    zone_id = db.Column(db.Integer, nullable=False, default=0)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Integer, nullable=False, default=0)
+    last_payment_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.UniqueConstraint('meeting_id', 'block_id', 'zone_id', name='uq_contribution_summary_meeting_block_zone'),
+    )
+
+    def __repr__(self):
+        return f'<MeetingContributionSummary meeting={self.meeting_id} block={self.block_id} zone={self.zone_id}>'
+
+class TableVersionModel(db.Model):
+    """Counter bumped whenever a table is written, used to validate cached API responses"""
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<TableVersion {self.table_name} {self.version}>'
+
 class CommunicationModel(db.Model):
     __tablename__ = 'communications'
     id = db.Column(db.Integer, primary_key=True)
@@ -1,27 +1,40 @@
 from flask import Blueprint, render_template, redirect, url_for, flash,request,jsonify, session, current_app
 from flask_security import login_required, current_user, roles_accepted, user_registered
-from app.main.forms import ProfileForm, AddMemberForm, AddCommitteForm, UmbrellaForm, BlockForm, ZoneForm, ScheduleForm, EditMemberForm,PaymentForm,AddMembershipForm
+from app.main.forms import ProfileForm, AddMemberForm, AddCommitteForm, UmbrellaForm, BlockForm, ZoneForm, ScheduleForm, EditMemberForm,PaymentForm,BulkPaymentForm,AddMembershipForm
 from app.main.models import UserModel, BlockModel, PaymentModel, ZoneModel, MeetingModel
 from app.auth.decorators import approval_required, umbrella_required
 from ..utils import save_picture, db
 from flask_wtf.csrf import CSRFProtect
 from datetime import datetime,timedelta
-from ..utils.send_sms import SendSMS
+from ..utils.send_sms import get_sms
 from ..utils.mpesa_security import require_safaricom_ip_validation
-from ..utils.mpesa import get_mpesa_client
-import logging,requests,os
+from ..services import (
+    ServiceError,
+    callbacks as callback_service,
+    contributions as contribution_service,
+    hierarchy as hierarchy_service,
+    ledger as ledger_service,
+    meetings as meeting_service,
+    payments as payment_service,
+    reference as reference_service,
+    search as search_service,
+    users as user_service,
+)
+from sqlalchemy.exc import SQLAlchemyError
+import logging
 from functools import wraps
 from ..utils.umbrella import (
     get_umbrella_by_user,
     get_blocks_by_umbrella,
     get_zones_by_block,
+    get_zone_map,
     cache_for_request,
 )
+from ..utils.tracing import traced
 
 
 
 main = Blueprint('main', __name__)
-sms = SendSMS()
 
 logger = logging.getLogger(__name__)
 
@@ -125,14 +138,7 @@ def render_settings_page(umbrella_form=None, block_form=None, zone_form=None,
         return "An error occurred while fetching data.", 500  
     
     # Prepare a mapping for zones with block names
-    zone_map = {}  # Store a mapping of zone_id to (zone_name, block_name)
-    for block in blocks:
-        # Fetch zones associated with the current block       
-        block_id = block['id']         
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']  #_idlock name from the block data
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name    
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     # Set the choices for the member_zone field in the form
     member_form.member_zone.choices = [("", "--Choose a Zone--")] + [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
@@ -226,7 +232,6 @@ active_tab=request.args.get('active_tab', 'profile'), selected_block=selected_bl
 
 def handle_profile_update():
     profile_form = ProfileForm()
-    api_url = f"{current_app.config['API_BASE_URL']}/api/v1/users/{current_user.id}"
 
     update_data = {}
     user_changed = False
@@ -237,18 +242,14 @@ def handle_profile_update():
         if profile_form.picture.data:
             try:
                 picture_file = save_picture(profile_form.picture.data)
-                image_path = os.path.join(current_app.root_path, 'static/images', picture_file)
 
                 if current_user.image_file != picture_file:
-                    with open(image_path, 'rb') as f:
-                        files = {'picture': (picture_file, f, 'image/png')}
-                        response = requests.patch(api_url, files=files, headers={'Authorization': f"Bearer {current_user.get_auth_token()}"})
-                    
-                    if response.status_code == 200:
+                    try:
+                        user_service.update_user(current_user.id, {'image_file': picture_file})
                         flash('Profile picture updated successfully!', 'success')
                         current_user.image_file = picture_file
                         user_changed = True
-                    else:
+                    except ServiceError:
                         flash('Failed to update profile picture.', 'danger')
                 else:
                     flash('The new profile picture is the same as the current one.', 'info')
@@ -265,20 +266,19 @@ def handle_profile_update():
             user_changed = True
    
 
-        # Make API call to update profile fields if any data changed
+        # Update profile fields if any data changed
         if update_data:
             try:
-                response = requests.patch(api_url, json=update_data, headers={'Authorization': f"Bearer {current_user.get_auth_token()}"})
-                if response.status_code == 200:
-                    flash("Profile updated successfully!", "success")
-                    user_changed = True
-                    # Update the current user details in session after successful update
-                    current_user.full_name = update_data.get('full_name', current_user.full_name)
-                    current_user.email = update_data.get('email', current_user.email)
-                else:
-                    errors = response.json().get('message', "An error occurred")
-                    flash(errors, "danger")
+                user_service.update_user(current_user.id, update_data)
+                flash("Profile updated successfully!", "success")
+                user_changed = True
+                # Update the current user details in session after successful update
+                current_user.full_name = update_data.get('full_name', current_user.full_name)
+                current_user.email = update_data.get('email', current_user.email)
+            except ServiceError as e:
+                flash(e.message or "An error occurred", "danger")
             except Exception as e:
+                db.session.rollback()
                 flash("An error occurred while updating profile details.", "danger")
 
         # Inform user if no changes were detected
@@ -295,18 +295,12 @@ def handle_profile_update():
 
 
 def get_roles():
-    response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/roles/")
-    return response.json() if response.status_code == 200 else None    
+    return reference_service.list_roles()
 
 # Helper function to get user by ID number
 def get_user_by_id_number(id_number):
     try:
-        response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/", params={'id_number': id_number})
-        # current_app.logger.debug(f"API Response: {response.json()}")  
-        if response.status_code == 200:
-            user = response.json()  # Expecting a single user, not a list
-            return user
-        return None
+        return user_service.get_user_by_id_number(id_number)
     except Exception as e:
         current_app.logger.error(f"Error fetching user by id_number: {e}")
         return None
@@ -391,9 +385,8 @@ def handle_committee_addition(committee_form):
          
 
             # Fetch block details and check for existing committee members
-            block_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/blocks/{block_id}")
-            if block_response.status_code == 200:
-                block = block_response.json()
+            block = hierarchy_service.get_block(block_id)
+            if block:
                 block_name = block['name']
 
                 # Ensure the block doesn't already have a chairman, secretary, or treasurer
@@ -416,22 +409,22 @@ def handle_committee_addition(committee_form):
 
 
             try:
-                # API PATCH request to update the user's role
-                response = requests.patch(
-                    f"{current_app.config['API_BASE_URL']}/api/v1/users/{user['id']}",
-                    json={"role_id": role_id, 'action': 'add', 'block_id': block_id}  
+                # Assign the committee role for the selected block
+                user_service.update_user(
+                    user['id'],
+                    {"role_id": role_id, 'action': 'add', 'block_id': int(block_id)},
+                    approver=current_user
                 )
+                flash(f"{user['full_name']} has been assigned '{role_name}' role in {block_name} successfully!", 'success')
+                active_tab = 'chairmen' if role_id == 3 else 'secretaries' if role_id == 4 else 'treasurers'
+                return redirect(url_for('main.committee', active_tab=active_tab))
+
+            except ServiceError as e:
+                flash(f"An error occurred: {e.message}", 'danger')
+                return redirect(url_for('main.settings', active_tab='committee'))
 
-                # Check if the response is successful
-                if response.status_code == 200:
-                    flash(f"{user['full_name']} has been assigned '{role_name}' role in {block_name} successfully!", 'success')
-                    active_tab = 'chairmen' if role_id == 3 else 'secretaries' if role_id == 4 else 'treasurers'
-                    return redirect(url_for('main.committee', active_tab=active_tab))
-                else:
-                    flash(f"An error occurred: {response.json().get('message')}", 'danger')
-                    return redirect(url_for('main.settings', active_tab='committee'))
-            
             except Exception as e:
+                db.session.rollback()
                 print ( f'{e}')
                 flash(f"Sorry, an error occurred.", 'danger')
                 return redirect(url_for('main.settings', active_tab='committee'))
@@ -442,8 +435,7 @@ def handle_committee_addition(committee_form):
     return render_settings_page(committee_form=committee_form,active_tab='committee')
 
 def get_umbrellas():
-    umbrellas_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/umbrellas")
-    return umbrellas_response.json()
+    return hierarchy_service.list_umbrellas()
 
 
 
@@ -497,7 +489,7 @@ def handle_block_creation(block_form):
             flash('A block with that name already exists in the umbrella!', 'info')
             return redirect(url_for('main.settings', active_tab='block'))
 
-        # Proceed to create the block via the API
+        # Proceed to create the block
         create_block({
             'name': block_form.block_name.data,
             'parent_umbrella_id': umbrella['id'],
@@ -538,10 +530,10 @@ def handle_zone_creation(zone_form):
             flash('A zone with that name already exists in this block!', 'info')
             return redirect(url_for('main.settings', active_tab='zone'))
 
-        # Proceed to create the zone via the API
+        # Proceed to create the zone
         create_zone({
             'name': zone_form.zone_name.data,
-            'parent_block_id': zone_form.parent_block.data,
+            'parent_block_id': int(zone_form.parent_block.data),
             'created_by': current_user.id
         })
         flash('Zone created successfully!', 'success')
@@ -569,14 +561,7 @@ def handle_member_creation(member_form):
         return "An error occurred while fetching data.", 500  
     
     # Prepare a mapping for zones with block names
-    zone_map = {}  # Store a mapping of zone_id to (zone_name, block_name)
-    for block in blocks:
-        # Fetch zones associated with the current block       
-        block_id = block['id']         
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']  
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     if umbrella:
         member_form.umbrella.data = umbrella.get('name', 'No Umbrella!')
@@ -617,22 +602,20 @@ def handle_member_creation(member_form):
             'full_name': member_form.full_name.data,
             'id_number': member_form.id_number.data,
             'phone_number': member_form.phone_number.data,
-            'zone_id': member_form.member_zone.data,
-            'bank_id': member_form.bank_id.data,
+            'zone_id': int(member_form.member_zone.data),
+            'bank_id': int(member_form.bank_id.data),
             'acc_number': member_form.acc_number.data,
+            'umbrella_id': umbrella['id'],
             'role_id': 5  # Automatically assign "Member" role
         }
 
-        # Create the member via API
-        response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/users/",params={'umbrella_id': umbrella['id']}, json=payload)
-
-        if response.status_code == 201:
+        try:
+            user_service.create_member(**payload)
             # Get the zone name using the selected zone_id
             zone_name = zone_map.get(int(member_form.member_zone.data))
             flash(f'{member_form.full_name.data} added to {zone_name} successfully!', 'success')
-        else:
-            error_message = response.json().get('message', 'Unknown error')
-            print(error_message)
+        except ServiceError as e:
+            print(e.message)
             flash('Failed to create member.', 'danger')
         
         # Persist zone selection for convenience
@@ -648,50 +631,47 @@ def handle_member_creation(member_form):
 
 # Helper function to get user by id
 def get_user_from_api(user_id):
-    response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}")
-    return response.json() if response.status_code == 200 else None
+    return user_service.get_user(user_id)
 
 
-
-# Helper function to get umbrella by user
-def get_umbrella_by_user(user_id):
-    response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/umbrellas/", params={'created_by': user_id})
-    umbrellas = response.json() if response.status_code == 200 else None
-    return umbrellas[0] if umbrellas else None
-    
-
 # Helper function to get members of a specific zone
+@traced()
 def get_members_by_zone(zone_id,umbrella_id):
-    """Fetches members associated with the specified zone via API."""
-    response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/", params={'role':'Member','zone_id': zone_id,'umbrella_id': umbrella_id})
-
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print('Error retrieving members from the server.', 'danger')
-        return []
+    """Fetches members associated with the specified zone."""
+    return user_service.list_users(role='Member', zone_id=zone_id, umbrella_id=umbrella_id)
 
 # Helper function to get banks
 def get_banks():
-    response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/banks/")
-    return response.json() if response.status_code == 200 else []
+    return reference_service.list_banks()
 
 
 
 # Helper function to create an umbrella
 def create_umbrella(payload):
-    response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/umbrellas/", json=payload)
-    return response.status_code == 201
+    try:
+        hierarchy_service.create_umbrella(**payload)
+        return True
+    except SQLAlchemyError:
+        db.session.rollback()
+        return False
 
 # Helper function to create a block
 def create_block(payload):
-    response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/blocks/", json=payload)
-    return response.status_code == 201
+    try:
+        hierarchy_service.create_block(**payload)
+        return True
+    except (ServiceError, SQLAlchemyError):
+        db.session.rollback()
+        return False
 
 # Helper function to create a zone
 def create_zone(payload):
-    response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/zones/", json=payload)
-    return response.status_code == 201
+    try:
+        hierarchy_service.create_zone(**payload)
+        return True
+    except SQLAlchemyError:
+        db.session.rollback()
+        return False
 
 
 
@@ -707,14 +687,7 @@ def statistics():
 
     try:
         # Fetch all meetings to identify hosts
-        response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/meetings/")
-        if response.status_code == 200:
-            meetings = response.json()  
-        elif response.status_code == 404:  # No meetings found
-            meetings = []
-        else:
-            print("Failed to fetch meetings data from the API.")
-            meetings = []
+        meetings = meeting_service.list_meetings()
 
     except Exception as e:
         print(f"Error fetching meetings data: {e}")
@@ -799,14 +772,7 @@ def render_host_page(active_tab=None, error=None,schedule_form=None,update_form=
     update_form.block_id.choices =  [(str(block['id']), block['name']) for block in blocks]
 
      # Prepare a mapping for zones with block names
-    zone_map = {}  # Store a mapping of zone_id to (zone_name, block_name)
-    for block in blocks:
-        # Fetch zones associated with the current block       
-        block_id = block['id']         
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']  
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     # Set the choices for the member_zone field in the form
     schedule_form.zone.choices = [("", "--Choose a Zone--")] + [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
@@ -814,31 +780,18 @@ def render_host_page(active_tab=None, error=None,schedule_form=None,update_form=
     update_form.member_zone.choices = [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
     # Get current page from request arguments (default is page 1)
 
-    current_page = int(request.args.get('page', 1))
+    current_page = request.args.get('page', 1, type=int)
     members_per_page = 5  # Number of members per page
-    # Fetch members
-    members = get_members()
-    if members:
-        for member in members:
-            member['bank_name'] = member.get('bank_name', 'Unknown Bank')
-            schedule_form.member.choices = [("", "--Choose a Member--")] + [(str(member['id']), member['full_name']) for member in members]
-    else:
-        schedule_form.member.choice = []
-    total_pages = 1  # Initialize with default value
-    total_members = len(members)
-    total_pages = (total_members + members_per_page - 1) // members_per_page
-    # Apply slicing for pagination
-    start = (current_page - 1) * members_per_page
-    end = start + members_per_page
-    paginated_members = members[start:end]
+    # Fetch only the members shown on this page
+    members_page = get_members_page(page=current_page, per_page=members_per_page,
+                                    cursor=request.args.get('cursor', type=int))
+    paginated_members = members_page['items']
+    for member in paginated_members:
+        member['bank_name'] = member.get('bank_name') or 'Unknown Bank'
+    schedule_form.member.choices = [("", "--Choose a Member--")] + get_member_choices()
 
     # Prepare pagination metadata
-    pagination = {
-        "current_page": current_page,
-        "total_pages": total_pages,
-        "has_prev": current_page > 1,
-        "has_next": current_page < total_pages
-    }
+    pagination = members_pagination(members_page, current_page, members_per_page)
 
 
     banks = get_banks()
@@ -886,14 +839,7 @@ def host():
     add_membership_form.block.choices = [("", "--Choose a Block--")] + [(str(block['id']), block['name']) for block in blocks]
 
     # Prepare a mapping for zones with block names
-    zone_map = {}  # Store a mapping of zone_id to (zone_name, block_name)
-    for block in blocks:
-        # Fetch zones associated with the current block       
-        block_id = block['id']         
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']  
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     # Set the choices for the member_zone field in the form
     add_membership_form.zone.choices = [("", "--Choose a Zone--")] + [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
@@ -905,23 +851,20 @@ def host():
             block_id = add_membership_form.block.data
             zone_id = add_membership_form.zone.data
             payload = {
-                    "block_id": block_id,
-                    "zone_id": zone_id
+                    "block_id": int(block_id),
+                    "zone_id": int(zone_id)
                 }
             
         user = get_user_by_id_number(id_number)
         user_id = user['id']
-        # API call to add membership
+        # Add the block and zone membership
         try:
-            response = requests.patch(
-                f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}",
-                json=payload,
-            )
-            if response.status_code == 200:
-                flash("Membership added successfully!", "success")
-            else:
-                flash(response.json().get('message', 'Failed to add membership'), "danger")
+            user_service.update_user(user_id, payload, approver=current_user)
+            flash("Membership added successfully!", "success")
+        except ServiceError as e:
+            flash(e.message or 'Failed to add membership', "danger")
         except Exception as e:
+            db.session.rollback()
             flash(f"Error updating member details: {str(e)}", "danger")      
 
         return redirect(url_for('main.host', active_tab='block_members'))
@@ -933,10 +876,9 @@ def host():
 def edit_meeting_details(meeting_id, schedule_form):
     # Fetch current meeting data
     try:
-        current_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/meetings/{meeting_id}")
-        if current_response.status_code == 200:
-            current_data = current_response.json()
-        else:
+        try:
+            current_data = meeting_service.get_meeting(meeting_id, upcoming_only=True) or {}
+        except ServiceError:
             current_data = {}
     except Exception as e:
         print(f"Error fetching meeting data: {str(e)}")
@@ -983,7 +925,7 @@ def edit_meeting_details(meeting_id, schedule_form):
             flash("No changes made.", "warning")
             return redirect(url_for('main.host', active_tab='upcoming_block'))
 
-        # Call the API to update the meeting with partial data
+        # Update the meeting with partial data
         success = update_meeting_api(meeting_id, payload)
 
         if success:
@@ -1001,13 +943,14 @@ def edit_meeting_details(meeting_id, schedule_form):
 
 def update_meeting_api(meeting_id, payload):
     try:
-        response = requests.patch(
-            f"{current_app.config['API_BASE_URL']}/api/v1/meetings/{meeting_id}",
-            json=payload
-        )
-        print(f"DETAILS FOR UPDATING THE MEEETING: {    response.json()}")
-        return response.status_code == 200
+        meeting = meeting_service.update_meeting(meeting_id, payload)
+        print(f"DETAILS FOR UPDATING THE MEEETING: {meeting}")
+        return True
+    except ServiceError as e:
+        logging.error(f"Failed to update meeting: {e.message}")
+        return False
     except Exception as e:
+        db.session.rollback()
         logging.error(f"Failed to update meeting: {e}")
         return False
 
@@ -1027,22 +970,13 @@ def handle_schedule_creation(schedule_form):
     schedule_form.block.choices = [("", "--Choose a Block--")] + [(str(block['id']), block['name']) for block in blocks]
 
      # Prepare a mapping for zones with block names
-    zone_map = {}  # Store a mapping of zone_id to (zone_name, block_name)
-    for block in blocks:
-        # Fetch zones associated with the current block
-        block_id = block['id']
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name'] 
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     # Set the choices for the member_zone field in the form
     schedule_form.zone.choices = [("", "--Choose a Zone--")] + [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
 
-    # Fetch members filtered by zone
-    members = get_members()
-    if members:
-        schedule_form.member.choices = [("", "--Choose a Member--")] + [(str(member['id']), member['full_name']) for member in members]
+    # Fetch member choices
+    schedule_form.member.choices = [("", "--Choose a Member--")] + get_member_choices()
 
 
 
@@ -1077,42 +1011,35 @@ def handle_schedule_creation(schedule_form):
 
         # Payload for creating the meeting
         payload = {
-            'block_id': schedule_form.block.data,
-            'zone_id': schedule_form.zone.data,
-            'host_id': schedule_form.member.data,
+            'block_id': int(schedule_form.block.data),
+            'zone_id': int(schedule_form.zone.data),
+            'host_id': int(schedule_form.member.data),
             'organizer_id': current_user.id,
             'date': meeting_date_str
         }
 
-        # Create meeting via API
+        # Create the meeting
         try:
-            # print(f"Attempting to schedule meeting with payload: {payload}")
-            response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/meetings/", json=payload)
-            # print(f"API Response Status: {response.status_code}")
-            # print(f"API Response Content: {response.text}")
-            if response.status_code == 201:
-                flash("Meeting has been scheduled successfully!", "success")
-                return redirect(url_for('main.host', active_tab='schedule_meeting'))
-            else:
-                error_msg = response.json().get('error', 'Meeting scheduling failed. Please try again later.')
-                flash(error_msg, 'danger')
+            meeting_service.create_meeting(**payload)
+            flash("Meeting has been scheduled successfully!", "success")
+            return redirect(url_for('main.host', active_tab='schedule_meeting'))
+        except ServiceError as e:
+            flash(e.body.get('error', 'Meeting scheduling failed. Please try again later.'), 'danger')
         except Exception as e:
+            db.session.rollback()
             print(f"Meeting scheduling error: {e}")
             flash('Error creating meeting. Please try again later.', 'danger') 
 
     return render_host_page(schedule_form=schedule_form,active_tab='schedule_meeting')
 
 
+@traced()
 def get_upcoming_meeting_details():
     """Fetch upcoming meetings for the current user.
     
     Returns:
         dict: Meeting details if found, None otherwise
     """
-    today = datetime.now()
-    week_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_end = (week_start + timedelta(days=6)).replace(hour=23, minute=59, second=59)
-
     organizer_id = current_user.id
 
     try:
@@ -1122,116 +1049,66 @@ def get_upcoming_meeting_details():
             logging.warning(f"No umbrella found for user {organizer_id}")
             return None
 
-        # logging.info(f"Fetching upcoming meetings for organizer_id={organizer_id}, umbrella_id={umbrella.get('id')}, start={week_start}, end={week_end}")
-
-        # Format dates in ISO format for API
-        params = {
-            'start_date': week_start.isoformat(),
-            'end_date': week_end.isoformat(),
-            'organizer_id': organizer_id,
-            'umbrella_id': umbrella.get('id')
-        }
+        meeting_data = meeting_service.list_meeting_details(organizer_id=organizer_id)
 
-        response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/meetings/",
-            params=params,
-            headers={
-                "Authorization": f"Bearer {current_user.get_auth_token()}",
-                "Content-Type": "application/json"
-            },
-            timeout=20
-        )
-        
-        # Log the full request details for debugging
-        # logging.info(f"API request URL: {response.request.url}")
-        # logging.info(f"API request headers: {response.request.headers}")
-        # logging.info(f"API response status: {response.status_code}")
-
-        if response.status_code == 200:
-            meeting_data = response.json()
-            # logging.info(f"API response received: {meeting_data}")
+        # Handle empty response
+        if not meeting_data:
+            logging.info("No meetings found for the specified criteria")
+            return None
 
-            # Handle empty response
-            if not meeting_data:
-                logging.info("No meetings found in response")
-                return None
+        first_meeting = meeting_data[0]
 
-            # Extract the first meeting if data is a list
-            first_meeting = meeting_data[0] if isinstance(meeting_data, list) else meeting_data
+        # Parse meeting date and check if it has expired
+        meeting_date_str = first_meeting.get('when')
+        if not meeting_date_str:
+            logging.error("Meeting date not found in response")
+            return None
 
-            if not first_meeting:
-                logging.info("No valid meeting data found")
+        try:
+            # Try multiple date formats
+            for date_format in ['%a, %d %b %Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']:
+                try:
+                    meeting_date = datetime.strptime(meeting_date_str, date_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                logging.error(f"Could not parse meeting date: {meeting_date_str}")
                 return None
 
-            # Parse meeting date and check if it has expired
-            meeting_date_str = first_meeting.get('when')
-            if not meeting_date_str:
-                logging.error("Meeting date not found in response")
+            # Compare dates using date components only for expiration check
+            today = datetime.now().date()
+            meeting_date_only = meeting_date.date()
+            
+            if meeting_date_only < today and (today - meeting_date_only).days > 6:
+                logging.info(f"Meeting has expired. Meeting date: {meeting_date_only}, Today: {today}")
                 return None
 
-            try:
-                # Try multiple date formats
-                for date_format in ['%a, %d %b %Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']:
-                    try:
-                        meeting_date = datetime.strptime(meeting_date_str, date_format)
-                        break
-                    except ValueError:
-                        continue
-                else:
-                    logging.error(f"Could not parse meeting date: {meeting_date_str}")
-                    return None
-
-                # Compare dates using date components only for expiration check
-                today = datetime.now().date()
-                meeting_date_only = meeting_date.date()
-                
-                if meeting_date_only < today and (today - meeting_date_only).days > 6:
-                    logging.info(f"Meeting has expired. Meeting date: {meeting_date_only}, Today: {today}")
-                    return None
-
-                # Extract details with proper validation
-                meeting_details = {
-                    'meeting_block': first_meeting.get('meeting_block', 'Unknown Block'),
-                    'meeting_zone': first_meeting.get('meeting_zone', 'Unknown Zone'),
-                    'host': first_meeting.get('host', 'Unknown Host'),
-                    'meeting_id': first_meeting.get('meeting_id'),
-                    'when': meeting_date_str,
-                    'event_id': first_meeting.get('event_id'),
-                    'paybill_no': first_meeting.get('paybill_no'),
-                    'acc_number': first_meeting.get('acc_number')
-                }
-
-                # Validate required fields
-                required_fields = ['meeting_id', 'event_id', 'paybill_no', 'acc_number']
-                if any(not meeting_details.get(field) for field in required_fields):
-                    logging.error(f"Missing required fields in meeting data: {meeting_details}")
-                    return None
-
-                logging.info(f"Successfully extracted meeting details: {meeting_details}")
-                return meeting_details
+            # Extract details with proper validation
+            meeting_details = {
+                'meeting_block': first_meeting.get('meeting_block', 'Unknown Block'),
+                'meeting_zone': first_meeting.get('meeting_zone', 'Unknown Zone'),
+                'host': first_meeting.get('host', 'Unknown Host'),
+                'meeting_id': first_meeting.get('meeting_id'),
+                'when': meeting_date_str,
+                'event_id': first_meeting.get('event_id'),
+                'paybill_no': first_meeting.get('paybill_no'),
+                'acc_number': first_meeting.get('acc_number')
+            }
 
-            except Exception as e:
-                logging.error(f"Error processing meeting date: {str(e)}")
+            # Validate required fields
+            required_fields = ['meeting_id', 'event_id', 'paybill_no', 'acc_number']
+            if any(not meeting_details.get(field) for field in required_fields):
+                logging.error(f"Missing required fields in meeting data: {meeting_details}")
                 return None
 
-        elif response.status_code == 404:
-            logging.info("No meetings found for the specified criteria")
-            return None
-        else:
-            logging.error(f"API request failed with status {response.status_code}")
-            try:
-                error_data = response.json()
-                logging.error(f"API error response: {error_data}")
-            except:
-                logging.error(f"Raw API error response: {response.text}")
+            logging.info(f"Successfully extracted meeting details: {meeting_details}")
+            return meeting_details
+
+        except Exception as e:
+            logging.error(f"Error processing meeting date: {str(e)}")
             return None
 
-    except requests.exceptions.Timeout:
-        logging.error("API request timed out after 20 seconds")
-        return None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"API request error: {str(e)}")
-        return None
     except Exception as e:
         logging.error(f"Unexpected error: {str(e)}")
         return None
@@ -1257,6 +1134,7 @@ def send_sms_notifications():
 
 
         # Check if the SMS service is initialized
+        sms = get_sms()
         if sms is None:
             flash('SMS service not initialized','warning')
             return redirect(url_for('main.host', active_tab='upcoming_block'))
@@ -1310,13 +1188,7 @@ def update_member(user_id, update_form):
     update_form.block_id.choices = [("", "--Choose an Additional Block--")] + [(str(block['id']), block['name']) for block in blocks]
 
     umbrella = get_umbrella_by_user(current_user.id)
-    zone_map = {}
-    for block in blocks:
-        block_id = block['id']
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     update_form.member_zone.choices = [("", "--Choose an Additional Zone--")] + [
         (str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()
@@ -1327,8 +1199,7 @@ def update_member(user_id, update_form):
 
     # Fetch current user data
     try:
-        current_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}")
-        current_data = current_response.json() if current_response.status_code == 200 else {}
+        current_data = user_service.get_user(user_id) or {}
     except Exception as e:
         print(f'{e}')
         flash(f"Error fetching current member data!", "danger")
@@ -1336,8 +1207,7 @@ def update_member(user_id, update_form):
 
     # Fetch all members to check for uniqueness
     try:
-        members_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users", params={'umbrella_id': current_data['umbrella_id']})
-        members = members_response.json() if members_response.status_code == 200 else []
+        members = user_service.list_users(umbrella_id=current_data['umbrella_id'])
     except Exception as e:
         print(f"Error fetching members for uniqueness check: {str(e)}")
         flash("An unexpected error occurred", "danger")
@@ -1375,25 +1245,23 @@ def update_member(user_id, update_form):
             form_data = getattr(update_form, form_field).data
             current_value = current_data.get(payload_key)
             if form_data and form_data != current_value:
-                payload[payload_key] = form_data
+                payload[payload_key] = int(form_data) if payload_key in ('zone_id', 'bank_id', 'block_id') else form_data
                 any_input = True
 
         if not any_input:
             flash("No input was provided. Please fill in at least one field.", "warning")
             return redirect(url_for('main.host', active_tab='block_members'))
 
-        # Send patch request
+        payload['umbrella_id'] = current_data['umbrella_id']
+
+        # Apply the update
         try:
-            response = requests.patch(
-                f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}",
-                json=payload,
-                params={'umbrella_id': current_data['umbrella_id']}
-            )
-            if response.status_code == 200:
-                flash("Member details updated successfully.", "success")
-            else:
-                flash("Failed to update member details. Please try again.", "danger")
+            user_service.update_user(user_id, payload, approver=current_user)
+            flash("Member details updated successfully.", "success")
+        except ServiceError:
+            flash("Failed to update member details. Please try again.", "danger")
         except Exception as e:
+            db.session.rollback()
             print(f"{str(e)}")
             flash(f"Error updating member details! ", "danger")
 
@@ -1406,18 +1274,17 @@ def update_member(user_id, update_form):
 # Function to handle member removal
 def remove_member(user_id):
     # Fetch user details first
-    user_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}")
+    user_data = user_service.get_user(user_id)
     
-    if user_response.status_code == 200:
-        user_data = user_response.json()
+    if user_data:
         full_name = user_data.get('full_name')
         
-        # Proceed with the delete request
-        delete_response = requests.delete(f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}")
-        
-        if delete_response.status_code == 200:
+        # Proceed with the removal
+        try:
+            user_service.delete_user(user_id)
             flash(f"{full_name} removed successfully.", 'success')
-        else:
+        except (ServiceError, SQLAlchemyError):
+            db.session.rollback()
             flash(f'Failed to remove {full_name}! Please drop the assigned role or meeting first.', 'warning')
     else:
         flash('Failed to retrieve user details', 'danger')
@@ -1426,7 +1293,7 @@ def remove_member(user_id):
 
 
 # Helper function to fetch members by role "Member"
-def get_members(page=1, per_page=5):
+def get_members():
     """Fetches members associated with the specified umbrella."""
     # Retrieve the umbrella details for the current user
     umbrella = get_umbrella_by_user(current_user.id)  
@@ -1440,26 +1307,53 @@ def get_members(page=1, per_page=5):
 
     try:
         # Fetch members associated with the umbrella
-        response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/users/",
-            params={'role': 'Member', 'umbrella_id': umbrella_id,"page": page, "per_page": per_page} 
-        )
-        
-        if response.status_code == 200:
-            members = response.json()
-            return members
-          
-        else:
-            return []
+        return user_service.list_users(role='Member', umbrella_id=umbrella_id)
     except Exception as e:
         return []
 
 
+# Helper function to fetch one page of members by role "Member"
+def get_members_page(page=1, per_page=5, cursor=None):
+    """Fetches one page of the umbrella's members, after ``cursor`` when given."""
+    empty_page = {'items': [], 'total': 0, 'next_cursor': None}
+    umbrella = get_umbrella_by_user(current_user.id)
+    if umbrella is None or not umbrella.get('id'):
+        return empty_page
+
+    try:
+        return user_service.paginate_users(role='Member', umbrella_id=umbrella['id'],
+                                           per_page=per_page, cursor=cursor, page=page)
+    except Exception as e:
+        print(f'Members page error: {e}')
+        return empty_page
+
+
+# Helper function to fetch member dropdown choices
+def get_member_choices():
+    """Fetches ``(id, full_name)`` choices for the umbrella's members."""
+    umbrella = get_umbrella_by_user(current_user.id)
+    if umbrella is None or not umbrella.get('id'):
+        return []
+    return [(str(user_id), full_name) for user_id, full_name in user_service.member_choices(umbrella['id'])]
+
+
+def members_pagination(members_page, current_page, per_page):
+    """Pagination metadata for a page returned by ``get_members_page``"""
+    total_pages = (members_page['total'] + per_page - 1) // per_page
+    return {
+        "current_page": current_page,
+        "total_pages": total_pages,
+        "has_prev": current_page > 1,
+        "has_next": members_page['next_cursor'] is not None,
+        "next_cursor": members_page['next_cursor']
+    }
+
+
 
 
 # Fetch and display committee members
 def render_committee_page(active_tab=None, error=None):
-    # Fetch Chairman, Secretary, and Treasurer from the API
+    # Fetch Chairman, Secretary, and Treasurer
     umbrella = get_umbrella_by_user(current_user.id)
     if not umbrella:
         flash('Please create an umbrella first to see your committee members!', 'info')
@@ -1468,20 +1362,10 @@ def render_committee_page(active_tab=None, error=None):
     umbrella_id = umbrella['id']  
 
     try:
-        chairman_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/", params={'role': 'Chairman','umbrella_id' : umbrella_id })
-        secretary_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/", params={'role': 'Secretary','umbrella_id' : umbrella_id})
-        treasurer_response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/users/", params={'role': 'Treasurer','umbrella_id' : umbrella_id})
-
-        # Raise exception if request failed
-        chairman_response.raise_for_status()
-        secretary_response.raise_for_status()
-        treasurer_response.raise_for_status()
-
-        # Parse the response
         committee_members = {
-            'chairmen': chairman_response.json(),
-            'secretaries': secretary_response.json(),
-            'treasurers': treasurer_response.json()
+            'chairmen': user_service.list_users(role='Chairman', umbrella_id=umbrella_id),
+            'secretaries': user_service.list_users(role='Secretary', umbrella_id=umbrella_id),
+            'treasurers': user_service.list_users(role='Treasurer', umbrella_id=umbrella_id)
         }
         print(f'Chairmen for Umbrella {umbrella_id}: {committee_members}')
 
@@ -1490,7 +1374,7 @@ def render_committee_page(active_tab=None, error=None):
                                active_tab=active_tab,
                                  error=error)
 
-    except requests.exceptions.RequestException as e:
+    except SQLAlchemyError as e:
         print(f'Committee error: {e}')
         flash(f"Error fetching committee members.", 'danger')
         return redirect(url_for('main.committee'))
@@ -1516,14 +1400,14 @@ def remove_committee_role(user_id, active_tab):
         return redirect(url_for('main.committee', active_tab=active_tab))
 
     try:
-        role_id = request.form.get('role_id')
+        role_id = int(request.form.get('role_id'))
         action = 'remove'
-        response = requests.patch(f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}", json={'role_id': role_id, 'action': action})
-        response.raise_for_status()
+        user_service.update_user(user_id, {'role_id': role_id, 'action': action}, approver=current_user)
         flash('Committee role removed successfully', 'success')
         return redirect(url_for('main.committee', active_tab=active_tab))
 
-    except requests.exceptions.RequestException as e:
+    except (ServiceError, SQLAlchemyError, TypeError, ValueError) as e:
+        db.session.rollback()
         flash(f"Error removing committee role!", 'danger')
         return redirect(url_for('main.committee', active_tab=active_tab))
 
@@ -1531,7 +1415,6 @@ def remove_committee_role(user_id, active_tab):
 # Helper function to render the reports page with member contributions
 def render_reports_page(active_tab=None, error=None, host_id=None, member_id=None, status=None, umbrella=None):
     schedule_form = ScheduleForm()
-    total_pages = 1  # Initialize with default value
     
     # Initialize variables that might be used in template
     meeting_block = None
@@ -1551,18 +1434,13 @@ def render_reports_page(active_tab=None, error=None, host_id=None, member_id=Non
     schedule_form.block.choices = [("", "--Choose a Block--")] + [(str(block['id']), block['name']) for block in blocks]
 
     # Mapping zones to blocks
-    zone_map = {}
-    for block in blocks:
-        block_id = block['id']
-        block_zones = get_zones_by_block(block_id)
-        block_name = block['name']
-        for zone in block_zones:
-            zone_map[zone['id']] = (zone['name'], block_name)  # Store both zone name and block name
+    zone_map = get_zone_map()  # zone_id -> (zone_name, block_name)
 
     schedule_form.zone.choices = [("", "--Choose a Zone--")] + [(str(zone_id), f"{zone_name} - ({block_name})") for zone_id, (zone_name, block_name) in zone_map.items()]
 
-    current_page = int(request.args.get('page', 1))
+    current_page = request.args.get('page', 1, type=int)
     members_per_page = 5  # Number of members per page
+    members_page = {'items': [], 'total': 0, 'next_cursor': None}
 
     combined_member_contributions = []
     host_name = 'No hosting scheduled'
@@ -1570,23 +1448,18 @@ def render_reports_page(active_tab=None, error=None, host_id=None, member_id=Non
     block_contributions_data = {'block_contributions': []}
 
     try:
-        # Fetch all members and contributions
-        all_members = get_members()
-        contributions_data = get_member_contributions(host_id=host_id, member_id=member_id, status=status)
-        member_contributions = contributions_data['member_contributions']
+        # Fetch the members shown on this page and their contributions
+        members_page = get_members_page(page=current_page, per_page=members_per_page,
+                                        cursor=request.args.get('cursor', type=int))
+        contributions_data = get_member_contributions(host_id=host_id, member_id=member_id, status=status,
+                                                      member_ids=[member['id'] for member in members_page['items']])
+        contributions_by_member = {c['id']: c for c in contributions_data['member_contributions']}
         host_name = contributions_data.get('host_name', host_name)
         meeting_date = contributions_data.get('meeting_date', meeting_date)
 
-        # Slice members for pagination
-        total_members = len(all_members)
-        total_pages = (total_members + members_per_page - 1) // members_per_page
-        start = (current_page - 1) * members_per_page
-        end = start + members_per_page
-        paginated_members = all_members[start:end]
-
         # Combine paginated members with their contributions
-        for member in paginated_members:
-            contribution = next((c for c in member_contributions if c['full_name'] == member['full_name']), None)
+        for member in members_page['items']:
+            contribution = contributions_by_member.get(member['id'])
             if contribution:
                 combined_member_contributions.append({
                     'full_name': member['full_name'],
@@ -1608,12 +1481,7 @@ def render_reports_page(active_tab=None, error=None, host_id=None, member_id=Non
         flash('Error fetching data. Please try again later.', 'danger')
 
     # Pagination metadata
-    pagination = {
-        "current_page": current_page,
-        "total_pages": total_pages,
-        "has_prev": current_page > 1,
-        "has_next": current_page < total_pages,
-    }
+    pagination = members_pagination(members_page, current_page, members_per_page)
 
     # Render the reports page
     return render_template('block_reports.html',
@@ -1655,16 +1523,7 @@ def get_block_contributions(meeting_id=None, host_id=None):
 
     try:
         # Fetch all blocks under the umbrella
-        blocks_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/blocks/", 
-            params={'parent_umbrella_id': umbrella['id']}  # Use parent_umbrella_id instead of umbrella_id
-        )
-
-        if blocks_response.status_code != 200:
-            flash("Error fetching blocks. Please try again later.", "danger")
-            return []
-
-        blocks = blocks_response.json()
+        blocks = hierarchy_service.list_blocks(parent_umbrella_id=umbrella['id'])
 
         # Fetch the latest meeting if no meeting ID is provided
         if not meeting_id:
@@ -1680,14 +1539,14 @@ def get_block_contributions(meeting_id=None, host_id=None):
             meeting_date = meeting.get('when', 'Unknown Date')
         else:
             # Verify that the meeting belongs to the umbrella's blocks
-            meeting_response = requests.get(
-                f"{current_app.config['API_BASE_URL']}/api/v1/meetings/{meeting_id}"
-            )
-            if meeting_response.status_code != 200:
+            try:
+                meeting_data = meeting_service.get_meeting(meeting_id, upcoming_only=True)
+            except ServiceError:
+                meeting_data = None
+            if not meeting_data:
                 flash("Error fetching meeting details.", "danger")
                 return []
             
-            meeting_data = meeting_response.json()
             block_id = meeting_data.get('block_id')
             # Check if the block belongs to the umbrella
             if not any(block['id'] == block_id for block in blocks):
@@ -1696,43 +1555,21 @@ def get_block_contributions(meeting_id=None, host_id=None):
             host_name = meeting_data.get('host_name', 'Unknown Host')
             meeting_date = meeting_data.get('date', 'Unknown Date')
 
-        # Fetch contributions for the meeting and filter by host if provided
-        contributions_params = {'meeting_id': meeting_id}
         if host_id:
             # Verify that the host belongs to the umbrella's blocks
-            host_response = requests.get(
-                f"{current_app.config['API_BASE_URL']}/api/v1/users/{host_id}"
-            )
-            if host_response.status_code != 200:
+            host_data = user_service.get_user(host_id)
+            if not host_data:
                 flash("Error fetching host details.", "danger")
                 return []
             
-            host_data = host_response.json()
             host_blocks = host_data.get('block_memberships', [])
             if not any(block['parent_umbrella_id'] == umbrella['id'] for block in host_blocks):
                 flash("You do not have permission to view this host's contributions.", "info")
                 return []
-            
-            contributions_params['host_id'] = host_id
-
-        contributions_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/payments/",
-            params=contributions_params
-        )
-
-        if contributions_response.status_code != 200:
-            flash("Error fetching contributions. Please try again later.", "danger")
-            return []
-
-        contributions = contributions_response.json()
 
-        # Aggregate contributions by block
-        block_contributions = {}
-        for block in blocks:
-            block_contributions[block['name']] = sum(
-                contribution['amount'] for contribution in contributions
-                if contribution['block_id'] == block['id']
-            )
+        # Read the pre-aggregated totals for each block
+        totals = ledger_service.block_totals(meeting_id)
+        block_contributions = {block['name']: totals.get(block['id'], 0) for block in blocks}
 
         return {
             'block_contributions': block_contributions,
@@ -1745,78 +1582,27 @@ def get_block_contributions(meeting_id=None, host_id=None):
         return []
 
 
-def get_member_contributions(meeting_id=None, host_id=None, status=None, member_id=None):
-    umbrella_id = get_umbrella_by_user(current_user.id)
+def get_member_contributions(meeting_id=None, host_id=None, status=None, member_id=None, member_ids=None):
+    umbrella = get_umbrella_by_user(current_user.id)
+    host_name = 'Unknown Host'
+    meeting_date = 'Unknown Date'
     try:
-        # Fetch all members of the umbrella
-        members_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/users/", 
-            params={'role': 'Member', 'umbrella_id': umbrella_id['id']}
-        )
-        
-        if members_response.status_code != 200:
-            flash("Error fetching members. Please try again later.", "danger")
-            return []
-
-        members = members_response.json()
-
         # Fetch the latest meeting if no meeting ID is provided
         if not meeting_id:
             meeting = get_upcoming_meeting_details()
             meeting_id = meeting['meeting_id']
             host_name = meeting['host']
             meeting_date = meeting['when']
-        
-        # Fetch contributions for the meeting and apply filters if provided
-        contributions_params = {'meeting_id': meeting_id}
-        if host_id:
-            contributions_params['host_id'] = host_id
-        if member_id:
-            contributions_params['payer_id'] = member_id
-        if status:
-            contributions_params['status'] = status
-
-        contributions_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/payments/", 
-            params=contributions_params
-        )
-
-        if contributions_response.status_code != 200:
-            flash("Error fetching contributions. Please try again later.", "danger")
-            return []
-
-        contributions = contributions_response.json()
 
-        # Dictionary to store total contribution for each member by phone and account number
-        contribution_totals = {}
-
-        for contribution in contributions:
-            phone_number = contribution['source_phone_number']
-            account_number = contribution['account_number']
-            key = (phone_number, account_number)  # Unique identifier for phone and account combination
-
-            if key not in contribution_totals:
-                contribution_totals[key] = 0
-            
-            contribution_totals[key] += contribution['amount']
-
-        # Combine members with their contributions
-        member_contributions = []
-        for member in members:
-            member_total_contribution = 0
-            member_status = 'Pending'
-
-            # Sum up the contributions for this member's phone number and account
-            for (phone, account_number), total_amount in contribution_totals.items():
-                if member['phone_number'] == phone:
-                    member_total_contribution += total_amount
-                    member_status = 'Contributed'  # If any contribution exists, mark status as contributed
-
-            member_contributions.append({
-                'full_name': member['full_name'],
-                'amount': member_total_contribution,
-                'status': member_status,
-            })
+        # Join the umbrella's members to their contributions for the meeting
+        member_contributions = contribution_service.member_contribution_report(
+            meeting_id=meeting_id,
+            host_id=host_id,
+            umbrella_id=umbrella['id'],
+            member_id=member_id,
+            status=status,
+            member_ids=member_ids
+        )
 
         return {
             'member_contributions': member_contributions,
@@ -1829,11 +1615,11 @@ def get_member_contributions(meeting_id=None, host_id=None, status=None, member_
         return []
 
 
-def render_contribution_page(active_tab=None,payment_form=None, error=None):
+def render_contribution_page(active_tab=None,payment_form=None, error=None, stk_job=None):
 
     if payment_form is None:
         payment_form = PaymentForm()
-    # API call to get user details
+    # Load user details
     try:
         user = get_user_from_api(current_user.id)
         if not user:
@@ -1871,6 +1657,7 @@ def render_contribution_page(active_tab=None,payment_form=None, error=None):
                            blocks=blocks,                          
                            active_tab=active_tab, 
                            banks=banks, 
+                           stk_job=stk_job,
                            error=error)
 
 
@@ -1888,6 +1675,8 @@ def manage_contribution():
     # Handle form submission
     if 'request_submit' in request.form:
         return handle_request_payment(payment_form=payment_form)
+    if 'bulk_request_submit' in request.form:
+        return handle_bulk_request_payment(payment_form=payment_form)
     if 'payment_submit' in request.form:
         return handle_send_to_bank(payment_form=payment_form)
 
@@ -1912,20 +1701,15 @@ def handle_send_to_bank(payment_form):
     banks = get_banks()
     payment_form.bank.choices =  [("", "--Choose a Bank--")] + [(str(bank['id']), bank['name']) for bank in banks]
 
-    members = get_members()
-    payment_form.member.choices =  [("", "--Choose a Member--")] + [(str(member['id']), member['full_name']) for member in members]
+    payment_form.member.choices =  [("", "--Choose a Member--")] + get_member_choices()
 
 
 
     if payment_form.validate_on_submit():
-        # Fetch total contributions for the selected block (assume an API fetch)
+        # Fetch total contributions for the selected block
         try:
-            response = requests.get(f"{current_app.config['API_BASE_URL']}/api/v1/payments/")
-            if response.status_code == 200:
-                total_amount = response.json().get('total_amount')
-            else:
-                print(f'Error: {response.json().get("message")}', 'danger')
-                return redirect(url_for('main.manage_contribution', active_tab='send_to_bank'))
+            contributions = payment_service.list_payments(block_id=block_id)
+            total_amount = sum(contribution['amount'] for contribution in contributions)
         except Exception as e:
             print(f'Total Contribution Fetch Error: {e}')
             flash('Error occurred while fetching total contributions. Please try again.', 'danger')
@@ -1939,17 +1723,13 @@ def handle_send_to_bank(payment_form):
 
         }
 
-        # Make API call to transfer funds to the bank
+        # Record the transfer to the bank
         try:
-            response = requests.post(f"{current_app.config['API_BASE_URL']}/api/v1/payments/", json=payload)
-
-            # Check API response
-            if response.status_code == 200:
-                flash('Funds transferred successfully to the bank account.', 'success')
-            else:
-                flash(f'Error: {response.json().get("message")}', 'danger')
+            payment_service.create_payment(payload)
+            flash('Funds transferred successfully to the bank account.', 'success')
 
         except Exception as e:
+            db.session.rollback()
             print(f'Bank Transfer Error: {e}')
             flash('Error occurred while transferring funds. Please try again.', 'danger')
 
@@ -1987,40 +1767,18 @@ def handle_request_payment(payment_form):
             return render_contribution_page(payment_form=payment_form, active_tab='request_payment')
 
         # Get the active umbrella meeting
-        now = datetime.now()
-        logger.info(f"Searching for meeting in block {block_id} with umbrella {block.parent_umbrella_id}")
-        
-        # First try to find a meeting that started within the last 24 hours
-        umbrella_meeting = MeetingModel.query.join(BlockModel).filter(
-            BlockModel.parent_umbrella_id == block.parent_umbrella_id,
-            MeetingModel.date >= now - timedelta(hours=24)  # Meeting started within last 24 hours
-        ).order_by(MeetingModel.date.desc()).first()
-        
-        if umbrella_meeting:
-            logger.info(f"Found recent meeting: ID={umbrella_meeting.id}, Date={umbrella_meeting.date}, Unique_ID={umbrella_meeting.unique_id}")
-        else:
-            logger.info("No recent meeting found, looking for latest scheduled meeting")
-            # If no recent meeting, try to find the latest scheduled meeting
-            umbrella_meeting = MeetingModel.query.join(BlockModel).filter(
-                BlockModel.parent_umbrella_id == block.parent_umbrella_id
-            ).order_by(MeetingModel.date.desc()).first()
-            
-            if umbrella_meeting:
-                logger.info(f"Found latest meeting: ID={umbrella_meeting.id}, Date={umbrella_meeting.date}, Unique_ID={umbrella_meeting.unique_id}")
-            else:
-                logger.error(f"No meeting found for umbrella {block.parent_umbrella_id}")
-                
+        umbrella_meeting = contribution_service.find_contribution_meeting(block)
+
         if not umbrella_meeting:
             flash('No active meeting found. Please ensure there is a scheduled meeting.', 'info')
             return render_contribution_page(payment_form=payment_form, active_tab='request_payment')
-            
-        logger.info(f"Found meeting: ID={umbrella_meeting.id}, Date={umbrella_meeting.date}, Unique_ID={umbrella_meeting.unique_id}")
-        
+
         # Use the umbrella meeting's unique_id as the bill reference (this matches the account number in SMS)
         bill_ref = umbrella_meeting.unique_id
 
         # Initialize M-Pesa payment using the umbrella meeting's unique_id
         try:
+            from ..utils.mpesa import get_mpesa_client
             mpesa = get_mpesa_client()
             response = mpesa.initiate_payment(
                 amount=int(amount),
@@ -2042,20 +1800,56 @@ def handle_request_payment(payment_form):
 
     # Redirect back to the 'Request Payment' tab
     return render_contribution_page(payment_form=payment_form, active_tab='request_payment')
-    
+
+
+def handle_bulk_request_payment(payment_form):
+    """
+    Sends an M-Pesa push notification to every member of the selected
+    block, or of the selected zone, and shows the job's progress.
+    """
+    # Only the block and amount are needed, and the block must be one of the user's umbrella
+    bulk_form = BulkPaymentForm()
+    blocks = get_blocks_by_umbrella(show_flash_messages=False)
+    bulk_form.block.choices = [("", "--Choose a Block--")] + [(str(block['id']), block['name']) for block in blocks]
+    if not bulk_form.validate_on_submit():
+        for errors in bulk_form.errors.values():
+            flash(errors[0], 'danger')
+        return render_contribution_page(payment_form=payment_form, active_tab='request_payment')
+
+    zone_id = request.form.get('zone')
+    stk_job = None
+    try:
+        block_id = int(bulk_form.block.data)
+        zone_id = int(zone_id) if zone_id else None
+        hierarchy_service.scoped_umbrella_id(current_user, block_id=block_id, zone_id=zone_id)
+        stk_job = contribution_service.request_block_contributions(
+            block_id=block_id,
+            zone_id=zone_id,
+            amount=bulk_form.amount.data,
+            requested_by=current_user.id
+        )
+        flash(f"Payment requests are being sent to {stk_job['total']} members.", 'success')
+    except ServiceError as e:
+        flash(e.message, 'danger')
+    except (TypeError, ValueError):
+        flash('Please select a block and enter an amount.', 'danger')
+    except Exception as e:
+        logger.error(f'Bulk M-Pesa payment request error: {str(e)}')
+        db.session.rollback()
+        flash('Error occurred while processing payment request. Please try again.', 'danger')
+
+    return render_contribution_page(payment_form=payment_form, active_tab='request_payment', stk_job=stk_job)
+
 @main.route('/payments/confirmation', methods=['POST'])
 @csrf_exempt
 @require_safaricom_ip_validation
 def mpesa_confirmation():
     print(request.json)
-    """Handle M-Pesa confirmation callback by forwarding to API endpoint"""
+    """Handle M-Pesa confirmation callback"""
     try:
-        # Forward the request to the API endpoint
-        api_url = f"{current_app.config['API_BASE_URL']}/api/v1/payments/confirmation"
-        response = requests.post(api_url, json=request.get_json())
-        return jsonify(response.json()), response.status_code
+        return jsonify(callback_service.enqueue('confirmation', request.get_json())), 200
     except Exception as e:
-        logger.error(f"Error forwarding M-Pesa confirmation to API: {str(e)}")
+        logger.error(f"Error handling M-Pesa confirmation: {str(e)}")
         return jsonify({
             "ResultCode": "0",
             "ResultDesc": "Success"
@@ -2066,23 +1860,22 @@ def mpesa_confirmation():
 @require_safaricom_ip_validation
 def mpesa_validation():
     print(request.json)
-    """Handle M-Pesa validation requests by forwarding to API endpoint"""
+    """Handle M-Pesa validation requests"""
     try:
-        # Forward the request to the API endpoint
-        api_url = f"{current_app.config['API_BASE_URL']}/api/v1/payments/validation"
-        response = requests.post(api_url, json=request.get_json())
-        return jsonify(response.json()), response.status_code
+        return jsonify(callback_service.enqueue('validation', request.get_json())), 200
     except Exception as e:
-        logger.error(f"Error forwarding M-Pesa validation to API: {str(e)}")
+        logger.error(f"Error handling M-Pesa validation: {str(e)}")
         return jsonify({
             "ResultCode": 1,
             "ResultDesc": "Internal server error"
         }), 200
 
 @main.route('/search',methods=['GET', 'POST'])
+@login_required
 def search():
     query = request.args.get('query')
     search_type = request.args.get('searchType') 
+    page = request.args.get('page', 1, type=int)
     # Check if search_type is provided
     # if not search_type:
     #     flash("Please select a category to search.", "warning")
@@ -2094,42 +1887,17 @@ def search():
         'blocks': [],
         'zones': []
     }
+    has_next = False
 
-    if query:
-        # Search based on the selected search type
-        if search_type == 'members':
-            members = UserModel.query.filter(
-                (UserModel.full_name.ilike(f"%{query}%")) |
-                (UserModel.email.ilike(f"%{query}%")) |
-                (UserModel.id_number.ilike(f"%{query}%")) |
-                (UserModel.phone_number.ilike(f"%{query}%")) | 
-                (UserModel.bank_id.ilike(f"%{query}%")) |
-                (UserModel.acc_number.ilike(f"%{query}%"))
-            ).all()
-            results['members'] = members
-
-        elif search_type == 'payments':
-            payments = PaymentModel.query.filter(
-                (PaymentModel.mpesa_id.ilike(f"%{query}%")) |
-                (PaymentModel.account_number.ilike(f"%{query}%")) |
-                (PaymentModel.source_phone_number.ilike(f"%{query}%")) |
-                (PaymentModel.amount.ilike(f"%{query}%"))
-            ).all()
-            results['payments'] = payments
-
-        elif search_type == 'blocks':
-            blocks = BlockModel.query.filter(
-                BlockModel.name.ilike(f"%{query}%")
-            ).all()
-            results['blocks'] = blocks
-
-        elif search_type == 'zones':
-            zones = ZoneModel.query.filter(
-                ZoneModel.name.ilike(f"%{query}%")
-            ).all()
-            results['zones'] = zones
-
-    return render_template('search_results.html', query=query, search_type=search_type, results=results)
+    if query and search_type in results:
+        # Search the selected category within the user's umbrella
+        umbrella = get_umbrella_by_user(current_user.id)
+        found = search_service.search(search_type, query, umbrella['id'] if umbrella else None, page=page)
+        results[search_type] = found['items']
+        has_next = found['has_next']
+
+    return render_template('search_results.html', query=query, search_type=search_type, results=results,
+                           page=page, has_next=has_next)
 
 @main.route('/block/<int:block_id>')
 @login_required
@@ -2231,41 +1999,20 @@ def get_filtered_members(block_id, zone_id=None):
 
 @main.route('/get_contribution_stats/<int:block_id>', methods=['GET'])
 @main.route('/get_contribution_stats/<int:block_id>/<int:zone_id>', methods=['GET'])
+@login_required
+@roles_accepted('SuperUser', 'Administrator', 'Chairman', 'Secretary', 'Treasurer')
 def get_contribution_stats(block_id, zone_id=None):
     try:
-        # Base query to get users
-        base_query = UserModel.query.join(UserModel.block_memberships)
-
-        # Filter by block and optionally by zone
-        if zone_id:
-            base_query = base_query.join(UserModel.zone_memberships)\
-                .filter(BlockModel.id == block_id, ZoneModel.id == zone_id)
-        else:
-            base_query = base_query.filter(BlockModel.id == block_id)
-
-        # Get all users in the block/zone
-        users = base_query.all()
-        total_users = len(users)
-
-        # Count users who have made payments
-        contributed = 0
-        for user in users:
-            # Use PaymentModel to check if user has payments
-            payment_exists = PaymentModel.query.filter_by(
-                payer_id=user.id,
-                block_id=block_id
-            ).first() is not None
-            if payment_exists:
-                contributed += 1
-
-        pending = total_users - contributed
-
+        hierarchy_service.scoped_umbrella_id(current_user, block_id=block_id, zone_id=zone_id)
+        stats = contribution_service.contribution_stats(block_id=block_id, zone_id=zone_id)
         return jsonify({
-            'contributed': contributed,
-            'pending': pending
+            'contributed': stats['contributed'],
+            'pending': stats['pending']
         })
+    except ServiceError as e:
+        return jsonify(e.body), 403
     except Exception as e:
-        print(f"Error getting contribution stats: {str(e)}")
+        logger.error(f"Error getting contribution stats: {str(e)}")
         return jsonify({'error': 'Error getting contribution stats'}), 500
 
 @main.route('/get_user_by_id/<id_number>')
@@ -2310,10 +2057,11 @@ def get_user_by_id(id_number):
 def get_filtered_member_contributions():
     try:
         # Get filter parameters from request
-        block_id = request.args.get('block_id')
-        zone_id = request.args.get('zone_id')
-        host_id = request.args.get('host_id')
-        member_id = request.args.get('member_id')
+        block_id = request.args.get('block_id', type=int)
+        zone_id = request.args.get('zone_id', type=int)
+        host_id = request.args.get('host_id', type=int)
+        # 'all_members' is not an id and so means no member filter
+        member_id = request.args.get('member_id', type=int)
         status = request.args.get('status')
 
         # Get umbrella ID for the current user
@@ -2321,26 +2069,6 @@ def get_filtered_member_contributions():
         if not umbrella:
             return jsonify({'error': 'No umbrella found'}), 404
 
-        # Prepare base query parameters
-        params = {'role': 'Member', 'umbrella_id': umbrella['id']}
-        
-        # Add block and zone filters if provided
-        if block_id:
-            params['block_id'] = block_id
-        if zone_id:
-            params['zone_id'] = zone_id
-
-        # Fetch filtered members
-        members_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/users/",
-            params=params
-        )
-        
-        if members_response.status_code != 200:
-            return jsonify({'error': 'Error fetching members'}), 500
-
-        members = members_response.json()
-
         # Get current meeting details
         meeting = get_upcoming_meeting_details()
         if not meeting:
@@ -2350,63 +2078,29 @@ def get_filtered_member_contributions():
         host_name = meeting['host']
         meeting_date = meeting['when']
 
-        # Prepare contribution query parameters
-        contributions_params = {'meeting_id': meeting_id}
         if host_id:
             # Verify that the host belongs to the umbrella's blocks
-            host_response = requests.get(
-                f"{current_app.config['API_BASE_URL']}/api/v1/users/{host_id}"
-            )
-            if host_response.status_code != 200:
+            host_data = user_service.get_user(host_id)
+            if not host_data:
                 flash("Error fetching host details.", "danger")
                 return []
             
-            host_data = host_response.json()
             host_blocks = host_data.get('block_memberships', [])
             if not any(block['parent_umbrella_id'] == umbrella['id'] for block in host_blocks):
                 flash("You do not have permission to view this host's contributions.", "info")
                 return []
-            
-            contributions_params['host_id'] = host_id
-
-        if member_id and member_id != 'all_members':
-            contributions_params['payer_id'] = member_id
-
-        if status:
-            contributions_params['status'] = status
 
-        contributions_response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/payments/",
-            params=contributions_params
+        # Join the filtered members to their contributions for the meeting
+        member_contributions = contribution_service.member_contribution_report(
+            meeting_id=meeting_id,
+            host_id=host_id,
+            umbrella_id=umbrella['id'],
+            block_id=block_id,
+            zone_id=zone_id,
+            member_id=member_id,
+            status=status
         )
 
-        if contributions_response.status_code != 200:
-            return jsonify({'error': 'Error fetching contributions'}), 500
-
-        contributions = contributions_response.json()
-
-        # Combine and filter member contributions
-        member_contributions = []
-        for member in members:
-            contribution_record = next(
-                (c for c in contributions if c['payer_id'] == member['id']), 
-                None
-            )
-
-            member_status = ('Contributed' 
-                           if contribution_record and contribution_record['transaction_status']
-                           else 'Pending')
-
-            # Apply status filter if provided
-            if status and status != member_status:
-                continue
-
-            member_contributions.append({
-                'full_name': member['full_name'],
-                'amount': contribution_record['amount'] if contribution_record else 0.0,
-                'status': member_status
-            })
-
         return jsonify({
             'member_contributions': member_contributions,
             'host_name': host_name,
@@ -2422,15 +2116,11 @@ def get_filtered_member_contributions():
 @csrf_exempt
 @require_safaricom_ip_validation
 def mpesa_stk_callback():
-    """Handle M-Pesa STK push callback by forwarding to API endpoint"""
+    """Handle M-Pesa STK push callback"""
     try:
-        # Forward the request to the API endpoint
-        api_url = f"{current_app.config['API_BASE_URL']}/api/v1/payments/stk/callback"
-        response = requests.post(api_url, json=request.get_json())
-        logger.info(f"Forwarded STK callback to API. Response: {response.status_code}")
-        return jsonify(response.json()), response.status_code
+        return jsonify(callback_service.enqueue('stk', request.get_json())), 200
     except Exception as e:
-        logger.error(f"Error forwarding M-Pesa STK callback to API: {str(e)}")
+        logger.error(f"Error handling M-Pesa STK callback: {str(e)}")
         return jsonify({
             "ResultCode": "0",
             "ResultDesc": "Success"
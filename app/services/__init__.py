@@ -0,0 +1,28 @@
+"""
+In-process service layer shared by the REST API and the dashboard blueprint.
+
+Each service function works directly against the database and returns the
+same serialized shapes the ``/api/v1`` endpoints respond with, so the
+``main`` blueprint can call them without a loopback HTTP request and the
+API resources stay thin wrappers around them.
+"""
+
+
+class ServiceError(Exception):
+    """A service-level failure carrying the response body and HTTP status."""
+
+    def __init__(self, body, status_code=400):
+        super().__init__(body)
+        self.body = body
+        self.status_code = status_code
+
+    @property
+    def message(self):
+        if isinstance(self.body, dict):
+            return self.body.get('message') or self.body.get('error')
+        return self.body
+
+
+from . import callbacks, contributions, hierarchy, meetings, payments, reference, users  # noqa: E402
+
+__all__ = ['ServiceError', 'callbacks', 'contributions', 'hierarchy', 'meetings', 'payments', 'reference', 'users']
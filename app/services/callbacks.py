@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.exc import IntegrityError
+from ..main.models import MpesaCallbackModel
+from ..utils import db
+from . import payments
+import threading
+import logging
+import json
+import uuid
+
+logger = logging.getLogger('mpesa')
+
+# How each kind of callback is applied, and what Daraja is told on receipt
+CALLBACK_HANDLERS = {
+    'validation': payments.apply_validation,
+    'confirmation': payments.apply_confirmation,
+    'stk': payments.apply_stk_callback
+}
+CALLBACK_ACKS = {
+    'validation': payments.VALIDATION_ACCEPTED,
+    'confirmation': payments.CONFIRMATION_ACK,
+    'stk': payments.STK_CALLBACK_ACK
+}
+
+# Longest wait between two attempts at a failed callback, in seconds
+MAX_RETRY_DELAY = 3600
+
+_workers = []
+_workers_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def callback_key(kind, data):
+    """Return the id a callback is deduplicated on: TransID, or CheckoutRequestID for STK results"""
+    if kind == 'stk':
+        key = data.get('Body', {}).get('stkCallback', {}).get('CheckoutRequestID')
+    else:
+        key = data.get('TransID')
+    # Callbacks without an id are kept rather than merged together
+    return str(key) if key else uuid.uuid4().hex
+
+
+def enqueue(kind, data):
+    """
+    Persist a callback for the background workers and return the Daraja
+    acknowledgement. A callback already received is acknowledged again
+    without being stored twice.
+    """
+    data = data or {}
+    key = callback_key(kind, data)
+    try:
+        db.session.add(MpesaCallbackModel(kind=kind, dedupe_key=key, payload=json.dumps(data)))
+        db.session.commit()
+        logger.info(f"Queued {kind} callback {key}")
+    except IntegrityError:
+        db.session.rollback()
+        logger.info(f"Ignoring duplicate {kind} callback {key}")
+    except Exception as e:
+        logger.error(f"Error queueing {kind} callback {key}: {str(e)}", exc_info=True)
+        db.session.rollback()
+        if kind == 'validation':
+            return dict(payments.VALIDATION_FAILED)
+        return dict(CALLBACK_ACKS[kind])
+
+    _wakeup.set()
+    return dict(CALLBACK_ACKS[kind])
+
+
+def claim_batch(batch_size=100):
+    """
+    Claim up to ``batch_size`` queued callbacks, oldest first.
+
+    Callbacks left in ``processing`` by a worker that died are reclaimed
+    after ``MPESA_CALLBACK_CLAIM_TIMEOUT`` seconds. Failed callbacks are
+    claimed again once their ``next_attempt_at`` has passed.
+    """
+    token = uuid.uuid4().hex
+    now = _now()
+    stale_before = now - timedelta(seconds=current_app.config.get('MPESA_CALLBACK_CLAIM_TIMEOUT', 300))
+    claimable = or_(
+        and_(MpesaCallbackModel.status == 'pending',
+             or_(MpesaCallbackModel.next_attempt_at.is_(None), MpesaCallbackModel.next_attempt_at <= now)),
+        and_(MpesaCallbackModel.status == 'processing', MpesaCallbackModel.claimed_at < stale_before)
+    )
+
+    # Row locks keep concurrent workers apart on Postgres; the status check
+    # in the update does the same where locks are not available.
+    ids = db.session.execute(
+        select(MpesaCallbackModel.id)
+        .where(claimable)
+        .order_by(MpesaCallbackModel.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.commit()
+        return []
+
+    db.session.execute(
+        update(MpesaCallbackModel)
+        .where(MpesaCallbackModel.id.in_(ids), claimable)
+        .values(status='processing', claim_token=token, claimed_at=now)
+    )
+    db.session.commit()
+    return MpesaCallbackModel.query.filter_by(claim_token=token).order_by(MpesaCallbackModel.id).all()
+
+
+def retry_delay(attempts):
+    """Seconds to wait before the next attempt, doubling from ``MPESA_CALLBACK_RETRY_BACKOFF``"""
+    backoff = current_app.config.get('MPESA_CALLBACK_RETRY_BACKOFF', 30)
+    return min(backoff * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def apply_callback(callback):
+    """Apply one claimed callback, retrying it later, with backoff, if it fails."""
+    try:
+        # Committed together with the payment update made by the handler
+        callback.status = 'done'
+        callback.processed_at = _now()
+        CALLBACK_HANDLERS[callback.kind](json.loads(callback.payload))
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        callback.attempts += 1
+        callback.last_error = str(e)[:255]
+        max_attempts = current_app.config.get('MPESA_CALLBACK_MAX_ATTEMPTS', 5)
+        callback.status = 'failed' if callback.attempts >= max_attempts else 'pending'
+        callback.next_attempt_at = _now() + timedelta(seconds=retry_delay(callback.attempts))
+        callback.processed_at = None
+        db.session.commit()
+        logger.error(f"Error applying {callback.kind} callback {callback.dedupe_key} "
+                     f"(attempt {callback.attempts}): {str(e)}", exc_info=True)
+        return False
+
+
+def apply_confirmations(callbacks):
+    """
+    Apply claimed confirmations with one bulk upsert. Returns False, with
+    nothing applied, if any of them fails.
+    """
+    try:
+        now = _now()
+        for callback in callbacks:
+            callback.status = 'done'
+            callback.processed_at = now
+        # Commits the statuses together with the payments
+        payments.upsert_confirmations([json.loads(callback.payload) for callback in callbacks])
+        return True
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Bulk confirmation upsert failed, applying one at a time: {str(e)}")
+        return False
+
+
+def drain(batch_size=100):
+    """Apply one batch of queued callbacks and return how many were claimed."""
+    claimed = claim_batch(batch_size)
+    remaining = claimed
+    confirmations = [callback for callback in claimed if callback.kind == 'confirmation']
+    if len(confirmations) > 1 and apply_confirmations(confirmations):
+        remaining = [callback for callback in claimed if callback.kind != 'confirmation']
+    for callback in remaining:
+        apply_callback(callback)
+    return len(claimed)
+
+
+def _work(app):
+    with app.app_context():
+        batch_size = app.config.get('MPESA_CALLBACK_BATCH_SIZE', 100)
+        poll_interval = app.config.get('MPESA_CALLBACK_POLL_INTERVAL', 1.0)
+        while True:
+            claimed = 0
+            try:
+                claimed = drain(batch_size)
+            except Exception as e:
+                logger.error(f"Error draining M-Pesa callbacks: {str(e)}", exc_info=True)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+            if not claimed:
+                _wakeup.wait(poll_interval)
+                _wakeup.clear()
+
+
+def start_workers(app):
+    """
+    Start the ``MPESA_CALLBACK_WORKERS`` background drainers once per
+    process. Called by ``create_app`` so callbacks queued before a restart,
+    or waiting out their backoff, are applied without a new one arriving.
+    """
+    count = app.config.get('MPESA_CALLBACK_WORKERS', 2)
+    if count <= 0 or any(worker.is_alive() for worker in _workers):
+        return
+    with _workers_lock:
+        if any(worker.is_alive() for worker in _workers):
+            return
+        _workers.clear()
+        for i in range(count):
+            worker = threading.Thread(target=_work, args=(app,), name=f'mpesa-callbacks-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+        logger.info(f"Started {count} M-Pesa callback workers")
@@ -0,0 +1,416 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import insert, select, func, and_, distinct
+from ..main.models import (
+    BlockModel, ZoneModel, MeetingModel, PaymentModel, UserModel, RoleModel, StkPushJobModel,
+    member_blocks, member_zones, roles_users
+)
+from ..utils import db
+from ..utils.phone import to_e164
+from . import ServiceError, hierarchy, ledger
+import threading
+import logging
+import time
+
+logger = logging.getLogger('mpesa')
+
+# Statuses shown for each member in contribution reports
+CONTRIBUTED = 'Contributed'
+PENDING = 'Pending'
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_mpesa_client():
+    """The shared M-Pesa client, imported on first use since it pulls in requests"""
+    from ..utils.mpesa import get_mpesa_client as shared_client
+    return shared_client()
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` calls per second, shared by threads"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_rate_limiter(rate):
+    """The process-wide STK push limiter, so concurrent jobs share ``rate`` between them"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None or _limiter.rate != float(rate):
+            _limiter = RateLimiter(rate)
+        return _limiter
+
+
+def reset_rate_limiter():
+    """Drop the shared limiter so the next job builds a fresh one"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = None
+
+
+def find_contribution_meeting(block):
+    """
+    Return the umbrella meeting contributions are collected for: one that
+    started within the last 24 hours, otherwise the latest scheduled one.
+    """
+    now = datetime.now()
+    logger.info(f"Searching for meeting in block {block.id} with umbrella {block.parent_umbrella_id}")
+
+    # First try to find a meeting that started within the last 24 hours
+    meeting = MeetingModel.query.join(BlockModel).filter(
+        BlockModel.parent_umbrella_id == block.parent_umbrella_id,
+        MeetingModel.date >= now - timedelta(hours=24)  # Meeting started within last 24 hours
+    ).order_by(MeetingModel.date.desc()).first()
+
+    if meeting:
+        logger.info(f"Found recent meeting: ID={meeting.id}, Date={meeting.date}, Unique_ID={meeting.unique_id}")
+        return meeting
+
+    logger.info("No recent meeting found, looking for latest scheduled meeting")
+    meeting = MeetingModel.query.join(BlockModel).filter(
+        BlockModel.parent_umbrella_id == block.parent_umbrella_id
+    ).order_by(MeetingModel.date.desc()).first()
+
+    if meeting:
+        logger.info(f"Found latest meeting: ID={meeting.id}, Date={meeting.date}, Unique_ID={meeting.unique_id}")
+    else:
+        logger.error(f"No meeting found for umbrella {block.parent_umbrella_id}")
+    return meeting
+
+
+def contribution_recipients(block_id, zone_id=None):
+    """Return ``(user_id, phone_number)`` for each member of a block or zone"""
+    query = (
+        db.session.query(UserModel.id, UserModel.phone_number)
+        .join(UserModel.block_memberships)
+        .filter(BlockModel.id == block_id)
+    )
+    if zone_id:
+        query = query.join(UserModel.zone_memberships).filter(ZoneModel.id == zone_id)
+    return [(user_id, phone) for user_id, phone in query.distinct().all() if phone]
+
+
+def contribution_stats(block_id=None, zone_id=None, meeting_id=None):
+    """
+    Count the members of a block, or one of its zones, who have contributed
+    and the total they paid, in a single query.
+
+    Payments are matched on ``block_id`` and, when given, ``meeting_id``.
+    With only a meeting the members of the meeting's block are counted.
+    Payments still pending or that failed do not count.
+
+    Raises:
+        ServiceError: If neither a block nor a meeting is given.
+    """
+    if not block_id and not meeting_id:
+        raise ServiceError({"message": "A block or meeting is required."}, 400)
+
+    if block_id:
+        members_block = block_id
+    else:
+        members_block = select(MeetingModel.block_id).where(MeetingModel.id == meeting_id).scalar_subquery()
+
+    paid = [
+        PaymentModel.payer_id == member_blocks.c.user_id,
+        ledger.counts_as_paid()
+    ]
+    if block_id:
+        paid.append(PaymentModel.block_id == block_id)
+    if meeting_id:
+        paid.append(PaymentModel.meeting_id == meeting_id)
+
+    query = select(
+        func.count(distinct(member_blocks.c.user_id)),
+        func.count(distinct(PaymentModel.payer_id)),
+        func.coalesce(func.sum(PaymentModel.amount), 0)
+    ).select_from(member_blocks)
+    if zone_id:
+        query = query.join(member_zones, and_(
+            member_zones.c.user_id == member_blocks.c.user_id,
+            member_zones.c.zone_id == zone_id
+        ))
+    query = query.outerjoin(PaymentModel, and_(*paid)).where(member_blocks.c.block_id == members_block)
+
+    members, contributed, total_amount = db.session.execute(query).one()
+    return {
+        'block_id': block_id,
+        'zone_id': zone_id,
+        'meeting_id': meeting_id,
+        'members': members,
+        'contributed': contributed,
+        'pending': members - contributed,
+        'total_amount': total_amount
+    }
+
+
+def member_contribution_report(meeting_id=None, host_id=None, umbrella_id=None, block_id=None,
+                               zone_id=None, member_id=None, status=None, member_ids=None):
+    """
+    Return each member with what they paid, in one query joining members
+    to their payments on ``payer_id``.
+
+    Payments are limited to ``meeting_id`` and to meetings hosted by
+    ``host_id`` when given. Members are limited to an umbrella, block,
+    zone, one member or a list of ``member_ids``, and to those whose
+    status, ``Contributed`` or ``Pending``, is ``status``.
+
+    Returns:
+        list: ``{id, full_name, amount, payments, status}`` per member, by id
+    """
+    paid = [PaymentModel.payer_id == UserModel.id, ledger.counts_as_paid()]
+    if meeting_id:
+        paid.append(PaymentModel.meeting_id == meeting_id)
+    if host_id:
+        paid.append(PaymentModel.meeting_id.in_(select(MeetingModel.id).where(MeetingModel.host_id == host_id)))
+
+    members = (
+        select(UserModel.id)
+        .join(roles_users, roles_users.c.user_id == UserModel.id)
+        .join(RoleModel, RoleModel.id == roles_users.c.role_id)
+        .where(RoleModel.name == 'Member')
+    )
+    if umbrella_id or block_id:
+        members = members.join(member_blocks, member_blocks.c.user_id == UserModel.id)
+        if block_id:
+            members = members.where(member_blocks.c.block_id == block_id)
+        if umbrella_id:
+            members = members.join(BlockModel, BlockModel.id == member_blocks.c.block_id)\
+                .where(BlockModel.parent_umbrella_id == umbrella_id)
+    if zone_id:
+        members = members.join(member_zones, member_zones.c.user_id == UserModel.id)\
+            .where(member_zones.c.zone_id == zone_id)
+    if member_id:
+        members = members.where(UserModel.id == member_id)
+    if member_ids is not None:
+        members = members.where(UserModel.id.in_(member_ids))
+
+    payment_count = func.count(PaymentModel.id)
+    query = (
+        select(UserModel.id, UserModel.full_name, func.coalesce(func.sum(PaymentModel.amount), 0), payment_count)
+        .outerjoin(PaymentModel, and_(*paid))
+        .where(UserModel.id.in_(members))
+        .group_by(UserModel.id, UserModel.full_name)
+        .order_by(UserModel.id)
+    )
+    if status == CONTRIBUTED:
+        query = query.having(payment_count > 0)
+    elif status == PENDING:
+        query = query.having(payment_count == 0)
+
+    return [
+        {
+            'id': user_id,
+            'full_name': full_name,
+            'amount': amount,
+            'payments': payments,
+            'status': CONTRIBUTED if payments else PENDING
+        }
+        for user_id, full_name, amount, payments in db.session.execute(query)
+    ]
+
+
+def get_job(job_id, user=None):
+    """
+    Return a bulk request's progress, or None if it does not exist or,
+    when ``user`` is given, was neither sent by them nor to their umbrella.
+    """
+    job = (
+        StkPushJobModel.query
+        .filter_by(job_id=job_id)
+        .execution_options(populate_existing=True)
+        .first()
+    )
+    if not job:
+        return None
+    if user is not None and job.requested_by != user.id:
+        try:
+            hierarchy.scoped_umbrella_id(user, block_id=job.block_id)
+        except ServiceError:
+            return None
+    return job.to_dict()
+
+
+def request_block_contributions(block_id, amount, requested_by=None, zone_id=None, wait=False):
+    """
+    Send an STK push for ``amount`` to every member of a block, or of one of
+    its zones, for the block's current meeting.
+
+    The pushes run in the background; the returned job can be polled with
+    ``get_job``. Pass ``wait=True`` to return only once every push is done.
+
+    Raises:
+        ServiceError: If the block, zone, meeting or members are missing.
+    """
+    block = db.session.get(BlockModel, block_id)
+    if not block:
+        raise ServiceError({"message": "Block not found."}, 404)
+
+    if zone_id and not ZoneModel.query.filter_by(id=zone_id, parent_block_id=block_id).first():
+        raise ServiceError({"message": "Zone does not belong to the specified block."}, 400)
+
+    if not amount or int(amount) <= 0:
+        raise ServiceError({"message": "Amount must be greater than zero."}, 400)
+
+    meeting = find_contribution_meeting(block)
+    if not meeting:
+        raise ServiceError({"message": "No active meeting found. Please ensure there is a scheduled meeting."}, 404)
+
+    recipients = contribution_recipients(block_id, zone_id)
+    if not recipients:
+        raise ServiceError({"message": "No members with phone numbers found."}, 400)
+
+    job = StkPushJobModel(
+        amount=int(amount),
+        block_id=block_id,
+        zone_id=zone_id,
+        meeting_id=meeting.id,
+        requested_by=requested_by,
+        total=len(recipients)
+    )
+    db.session.add(job)
+    db.session.commit()
+    logger.info(f"Queued STK push job {job.job_id} for {len(recipients)} members of block {block_id}")
+
+    thread = threading.Thread(
+        target=run_job,
+        args=(current_app._get_current_object(), job.job_id, recipients, meeting.unique_id),
+        name=f'stk-push-job-{job.job_id}',
+        daemon=True
+    )
+    thread.start()
+    if wait:
+        thread.join()
+
+    return get_job(job.job_id)
+
+
+def _send_push(app, mpesa, limiter, phone_number, amount, bill_ref):
+    with app.app_context():
+        limiter.acquire()
+        return mpesa.initiate_payment(amount=amount, phone_number=phone_number, bill_ref_number=bill_ref)
+
+
+def run_job(app, job_id, recipients, bill_ref):
+    """
+    Fan out a job's STK pushes over a bounded thread pool.
+
+    Pushes are rate limited to ``MPESA_STK_RATE_LIMIT`` per second across
+    all of the process's jobs. Each
+    accepted push is stored as a pending payment as soon as its response
+    arrives, so the STK callback can match it by checkout request id. A
+    pending payment that fails to insert is kept and inserted again with
+    the next one, since its push has already gone out.
+    """
+    with app.app_context():
+        job = StkPushJobModel.query.filter_by(job_id=job_id).first()
+        job.status = 'running'
+        db.session.commit()
+
+        limiter = get_rate_limiter(app.config.get('MPESA_STK_RATE_LIMIT', 5))
+        pending_payments = []
+        progress = {'status': 'running', 'sent': 0, 'failed': 0, 'last_error': None}
+
+        def store(rows):
+            try:
+                if rows:
+                    db.session.execute(insert(PaymentModel), rows)
+                job.status, job.sent, job.failed = progress['status'], progress['sent'], progress['failed']
+                job.last_error = progress['last_error']
+                db.session.commit()
+                return True
+            except Exception as e:
+                # A rollback expires the job too, so its progress is kept in ``progress``
+                db.session.rollback()
+                logger.error(f"Error storing {len(rows)} pending payments for job {job_id}: {str(e)}")
+                return False
+
+        def flush():
+            """Store the unsaved pending payments with the job's progress; True once all are stored"""
+            if store(pending_payments):
+                pending_payments.clear()
+                return True
+            # One at a time, so one bad row does not hold back the others
+            for payment in list(pending_payments):
+                if store([payment]):
+                    pending_payments.remove(payment)
+            return not pending_payments
+
+        try:
+            mpesa = get_mpesa_client()
+            with ThreadPoolExecutor(
+                max_workers=app.config.get('MPESA_STK_CONCURRENCY', 4),
+                thread_name_prefix='stk-push'
+            ) as executor:
+                futures = {
+                    executor.submit(_send_push, app, mpesa, limiter, phone, job.amount, bill_ref): (payer_id, phone)
+                    for payer_id, phone in recipients
+                }
+                for future in as_completed(futures):
+                    payer_id, phone = futures[future]
+                    try:
+                        response = future.result()
+                        if str(response.get('ResponseCode')) != '0':
+                            raise ValueError(response.get('ResponseDescription') or response.get('errorMessage') or 'STK push rejected')
+                    except Exception as e:
+                        logger.error(f"STK push to payer {payer_id} failed for job {job_id}: {str(e)}")
+                        progress['failed'] += 1
+                        progress['last_error'] = str(e)[:255]
+                        continue
+
+                    checkout_request_id = response.get('CheckoutRequestID')
+                    pending_payments.append({
+                        # The receipt number replaces this once the callback arrives
+                        'mpesa_id': checkout_request_id,
+                        'checkout_request_id': checkout_request_id,
+                        'merchant_request_id': response.get('MerchantRequestID'),
+                        'account_number': bill_ref,
+                        'source_phone_number': phone,
+                        'phone_e164': to_e164(phone),
+                        'amount': job.amount,
+                        'transaction_status': 'pending',
+                        'status': 'pending',
+                        'transaction_type': 'CustomerPayBillOnline',
+                        'payer_id': payer_id,
+                        'block_id': job.block_id,
+                        'meeting_id': job.meeting_id
+                    })
+                    progress['sent'] += 1
+                    flush()
+
+            progress['status'] = 'completed'
+        except Exception as e:
+            logger.error(f"STK push job {job_id} failed: {str(e)}", exc_info=True)
+            db.session.rollback()
+            progress['status'] = 'failed'
+            progress['last_error'] = str(e)[:255]
+
+        if not flush():
+            # Logged in full so the payments of pushes already sent can be restored by hand
+            logger.critical(f"Job {job_id} could not store the pending payments of sent pushes: {pending_payments}")
+            progress['last_error'] = f"{len(pending_payments)} pending payments not stored"
+            pending_payments.clear()
+            progress['status'] = 'failed'
+        job.finished_at = datetime.now(timezone.utc)
+        flush()
+        logger.info(f"STK push job {job_id} {job.status}: {job.sent} sent, {job.failed} failed")
@@ -0,0 +1,135 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, case
+from ..main.models import (
+    PaymentModel, UserModel, BlockModel, ZoneModel, BankModel, RoleModel,
+    roles_users, member_blocks, member_zones
+)
+from ..utils import db
+import csv
+import io
+import msgspec
+
+# Rows fetched from the database cursor at a time, and written out together
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+_encoder = msgspec.json.Encoder()
+
+
+def payments_query(umbrella_id=None, block_id=None, meeting_id=None, start=None, end=None):
+    """
+    Payments by date, filtered by umbrella, block, meeting and a date range
+    whose ``end`` day is included.
+    """
+    query = (
+        select(
+            PaymentModel.id,
+            PaymentModel.mpesa_id,
+            PaymentModel.payment_date,
+            PaymentModel.amount,
+            PaymentModel.account_number,
+            PaymentModel.source_phone_number,
+            PaymentModel.transaction_status,
+            PaymentModel.status,
+            PaymentModel.payer_id,
+            case((UserModel.id.is_(None), 'Unknown'), else_=UserModel.full_name).label('payer_full_name'),
+            PaymentModel.block_id,
+            case((BlockModel.id.is_(None), 'Unknown'), else_=BlockModel.name).label('block_name'),
+            PaymentModel.meeting_id,
+            PaymentModel.first_name,
+            PaymentModel.middle_name,
+            PaymentModel.last_name
+        )
+        .outerjoin(UserModel, UserModel.id == PaymentModel.payer_id)
+        .outerjoin(BlockModel, BlockModel.id == PaymentModel.block_id)
+        .order_by(PaymentModel.payment_date, PaymentModel.id)
+    )
+    if umbrella_id:
+        query = query.where(PaymentModel.block_id.in_(
+            select(BlockModel.id).where(BlockModel.parent_umbrella_id == umbrella_id)
+        ))
+    if block_id:
+        query = query.where(PaymentModel.block_id == block_id)
+    if meeting_id:
+        query = query.where(PaymentModel.meeting_id == meeting_id)
+    if start:
+        query = query.where(PaymentModel.payment_date >= datetime.combine(start, time.min))
+    if end:
+        query = query.where(PaymentModel.payment_date < datetime.combine(end + timedelta(days=1), time.min))
+    return query
+
+
+def members_query(umbrella_id=None, block_id=None, zone_id=None):
+    """Members by id, filtered by the umbrella, block and zone they belong to."""
+    members = (
+        select(UserModel.id)
+        .join(roles_users, roles_users.c.user_id == UserModel.id)
+        .join(RoleModel, RoleModel.id == roles_users.c.role_id)
+        .where(RoleModel.name == 'Member')
+    )
+    if umbrella_id or block_id:
+        members = members.join(member_blocks, member_blocks.c.user_id == UserModel.id)
+        if block_id:
+            members = members.where(member_blocks.c.block_id == block_id)
+        if umbrella_id:
+            members = members.join(BlockModel, BlockModel.id == member_blocks.c.block_id)\
+                .where(BlockModel.parent_umbrella_id == umbrella_id)
+    if zone_id:
+        members = members.join(member_zones, member_zones.c.user_id == UserModel.id)\
+            .where(member_zones.c.zone_id == zone_id)
+
+    return (
+        select(
+            UserModel.id,
+            UserModel.full_name,
+            UserModel.email,
+            UserModel.id_number,
+            UserModel.phone_number,
+            BankModel.name.label('bank_name'),
+            UserModel.acc_number,
+            UserModel.zone_id,
+            ZoneModel.name.label('zone_name'),
+            UserModel.umbrella_id,
+            UserModel.is_approved,
+            UserModel.registered_at
+        )
+        .outerjoin(BankModel, BankModel.id == UserModel.bank_id)
+        .outerjoin(ZoneModel, ZoneModel.id == UserModel.zone_id)
+        .where(UserModel.id.in_(members))
+        .order_by(UserModel.id)
+    )
+
+
+def stream_rows(query, export_format='csv', batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield ``query``'s rows as CSV, with a header line, or as one JSON object
+    per line, a batch at a time.
+
+    Rows are read through a server-side cursor, so memory stays constant
+    however many rows there are.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        columns = list(result.keys())
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield _encoder.encode_lines([dict(zip(columns, row)) for row in rows])
+    finally:
+        result.close()
@@ -0,0 +1,248 @@
+from flask_restful import marshal
+from sqlalchemy import event, select
+from sqlalchemy.orm import joinedload
+from ..main.models import UmbrellaModel, BlockModel, ZoneModel, MeetingModel
+from ..api.serializers import umbrella_fields, block_fields, zone_fields
+from ..api.row_serializers import RowSerializer, field_columns
+from ..utils import db
+from ..utils.hierarchy_cache import get_hierarchy_cache
+from . import ServiceError
+
+
+# Cache keys: an umbrella's block and zone tree, and the umbrella a user created
+TREE_KEY = 'umbrella-tree:{}'
+USER_UMBRELLA_KEY = 'user-umbrella:{}'
+
+# Listings are serialized from column rows rather than loaded models
+BLOCK_ROWS = RowSerializer(block_fields)
+ZONE_ROWS = RowSerializer(zone_fields)
+
+
+# Cached trees
+def load_umbrella_tree(umbrella_id, member_counts=False):
+    """
+    Load an umbrella with its blocks, each with its ``zones``, in one query.
+
+    Args:
+        member_counts (bool): Add each block's and zone's ``member_count``
+
+    Returns:
+        dict: The tree, or None if the umbrella does not exist
+    """
+    blocks = joinedload(UmbrellaModel.blocks)
+    zones = blocks.joinedload(BlockModel.zones)
+    options = [blocks, zones]
+    if member_counts:
+        options += [blocks.undefer(BlockModel.member_count), zones.undefer(ZoneModel.member_count)]
+    umbrella = db.session.get(UmbrellaModel, umbrella_id, options=options, populate_existing=True)
+    if not umbrella:
+        return None
+
+    def node(item, fields):
+        serialized = dict(marshal(item, fields))
+        if member_counts:
+            serialized['member_count'] = item.member_count
+        return serialized
+
+    tree = dict(marshal(umbrella, umbrella_fields))
+    tree['blocks'] = [
+        dict(node(block, block_fields), zones=[
+            node(zone, zone_fields) for zone in sorted(block.zones, key=lambda zone: zone.id)
+        ])
+        for block in sorted(umbrella.blocks, key=lambda block: block.id)
+    ]
+    return tree
+
+
+def umbrella_tree(umbrella_id):
+    """
+    Return an umbrella with its blocks, each with its ``zones``, or None.
+
+    Trees are cached across requests until the umbrella, one of its blocks
+    or one of its zones changes, or for ``HIERARCHY_CACHE_TTL`` seconds.
+    """
+    if not umbrella_id:
+        return None
+    cache = get_hierarchy_cache()
+    key = TREE_KEY.format(umbrella_id)
+    tree = cache.get(key)
+    if tree is not None:
+        return tree
+
+    tree = load_umbrella_tree(umbrella_id)
+    if tree:
+        cache.set(key, tree)
+    return tree
+
+
+def user_umbrella_id(user_id):
+    """Return the id of the first umbrella created by a user, or None."""
+    cache = get_hierarchy_cache()
+    key = USER_UMBRELLA_KEY.format(user_id)
+    # 0 marks a user without an umbrella, which a cache miss cannot
+    umbrella_id = cache.get(key)
+    if umbrella_id is None:
+        umbrella = UmbrellaModel.query.filter_by(created_by=user_id).order_by(UmbrellaModel.id).first()
+        umbrella_id = umbrella.id if umbrella else 0
+        cache.set(key, umbrella_id)
+    return umbrella_id or None
+
+
+def invalidate_umbrella(umbrella_id=None, created_by=None):
+    """Drop the cached tree of an umbrella and the umbrella cached for its creator."""
+    cache = get_hierarchy_cache()
+    if umbrella_id:
+        cache.delete(TREE_KEY.format(umbrella_id))
+    if created_by:
+        cache.delete(USER_UMBRELLA_KEY.format(created_by))
+
+
+def invalidate_block(block_id=None, parent_umbrella_id=None):
+    """Drop the cached tree holding a block, found from its id when the umbrella is not given."""
+    if not parent_umbrella_id and block_id:
+        parent_umbrella_id = db.session.query(BlockModel.parent_umbrella_id).filter_by(id=block_id).scalar()
+    invalidate_umbrella(parent_umbrella_id)
+
+
+def member_umbrella_id(user):
+    """Return the umbrella a user works in: the one they created, their own, or their first block's."""
+    umbrella_id = user_umbrella_id(user.id) or user.umbrella_id
+    if not umbrella_id and user.block_memberships:
+        umbrella_id = user.block_memberships[0].parent_umbrella_id
+    return umbrella_id
+
+
+def scoped_umbrella_id(user, umbrella_id=None, block_id=None, zone_id=None, meeting_id=None):
+    """
+    Pin a listing's filters to the umbrella of ``user``; only a SuperUser
+    may read across umbrellas.
+
+    Returns:
+        int: The umbrella to filter on, or None for a SuperUser reading all of them
+
+    Raises:
+        ServiceError: If the user has no umbrella or a filter lies outside it
+    """
+    if user.has_role('SuperUser'):
+        return umbrella_id
+
+    own_umbrella_id = member_umbrella_id(user)
+    if not own_umbrella_id:
+        raise ServiceError({"message": "You do not belong to an umbrella."}, 403)
+
+    parents = []
+    if umbrella_id:
+        parents.append(umbrella_id)
+    if block_id:
+        parents.append(select(BlockModel.parent_umbrella_id).where(BlockModel.id == block_id))
+    if zone_id:
+        parents.append(select(BlockModel.parent_umbrella_id)
+                       .join(ZoneModel, ZoneModel.parent_block_id == BlockModel.id)
+                       .where(ZoneModel.id == zone_id))
+    if meeting_id:
+        parents.append(select(BlockModel.parent_umbrella_id)
+                       .join(MeetingModel, MeetingModel.block_id == BlockModel.id)
+                       .where(MeetingModel.id == meeting_id))
+
+    for parent in parents:
+        if not isinstance(parent, int):
+            parent = db.session.execute(parent).scalar()
+        if parent != own_umbrella_id:
+            raise ServiceError({"message": "You do not have permission to access this umbrella."}, 403)
+    return own_umbrella_id
+
+
+@event.listens_for(db.metadata, 'after_drop')
+def _clear_after_drop(target, connection, **kw):
+    """Ids are reused once the tables are recreated, so cached trees go with them"""
+    get_hierarchy_cache().clear()
+
+
+# Umbrellas
+def list_umbrellas(created_by=None):
+    """Return all umbrellas, optionally only those created by a user."""
+    query = UmbrellaModel.query
+    if created_by:
+        query = query.filter_by(created_by=created_by)
+    return marshal(query.all(), umbrella_fields)
+
+
+def get_umbrella(umbrella_id):
+    umbrella = db.session.get(UmbrellaModel, umbrella_id)
+    return marshal(umbrella, umbrella_fields) if umbrella else None
+
+
+def get_umbrella_by_user(user_id):
+    """Return the first umbrella created by the given user, or None."""
+    umbrellas = list_umbrellas(created_by=user_id)
+    return umbrellas[0] if umbrellas else None
+
+
+def create_umbrella(name, location, created_by):
+    umbrella = UmbrellaModel(
+        name=name,
+        location=location,
+        created_by=created_by,
+        initials=UmbrellaModel.generate_unique_initials(name)
+    )
+    db.session.add(umbrella)
+    db.session.commit()
+    invalidate_umbrella(umbrella.id, created_by=created_by)
+    return marshal(umbrella, umbrella_fields)
+
+
+# Blocks
+def list_blocks(parent_umbrella_id=None):
+    """Return all blocks, optionally filtered by their parent umbrella."""
+    query = select(*field_columns(BlockModel, block_fields))
+    if parent_umbrella_id:
+        query = query.where(BlockModel.parent_umbrella_id == parent_umbrella_id)
+    return BLOCK_ROWS.many(db.session.execute(query).mappings())
+
+
+def get_block(block_id):
+    block = db.session.get(BlockModel, block_id)
+    return marshal(block, block_fields) if block else None
+
+
+def create_block(name, parent_umbrella_id, created_by):
+    """Create a block, rejecting duplicate names within the same umbrella."""
+    existing_block = BlockModel.query.filter_by(
+        name=name,
+        parent_umbrella_id=parent_umbrella_id
+    ).first()
+    if existing_block:
+        raise ServiceError({"success": False, "message": "Block with this name already exists under the specified umbrella."}, 400)
+
+    block = BlockModel(
+        name=name,
+        parent_umbrella_id=parent_umbrella_id,
+        created_by=created_by,
+        initials=BlockModel.block_initials(name)
+    )
+    db.session.add(block)
+    db.session.commit()
+    invalidate_umbrella(parent_umbrella_id)
+    return marshal(block, block_fields)
+
+
+# Zones
+def list_zones(parent_block_id=None):
+    """Return all zones, optionally filtered by their parent block."""
+    query = select(*field_columns(ZoneModel, zone_fields))
+    if parent_block_id:
+        query = query.where(ZoneModel.parent_block_id == parent_block_id)
+    return ZONE_ROWS.many(db.session.execute(query).mappings())
+
+
+def get_zone(zone_id):
+    zone = db.session.get(ZoneModel, zone_id)
+    return marshal(zone, zone_fields) if zone else None
+
+
+def create_zone(name, parent_block_id, created_by):
+    zone = ZoneModel(name=name, parent_block_id=parent_block_id, created_by=created_by)
+    db.session.add(zone)
+    db.session.commit()
+    invalidate_block(parent_block_id)
+    return marshal(zone, zone_fields)
@@ -0,0 +1,177 @@
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.dialects import postgresql, sqlite
+from ..main.models import PaymentModel, UserModel, MeetingContributionSummaryModel
+from ..utils import db
+import logging
+
+logger = logging.getLogger('mpesa')
+
+# Databases with INSERT ... ON CONFLICT, and how many payments are summed per statement
+SUMMARY_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+SUMMARY_CHUNK_SIZE = 500
+
+# Payment statuses, in any case, that do not count as a contribution
+UNPAID_STATUSES = ('pending', 'failed')
+
+
+def counts_as_paid():
+    """
+    Payments that count as a contribution: any status but pending or failed,
+    so manual payments with another or no status count too. Shared by the
+    summary and the contribution stats and reports, which must agree.
+    """
+    return func.lower(func.coalesce(PaymentModel.transaction_status, '')).notin_(UNPAID_STATUSES)
+
+
+def is_paid(status):
+    """``counts_as_paid`` for a status already loaded"""
+    return str(status or '').lower() not in UNPAID_STATUSES
+
+
+def _summary_select():
+    """Paid payments grouped by meeting, block and the payer's zone"""
+    block_id = func.coalesce(PaymentModel.block_id, 0)
+    zone_id = func.coalesce(UserModel.zone_id, 0)
+    return (
+        select(
+            PaymentModel.meeting_id,
+            block_id,
+            zone_id,
+            func.count(PaymentModel.id),
+            func.coalesce(func.sum(PaymentModel.amount), 0),
+            func.max(PaymentModel.payment_date)
+        )
+        .outerjoin(UserModel, UserModel.id == PaymentModel.payer_id)
+        .where(PaymentModel.meeting_id.isnot(None), counts_as_paid())
+        .group_by(PaymentModel.meeting_id, block_id, zone_id)
+    )
+
+
+def _add_to_summary(groups):
+    """Add ``(meeting_id, block_id, zone_id, count, total, last_payment_at)`` groups to the summary."""
+    rows = [
+        {
+            'meeting_id': meeting_id,
+            'block_id': block_id,
+            'zone_id': zone_id,
+            'payment_count': count,
+            'total_amount': int(total),
+            'last_payment_at': last_payment_at
+        }
+        for meeting_id, block_id, zone_id, count, total, last_payment_at in groups
+    ]
+    if not rows:
+        return
+
+    table = MeetingContributionSummaryModel.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in SUMMARY_DIALECTS:
+        stmt = SUMMARY_DIALECTS[dialect](table).values(rows)
+        excluded = stmt.excluded
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.meeting_id, table.c.block_id, table.c.zone_id],
+            set_={
+                'payment_count': table.c.payment_count + excluded.payment_count,
+                'total_amount': table.c.total_amount + excluded.total_amount,
+                'last_payment_at': case(
+                    (table.c.last_payment_at.is_(None), excluded.last_payment_at),
+                    (excluded.last_payment_at > table.c.last_payment_at, excluded.last_payment_at),
+                    else_=table.c.last_payment_at
+                ),
+                'updated_at': func.current_timestamp()
+            }
+        ))
+        return
+
+    for row in rows:
+        summary = MeetingContributionSummaryModel.query.filter_by(
+            meeting_id=row['meeting_id'], block_id=row['block_id'], zone_id=row['zone_id']
+        ).first()
+        if not summary:
+            db.session.add(MeetingContributionSummaryModel(**row))
+            continue
+        summary.payment_count += row['payment_count']
+        summary.total_amount += row['total_amount']
+        if row['last_payment_at'] and (not summary.last_payment_at or row['last_payment_at'] > summary.last_payment_at):
+            summary.last_payment_at = row['last_payment_at']
+
+
+def add_payments(mpesa_ids):
+    """
+    Add newly completed payments to the meeting contribution summary.
+
+    Call this once per payment, in the transaction that completes it;
+    payments without a meeting are skipped. The caller commits.
+    """
+    mpesa_ids = [mpesa_id for mpesa_id in mpesa_ids if mpesa_id]
+    for start in range(0, len(mpesa_ids), SUMMARY_CHUNK_SIZE):
+        chunk = mpesa_ids[start:start + SUMMARY_CHUNK_SIZE]
+        _add_to_summary(db.session.execute(
+            _summary_select().where(PaymentModel.mpesa_id.in_(chunk))
+        ).all())
+
+
+def _rebuild(meeting_id=None):
+    table = MeetingContributionSummaryModel.__table__
+    query = _summary_select()
+    clear = delete(table)
+    if meeting_id:
+        query = query.where(PaymentModel.meeting_id == meeting_id)
+        clear = clear.where(table.c.meeting_id == meeting_id)
+
+    db.session.execute(clear)
+    return db.session.execute(insert(table).from_select(
+        ['meeting_id', 'block_id', 'zone_id', 'payment_count', 'total_amount', 'last_payment_at'],
+        query
+    )).rowcount
+
+
+def rebuild_summary(meeting_id=None):
+    """
+    Recompute the summary from the payments table, for one meeting or all
+    of them. Returns the number of summary rows written.
+    """
+    count = _rebuild(meeting_id)
+    db.session.commit()
+    logger.info(f"Rebuilt {count} contribution summary rows")
+    return count
+
+
+def refresh_meetings(meeting_ids):
+    """
+    Recompute the summary of the meetings whose payments were created,
+    changed or deleted by hand rather than completed through M-Pesa.
+    The caller commits.
+    """
+    db.session.flush()
+    for meeting_id in sorted({meeting_id for meeting_id in meeting_ids if meeting_id}):
+        _rebuild(meeting_id)
+
+
+def refresh_member(user_id):
+    """
+    Recompute the summary of every meeting a member paid into, as their
+    payments are grouped by their current zone. Call when the zone changes;
+    the caller commits.
+    """
+    refresh_meetings(db.session.scalars(
+        select(PaymentModel.meeting_id).where(PaymentModel.payer_id == user_id).distinct()
+    ).all())
+
+
+def is_empty():
+    """True while the summary has never been built"""
+    return db.session.execute(select(MeetingContributionSummaryModel.id).limit(1)).first() is None
+
+
+def block_totals(meeting_id):
+    """Return ``{block_id: total_amount}`` of paid payments for a meeting."""
+    table = MeetingContributionSummaryModel.__table__
+    return dict(db.session.execute(
+        select(table.c.block_id, func.sum(table.c.total_amount))
+        .where(table.c.meeting_id == meeting_id)
+        .group_by(table.c.block_id)
+    ).all())
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta
+from flask_restful import marshal
+from sqlalchemy import select
+from ..main.models import MeetingModel, BlockModel, ZoneModel
+from ..api.serializers import meeting_fields
+from ..api.row_serializers import RowSerializer, field_columns
+from ..utils import db
+from . import ServiceError
+
+MEETING_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Columns a caller may change through ``update_meeting``
+UPDATABLE_FIELDS = ('host_id', 'block_id', 'zone_id', 'organizer_id', 'date')
+
+MEETING_ROWS = RowSerializer(meeting_fields)
+
+
+def meeting_details(meeting):
+    """Summarize a meeting with its block, zone, host and payment details."""
+    host = meeting.host
+    return {
+        'meeting_block': meeting.block.name if meeting.block else 'Unknown Block',
+        'meeting_zone': meeting.zone.name if meeting.zone else 'Unknown Zone',
+        'host': host.full_name if host else 'Unknown Host',
+        'paybill_no': host.bank.paybill_no if host and host.bank else 'Unknown Paybill',
+        'acc_number': host.acc_number if host else 'Unknown Account',
+        'meeting_id': meeting.id,
+        'when': meeting.date.strftime('%a, %d %b %Y %H:%M:%S'),
+        'event_id': meeting.unique_id
+    }
+
+
+def list_meetings():
+    """Return every meeting as serialized by the meetings endpoint."""
+    rows = db.session.execute(select(*field_columns(MeetingModel, meeting_fields))).mappings()
+    return MEETING_ROWS.many(rows)
+
+
+def list_meeting_details(organizer_id=None, start=None, end=None):
+    """
+    Return meeting summaries filtered by organizer and/or a date range.
+
+    Args:
+        organizer_id: Only include meetings organized by this user
+        start (datetime): Earliest meeting date, used together with ``end``
+        end (datetime): Latest meeting date, used together with ``start``
+    """
+    query = MeetingModel.query
+    if organizer_id:
+        query = query.filter(MeetingModel.organizer_id == organizer_id)
+    if start and end:
+        query = query.filter(MeetingModel.date >= start, MeetingModel.date <= end)
+    return [meeting_details(meeting) for meeting in query.all()]
+
+
+def get_meeting(meeting_id, upcoming_only=False):
+    """
+    Return a serialized meeting, or None if it does not exist.
+
+    Raises:
+        ServiceError: If ``upcoming_only`` is set and the meeting has passed.
+    """
+    meeting = db.session.get(MeetingModel, meeting_id)
+    if not meeting:
+        return None
+    if upcoming_only and meeting.date < datetime.now():
+        raise ServiceError({'message': 'No upcoming meeting available'}, 404)
+    return marshal(meeting, meeting_fields)
+
+
+def create_meeting(host_id, block_id, zone_id, organizer_id, date):
+    """
+    Schedule a meeting, allowing one meeting per block and zone each week.
+
+    Args:
+        date (str): Meeting date formatted as ``YYYY-MM-DD HH:MM:SS``
+
+    Raises:
+        ServiceError: On missing or invalid input, or a clashing meeting.
+    """
+    if not block_id or not zone_id or not date:
+        raise ServiceError({'error': 'Block ID, Zone ID, and date are required'}, 400)
+
+    try:
+        meeting_date = datetime.strptime(date, MEETING_DATE_FORMAT)
+    except ValueError:
+        raise ServiceError({'error': 'Invalid date format, expected YYYY-MM-DD HH:MM:SS'}, 400)
+
+    block = db.session.get(BlockModel, block_id)
+    if not block:
+        raise ServiceError({'error': 'Block not found'}, 404)
+    zone = ZoneModel.query.filter_by(id=zone_id, parent_block_id=block_id).first()
+    if not zone:
+        raise ServiceError({'error': 'Zone does not belong to the specified block'}, 400)
+
+    # Get the current week range (start and end of the week)
+    week_start = meeting_date - timedelta(days=meeting_date.weekday())
+    week_end = week_start + timedelta(days=6, hours=23, minutes=59, seconds=59)
+
+    existing_meeting = MeetingModel.query.join(
+        BlockModel, MeetingModel.block_id == BlockModel.id
+    ).filter(
+        MeetingModel.block_id == block_id,
+        MeetingModel.zone_id == zone_id,
+        BlockModel.parent_umbrella_id == block.parent_umbrella_id,
+        MeetingModel.date >= week_start,
+        MeetingModel.date <= week_end
+    ).first()
+
+    if existing_meeting:
+        raise ServiceError({
+            'error': 'A meeting is already scheduled this week.',
+            'block': block_id,
+            'zone': zone_id,
+            'umbrella': block.parent_umbrella_id
+        }, 409)
+
+    meeting = MeetingModel(
+        host_id=host_id,
+        block_id=block_id,
+        zone_id=zone_id,
+        organizer_id=organizer_id,
+        date=meeting_date
+    )
+    db.session.add(meeting)
+    db.session.commit()
+    return marshal(meeting, meeting_fields)
+
+
+def update_meeting(meeting_id, changes):
+    """
+    Apply a partial update to a meeting.
+
+    Raises:
+        ServiceError: If the meeting is missing, the new date is invalid or
+            in the past, or the zone does not belong to the block.
+    """
+    meeting = db.session.get(MeetingModel, meeting_id)
+    if not meeting:
+        raise ServiceError({'error': 'Meeting not found'}, 404)
+
+    changes = dict(changes)
+    if changes.get('date'):
+        try:
+            updated_date = datetime.strptime(changes['date'], MEETING_DATE_FORMAT)
+        except ValueError:
+            raise ServiceError({'error': 'Invalid date format, expected YYYY-MM-DD HH:MM:SS'}, 400)
+        if updated_date < datetime.now():
+            raise ServiceError({'error': 'Meeting date must be in the future'}, 400)
+        changes['date'] = updated_date
+
+    # Validate block and zone relationship if provided
+    if changes.get('block_id') and changes.get('zone_id'):
+        block = db.session.get(BlockModel, changes['block_id'])
+        zone = ZoneModel.query.filter_by(id=changes['zone_id'], parent_block_id=changes['block_id']).first()
+        if not block or not zone:
+            raise ServiceError({'error': 'Zone does not belong to the specified block'}, 400)
+
+    for key, value in changes.items():
+        if value is not None and key in UPDATABLE_FIELDS:
+            setattr(meeting, key, value)
+
+    db.session.commit()
+    return marshal(meeting, meeting_fields)
@@ -0,0 +1,409 @@
+from datetime import datetime, timezone
+from flask_restful import marshal
+from sqlalchemy import func, select, case
+from sqlalchemy.dialects import postgresql, sqlite
+from ..main.models import PaymentModel, UserModel, BlockModel, MeetingModel, member_blocks
+from ..api.serializers import payment_fields, format_datetime
+from ..api.row_serializers import RowSerializer, field_columns
+from ..utils import db
+from ..utils.msisdn_hashed import find_users_by_hashed_msisdns
+from ..utils.phone import to_e164
+from ..utils.logging_config import LazyJson
+from . import ServiceError, ledger
+import logging
+
+logger = logging.getLogger('mpesa')
+
+# Query parameters the payments listing can be filtered by
+PAYMENT_FILTERS = ('meeting_id', 'payer_id', 'block_id', 'mpesa_id')
+
+# Acknowledgements returned to Daraja for each callback
+VALIDATION_ACCEPTED = {"ResultCode": "0", "ResultDesc": "Accepted"}
+VALIDATION_FAILED = {"ResultCode": "1", "ResultDesc": "Internal server error"}
+CONFIRMATION_ACK = {"C2BPaymentConfirmationResult": "Success"}
+STK_CALLBACK_ACK = {"ResultCode": "0", "ResultDesc": "Success"}
+
+# Databases with INSERT ... ON CONFLICT, and how many payments go in one statement
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+UPSERT_CHUNK_SIZE = 500
+
+# ``payment_fields`` values the listing query cannot select, as the model computes them
+PAYMENT_ROWS = RowSerializer(payment_fields, computed={
+    'payment_date': lambda row: format_datetime(row['payment_date']),
+    'customer_name': lambda row: ' '.join(filter(None, [row['first_name'], row['middle_name'], row['last_name']]))
+})
+
+
+def normalize_phone_number(phone_number):
+    """Normalize phone number to remove country code or leading zeroes."""
+    if phone_number.startswith("+"):
+        phone_number = phone_number[1:]  # Remove the '+'
+    if phone_number.startswith("254"):
+        phone_number = phone_number[3:]  # Remove '254'
+    if phone_number.startswith("0"):
+        phone_number = phone_number[1:]  # Remove leading '0'
+    return phone_number
+
+
+def list_payments(**filters):
+    """
+    Return serialized payments, filtered by any of ``meeting_id``,
+    ``payer_id``, ``block_id`` and ``mpesa_id``. Other keys are ignored.
+    """
+    query = (
+        select(
+            *field_columns(PaymentModel, payment_fields),
+            # 'Unknown' without a payer or block, as the fields' getattr defaults give
+            case((UserModel.id.is_(None), 'Unknown'), else_=UserModel.full_name).label('payer_full_name'),
+            case((BlockModel.id.is_(None), 'Unknown'), else_=BlockModel.name).label('block_name')
+        )
+        .outerjoin(UserModel, UserModel.id == PaymentModel.payer_id)
+        .outerjoin(BlockModel, BlockModel.id == PaymentModel.block_id)
+    )
+    for key in PAYMENT_FILTERS:
+        value = filters.get(key)
+        if value:
+            query = query.where(getattr(PaymentModel, key) == value)
+    return PAYMENT_ROWS.many(db.session.execute(query).mappings())
+
+
+def get_payment(payment_id):
+    payment = db.session.get(PaymentModel, payment_id)
+    return marshal(payment, payment_fields) if payment else None
+
+
+def list_payments_by_phone(phone_number, meeting_id=None):
+    """
+    Return a payer's payments summarized with their block and meeting.
+
+    The number may be in any local or international format; it is matched
+    on the indexed E.164 columns of users and payments.
+
+    Raises:
+        ServiceError: If no user or no payment matches the phone number.
+    """
+    phone_e164 = to_e164(phone_number)
+    logger.info(f"Searching for payments by phone number: {phone_e164} and meeting_id: {meeting_id}")
+
+    query = (
+        db.session.query(PaymentModel, UserModel, BlockModel.name)
+        .join(UserModel, UserModel.phone_e164 == PaymentModel.phone_e164)
+        .outerjoin(BlockModel, BlockModel.id == PaymentModel.block_id)
+        .filter(PaymentModel.phone_e164 == phone_e164)
+        .order_by(PaymentModel.id)
+    )
+    if meeting_id:
+        query = query.filter(PaymentModel.meeting_id == meeting_id)
+
+    rows = query.all() if phone_e164 else []
+
+    if not rows:
+        if not phone_e164 or not UserModel.query.filter_by(phone_e164=phone_e164).first():
+            logger.warning(f"No user found for phone number: {phone_number}")
+            raise ServiceError({"message": "User not found for this phone number."}, 404)
+        logger.info(f"No payments found for phone number: {phone_e164} and meeting_id: {meeting_id}")
+        raise ServiceError({"message": "No payments found for this phone number and meeting."}, 404)
+
+    # Associate the payment with the user, block, and meeting
+    payment_data = []
+    for payment, user, block_name in rows:
+        payment_data.append({
+            "mpesa_id": payment.mpesa_id,
+            "amount": payment.amount,
+            "transaction_status": payment.transaction_status,
+            "payer_id": user.id,
+            "payer_full_name": user.full_name,
+            "block_id": payment.block_id,
+            "block_name": block_name or "Unknown",
+            "meeting_id": payment.meeting_id,
+            "payment_date": payment.payment_date.isoformat() if payment.payment_date else None,
+            "status": "Contributed" if payment.transaction_status else "Pending"
+        })
+
+    logger.info(f"Payments retrieved for phone number {phone_e164} and meeting_id {meeting_id}: {len(payment_data)}")
+    return payment_data
+
+
+def create_payment(args):
+    """Record a payment from a mapping of payment fields."""
+    payment = PaymentModel(
+        mpesa_id=args.get('mpesa_id'),
+        account_number=args.get('account_number'),
+        source_phone_number=args.get('source_phone_number'),
+        amount=args.get('amount'),
+        payment_date=args.get('payment_date', datetime.now(timezone.utc)),
+        transaction_status=args.get('transaction_status', False),
+        bank_id=args.get('bank_id'),
+        block_id=args.get('block_id'),
+        payer_id=args.get('payer_id'),
+        meeting_id=args.get('meeting_id'),
+
+        # M-Pesa specific fields
+        transaction_type=args.get('transaction_type'),
+        business_short_code=args.get('business_short_code'),
+        invoice_number=args.get('invoice_number'),
+        org_account_balance=args.get('org_account_balance'),
+        third_party_trans_id=args.get('third_party_trans_id'),
+        first_name=args.get('first_name'),
+        middle_name=args.get('middle_name'),
+        last_name=args.get('last_name')
+    )
+    db.session.add(payment)
+    ledger.refresh_meetings([payment.meeting_id])
+    db.session.commit()
+
+    logger.info(f"Successfully created payment with ID: {payment.id}")
+    return marshal(payment, payment_fields)
+
+
+def update_payment(payment_id, changes):
+    """
+    Apply a partial update to a payment.
+
+    Raises:
+        ServiceError: If the payment does not exist.
+    """
+    payment = db.session.get(PaymentModel, payment_id)
+    if not payment:
+        raise ServiceError({"message": f"Payment with id {payment_id} not found"}, 404)
+
+    old_meeting_id = payment.meeting_id
+    for key, value in changes.items():
+        if value is not None:
+            setattr(payment, key, value)
+
+    ledger.refresh_meetings([old_meeting_id, payment.meeting_id])
+    db.session.commit()
+    logger.info(f"Successfully updated payment with ID: {payment_id}")
+    return marshal(payment, payment_fields)
+
+
+def delete_payment(payment_id):
+    """
+    Delete a payment.
+
+    Raises:
+        ServiceError: If the payment does not exist.
+    """
+    payment = db.session.get(PaymentModel, payment_id)
+    if not payment:
+        raise ServiceError({"message": f"Payment with id {payment_id} not found"}, 404)
+
+    db.session.delete(payment)
+    ledger.refresh_meetings([payment.meeting_id])
+    db.session.commit()
+
+
+def apply_validation(data):
+    """
+    Store a C2B validation request as a pending payment.
+
+    A payment already recorded for the TransID is left untouched, so the
+    request can be applied more than once.
+    """
+    logger.info("Validation request data: %s", LazyJson(data))
+
+    if data.get('TransID') and PaymentModel.query.filter_by(mpesa_id=data.get('TransID')).first():
+        logger.info(f"Payment already recorded for TransID: {data.get('TransID')}")
+        return
+
+    transaction = PaymentModel(
+        mpesa_id=data.get('TransID'),
+        account_number=data.get('BillRefNumber'),
+        source_phone_number=data.get('MSISDN'),
+        amount=float(data.get('TransAmount', 0)),
+        transaction_type=data.get('TransactionType'),
+        business_short_code=data.get('BusinessShortCode'),
+        transaction_status='pending'
+    )
+    db.session.add(transaction)
+    db.session.commit()
+
+    logger.info(f"Stored validation request for TransID: {data.get('TransID')}")
+
+
+def apply_confirmation(data):
+    """Complete, or record, the payment a C2B confirmation is for."""
+    logger.info("Confirmation request data: %s", LazyJson(data))
+    upsert_confirmations([data])
+    logger.info(f"Applied confirmation for TransID: {data.get('TransID')}")
+
+
+def _confirmation_rows(items):
+    """Build payment rows for C2B confirmations, resolving payers, blocks and meetings in bulk."""
+    payers = find_users_by_hashed_msisdns(data.get('MSISDN') for data in items)
+
+    payer_ids = {payer.id for payer in payers.values()}
+    blocks = {}
+    if payer_ids:
+        # A payer's contribution is attributed to their first block
+        for user_id, block_id in (
+            db.session.query(member_blocks.c.user_id, func.min(member_blocks.c.block_id))
+            .filter(member_blocks.c.user_id.in_(payer_ids))
+            .group_by(member_blocks.c.user_id)
+        ):
+            blocks[user_id] = block_id
+
+    bill_refs = {data.get('BillRefNumber') for data in items if data.get('BillRefNumber')}
+    meetings = {}
+    if bill_refs:
+        meetings = dict(
+            db.session.query(MeetingModel.unique_id, MeetingModel.id)
+            .filter(MeetingModel.unique_id.in_(bill_refs))
+        )
+
+    # Later deliveries of the same TransID win
+    rows = {}
+    for data in items:
+        payer = payers.get(data.get('MSISDN'))
+        rows[data.get('TransID')] = {
+            'mpesa_id': data.get('TransID'),
+            'account_number': data.get('BillRefNumber'),
+            'source_phone_number': data.get('MSISDN'),
+            # The MSISDN is usually hashed, so the payer's number is stored instead
+            'phone_e164': payer.phone_e164 if payer else to_e164(data.get('MSISDN')),
+            'amount': float(data.get('TransAmount', 0)),
+            'payment_date': datetime.strptime(
+                data.get('TransTime', ''),
+                '%Y%m%d%H%M%S'
+            ).replace(tzinfo=timezone.utc),
+            'transaction_type': data.get('TransactionType'),
+            'business_short_code': data.get('BusinessShortCode'),
+            'first_name': data.get('FirstName'),
+            'middle_name': data.get('MiddleName'),
+            'last_name': data.get('LastName'),
+            'org_account_balance': data.get('OrgAccountBalance'),
+            'transaction_status': 'completed',
+            'payer_id': payer.id if payer else None,
+            'block_id': blocks.get(payer.id) if payer else None,
+            'meeting_id': meetings.get(data.get('BillRefNumber'))
+        }
+    return list(rows.values())
+
+
+def upsert_confirmations(items, chunk_size=UPSERT_CHUNK_SIZE):
+    """
+    Apply a batch of C2B confirmations in one transaction.
+
+    Each confirmation completes the payment with its TransID, or records a
+    new completed payment, through ``INSERT ... ON CONFLICT (mpesa_id) DO
+    UPDATE`` on PostgreSQL and SQLite. Other databases fall back to a
+    lookup and insert or update per payment. Nothing is applied if any
+    confirmation is invalid. Payments completed for the first time are
+    added to the meeting contribution summary in the same transaction.
+
+    Returns:
+        int: Number of payments written
+    """
+    rows = _confirmation_rows(items)
+    if not rows:
+        return 0
+
+    mpesa_ids = [row['mpesa_id'] for row in rows]
+    already_completed = set(db.session.scalars(
+        select(PaymentModel.mpesa_id)
+        .where(PaymentModel.mpesa_id.in_(mpesa_ids), ledger.counts_as_paid())
+    ))
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in UPSERT_DIALECTS:
+        table = PaymentModel.__table__
+        for start in range(0, len(rows), chunk_size):
+            stmt = UPSERT_DIALECTS[dialect](table).values(rows[start:start + chunk_size])
+            excluded = stmt.excluded
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.mpesa_id],
+                set_={
+                    'transaction_status': excluded.transaction_status,
+                    'payment_date': excluded.payment_date,
+                    'first_name': excluded.first_name,
+                    'middle_name': excluded.middle_name,
+                    'last_name': excluded.last_name,
+                    'org_account_balance': excluded.org_account_balance,
+                    # Keep what validation or an STK push already knew when the payer is unknown
+                    'payer_id': func.coalesce(excluded.payer_id, table.c.payer_id),
+                    'phone_e164': func.coalesce(excluded.phone_e164, table.c.phone_e164),
+                    'block_id': func.coalesce(excluded.block_id, table.c.block_id),
+                    'meeting_id': func.coalesce(table.c.meeting_id, excluded.meeting_id)
+                }
+            ))
+    else:
+        for row in rows:
+            payment = PaymentModel.query.filter_by(mpesa_id=row['mpesa_id']).first()
+            if not payment:
+                db.session.add(PaymentModel(**row))
+                continue
+            for key in ('transaction_status', 'payment_date', 'first_name', 'middle_name',
+                        'last_name', 'org_account_balance'):
+                setattr(payment, key, row[key])
+            payment.payer_id = row['payer_id'] or payment.payer_id
+            payment.phone_e164 = row['phone_e164'] or payment.phone_e164
+            payment.block_id = row['block_id'] or payment.block_id
+            payment.meeting_id = payment.meeting_id or row['meeting_id']
+
+    ledger.add_payments([mpesa_id for mpesa_id in mpesa_ids if mpesa_id not in already_completed])
+    db.session.commit()
+    logger.info(f"Upserted {len(rows)} confirmed payments")
+    return len(rows)
+
+
+def apply_stk_callback(data):
+    """
+    Complete or fail the pending payment an STK push result is for.
+
+    Raises:
+        ServiceError: If no payment matches yet, so the callback is retried
+            rather than marked done while the result is dropped.
+    """
+    logger.info("STK callback data: %s", LazyJson(data))
+
+    callback_data = data.get("Body", {}).get("stkCallback", {})
+    merchant_request_id = callback_data.get("MerchantRequestID")
+    checkout_request_id = callback_data.get("CheckoutRequestID")
+    result_code = callback_data.get("ResultCode")
+    result_desc = callback_data.get("ResultDesc")
+
+    logger.info(f"STK callback result: code={result_code}, desc={result_desc}")
+    logger.info(f"MerchantRequestID: {merchant_request_id}")
+    logger.info(f"CheckoutRequestID: {checkout_request_id}")
+
+    transaction = PaymentModel.query.filter_by(
+        merchant_request_id=merchant_request_id,
+        checkout_request_id=checkout_request_id
+    ).first()
+
+    if not transaction:
+        raise ServiceError({"message": f"No payment found for STK push {checkout_request_id}"}, 404)
+
+    newly_completed = result_code == "0" and not ledger.is_paid(transaction.transaction_status)
+    transaction.transaction_status = 'completed' if result_code == "0" else 'failed'
+    transaction.result_code = result_code
+    transaction.result_desc = result_desc
+
+    if result_code == "0":
+        # Extract payment details on success
+        items = callback_data.get("CallbackMetadata", {}).get("Item", [])
+        for item in items:
+            name = item.get("Name")
+            value = item.get("Value")
+
+            if name == "Amount":
+                transaction.amount = float(value)
+            elif name == "MpesaReceiptNumber":
+                transaction.mpesa_id = value
+            elif name == "TransactionDate":
+                transaction.payment_date = datetime.strptime(
+                    str(value),
+                    '%Y%m%d%H%M%S'
+                ).replace(tzinfo=timezone.utc)
+            elif name == "PhoneNumber":
+                transaction.source_phone_number = value
+
+    if newly_completed:
+        db.session.flush()
+        ledger.add_payments([transaction.mpesa_id])
+    db.session.commit()
+    logger.info(f"Updated STK transaction status: {transaction.transaction_status}")
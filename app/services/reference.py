@@ -0,0 +1,13 @@
+from flask_restful import marshal
+from ..main.models import RoleModel, BankModel
+from ..api.serializers import role_fields, bank_fields
+
+
+def list_roles():
+    """Return every role as serialized by the roles endpoint."""
+    return marshal(RoleModel.query.all(), role_fields)
+
+
+def list_banks():
+    """Return every bank as serialized by the banks endpoint."""
+    return marshal(BankModel.query.all(), bank_fields)
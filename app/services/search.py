@@ -0,0 +1,246 @@
+from sqlalchemy import DDL, event, select, or_, func, text, literal_column, table, column, false
+from ..main.models import UserModel, PaymentModel, BlockModel, ZoneModel
+from ..utils import db
+from ..utils.phone import to_e164
+from .payments import normalize_phone_number
+import logging
+import re
+
+logger = logging.getLogger('mpesa')
+
+DEFAULT_PAGE_SIZE = 20
+
+# Digit queries this long are phone numbers, e.g. 712345678; shorter ones are IDs or amounts
+PHONE_MIN_DIGITS = 9
+
+# Columns covered by the full-text index of each table
+SEARCH_COLUMNS = {
+    'users': ('full_name', 'email', 'acc_number'),
+    'blocks': ('name',),
+    'zones': ('name',)
+}
+
+# The member document; queries repeat the indexed expression so Postgres uses the index
+USERS_DOCUMENT = (
+    "to_tsvector('simple', coalesce(users.full_name, '') || ' ' || "
+    "coalesce(users.email, '') || ' ' || coalesce(users.acc_number, ''))"
+)
+
+POSTGRES_INDEXES = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_users_search ON users USING gin ({USERS_DOCUMENT})",
+    "CREATE INDEX IF NOT EXISTS ix_users_full_name_trgm ON users USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_blocks_name_trgm ON blocks USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_zones_name_trgm ON zones USING gin (name gin_trgm_ops)"
+)
+
+# M-Pesa receipt numbers: ten letters and digits, e.g. RKTQDM7W6S
+RECEIPT_PATTERN = re.compile(r'^(?=.*[A-Z])(?=.*\d)[A-Z0-9]{10}$')
+
+
+def _fts_statements(table_name, columns):
+    """SQLite FTS5 table kept in step with ``table_name`` by triggers"""
+    fts = f'{table_name}_fts'
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{name}' for name in columns)
+    old_values = ', '.join(f'old.{name}' for name in columns)
+    insert_new = f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values});"
+    delete_old = f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table_name}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table_name} BEGIN {delete_old} {insert_new} END"
+    )
+
+
+def _register_index_ddl():
+    """Create the search index with the tables, and drop the SQLite one with them."""
+    models = {'users': UserModel, 'blocks': BlockModel, 'zones': ZoneModel}
+    for table_name, columns in SEARCH_COLUMNS.items():
+        target = models[table_name].__table__
+        for statement in _fts_statements(table_name, columns):
+            event.listen(target, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+        event.listen(target, 'before_drop', DDL(f'DROP TABLE IF EXISTS {table_name}_fts').execute_if(dialect='sqlite'))
+
+    # Postgres indexes are created once every table exists
+    for statement in POSTGRES_INDEXES:
+        event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+_register_index_ddl()
+
+
+def build_index():
+    """
+    Create the search index on an existing database and fill it from the
+    current rows. Safe to run more than once.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for statement in POSTGRES_INDEXES:
+            db.session.execute(text(statement))
+    elif dialect == 'sqlite':
+        for table_name, columns in SEARCH_COLUMNS.items():
+            for statement in _fts_statements(table_name, columns):
+                db.session.execute(text(statement))
+            db.session.execute(text(f"INSERT INTO {table_name}_fts({table_name}_fts) VALUES ('rebuild')"))
+    else:
+        logger.warning(f"No search index for {dialect}; search falls back to table scans")
+    db.session.commit()
+    return dialect
+
+
+def _terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+def _text_match(table_name, model, query, name_column):
+    """
+    Rank ``model`` rows matching every word of ``query`` as a prefix.
+
+    Returns the filter and the ordering, or None when there is nothing
+    indexed to match on.
+    """
+    terms = _terms(query)
+    if not terms:
+        return None
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        pattern = f'%{query}%'
+        if table_name == 'users':
+            document = literal_column(USERS_DOCUMENT)
+            ts_query = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+            return (
+                or_(document.op('@@')(ts_query), name_column.op('%')(query)),
+                func.greatest(func.ts_rank(document, ts_query), func.similarity(name_column, query)).desc()
+            )
+        return name_column.ilike(pattern), func.similarity(name_column, query).desc()
+
+    if dialect == 'sqlite':
+        fts = table(f'{table_name}_fts', column('rowid'), column('rank'))
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matching = select(fts.c.rowid).where(literal_column(f'{table_name}_fts').op('MATCH')(match))
+        rank = (
+            select(fts.c.rank)
+            .where(fts.c.rowid == model.id, literal_column(f'{table_name}_fts').op('MATCH')(match))
+            .scalar_subquery()
+        )
+        return model.id.in_(matching), rank
+
+    return name_column.ilike(f'%{query}%'), name_column
+
+
+def _phone_variants(query):
+    digits = re.sub(r'\D', '', query)
+    if len(digits) < PHONE_MIN_DIGITS:
+        return []
+    local = normalize_phone_number(digits)
+    return [f'0{local}', f'254{local}', f'+254{local}']
+
+
+def _members(query, umbrella_id):
+    in_umbrella = or_(
+        UserModel.umbrella_id == umbrella_id,
+        UserModel.block_memberships.any(BlockModel.parent_umbrella_id == umbrella_id)
+    )
+
+    # Exact ID and phone numbers go straight to their indexed columns
+    compact = query.replace(' ', '')
+    if compact.lstrip('+').isdigit():
+        exact = [UserModel.phone_number.in_(_phone_variants(compact))]
+        if compact.isdigit() and len(compact) <= 9:
+            exact.append(UserModel.id_number == int(compact))
+        found = select(UserModel).where(or_(*exact), in_umbrella)
+        return found, None
+
+    match = _text_match('users', UserModel, query, UserModel.full_name)
+    if match is None:
+        return None, None
+    condition, rank = match
+    return select(UserModel).where(condition, in_umbrella), rank
+
+
+def _payments(query, umbrella_id):
+    in_umbrella = PaymentModel.block_id.in_(
+        select(BlockModel.id).where(BlockModel.parent_umbrella_id == umbrella_id)
+    )
+    value = query.strip().upper()
+    compact = value.replace(' ', '')
+    if RECEIPT_PATTERN.match(value):
+        condition = PaymentModel.mpesa_id == value
+    elif compact.lstrip('+').isdigit() and len(compact.lstrip('+')) >= PHONE_MIN_DIGITS:
+        # The payer's number, in any format, through the phone_e164 index
+        phone = to_e164(compact)
+        condition = PaymentModel.phone_e164 == phone if phone else false()
+    elif value.isdigit():
+        condition = PaymentModel.amount == int(value)
+    else:
+        # Account numbers, or the start of a receipt number, through the mpesa_id index
+        condition = or_(
+            PaymentModel.account_number == query.strip(),
+            PaymentModel.mpesa_id.between(value, value + '\uffff')
+        )
+    return select(PaymentModel).where(condition, in_umbrella), PaymentModel.payment_date.desc()
+
+
+def _blocks(query, umbrella_id):
+    match = _text_match('blocks', BlockModel, query, BlockModel.name)
+    if match is None:
+        return None, None
+    condition, rank = match
+    return select(BlockModel).where(condition, BlockModel.parent_umbrella_id == umbrella_id), rank
+
+
+def _zones(query, umbrella_id):
+    match = _text_match('zones', ZoneModel, query, ZoneModel.name)
+    if match is None:
+        return None, None
+    condition, rank = match
+    in_umbrella = ZoneModel.parent_block_id.in_(
+        select(BlockModel.id).where(BlockModel.parent_umbrella_id == umbrella_id)
+    )
+    return select(ZoneModel).where(condition, in_umbrella), rank
+
+
+SEARCHES = {
+    'members': _members,
+    'payments': _payments,
+    'blocks': _blocks,
+    'zones': _zones
+}
+
+
+def search(search_type, query, umbrella_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Search one category of an umbrella's records, best matches first.
+
+    Members, blocks and zones are matched word by word, each word as a
+    prefix, through the full-text index. ID numbers, phone numbers and
+    M-Pesa receipt numbers are looked up exactly instead.
+
+    Returns:
+        dict: The page's ``items`` as model instances, ``page`` and
+        ``has_next``.
+    """
+    page = max(int(page or 1), 1)
+    result = {'items': [], 'page': page, 'has_next': False}
+    query = (query or '').strip()
+    if search_type not in SEARCHES or not query or not umbrella_id:
+        return result
+
+    statement, rank = SEARCHES[search_type](query, umbrella_id)
+    if statement is None:
+        return result
+
+    model = statement.column_descriptions[0]['entity']
+    if rank is not None:
+        statement = statement.order_by(rank)
+    statement = statement.order_by(model.id).offset((page - 1) * per_page).limit(per_page + 1)
+
+    items = db.session.scalars(statement).all()
+    result['items'] = items[:per_page]
+    result['has_next'] = len(items) > per_page
+    return result
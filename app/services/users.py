@@ -0,0 +1,408 @@
+from flask_restful import marshal
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from ..main.models import (
+    UserModel, RoleModel, BlockModel, ZoneModel, UmbrellaModel, BankModel,
+    roles_users, member_blocks, member_zones
+)
+from ..api.serializers import get_user_fields
+from ..api.row_serializers import RowSerializer, field_columns
+from ..utils import db, save_picture
+from . import ServiceError, ledger
+import logging
+
+logger = logging.getLogger('mpesa')
+
+user_fields = get_user_fields()
+
+# Load everything ``user_fields`` serializes with one query per relationship
+# instead of one per user
+USER_LOAD_OPTIONS = (
+    selectinload(UserModel.roles),
+    selectinload(UserModel.block_memberships),
+    selectinload(UserModel.zone_memberships),
+    selectinload(UserModel.chaired_blocks),
+    selectinload(UserModel.secretary_blocks),
+    selectinload(UserModel.treasurer_blocks),
+    selectinload(UserModel.bank)
+)
+
+# Listings are serialized from column rows: one query for the users, and
+# one per nested list giving ``(user_id, id, name)`` for a set of user ids
+USER_ROWS = RowSerializer(user_fields)
+USER_LISTS = {
+    'roles': lambda user_ids: (
+        select(roles_users.c.user_id, RoleModel.id, RoleModel.name)
+        .join(RoleModel, RoleModel.id == roles_users.c.role_id)
+        .where(roles_users.c.user_id.in_(user_ids))
+    ),
+    'block_memberships': lambda user_ids: (
+        select(member_blocks.c.user_id, BlockModel.id, BlockModel.name)
+        .join(BlockModel, BlockModel.id == member_blocks.c.block_id)
+        .where(member_blocks.c.user_id.in_(user_ids))
+    ),
+    'zone_memberships': lambda user_ids: (
+        select(member_zones.c.user_id, ZoneModel.id, ZoneModel.name)
+        .join(ZoneModel, ZoneModel.id == member_zones.c.zone_id)
+        .where(member_zones.c.user_id.in_(user_ids))
+    ),
+    'chaired_blocks': lambda user_ids: (
+        select(BlockModel.chairman_id, BlockModel.id, BlockModel.name).where(BlockModel.chairman_id.in_(user_ids))
+    ),
+    'secretary_blocks': lambda user_ids: (
+        select(BlockModel.secretary_id, BlockModel.id, BlockModel.name).where(BlockModel.secretary_id.in_(user_ids))
+    ),
+    'treasurer_blocks': lambda user_ids: (
+        select(BlockModel.treasurer_id, BlockModel.id, BlockModel.name).where(BlockModel.treasurer_id.in_(user_ids))
+    )
+}
+
+# Page sizes for ``paginate_users``
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Columns a caller may change through ``update_user``
+UPDATABLE_FIELDS = (
+    'full_name', 'email', 'id_number', 'phone_number', 'bank_id',
+    'acc_number', 'zone_id', 'image_file', 'umbrella_id'
+)
+
+DUPLICATE_MEMBER_MESSAGE = "A member with this ID number, phone number, or account number already exists in this zone."
+
+
+def get_user(user_id):
+    """Return a serialized user by primary key, or None."""
+    user = db.session.get(UserModel, user_id, options=USER_LOAD_OPTIONS)
+    return marshal(user, user_fields) if user else None
+
+
+def get_user_by_id_number(id_number):
+    """Return a serialized user by national ID number, or None."""
+    user = UserModel.query.options(*USER_LOAD_OPTIONS).filter_by(id_number=id_number).first()
+    return marshal(user, user_fields) if user else None
+
+
+def _filter_users(role=None, umbrella_id=None, zone_id=None):
+    """Build the user query for a role and, within a role, a zone or umbrella."""
+    query = UserModel.query
+
+    # Fetch users by role and zone_id
+    if role and zone_id:
+        query = (
+            query
+            .join(UserModel.roles)
+            .filter(RoleModel.name == role, UserModel.zone_id == zone_id)
+        )
+
+    # Fetch users by role and umbrella_id
+    elif role and umbrella_id:
+        query = (
+            query
+            .join(UserModel.roles)
+            .join(UserModel.block_memberships)
+            .filter(RoleModel.name == role)
+            .filter(BlockModel.parent_umbrella_id == umbrella_id)
+        )
+
+    # Fetch users by role only
+    elif role:
+        query = query.join(UserModel.roles).filter(RoleModel.name == role)
+
+    return query
+
+
+def _serialize_users(condition, limit=None):
+    """
+    Serialize the users matching ``condition``, ordered by id, as
+    ``marshal(users, user_fields)`` would, without loading any models.
+    """
+    query = (
+        select(*field_columns(UserModel, user_fields), BankModel.name.label('bank_name'))
+        .outerjoin(BankModel, BankModel.id == UserModel.bank_id)
+        .where(condition)
+        .order_by(UserModel.id)
+        .limit(limit)
+    )
+    rows = {row['id']: dict(row) for row in db.session.execute(query).mappings()}
+    if not rows:
+        return []
+
+    for key in USER_LISTS:
+        for row in rows.values():
+            row[key] = []
+    # Short pages pass their ids; whole listings repeat the filter instead
+    user_ids = list(rows) if limit else select(UserModel.id).where(condition)
+    for key, related in USER_LISTS.items():
+        for user_id, item_id, name in db.session.execute(related(user_ids)):
+            rows[user_id][key].append({'id': item_id, 'name': name})
+    return USER_ROWS.many(rows.values())
+
+
+def list_users(role=None, umbrella_id=None, zone_id=None):
+    """
+    Return serialized users filtered by role and, within a role, by zone
+    or umbrella. Without a role every user is returned.
+    """
+    matching_ids = _filter_users(role, umbrella_id, zone_id).with_entities(UserModel.id).subquery()
+    return _serialize_users(UserModel.id.in_(select(matching_ids.c.id)))
+
+
+def paginate_users(role=None, umbrella_id=None, zone_id=None, per_page=DEFAULT_PAGE_SIZE, cursor=None, page=None):
+    """
+    Return one page of the users ``list_users`` would return, ordered by id.
+
+    Pages are keyed on the last id seen: pass a page's ``next_cursor`` as
+    ``cursor`` to get the one after it. ``page`` skips straight to a page
+    number instead, for numbered links.
+
+    Returns:
+        dict: ``items``, the ``total`` number of matching users and
+        ``next_cursor``, which is None on the last page.
+    """
+    per_page = max(1, min(int(per_page or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    matching_ids = _filter_users(role, umbrella_id, zone_id).with_entities(UserModel.id).distinct().subquery()
+    total = db.session.scalar(select(func.count()).select_from(matching_ids))
+
+    query = select(matching_ids.c.id).order_by(matching_ids.c.id)
+    if cursor:
+        query = query.where(matching_ids.c.id > int(cursor))
+    elif page and int(page) > 1:
+        query = query.offset((int(page) - 1) * per_page)
+
+    # One extra row tells whether another page follows
+    page_ids = db.session.scalars(query.limit(per_page + 1)).all()
+    next_cursor = str(page_ids[per_page - 1]) if len(page_ids) > per_page else None
+    page_ids = page_ids[:per_page]
+    return {
+        'items': _serialize_users(UserModel.id.in_(page_ids), limit=per_page) if page_ids else [],
+        'total': total,
+        'next_cursor': next_cursor
+    }
+
+
+def member_choices(umbrella_id):
+    """Return ``(id, full_name)`` for each member of an umbrella, for form dropdowns."""
+    rows = (
+        _filter_users('Member', umbrella_id)
+        .with_entities(UserModel.id, UserModel.full_name)
+        .distinct()
+        .order_by(UserModel.id)
+        .all()
+    )
+    return [(user_id, full_name) for user_id, full_name in rows]
+
+
+def create_member(full_name, id_number, phone_number, zone_id, bank_id, acc_number, umbrella_id, role_id=None):
+    """
+    Register a member in a zone, adding the block and zone memberships.
+
+    Raises:
+        ServiceError: If the umbrella, zone or block is missing or the member
+            duplicates an existing one in the zone.
+    """
+    umbrella = db.session.get(UmbrellaModel, umbrella_id) if umbrella_id is not None else None
+    if not umbrella:
+        raise ServiceError({"message": "Umbrella does not exist."}, 400)
+
+    zone = db.session.get(ZoneModel, zone_id) if zone_id is not None else None
+    if not zone:
+        raise ServiceError({"message": "Zone does not exist."}, 400)
+
+    # Validate block (parent of the zone)
+    block = db.session.get(BlockModel, zone.parent_block_id)
+    if not block:
+        raise ServiceError({"message": "Block associated with the zone does not exist."}, 400)
+
+    existing_user = UserModel.query.filter(
+        (UserModel.id_number == id_number) |
+        (UserModel.phone_number == phone_number) |
+        (UserModel.acc_number == acc_number),
+        UserModel.zone_id == zone_id,
+        UserModel.umbrella_id == umbrella_id
+    ).first()
+    if existing_user:
+        raise ServiceError({"message": DUPLICATE_MEMBER_MESSAGE}, 400)
+
+    try:
+        new_user = UserModel(
+            full_name=full_name,
+            id_number=id_number,
+            phone_number=phone_number,
+            zone_id=zone_id,
+            bank_id=bank_id,
+            acc_number=acc_number,
+            umbrella_id=umbrella_id
+        )
+        db.session.add(new_user)
+        db.session.flush()  # Flush to assign an ID to the user
+
+        if role_id is not None:
+            role = db.session.get(RoleModel, role_id)
+            if role:
+                new_user.roles.append(role)
+
+        db.session.execute(member_blocks.insert().values(user_id=new_user.id, block_id=block.id))
+        db.session.execute(member_zones.insert().values(user_id=new_user.id, zone_id=zone.id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise ServiceError({"message": DUPLICATE_MEMBER_MESSAGE}, 400)
+
+    return marshal(new_user, user_fields)
+
+
+def update_user(user_id, changes, image_file=None, approver=None):
+    """
+    Apply a partial update to a user.
+
+    ``changes`` holds plain field updates plus the optional control keys
+    ``is_approved``, ``block_id`` (adds a block membership or, with a
+    committee role, the block that role is held in), ``role_id`` and
+    ``action`` (``'add'`` or ``'remove'`` a role). ``image_file`` is an
+    uploaded picture to store as the user's avatar.
+
+    Raises:
+        ServiceError: If the user is missing, a committee role conflicts,
+            or nothing was changed.
+    """
+    user = db.session.get(UserModel, user_id)
+    if not user:
+        raise ServiceError({"message": "User not found"}, 404)
+    updated = False
+    old_zone_id = user.zone_id
+
+    # Handle approval
+    is_approved = changes.get('is_approved')
+    if is_approved is not None:
+        if is_approved and not user.is_approved:
+            user.approve(approver)
+            updated = True
+        elif not is_approved and user.is_approved:
+            user.unapprove()
+            updated = True
+
+    # Any provided value counts as an update; only real columns are written
+    for key, value in changes.items():
+        if value is not None and key not in ('is_approved', 'approval_date', 'approved_by_id', 'block_id'):
+            if key in UPDATABLE_FIELDS:
+                setattr(user, key, value)
+            updated = True
+
+    if image_file:
+        user.image_file = save_picture(image_file)
+        updated = True
+
+    # Check if block_id is provided to update block memberships
+    block_id = changes.get('block_id')
+    if block_id is not None:
+        block = db.session.get(BlockModel, block_id)
+        if block:
+            if block not in user.block_memberships:
+                user.block_memberships.append(block)
+                logger.info(f"Added block {block.id} to user's block memberships.")
+                updated = True
+            else:
+                logger.info(f"User {user.id} is already a member of block {block.id}.")
+        else:
+            logger.warning(f"Block {block_id} not found.")
+
+    # Check if zone_id is provided to update zone memberships
+    zone_id = changes.get('zone_id')
+    if zone_id is not None:
+        zone = db.session.get(ZoneModel, zone_id)
+        if zone:
+            if zone not in user.zone_memberships:
+                user.zone_memberships.append(zone)
+                logger.info(f"Added zone {zone.id} to user's zone memberships.")
+                updated = True
+            else:
+                logger.info(f"User {user.id} is already a member of zone {zone.id}.")
+        else:
+            logger.warning(f"Zone {zone_id} not found.")
+
+    role_id = changes.get('role_id')
+    action = changes.get('action')
+
+    if role_id is not None:
+        role = db.session.get(RoleModel, role_id)
+
+        if role:
+            # Ensure Chairman, Secretary, and Treasurer are mutually exclusive
+            if role_id == 3 and any(r.id in [4, 6] for r in user.roles):
+                raise ServiceError({"message": "Cannot assign Chairman when the user is already a Secretary or Treasurer."}, 400)
+
+            elif role_id == 4 and any(r.id in [3, 6] for r in user.roles):
+                raise ServiceError({"message": "Cannot assign Secretary when the user is already a Chairman or Treasurer."}, 400)
+
+            elif role_id == 6 and any(r.id in [3, 4] for r in user.roles):
+                raise ServiceError({"message": "Cannot assign Treasurer when the user is already a Chairman or Secretary."}, 400)
+
+            # Handle Role Removal
+            if action == 'remove':
+                if role in user.roles:
+                    # Retrieve the block_id associated with the user's role
+                    role_assignment = db.session.query(roles_users).filter_by(user_id=user.id, role_id=role_id).first()
+                    if role_assignment:
+                        block_id = role_assignment.block_id
+
+                        user.roles.remove(role)
+                        updated = True
+
+                        # Remove the block from the corresponding block list
+                        if block_id:
+                            if role_id == 3:  # Chairman
+                                user.chaired_blocks = [b for b in user.chaired_blocks if b.id != block_id]
+                            elif role_id == 4:  # Secretary
+                                user.secretary_blocks = [b for b in user.secretary_blocks if b.id != block_id]
+                            elif role_id == 6:  # Treasurer
+                                user.treasurer_blocks = [b for b in user.treasurer_blocks if b.id != block_id]
+                else:
+                    raise ServiceError({"message": "User does not have this role"}, 400)
+
+            # Handle Role Addition
+            elif action == 'add':
+                if role in user.roles:
+                    raise ServiceError({"message": f"User already has the role '{role.name}'."}, 400)
+                user.roles.append(role)
+                updated = True
+
+            # Update Blocks Based on Role
+            block_id = changes.get('block_id')
+            if block_id is not None:
+                block = db.session.get(BlockModel, block_id)
+                if block:
+                    if role_id == 3:  # Chairman
+                        if block not in user.chaired_blocks:
+                            user.chaired_blocks.append(block)
+
+                    elif role_id == 4:  # Secretary
+                        if block not in user.secretary_blocks:
+                            user.secretary_blocks.append(block)
+
+                    elif role_id == 5:  # Treasurer
+                        if block not in user.treasurer_blocks:
+                            user.treasurer_blocks.append(block)
+
+    if not updated:
+        raise ServiceError({"message": "No updates made to user."}, 400)
+
+    if user.zone_id != old_zone_id:
+        # The summary groups a member's payments by their current zone
+        ledger.refresh_member(user.id)
+    db.session.commit()
+    return marshal(user, user_fields)
+
+
+def delete_user(user_id):
+    """
+    Delete a user.
+
+    Raises:
+        ServiceError: If the user does not exist.
+    """
+    user = db.session.get(UserModel, user_id)
+    if not user:
+        raise ServiceError({"message": "User not found"}, 404)
+    db.session.delete(user)
+    db.session.commit()
@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+from sqlalchemy import event, inspect, select, update, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from ..main.models import TableVersionModel
+from ..utils import db
+
+# Tables the API serves; writes to any other table are not counted
+VERSIONED_TABLES = frozenset([
+    'users', 'roles', 'roles_users', 'member_blocks', 'member_zones', 'banks', 'umbrellas',
+    'blocks', 'zones', 'meetings', 'payments', 'communications'
+])
+
+# Databases with INSERT ... ON CONFLICT
+VERSION_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+CHANGED_TABLES = 'changed_tables'
+
+
+def _now():
+    # HTTP dates have whole seconds
+    return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+
+
+def table_versions(tables):
+    """
+    Return ``{table_name: (version, updated_at)}`` for ``tables``.
+
+    Tables never written since versions were first kept are ``(0, None)``.
+    """
+    versions = {table: (0, None) for table in tables}
+    rows = db.session.execute(
+        select(TableVersionModel.table_name, TableVersionModel.version, TableVersionModel.updated_at)
+        .where(TableVersionModel.table_name.in_(list(tables)))
+    ).all()
+    for table, version, updated_at in rows:
+        versions[table] = (version, updated_at)
+    return versions
+
+
+def bump(tables, connection=None):
+    """Count a write to each of ``tables``, in its own transaction unless ``connection`` is given."""
+    tables = sorted(set(tables) & VERSIONED_TABLES)
+    if not tables:
+        return
+    if connection is None:
+        with db.engine.begin() as connection:
+            return bump(tables, connection)
+
+    now = _now()
+    table = TableVersionModel.__table__
+    dialect = connection.dialect.name
+    if dialect in VERSION_DIALECTS:
+        stmt = VERSION_DIALECTS[dialect](table).values(
+            [{'table_name': name, 'version': 1, 'updated_at': now} for name in tables]
+        )
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.table_name],
+            set_={'version': table.c.version + 1, 'updated_at': stmt.excluded.updated_at}
+        ))
+        return
+
+    for name in tables:
+        result = connection.execute(
+            update(table).where(table.c.table_name == name).values(version=table.c.version + 1, updated_at=now)
+        )
+        if not result.rowcount:
+            connection.execute(insert(table).values(table_name=name, version=1, updated_at=now))
+
+
+def _changed(session):
+    return session.info.setdefault(CHANGED_TABLES, set())
+
+
+def _association_tables(instance):
+    """Association tables written through ``instance``'s many-to-many collections"""
+    state = inspect(instance)
+    for relationship in state.mapper.relationships:
+        if relationship.secondary is not None and state.attrs[relationship.key].history.has_changes():
+            yield relationship.secondary.name
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_tables(session, flush_context):
+    # new, dirty and deleted still hold what was just flushed
+    changed = _changed(session)
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(instance, '__table__', None)
+        if table is None:
+            continue
+        if instance not in session.dirty or session.is_modified(instance):
+            changed.add(table.name)
+        changed.update(_association_tables(instance))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_bulk_tables(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and getattr(table, 'name', None):
+            _changed(orm_execute_state.session).add(table.name)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_committed_tables(session):
+    # Flush first so the tables of the last pending changes are counted too
+    session.flush()
+    changed = session.info.pop(CHANGED_TABLES, None)
+    if not changed or not changed & VERSIONED_TABLES:
+        return
+    # Bumped in the committing transaction, so the writes and their versions
+    # are committed together or not at all
+    bump(changed, session.connection())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_tables(session):
+    session.info.pop(CHANGED_TABLES, None)
@@ -1,7 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_mailman import Mail
 import secrets
-from PIL import Image
 from flask import current_app
 import logging
 import os
@@ -50,6 +49,8 @@ def save_picture(form_picture):
 
         # Resize the image and save it
         output_size = (125, 125)
+        # Pillow is only needed here, so it is not imported with the app
+        from PIL import Image
         i = Image.open(form_picture)
         i.thumbnail(output_size)
         i.save(picture_path)
@@ -0,0 +1,91 @@
+import os
+import logging
+from flask_security.utils import hash_password
+from . import db
+from .initial_banks import import_banks
+
+logger = logging.getLogger(__name__)
+
+# Roles every deployment needs
+ROLES = (
+    ('SuperUser', 'System Administrator'),
+    ('Administrator', 'Account Owner and Umbrella creator'),
+    ('Chairman', 'Block chairman'),
+    ('Secretary', 'Block secretary'),
+    ('Member', 'Regular member'),
+    ('Treasurer', 'Block Treasurer')
+)
+
+BANKS_FILE = 'banks.json'
+
+
+def get_superusers_from_env():
+    """Superusers configured as SUPERUSER_1_EMAIL, SUPERUSER_1_PASSWORD, ... SUPERUSER_n_*"""
+    superusers = []
+    i = 1
+    while True:
+        email = os.getenv(f'SUPERUSER_{i}_EMAIL')
+        if not email:
+            break
+
+        superusers.append({
+            'email': email,
+            'password': os.getenv(f'SUPERUSER_{i}_PASSWORD'),
+            'id_number': int(os.getenv(f'SUPERUSER_{i}_ID')),
+            'full_name': os.getenv(f'SUPERUSER_{i}_NAME'),
+            'phone_number': os.getenv(f'SUPERUSER_{i}_PHONE')
+        })
+        i += 1
+    return superusers
+
+
+def bootstrap(banks_file=BANKS_FILE):
+    """
+    Create the schema, the roles, the superusers from the environment and,
+    on an empty database, the banks in ``banks_file``; build the meeting
+    contribution summary if it is empty. Safe to run more than once; this
+    used to run inside ``create_app`` on every boot.
+
+    Returns:
+        dict: Number of ``roles``, ``superusers`` and ``banks`` created
+    """
+    # Imported here so the models load only when bootstrapping
+    from app.main.models import BankModel, user_datastore
+
+    db.create_all()
+    counts = {'roles': 0, 'superusers': 0, 'banks': 0}
+
+    for role_name, description in ROLES:
+        if not user_datastore.find_role(role_name):
+            user_datastore.create_role(name=role_name, description=description)
+            counts['roles'] += 1
+    db.session.commit()
+
+    for user_data in get_superusers_from_env():
+        if not user_datastore.find_user(email=user_data['email']):
+            user_datastore.create_user(
+                email=user_data['email'],
+                password=hash_password(user_data['password']),
+                id_number=user_data['id_number'],
+                full_name=user_data['full_name'],
+                phone_number=user_data['phone_number'],
+                roles=[user_datastore.find_role('SuperUser')],
+                is_approved=True
+            )
+            counts['superusers'] += 1
+            logger.info(f"Created superuser: {user_data['email']}")
+    db.session.commit()
+
+    if BankModel.query.first() is None:
+        success, message, count = import_banks(banks_file)
+        if success:
+            counts['banks'] = count
+            logger.info(f"Initial banks import: {message}")
+        else:
+            logger.error(f"Failed to import initial banks: {message}")
+
+    # Sum the payments of a database that predates the contribution summary
+    from app.services import ledger
+    if ledger.is_empty():
+        ledger.rebuild_summary()
+    return counts
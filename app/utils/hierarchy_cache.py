@@ -0,0 +1,131 @@
+import os
+import time
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Optional
+from cachelib import BaseCache, FileSystemCache
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Used when the cache is created outside an application context
+DEFAULT_SETTINGS = {
+    'HIERARCHY_CACHE': 'memory',
+    'HIERARCHY_CACHE_TTL': 300,
+    'HIERARCHY_CACHE_SIZE': 256
+}
+
+_cache = None
+_lock = threading.Lock()
+
+
+class LRUCache(BaseCache):
+    """
+    Cache shared by the threads of a single process.
+
+    Entries expire ``default_timeout`` seconds after they are set, and the
+    least recently used entry is evicted once ``threshold`` are held.
+    """
+
+    def __init__(self, threshold: int = 256, default_timeout: int = 300):
+        super().__init__(default_timeout)
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._mutex = threading.Lock()
+
+    def get(self, key):
+        with self._mutex:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        expires_at = time.time() + timeout if timeout else 0
+        with self._mutex:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.threshold:
+                self._entries.popitem(last=False)
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._mutex:
+            return self._entries.pop(key, None) is not None
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._mutex:
+            self._entries.clear()
+        return True
+
+
+def create_hierarchy_cache(url: Optional[str] = None, ttl: int = 300, size: int = 256) -> BaseCache:
+    """
+    Build a cache from the ``HIERARCHY_CACHE`` setting.
+
+    Args:
+        url (str): ``memory``, ``file`` or a ``redis://`` URL
+        ttl (int): Seconds an entry is kept
+        size (int): Entries kept before the oldest are evicted
+    """
+    url = url or 'memory'
+    if url == 'memory':
+        return LRUCache(threshold=size, default_timeout=ttl)
+    if url == 'file':
+        return FileSystemCache(os.path.join(tempfile.gettempdir(), 'tabpay_hierarchy_cache'),
+                               threshold=size, default_timeout=ttl)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+            from cachelib import RedisCache
+        except ImportError:
+            raise ImportError("The redis package is required for a redis:// HIERARCHY_CACHE")
+        return RedisCache(host=redis.Redis.from_url(url), default_timeout=ttl, key_prefix='tabpay:')
+    raise ValueError(f"Unsupported hierarchy cache: {url}")
+
+
+def _settings():
+    settings = dict(DEFAULT_SETTINGS)
+    if has_app_context():
+        for key in settings:
+            settings[key] = current_app.config.get(key, settings[key])
+    return settings
+
+
+def get_hierarchy_cache() -> BaseCache:
+    """Get the process-wide cache of umbrella, block and zone trees"""
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                settings = _settings()
+                _cache = create_hierarchy_cache(
+                    settings['HIERARCHY_CACHE'],
+                    ttl=settings['HIERARCHY_CACHE_TTL'],
+                    size=settings['HIERARCHY_CACHE_SIZE']
+                )
+                logger.info(f"Created {settings['HIERARCHY_CACHE']} hierarchy cache")
+    return _cache
+
+
+def reset_hierarchy_cache():
+    """Drop the cache so the next call builds a fresh one"""
+    global _cache
+    with _lock:
+        _cache = None
@@ -0,0 +1,127 @@
+import threading
+import logging
+import requests
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Used when the session is created outside an application context
+DEFAULT_SETTINGS = {
+    'HTTP_POOL_CONNECTIONS': 10,
+    'HTTP_POOL_MAXSIZE': 20,
+    'HTTP_TIMEOUT': 30,
+    'HTTP_MAX_RETRIES': 3,
+    'HTTP_RETRY_BACKOFF': 0.5
+}
+
+# Only idempotent requests are retried; an STK push or payment POST must
+# never be sent twice because the first response was lost.
+RETRY_METHODS = frozenset(['HEAD', 'GET', 'OPTIONS'])
+RETRY_STATUSES = (502, 503, 504)
+
+_session = None
+_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout to every request"""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        url = request.url.split('?', 1)[0]
+        with span(f'HTTP {request.method}', 'client', {'http.method': request.method, 'http.url': url}) as current:
+            response = super().send(request, **kwargs)
+            if current is not None:
+                current['attributes']['http.status_code'] = response.status_code
+            return response
+
+
+def _settings():
+    settings = dict(DEFAULT_SETTINGS)
+    if has_app_context():
+        for key in settings:
+            settings[key] = current_app.config.get(key, settings[key])
+    return settings
+
+
+def create_http_session(settings=None) -> requests.Session:
+    """Build a session with per-host keep-alive pools and a retry policy"""
+    settings = settings or _settings()
+    retry = Retry(
+        total=settings['HTTP_MAX_RETRIES'],
+        backoff_factor=settings['HTTP_RETRY_BACKOFF'],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=settings['HTTP_POOL_CONNECTIONS'],
+        pool_maxsize=settings['HTTP_POOL_MAXSIZE'],
+        max_retries=retry,
+        timeout=settings['HTTP_TIMEOUT']
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    """
+    Get the process-wide HTTP session used for all outbound calls.
+
+    The session is created on first use so that each worker process
+    forked by the WSGI server opens its own connections.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = create_http_session()
+                logger.info("Created pooled HTTP session")
+    return _session
+
+
+def reset_http_session():
+    """Close the shared session so the next call builds a fresh one"""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def pool_stats():
+    """
+    Report connection reuse for each host the session has talked to.
+
+    ``misses`` counts new connections opened and ``hits`` counts requests
+    served over an already open keep-alive connection.
+    """
+    stats = {}
+    if _session is None:
+        return stats
+
+    for adapter in set(_session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f'{pool.scheme}://{pool.host}:{pool.port}'
+            misses = pool.num_connections
+            requests_made = pool.num_requests
+            stats[host] = {
+                'requests': requests_made,
+                'hits': max(requests_made - misses, 0),
+                'misses': misses
+            }
+    return stats
@@ -1,55 +1,194 @@
+import atexit
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-
-def setup_logger():
-    """Configure logging for the application"""
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    # Configure root logger
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+LOG_DIR = 'logs'
+MAX_BYTES = 10485760  # 10MB
+BACKUP_COUNT = 10
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any ``extra`` fields alongside the message"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LazyJson:
+    """
+    A payload rendered as indented JSON only if its record is written.
+
+        logger.info("Callback data: %s", LazyJson(data))
+
+    The payload must not be changed after logging, as it is rendered later
+    on the logging thread.
+    """
+    __slots__ = ('payload',)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __str__(self):
+        try:
+            return json.dumps(self.payload, indent=2, default=str)
+        except (TypeError, ValueError):
+            return repr(self.payload)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of the records below WARNING from chosen loggers.
+
+    ``rates`` maps a logger name to the fraction kept, which also applies
+    to its children, e.g. ``{'mpesa': 0.1}`` keeps one INFO record in ten.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._seen = {}
+        self._mutex = threading.Lock()
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return name, self.rates[name]
+            name = name.rpartition('.')[0]
+        return None, 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        name, rate = self._rate(record.name)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        with self._mutex:
+            seen = self._seen.get(name, 0) + 1
+            self._seen[name] = seen
+        # Keep a record whenever the running count crosses a whole number
+        return int(seen * rate) != int((seen - 1) * rate)
+
+
+class LoggerFilter(logging.Filter):
+    """Pass only the records of one logger and its children"""
+
+    def filter(self, record):
+        return record.name == self.name or record.name.startswith(self.name + '.')
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue records without formatting them.
+
+    The stock handler renders each message before queueing it, on the
+    request thread. The queue here stays in-process, so records are
+    passed as they are and rendered by the listener's handlers.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def parse_sample_rates(value):
+    """Read ``mpesa=0.1,app.services=0.5`` into ``{'mpesa': 0.1, 'app.services': 0.5}``"""
+    rates = {}
+    for item in (value or '').split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+def setup_logger(level=logging.INFO, json_logs=True, sample_rates=None, log_dir=None):
+    """
+    Send the root logger's records through a queue to a background thread
+    that writes ``app.log`` and ``mpesa.log`` under ``log_dir`` (``logs``
+    by default) and the console, so request threads never wait on disk.
+
+    Safe to call more than once: the pipeline is set up once per process.
+    """
+    global _listener
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    console_formatter = logging.Formatter(
-        '%(levelname)s: %(message)s'
-    )
-    
-    # File handler for all logs
-    file_handler = RotatingFileHandler(
-        'logs/app.log',
-        maxBytes=10485760,  # 10MB
-        backupCount=10
-    )
-    file_handler.setFormatter(file_formatter)
-    file_handler.setLevel(logging.INFO)
-    
-    # Specific handler for M-PESA logs
-    mpesa_handler = RotatingFileHandler(
-        'logs/mpesa.log',
-        maxBytes=10485760,  # 10MB
-        backupCount=10
-    )
-    mpesa_handler.setFormatter(file_formatter)
-    mpesa_handler.setLevel(logging.INFO)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(console_formatter)
-    console_handler.setLevel(logging.INFO)
-    
-    # Add handlers to root logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    # Configure M-PESA specific logger
-    mpesa_logger = logging.getLogger('mpesa')
-    mpesa_logger.setLevel(logging.INFO)
-    mpesa_logger.addHandler(mpesa_handler)
-    
+    with _lock:
+        if _listener is not None:
+            return logger
+
+        log_dir = log_dir or LOG_DIR
+        os.makedirs(log_dir, exist_ok=True)
+        file_formatter = JsonFormatter() if json_logs else logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
+        # File handler for all logs
+        file_handler = RotatingFileHandler(os.path.join(log_dir, 'app.log'), maxBytes=MAX_BYTES,
+                                           backupCount=BACKUP_COUNT)
+        file_handler.setFormatter(file_formatter)
+        file_handler.setLevel(level)
+
+        # Specific handler for M-PESA logs
+        mpesa_handler = RotatingFileHandler(os.path.join(log_dir, 'mpesa.log'), maxBytes=MAX_BYTES,
+                                            backupCount=BACKUP_COUNT)
+        mpesa_handler.setFormatter(file_formatter)
+        mpesa_handler.setLevel(level)
+        mpesa_handler.addFilter(LoggerFilter('mpesa'))
+
+        # Console handler
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        console_handler.setLevel(level)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = LazyQueueHandler(log_queue)
+        if sample_rates:
+            queue_handler.addFilter(SamplingFilter(sample_rates))
+
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logging.getLogger('mpesa').setLevel(level)
+
+        _listener = QueueListener(log_queue, file_handler, mpesa_handler, console_handler,
+                                  respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
     return logger
+
+
+def stop_logging():
+    """Write out queued records, then remove the pipeline so it can be set up again"""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, LazyQueueHandler):
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,207 @@
+import gc
+import os
+import time
+import threading
+import logging
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# Used when the monitor is created outside an application context
+DEFAULT_SETTINGS = {
+    'MEMORY_SAMPLE_EVERY': 500,
+    'MEMORY_SAMPLE_INTERVAL': 60,
+    'MEMORY_GC_THRESHOLD_MB': 0,
+    'MEMORY_GC_COOLDOWN': 300
+}
+
+_monitor = None
+_lock = threading.Lock()
+
+
+class MemoryMonitor:
+    """
+    Sample the process's memory and garbage collector instead of measuring
+    them on every request.
+
+    A sample is taken every ``sample_every`` requests and every ``interval``
+    seconds from a daemon thread. A full collection is forced only when a
+    sample finds the RSS above ``gc_threshold_mb``, at most once per
+    ``gc_cooldown`` seconds. Time spent in collections is measured through
+    ``gc.callbacks``.
+    """
+
+    def __init__(self, sample_every: int = 500, interval: float = 60, gc_threshold_mb: float = 0,
+                 gc_cooldown: float = 300):
+        self.sample_every = sample_every
+        self.interval = interval
+        self.gc_threshold_mb = gc_threshold_mb
+        self.gc_cooldown = gc_cooldown
+
+        self.requests = 0
+        self.samples = 0
+        self.forced_collections = 0
+        self.last_forced_at = None
+        self.latest = None
+        self.peak_rss_mb = 0.0
+        self.gc_pause_seconds = 0.0
+        self.gc_max_pause_seconds = 0.0
+
+        # Imported here so loading the app does not load psutil
+        import psutil
+        self._process = psutil.Process(os.getpid())
+        self._mutex = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._gc_started = None
+        gc.callbacks.append(self._time_collection)
+
+    def _time_collection(self, phase, info):
+        if phase == 'start':
+            self._gc_started = time.perf_counter()
+        elif self._gc_started is not None:
+            pause = time.perf_counter() - self._gc_started
+            self._gc_started = None
+            self.gc_pause_seconds += pause
+            self.gc_max_pause_seconds = max(self.gc_max_pause_seconds, pause)
+
+    def record_request(self):
+        """Count a request, sampling on every ``sample_every``-th"""
+        self.requests += 1
+        if self.sample_every and self.requests % self.sample_every == 0:
+            self.sample()
+
+    def _rss_mb(self):
+        return self._process.memory_info().rss / 1024 / 1024
+
+    def sample(self) -> dict:
+        """Measure the RSS and collector state, collecting first when over the threshold"""
+        with self._mutex:
+            rss_mb = self._rss_mb()
+            collected = None
+            now = time.monotonic()
+            if (self.gc_threshold_mb and rss_mb > self.gc_threshold_mb
+                    and (self.last_forced_at is None or now - self.last_forced_at >= self.gc_cooldown)):
+                collected = gc.collect()
+                self.forced_collections += 1
+                self.last_forced_at = now
+                logger.warning(f"RSS {rss_mb:.1f} MB over {self.gc_threshold_mb} MB, "
+                               f"collected {collected} objects")
+                rss_mb = self._rss_mb()
+
+            self.samples += 1
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+            self.latest = {
+                'rss_mb': round(rss_mb, 2),
+                'gc_pending': list(gc.get_count()),
+                'gc_collections': [stats['collections'] for stats in gc.get_stats()],
+                'gc_collected': [stats['collected'] for stats in gc.get_stats()],
+                'gc_uncollectable': [stats['uncollectable'] for stats in gc.get_stats()],
+                'forced_collected': collected,
+                'sampled_at': time.time()
+            }
+            logger.info(f"Memory usage: {rss_mb:.2f} MB")
+            return self.latest
+
+    def metrics(self) -> dict:
+        """The latest sample with the totals since the monitor started"""
+        return {
+            'pid': self._process.pid,
+            'requests': self.requests,
+            'samples': self.samples,
+            'peak_rss_mb': round(self.peak_rss_mb, 2),
+            'forced_collections': self.forced_collections,
+            'gc_pause_seconds': round(self.gc_pause_seconds, 6),
+            'gc_max_pause_seconds': round(self.gc_max_pause_seconds, 6),
+            'latest': self.latest
+        }
+
+    def prometheus(self) -> str:
+        """``metrics()`` in the Prometheus text format"""
+        metrics = self.metrics()
+        latest = metrics['latest'] or self.sample()
+        lines = [
+            f'tabpay_memory_rss_bytes {int(latest["rss_mb"] * 1024 * 1024)}',
+            f'tabpay_memory_peak_rss_bytes {int(metrics["peak_rss_mb"] * 1024 * 1024)}',
+            f'tabpay_memory_samples_total {metrics["samples"]}',
+            f'tabpay_memory_forced_collections_total {metrics["forced_collections"]}',
+            f'tabpay_gc_pause_seconds_total {metrics["gc_pause_seconds"]}',
+            f'tabpay_gc_max_pause_seconds {metrics["gc_max_pause_seconds"]}'
+        ]
+        for generation, (pending, collections, collected) in enumerate(
+                zip(latest['gc_pending'], latest['gc_collections'], latest['gc_collected'])):
+            lines += [
+                f'tabpay_gc_pending_objects{{generation="{generation}"}} {pending}',
+                f'tabpay_gc_collections_total{{generation="{generation}"}} {collections}',
+                f'tabpay_gc_collected_objects_total{{generation="{generation}"}} {collected}'
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def start(self):
+        """Start sampling every ``interval`` seconds, once per process"""
+        if not self.interval or (self._thread and self._thread.is_alive()):
+            return
+        with self._mutex:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='memory-telemetry', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f"Error sampling memory: {str(e)}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._time_collection in gc.callbacks:
+            gc.callbacks.remove(self._time_collection)
+
+
+def _settings():
+    settings = dict(DEFAULT_SETTINGS)
+    if has_app_context():
+        for key in settings:
+            settings[key] = current_app.config.get(key, settings[key])
+    return settings
+
+
+def get_memory_monitor() -> MemoryMonitor:
+    """Get the process-wide memory monitor"""
+    global _monitor
+    if _monitor is None:
+        with _lock:
+            if _monitor is None:
+                settings = _settings()
+                _monitor = MemoryMonitor(
+                    sample_every=settings['MEMORY_SAMPLE_EVERY'],
+                    interval=settings['MEMORY_SAMPLE_INTERVAL'],
+                    gc_threshold_mb=settings['MEMORY_GC_THRESHOLD_MB'],
+                    gc_cooldown=settings['MEMORY_GC_COOLDOWN']
+                )
+    return _monitor
+
+
+def reset_memory_monitor():
+    """Stop the monitor so the next call builds a fresh one"""
+    global _monitor
+    with _lock:
+        if _monitor is not None:
+            _monitor.stop()
+        _monitor = None
+
+
+def init_memory_telemetry(app):
+    """Count requests towards the sampled memory telemetry"""
+
+    @app.before_request
+    def record_memory_sample():
+        monitor = get_memory_monitor()
+        # Started here rather than at boot so forked workers get their own thread
+        monitor.start()
+        monitor.record_request()
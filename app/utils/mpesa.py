@@ -1,19 +1,25 @@
 import requests
 import base64
+import hashlib
 import json
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 from dataclasses import dataclass
 from flask import current_app
+from .http_client import get_http_session
+from .logging_config import LazyJson
+from .token_store import TokenStore, MemoryTokenStore, create_token_store
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Seconds before expiry that a token stops being handed out
+TOKEN_EXPIRY_BUFFER = 100
+# Seconds between background renewal attempts after a failure
+RENEWAL_RETRY_INTERVAL = 30
+
 @dataclass
 class MpesaCredentials:
     """Data class to hold M-Pesa API credentials"""
@@ -26,12 +32,37 @@ class MpesaCredentials:
     stk_push_passkey: Optional[str] = None
 
 class MpesaAuthManager:
-    """Handles M-Pesa API authentication"""
+    """Handles M-Pesa API authentication
+
+    The access token is kept in a shared ``TokenStore`` so every worker
+    reuses one token. Refreshes are single-flight: callers take the
+    store's lock and re-check it before asking Daraja for a new token.
+    With ``background_renewal`` a daemon thread renews the token
+    ``renew_before`` seconds ahead of expiry so requests never wait on it.
+    """
     
-    def __init__(self, credentials: MpesaCredentials):
+    def __init__(
+        self,
+        credentials: MpesaCredentials,
+        token_store: Optional[TokenStore] = None,
+        renew_before: int = 300,
+        background_renewal: bool = False
+    ):
         self.credentials = credentials
         self._access_token = None
         self._token_expiry = None
+        self.token_store = token_store or MemoryTokenStore()
+        self.renew_before = renew_before
+        self.background_renewal = background_renewal
+        self._renewal_lock = threading.Lock()
+        self._renewal_thread = None
+        self._stop_renewal = threading.Event()
+
+        # One shared token per consumer key, without exposing the key itself
+        key_digest = hashlib.sha256(
+            f'{credentials.environment}:{credentials.consumer_key}'.encode()
+        ).hexdigest()[:16]
+        self.token_key = f'mpesa_token:{key_digest}'
 
         # Base URLs for different environments
         if credentials.environment == 'sandbox':
@@ -49,52 +80,13 @@ class MpesaAuthManager:
                 logger.debug("Using cached access token")
                 return self._access_token
 
-            # Clear any existing token
-            self._access_token = None
-            self._token_expiry = None
+            # Another worker may already have fetched a token
+            if not self._load_shared_token():
+                self.refresh_access_token()
 
-            auth_url = f'{self.auth_url}/v1/generate?grant_type=client_credentials'
-            auth_string = f'{self.credentials.consumer_key}:{self.credentials.consumer_secret}'
-            auth_base64 = base64.b64encode(auth_string.encode()).decode('utf-8')
-            
-            headers = {
-                'Authorization': f'Basic {auth_base64}'
-            }
-            
-            logger.info(f"Getting new access token from: {auth_url}")
-            logger.debug(f"Using credentials: consumer_key={self.credentials.consumer_key[:4]}***, environment={self.credentials.environment}")
-            
-            response = requests.get(
-                auth_url,
-                headers=headers,
-                verify=True,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Auth failed: {response.status_code} - {response.text}")
-                raise ValueError(f"Authentication failed: {response.text}")
-            
-            try:
-                data = response.json()
-            except json.JSONDecodeError:
-                logger.error(f"Invalid JSON response: {response.text}")
-                raise ValueError("Invalid JSON response from auth endpoint")
-
-            self._access_token = data.get('access_token')
-            
-            if not self._access_token:
-                logger.error(f"No access token in response: {data}")
-                raise ValueError("No access token in response")
-            
-            # Set token expiry (typically 1 hour)
-            expires_in = int(data.get('expires_in', 3599))
-            self._token_expiry = datetime.now() + timedelta(seconds=expires_in - 100)  # Buffer of 100 seconds
-            
-            logger.info("Successfully obtained new access token")
-            logger.debug(f"Token expiry set to: {self._token_expiry}")
+            self._start_renewal()
             return self._access_token
-            
+
         except Exception as e:
             logger.error(f"Error getting access token: {str(e)}")
             # Clear token on error
@@ -102,6 +94,113 @@ class MpesaAuthManager:
             self._token_expiry = None
             raise
 
+    def refresh_access_token(self, min_ttl: int = 0) -> str:
+        """Fetch a new token unless another caller refreshed one meanwhile
+
+        Args:
+            min_ttl (int): Seconds the shared token must still be valid for
+                to be reused instead of fetching a new one
+        """
+        with self.token_store.lock(self.token_key):
+            if self._load_shared_token(min_ttl):
+                return self._access_token
+
+            token, expires_at = self._request_access_token()
+            self.token_store.set(self.token_key, token, expires_at)
+            self._set_token(token, expires_at)
+            return token
+
+    def _load_shared_token(self, min_ttl: int = 0) -> bool:
+        entry = self.token_store.get(self.token_key)
+        if not entry:
+            return False
+        token, expires_at = entry
+        if expires_at - TOKEN_EXPIRY_BUFFER - min_ttl <= time.time():
+            return False
+        self._set_token(token, expires_at)
+        logger.debug("Using shared access token")
+        return True
+
+    def _set_token(self, token: str, expires_at: float):
+        self._access_token = token
+        self._token_expiry = datetime.fromtimestamp(expires_at - TOKEN_EXPIRY_BUFFER)
+
+    def _request_access_token(self):
+        """Ask Daraja for a new token, returning it with its expiry timestamp"""
+        auth_url = f'{self.auth_url}/v1/generate?grant_type=client_credentials'
+        auth_string = f'{self.credentials.consumer_key}:{self.credentials.consumer_secret}'
+        auth_base64 = base64.b64encode(auth_string.encode()).decode('utf-8')
+        
+        headers = {
+            'Authorization': f'Basic {auth_base64}'
+        }
+        
+        logger.info(f"Getting new access token from: {auth_url}")
+        logger.debug(f"Using credentials: consumer_key={self.credentials.consumer_key[:4]}***, environment={self.credentials.environment}")
+        
+        response = get_http_session().get(
+            auth_url,
+            headers=headers,
+            verify=True,
+            timeout=30
+        )
+        
+        if response.status_code != 200:
+            logger.error(f"Auth failed: {response.status_code} - {response.text}")
+            raise ValueError(f"Authentication failed: {response.text}")
+        
+        try:
+            data = response.json()
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON response: {response.text}")
+            raise ValueError("Invalid JSON response from auth endpoint")
+
+        access_token = data.get('access_token')
+        
+        if not access_token:
+            logger.error(f"No access token in response: {data}")
+            raise ValueError("No access token in response")
+        
+        # Token lifetime is typically 1 hour
+        expires_in = int(data.get('expires_in', 3599))
+        
+        logger.info("Successfully obtained new access token")
+        return access_token, time.time() + expires_in
+
+    def _start_renewal(self):
+        if not self.background_renewal:
+            return
+        with self._renewal_lock:
+            if self._renewal_thread and self._renewal_thread.is_alive():
+                return
+            self._stop_renewal.clear()
+            self._renewal_thread = threading.Thread(
+                target=self._renew_token,
+                name='mpesa-token-renewal',
+                daemon=True
+            )
+            self._renewal_thread.start()
+
+    def stop_renewal(self):
+        """Stop the background renewal thread"""
+        self._stop_renewal.set()
+
+    def _renew_token(self):
+        while True:
+            wait = RENEWAL_RETRY_INTERVAL
+            if self._token_expiry:
+                wait = max(
+                    (self._token_expiry - datetime.now()).total_seconds() - self.renew_before,
+                    RENEWAL_RETRY_INTERVAL
+                )
+            if self._stop_renewal.wait(wait):
+                return
+            try:
+                self.refresh_access_token(min_ttl=self.renew_before)
+                logger.debug(f"Token renewed, next expiry at: {self._token_expiry}")
+            except Exception as e:
+                logger.error(f"Background token renewal failed: {str(e)}")
+
 class MpesaC2B:
     """Handles M-Pesa Customer to Business (C2B) operations"""
     
@@ -116,7 +215,15 @@ class MpesaC2B:
             stk_push_shortcode=current_app.config.get('MPESA_STK_PUSH_SHORTCODE'),
             stk_push_passkey=current_app.config.get('MPESA_STK_PUSH_PASSKEY')
         )
-        self.auth_manager = MpesaAuthManager(credentials)
+        self.auth_manager = MpesaAuthManager(
+            credentials,
+            token_store=create_token_store(
+                current_app.config.get('MPESA_TOKEN_STORE'),
+                current_app.config.get('MPESA_TOKEN_STORE_PATH')
+            ),
+            renew_before=current_app.config.get('MPESA_TOKEN_RENEW_BEFORE', 300),
+            background_renewal=current_app.config.get('MPESA_TOKEN_RENEWAL', True)
+        )
         self.api_url = self.auth_manager.api_url
         self.credentials = credentials
 
@@ -151,11 +258,11 @@ class MpesaC2B:
         }
         
         try:
-            logger.info(f"Registering URL with payload: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, json=payload, headers=headers)
+            logger.info("Registering URL with payload: %s", LazyJson(payload))
+            response = get_http_session().post(url, json=payload, headers=headers)
             response.raise_for_status()
             result = response.json()
-            logger.info(f"Successfully registered URL: {json.dumps(result, indent=2)}")
+            logger.info("Successfully registered URL: %s", LazyJson(result))
             return result
         except Exception as e:
             logger.error(f"URL registration failed: {str(e)}")
@@ -218,9 +325,9 @@ class MpesaC2B:
             
             logger.info(f"Initiating payment to URL: {url}")
             logger.info(f"Using callback URL: {callback_url}")
-            logger.info(f"Initiating payment with payload: {json.dumps(payload, indent=2)}")
+            logger.info("Initiating payment with payload: %s", LazyJson(payload))
             
-            response = requests.post(
+            response = get_http_session().post(
                 url, 
                 json=payload, 
                 headers=headers, 
@@ -234,7 +341,7 @@ class MpesaC2B:
                 response.raise_for_status()
             
             result = response.json()
-            logger.info(f"Successfully initiated payment: {json.dumps(result, indent=2)}")
+            logger.info("Successfully initiated payment: %s", LazyJson(result))
             return result
             
         except requests.exceptions.RequestException as e:
@@ -300,10 +407,10 @@ class MpesaC2B:
         }
         
         try:
-            logger.info(f"Initiating STK Push with payload: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, json=payload, headers=headers)
+            logger.info("Initiating STK Push with payload: %s", LazyJson(payload))
+            response = get_http_session().post(url, json=payload, headers=headers)
             logger.debug(f"Response status code: {response.status_code}")
-            logger.debug(f"Response headers: {json.dumps(dict(response.headers), indent=2)}")
+            logger.debug("Response headers: %s", LazyJson(dict(response.headers)))
             
             if response.status_code != 200:
                 logger.error(f"STK Push request failed with status {response.status_code}")
@@ -311,7 +418,7 @@ class MpesaC2B:
                 response.raise_for_status()
             
             result = response.json()
-            logger.info(f"Successfully initiated STK Push: {json.dumps(result, indent=2)}")
+            logger.info("Successfully initiated STK Push: %s", LazyJson(result))
             return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error initiating STK Push: {str(e)}")
@@ -341,10 +448,10 @@ class MpesaC2B:
         }
         
         try:
-            logger.info(f"Querying STK Push status with payload: {json.dumps(payload, indent=2)}")
-            response = requests.post(url, json=payload, headers=headers)
+            logger.info("Querying STK Push status with payload: %s", LazyJson(payload))
+            response = get_http_session().post(url, json=payload, headers=headers)
             logger.debug(f"Response status code: {response.status_code}")
-            logger.debug(f"Response headers: {json.dumps(dict(response.headers), indent=2)}")
+            logger.debug("Response headers: %s", LazyJson(dict(response.headers)))
             
             if response.status_code != 200:
                 logger.error(f"STK Push status query failed with status {response.status_code}")
@@ -352,7 +459,7 @@ class MpesaC2B:
                 response.raise_for_status()
             
             result = response.json()
-            logger.info(f"Successfully queried STK Push status: {json.dumps(result, indent=2)}")
+            logger.info("Successfully queried STK Push status: %s", LazyJson(result))
             return result
         except requests.exceptions.RequestException as e:
             logger.error(f"Error querying STK Push status: {str(e)}")
@@ -1,6 +1,7 @@
 import requests
 import logging
 from flask import current_app
+from .http_client import get_http_session
 import socket
 import ssl
 
@@ -49,7 +50,7 @@ def test_callback_url_accessibility():
 
         # Connectivity Test
         try:
-            response = requests.post(
+            response = get_http_session().post(
                 callback_url, 
                 json={"test": "mpesa_notification_test"},
                 timeout=10
@@ -1,6 +1,7 @@
-import hashlib
-from typing import Optional
-from app.main.models import UserModel,RoleModel
+from typing import Dict, Iterable, Optional
+from app.main.models import UserModel, RoleModel, MsisdnHashModel
+from app.utils import db
+from sqlalchemy.orm import selectinload
 import logging
 
 
@@ -10,52 +11,88 @@ logger = logging.getLogger('mpesa')
 def find_user_by_hashed_msisdn(hashed_msisdn: Optional[str]) -> Optional[UserModel]:
     """
     Find a user by matching their hashed phone number with Safaricom's hashed MSISDN.
-    
+
+    The hashes of every phone number format are precomputed into the
+    ``msisdn_hashes`` table whenever a phone number is written, so the
+    payer is resolved with a single indexed query.
+
     Args:
         hashed_msisdn (str): The pre-hashed MSISDN from Safaricom Daraja API
-        
+
     Returns:
         Optional[UserModel]: Matching user or None if not found
     """
     if not hashed_msisdn:
         logger.warning("No hashed MSISDN provided")
         return None
-        
+
     try:
-        # Get all users
-        role = RoleModel.query.filter_by(name='Member').first()
-        users = UserModel.query.filter(UserModel.roles.contains(role)).all()
-        logger.debug(f"Found {len(users)} users to check")
-        
-        # Check each user's phone number
-        for user in users:
-            if not user.phone_number:
-                continue
-                
-            phone = user.phone_number
-            original_phone = phone
-            
-            # Try different phone number formats
-            formats_to_try = [
-                phone,  # Original format
-                phone.lstrip('+'),  # Remove leading +
-                phone.lstrip('0'),  # Remove leading 0
-                '254' + phone.lstrip('+254').lstrip('0')  # Ensure 254 prefix
-            ]
-            
-            for phone_format in formats_to_try:
-                # Hash the phone number
-                user_phone_hash = hashlib.sha256(phone_format.encode()).hexdigest()
-                logger.debug(f"Testing format: {phone_format} -> hash: {user_phone_hash}")
-                
-                # Compare with Safaricom's hashed MSISDN
-                if user_phone_hash == hashed_msisdn:
-                    logger.info(f"Found matching user {user.full_name} for hashed MSISDN. Format used: {phone_format}")
-                    return user
-                    
-        logger.warning(f"No matching user found for hashed MSISDN after trying all formats")
+        user = (
+            UserModel.query
+            .join(MsisdnHashModel, MsisdnHashModel.user_id == UserModel.id)
+            .filter(MsisdnHashModel.msisdn_hash == hashed_msisdn)
+            .filter(UserModel.roles.any(RoleModel.name == 'Member'))
+            .first()
+        )
+        if user:
+            logger.info(f"Found matching user {user.full_name} for hashed MSISDN")
+            return user
+
+        logger.warning(f"No matching user found for hashed MSISDN")
         return None
-        
+
     except Exception as e:
         logger.error(f"Error matching hashed MSISDN: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def find_users_by_hashed_msisdns(hashed_msisdns: Iterable[str]) -> Dict[str, UserModel]:
+    """
+    Resolve many hashed MSISDNs to members with a single query.
+
+    Args:
+        hashed_msisdns: Pre-hashed MSISDNs from Safaricom Daraja API
+
+    Returns:
+        Dict[str, UserModel]: Matching member for each hash that has one
+    """
+    hashed_msisdns = {h for h in hashed_msisdns if h}
+    if not hashed_msisdns:
+        return {}
+
+    rows = (
+        db.session.query(MsisdnHashModel.msisdn_hash, UserModel)
+        .join(UserModel, MsisdnHashModel.user_id == UserModel.id)
+        .filter(MsisdnHashModel.msisdn_hash.in_(hashed_msisdns))
+        .filter(UserModel.roles.any(RoleModel.name == 'Member'))
+        .all()
+    )
+    users = {}
+    for msisdn_hash, user in rows:
+        users.setdefault(msisdn_hash, user)
+    return users
+
+def rebuild_msisdn_hashes() -> int:
+    """
+    Recompute the MSISDN hash index for every user with a phone number.
+
+    Used to backfill users created before the index existed.
+
+    Returns:
+        int: Number of users whose hashes were rebuilt
+    """
+    count = 0
+    users = (
+        UserModel.query
+        .options(selectinload(UserModel.msisdn_hashes))
+        .filter(UserModel.phone_number.isnot(None))
+        .all()
+    )
+    for user in users:
+        user.msisdn_hashes = [
+            MsisdnHashModel(msisdn_hash=msisdn_hash)
+            for msisdn_hash in MsisdnHashModel.hashes_for(user.phone_number)
+        ]
+        count += 1
+    db.session.commit()
+    logger.info(f"Rebuilt MSISDN hashes for {count} users")
+    return count
@@ -42,7 +42,6 @@ class NetworkDiagnostics:
         """
         Comprehensive network configuration diagnostic for M-Pesa callback URLs
         """
-        logging.basicConfig(level=logging.INFO)
         logger = logging.getLogger(__name__)
 
         # M-Pesa Callback URLs from .env
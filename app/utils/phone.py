@@ -0,0 +1,99 @@
+from typing import Optional
+from sqlalchemy import inspect, select, update
+from sqlalchemy.schema import CreateIndex
+from . import db
+import phonenumbers
+import logging
+
+logger = logging.getLogger('mpesa')
+
+# Numbers written without a country code are read as Kenyan
+DEFAULT_REGION = 'KE'
+BACKFILL_BATCH_SIZE = 1000
+
+
+def to_e164(phone: Optional[str], region: str = DEFAULT_REGION) -> Optional[str]:
+    """
+    Normalize a phone number to E.164, e.g. ``0712 345 678`` to ``+254712345678``.
+
+    Returns:
+        Optional[str]: The E.164 number, or None if ``phone`` is not a valid number
+    """
+    if not phone:
+        return None
+    phone = str(phone).strip()
+    # Daraja sends MSISDNs as 2547... without the +
+    if phone.isdigit() and phone.startswith('254'):
+        phone = '+' + phone
+    try:
+        number = phonenumbers.parse(phone, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def _ensure_column(table, column):
+    """Add ``column`` and its index to an existing table created before it existed."""
+    inspector = inspect(db.engine)
+    if column.name in {existing['name'] for existing in inspector.get_columns(table.name)}:
+        return
+    logger.info(f"Adding {table.name}.{column.name}")
+    with db.engine.begin() as connection:
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+        for index in table.indexes:
+            if column in index.columns.values():
+                connection.execute(CreateIndex(index))
+
+
+def backfill_phone_e164(batch_size: int = BACKFILL_BATCH_SIZE) -> dict:
+    """
+    Fill ``phone_e164`` for users and payments written before the column existed.
+
+    Payments whose source number is a hashed MSISDN take their payer's number.
+
+    Returns:
+        dict: Number of ``users`` and ``payments`` updated
+    """
+    # Imported here because the models use ``to_e164``
+    from app.main.models import UserModel, PaymentModel
+
+    _ensure_column(UserModel.__table__, UserModel.__table__.c.phone_e164)
+    _ensure_column(PaymentModel.__table__, PaymentModel.__table__.c.phone_e164)
+
+    counts = {'users': 0, 'payments': 0}
+    for model, phone_column, key in (
+        (UserModel, UserModel.phone_number, 'users'),
+        (PaymentModel, PaymentModel.source_phone_number, 'payments')
+    ):
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(model.id, phone_column)
+                .where(model.id > last_id, model.phone_e164.is_(None), phone_column.isnot(None))
+                .order_by(model.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            changes = [{'id': row_id, 'phone_e164': to_e164(phone)} for row_id, phone in rows]
+            changes = [change for change in changes if change['phone_e164']]
+            if changes:
+                db.session.execute(update(model), changes)
+                counts[key] += len(changes)
+            db.session.commit()
+
+    payer_phone = select(UserModel.phone_e164).where(UserModel.id == PaymentModel.payer_id).scalar_subquery()
+    result = db.session.execute(
+        update(PaymentModel)
+        .where(PaymentModel.phone_e164.is_(None), payer_phone.isnot(None))
+        .values(phone_e164=payer_phone)
+        .execution_options(synchronize_session=False)
+    )
+    counts['payments'] += result.rowcount
+    db.session.commit()
+    logger.info(f"Backfilled E.164 phone numbers for {counts['users']} users and {counts['payments']} payments")
+    return counts
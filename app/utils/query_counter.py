@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from . import db
+
+
+class QueryCounter:
+    """Records the SQL statements run while it is active"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Count the statements sent to ``engine`` (the app's engine by default)
+    inside the block, e.g. to check a listing does not query once per row.
+
+        with count_queries() as counter:
+            list_users()
+        assert counter.count <= 10
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
@@ -0,0 +1,30 @@
+from sqlalchemy import inspect
+from . import db
+import logging
+
+logger = logging.getLogger('mpesa')
+
+
+def create_missing_indexes():
+    """
+    Create the model indexes an existing database does not have yet.
+
+    ``db.create_all()`` skips tables that already exist, so indexes added to
+    a model later are created here instead. Safe to run more than once.
+
+    Returns:
+        list: Names of the indexes created
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+            logger.info(f"Creating index {index.name} on {table.name}")
+            index.create(db.engine)
+            created.append(index.name)
+    return created
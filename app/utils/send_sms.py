@@ -1,5 +1,5 @@
 import os
-import africastalking
+import threading
 from typing import List
 import logging
 from config import Config
@@ -19,7 +19,8 @@ class SendSMS:
                 raise ValueError("Missing required environment variables")
             
             
-            # Initialize the SDK
+            # Initialize the SDK, imported on first use since it pulls in requests
+            import africastalking
             africastalking.initialize(username=username, api_key=api_key)
             self.sms = africastalking.SMS
             
@@ -126,9 +127,40 @@ class SendSMS:
         Test the connection to Africa's Talking
         """
         try:
+            import africastalking
             account_info = africastalking.Application.fetch_application_data()
             logger.info(f"Connection test successful. Account info: {account_info}")
             return True
         except Exception as e:
             # logger.error(f"Connection test failed: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+_sms = None
+_sms_lock = threading.Lock()
+
+
+def get_sms():
+    """
+    The shared SMS client, created on first use rather than at import so
+    booting a worker does not call Africa's Talking.
+
+    Returns:
+        SendSMS: The client, or None if it could not be initialized
+    """
+    global _sms
+    if _sms is None:
+        with _sms_lock:
+            if _sms is None:
+                try:
+                    _sms = SendSMS()
+                except Exception as e:
+                    logger.error(f"Failed to initialize SMS service: {str(e)}")
+                    return None
+    return _sms
+
+
+def reset_sms():
+    """Drop the client so the next call builds a fresh one"""
+    global _sms
+    with _sms_lock:
+        _sms = None
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TokenStore(ABC):
+    """
+    Shared storage for short-lived API tokens.
+
+    A store keeps ``(token, expires_at)`` pairs keyed by name, where
+    ``expires_at`` is a Unix timestamp, and provides a lock that is held
+    while a token is being refreshed so only one caller fetches a new one.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        """Return ``(token, expires_at)`` for ``key``, or None"""
+
+    @abstractmethod
+    def set(self, key: str, token: str, expires_at: float):
+        """Store ``token`` under ``key`` until ``expires_at``"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Forget the token stored under ``key``"""
+
+    @abstractmethod
+    def lock(self, key: str):
+        """Return a context manager held while refreshing ``key``"""
+
+
+class MemoryTokenStore(TokenStore):
+    """Token store shared by the threads of a single process"""
+
+    def __init__(self):
+        self._tokens = {}
+        self._mutex = threading.Lock()
+        self._locks = {}
+
+    def get(self, key):
+        with self._mutex:
+            return self._tokens.get(key)
+
+    def set(self, key, token, expires_at):
+        with self._mutex:
+            self._tokens[key] = (token, expires_at)
+
+    def delete(self, key):
+        with self._mutex:
+            self._tokens.pop(key, None)
+
+    @contextmanager
+    def lock(self, key):
+        with self._mutex:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            yield
+
+
+class FileTokenStore(TokenStore):
+    """
+    Token store shared by every process on the host through a JSON file.
+
+    Reads are lock-free because writes replace the file atomically; the
+    refresh lock is an ``flock`` on a sibling ``.refresh.lock`` file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, key):
+        entry = self._read().get(key)
+        return (entry['token'], entry['expires_at']) if entry else None
+
+    def set(self, key, token, expires_at):
+        # Callers hold lock(key); other keys may be written concurrently
+        with self._file_lock():
+            data = self._read()
+            data[key] = {'token': token, 'expires_at': expires_at}
+            self._write(data)
+
+    def delete(self, key):
+        with self._file_lock():
+            data = self._read()
+            if data.pop(key, None) is not None:
+                self._write(data)
+
+    @contextmanager
+    def _file_lock(self, suffix='.lock'):
+        with open(self.path + suffix, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def lock(self, key):
+        # flock is per open file, so threads in this process queue up first
+        with self._thread_lock, self._file_lock('.refresh.lock'):
+            yield
+
+
+class RedisTokenStore(TokenStore):
+    """Token store shared across hosts through Redis"""
+
+    def __init__(self, url: str, lock_timeout: int = 60):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for a redis:// MPESA_TOKEN_STORE")
+        self.client = redis.Redis.from_url(url)
+        self.lock_timeout = lock_timeout
+
+    def get(self, key):
+        value = self.client.get(key)
+        if not value:
+            return None
+        entry = json.loads(value)
+        return entry['token'], entry['expires_at']
+
+    def set(self, key, token, expires_at):
+        ttl = max(int(expires_at - time.time()), 1)
+        self.client.set(key, json.dumps({'token': token, 'expires_at': expires_at}), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    @contextmanager
+    def lock(self, key):
+        with self.client.lock(f'{key}:lock', timeout=self.lock_timeout):
+            yield
+
+
+def create_token_store(url: Optional[str] = None, path: Optional[str] = None) -> TokenStore:
+    """
+    Build a token store from the ``MPESA_TOKEN_STORE`` setting.
+
+    Args:
+        url (str): ``memory``, ``file`` or a ``redis://`` URL
+        path (str): Token file used by the ``file`` store
+    """
+    url = url or 'memory'
+    if url == 'memory':
+        return MemoryTokenStore()
+    if url == 'file':
+        return FileTokenStore(path or os.path.join(tempfile.gettempdir(), 'tabpay_mpesa_token.json'))
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisTokenStore(url)
+    raise ValueError(f"Unsupported token store: {url}")
@@ -0,0 +1,386 @@
+import os
+import math
+import time
+import uuid
+import json
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import QueueListener, RotatingFileHandler
+from flask import current_app, g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Used when the tracer is created outside an application context
+DEFAULT_SETTINGS = {
+    'TRACE_EXPORT_FILE': 'logs/traces.jsonl',
+    'TRACE_ROUTE_WINDOW': 1000
+}
+
+# OpenTelemetry SpanKind and StatusCode values
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+MAX_STATEMENT_LENGTH = 2000
+MAX_BYTES = 10485760  # 10MB
+BACKUP_COUNT = 5
+
+_tracer = None
+_lock = threading.Lock()
+_sqlalchemy_instrumented = False
+
+
+class Trace:
+    """
+    The spans of one request, collected on the request's own thread.
+
+    The trace id doubles as the request id unless the client sent an
+    ``X-Request-ID``, which is then kept as an attribute of every span.
+    """
+
+    def __init__(self, request_id=None):
+        self.trace_id = uuid.uuid4().hex
+        self.request_id = request_id or self.trace_id
+        self.spans = []
+        self.stack = []
+
+    def start_span(self, name, kind='internal', attributes=None) -> dict:
+        span = {
+            'name': name,
+            'kind': kind,
+            'span_id': os.urandom(8).hex(),
+            'parent_id': self.stack[-1]['span_id'] if self.stack else '',
+            'start_ns': time.time_ns(),
+            'started': time.perf_counter_ns(),
+            'attributes': dict(attributes or {}),
+            'error': None
+        }
+        self.stack.append(span)
+        return span
+
+    def end_span(self, span, error=None):
+        span['duration_ns'] = time.perf_counter_ns() - span['started']
+        if error is not None:
+            span['error'] = str(error) or type(error).__name__
+        if span in self.stack:
+            self.stack.remove(span)
+        self.spans.append(span)
+
+    def to_otlp(self) -> dict:
+        """The trace as an OTLP/JSON ``ExportTraceServiceRequest``"""
+        spans = []
+        for span in self.spans:
+            attributes = dict(span['attributes'], **{'http.request_id': self.request_id})
+            spans.append({
+                'traceId': self.trace_id,
+                'spanId': span['span_id'],
+                'parentSpanId': span['parent_id'],
+                'name': span['name'],
+                'kind': SPAN_KINDS[span['kind']],
+                'startTimeUnixNano': str(span['start_ns']),
+                'endTimeUnixNano': str(span['start_ns'] + span['duration_ns']),
+                'attributes': [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()],
+                'status': ({'code': STATUS_ERROR, 'message': span['error']} if span['error']
+                           else {'code': STATUS_OK})
+            })
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'tabpay'}}]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+        }]}
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OtlpLine:
+    """A finished trace, serialized only when the exporter thread writes it"""
+    __slots__ = ('trace',)
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def __str__(self):
+        return json.dumps(self.trace.to_otlp(), separators=(',', ':'))
+
+
+class SpanExporter:
+    """
+    Append finished traces to a rotating file, one OTLP/JSON export request
+    per line, from a background thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._listener = None
+        self._mutex = threading.Lock()
+
+    def _start(self):
+        with self._mutex:
+            if self._listener is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(self.path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._listener = QueueListener(self._queue, handler)
+            self._listener.start()
+
+    def export(self, trace):
+        if self._listener is None:
+            # Started here rather than at boot so forked workers get their own thread
+            self._start()
+        self._queue.put(logging.makeLogRecord({'msg': OtlpLine(trace)}))
+
+    def stop(self):
+        """Write out the queued traces and close the file"""
+        with self._mutex:
+            if self._listener is None:
+                return
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Tracer:
+    """
+    Keep the latest ``route_window`` request durations of each route for
+    the percentiles on /admin/perf, and hand finished traces to the exporter.
+    """
+
+    def __init__(self, export_file=None, route_window=1000):
+        self.route_window = route_window
+        self.exporter = SpanExporter(export_file) if export_file else None
+        self._durations = {}
+        self._counts = {}
+        self._errors = {}
+        self._mutex = threading.Lock()
+
+    def record(self, route, duration_ms, error=False):
+        with self._mutex:
+            if route not in self._durations:
+                self._durations[route] = deque(maxlen=self.route_window)
+                self._counts[route] = 0
+                self._errors[route] = 0
+            self._durations[route].append(duration_ms)
+            self._counts[route] += 1
+            self._errors[route] += bool(error)
+
+    def finish(self, trace):
+        """Record the request span's duration and export the trace"""
+        root = trace.spans[-1]
+        self.record(root['name'], root['duration_ns'] / 1e6, error=bool(root['error']))
+        if self.exporter is not None:
+            self.exporter.export(trace)
+
+    def summary(self) -> list:
+        """p50/p95/p99 milliseconds per route, slowest p95 first"""
+        with self._mutex:
+            routes = {route: sorted(durations) for route, durations in self._durations.items()}
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+        rows = []
+        for route, ordered in routes.items():
+            rows.append({
+                'route': route,
+                'requests': counts[route],
+                'errors': errors[route],
+                'p50': round(percentile(ordered, 0.50), 2),
+                'p95': round(percentile(ordered, 0.95), 2),
+                'p99': round(percentile(ordered, 0.99), 2),
+                'max': round(ordered[-1], 2)
+            })
+        return sorted(rows, key=lambda row: row['p95'], reverse=True)
+
+    def stop(self):
+        if self.exporter is not None:
+            self.exporter.stop()
+
+
+def _settings():
+    settings = dict(DEFAULT_SETTINGS)
+    if has_app_context():
+        for key in settings:
+            settings[key] = current_app.config.get(key, settings[key])
+    return settings
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer"""
+    global _tracer
+    if _tracer is None:
+        with _lock:
+            if _tracer is None:
+                settings = _settings()
+                _tracer = Tracer(export_file=settings['TRACE_EXPORT_FILE'],
+                                 route_window=settings['TRACE_ROUTE_WINDOW'])
+                atexit.register(_tracer.stop)
+    return _tracer
+
+
+def reset_tracer():
+    """Flush the exporter so the next call builds a fresh tracer"""
+    global _tracer
+    with _lock:
+        if _tracer is not None:
+            _tracer.stop()
+        _tracer = None
+
+
+def current_trace():
+    """The trace of the current request, or None outside a traced request"""
+    return g.get('trace') if has_request_context() else None
+
+
+@contextmanager
+def span(name, kind='internal', attributes=None):
+    """
+    Time a block as a span of the current request's trace; does nothing
+    outside one. Yields the span so attributes can be added to it.
+    """
+    trace = current_trace()
+    if trace is None:
+        yield None
+        return
+    current = trace.start_span(name, kind, attributes)
+    try:
+        yield current
+    except Exception as e:
+        trace.end_span(current, error=e)
+        raise
+    trace.end_span(current)
+
+
+def traced(name=None):
+    """Decorator recording each call of a function as a span"""
+    def decorator(f):
+        span_name = name or f.__qualname__
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with span(span_name):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = current_trace()
+    if trace is None or context is None:
+        return
+    operation = statement.split(None, 1)[0].upper() if statement else ''
+    context._trace_span = trace.start_span(
+        f'SQL {operation}'.strip(),
+        'client',
+        {'db.system': conn.dialect.name, 'db.statement': statement[:MAX_STATEMENT_LENGTH],
+         'db.executemany': executemany}
+    )
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = getattr(context, '_trace_span', None)
+    trace = current_trace()
+    if current is not None and trace is not None:
+        context._trace_span = None
+        current['attributes']['db.rowcount'] = cursor.rowcount
+        trace.end_span(current)
+
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    current = getattr(context, '_trace_span', None)
+    trace = current_trace()
+    if current is not None and trace is not None:
+        context._trace_span = None
+        trace.end_span(current, error=exception_context.original_exception)
+
+
+def instrument_sqlalchemy():
+    """Record every statement run on any engine in the process, once"""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    _sqlalchemy_instrumented = True
+
+
+def init_tracing(app, blueprints=('main',)):
+    """
+    Trace every request: a server span for the request itself, a span for
+    each view of ``blueprints`` and, through the hooks elsewhere, for API
+    resource methods, SQL statements and outbound HTTP calls.
+
+    Call after the blueprints are registered.
+    """
+    if not app.config.get('TRACING_ENABLED', True):
+        return
+    instrument_sqlalchemy()
+
+    def start_trace():
+        trace = Trace(request.headers.get(REQUEST_ID_HEADER))
+        g.trace = trace
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        trace.start_span(f'{request.method} {route}', 'server', {
+            'http.method': request.method,
+            'http.route': route,
+            'http.target': request.path
+        })
+
+    def tag_response(response):
+        trace = current_trace()
+        if trace is not None:
+            response.headers[REQUEST_ID_HEADER] = trace.request_id
+            if trace.stack:
+                trace.stack[0]['attributes']['http.status_code'] = response.status_code
+                if response.status_code >= 500:
+                    trace.stack[0]['error'] = f'HTTP {response.status_code}'
+        return response
+
+    def finish_trace(error=None):
+        trace = g.pop('trace', None)
+        if trace is None or not trace.stack:
+            return
+        # Spans left open by an exception end with the request
+        while trace.stack:
+            trace.end_span(trace.stack[-1], error=error)
+        try:
+            get_tracer().finish(trace)
+        except Exception as e:
+            logger.error(f"Error exporting trace: {str(e)}")
+
+    # Runs ahead of the other before_request hooks so the request span covers them
+    app.before_request_funcs.setdefault(None, []).insert(0, start_trace)
+    app.after_request(tag_response)
+    app.teardown_request(finish_trace)
+
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint.partition('.')[0] in blueprints:
+            app.view_functions[endpoint] = traced(f'view {endpoint}')(view)
@@ -1,8 +1,10 @@
 from flask import current_app, flash, g
 from flask_security import current_user
 from functools import wraps
-import time
-import requests
+from sqlalchemy.exc import SQLAlchemyError
+from . import db
+from .tracing import traced
+from ..services import ServiceError, hierarchy, users
 
 def cache_for_request(f):
     """Cache the result of a function for the duration of the request."""
@@ -17,116 +19,84 @@ def cache_for_request(f):
     return decorated
 
 @cache_for_request
+@traced()
 def get_umbrella_by_user(user_id):
     """Get umbrella for a specific user."""
     try:
-        response = requests.get(
-            f"{current_app.config['API_BASE_URL']}/api/v1/umbrellas/",
-            params={"created_by": user_id},
-            headers={"Authorization": f"Bearer {current_user.get_auth_token()}"}
-        )
-        if response.status_code == 200:
-            data = response.json()
-            return data[0] if isinstance(data, list) and data else data
-        return None
+        tree = hierarchy.umbrella_tree(hierarchy.user_umbrella_id(user_id))
+        if not tree:
+            return None
+        return {key: value for key, value in tree.items() if key != 'blocks'}
     except Exception as e:
         current_app.logger.error(f"Error fetching umbrella: {str(e)}")
         return None
 
 @cache_for_request
-def get_blocks_by_umbrella(show_flash_messages=True, max_retries=3):
-    """Fetches blocks associated with the current user's umbrella via API.
+@traced()
+def get_blocks_by_umbrella(show_flash_messages=True):
+    """Fetches blocks associated with the current user's umbrella.
     
     Args:
         show_flash_messages: Whether to show flash messages on errors (default: True)
-        max_retries: Maximum number of retry attempts (default: 3)
     
     Returns:
         list: List of blocks associated with the user's umbrella
     """
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            # Get the user's umbrella first
-            umbrella = get_umbrella_by_user(current_user.id)
-            if not umbrella:
-                if show_flash_messages:
-                    flash('No umbrella found. Please create an umbrella first.', 'warning')
-                return []
-
-            response = requests.get(
-                f"{current_app.config['API_BASE_URL']}/api/v1/blocks/",
-                params={'parent_umbrella_id': umbrella['id']},
-                headers={"Authorization": f"Bearer {current_user.get_auth_token()}"},
-                timeout=20
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data if isinstance(data, list) else []
-            
-        except requests.exceptions.Timeout:
-            retry_count += 1
-            if retry_count == max_retries:
-                current_app.logger.error(f"Timeout error after {max_retries} retries when fetching blocks")
-                if show_flash_messages:
-                    flash('Server is taking too long to respond. Please try again later.', 'danger')
-                return []
-            current_app.logger.warning(f"Timeout occurred, retrying ({retry_count}/{max_retries})...")
-            continue
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Error fetching blocks: {str(e)}")
-            if show_flash_messages:
-                flash('Error retrieving blocks from the server. Please try again later.', 'danger')
-            return []
-        except ValueError as e:
-            current_app.logger.error(f"Error processing block data: {str(e)}")
+    try:
+        # Get the user's umbrella first
+        umbrella = get_umbrella_by_user(current_user.id)
+        if not umbrella:
             if show_flash_messages:
-                flash('Error processing server response. Please contact support.', 'danger')
+                flash('No umbrella found. Please create an umbrella first.', 'warning')
             return []
 
+        tree = hierarchy.umbrella_tree(umbrella['id'])
+        return [dict(block) for block in tree['blocks']] if tree else []
+
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Error fetching blocks: {str(e)}")
+        if show_flash_messages:
+            flash('Error retrieving blocks from the server. Please try again later.', 'danger')
+        return []
+
 @cache_for_request
-def get_zones_by_block(block_id, show_flash_messages=True, max_retries=3):
+@traced()
+def get_zones_by_block(block_id, show_flash_messages=True):
     """Get zones for a specific block.
     
     Args:
         block_id: ID of the block to get zones for
         show_flash_messages: Whether to show flash messages on errors (default: True)
-        max_retries: Maximum number of retry attempts (default: 3)
     
     Returns:
         list: List of zones associated with the block
     """
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            response = requests.get(
-                f"{current_app.config['API_BASE_URL']}/api/v1/zones/",
-                params={"parent_block_id": block_id},
-                headers={"Authorization": f"Bearer {current_user.get_auth_token()}"},
-                timeout=20  # Increased timeout
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data if isinstance(data, list) else []
-        except requests.exceptions.Timeout:
-            retry_count += 1
-            if retry_count == max_retries:
-                current_app.logger.error(f"Timeout error after {max_retries} retries when fetching zones")
-                if show_flash_messages:
-                    flash('Server is taking too long to respond. Please try again later.', 'danger')
-                return []
-            current_app.logger.warning(f"Timeout occurred, retrying ({retry_count}/{max_retries})...")
-            continue
-        except requests.exceptions.RequestException as e:
-            current_app.logger.error(f"Error fetching zones: {str(e)}")
-            if show_flash_messages:
-                flash('Error retrieving zones from the server. Please try again later.', 'danger')
-            return []
-        except ValueError as e:
-            current_app.logger.error(f"Error processing zone data: {str(e)}")
-            if show_flash_messages:
-                flash('Error processing server response. Please contact support.', 'danger')
-            return []
+    try:
+        # Blocks of the user's own umbrella come from its cached tree
+        blocks = get_blocks_by_umbrella(show_flash_messages=False) if current_user.is_authenticated else []
+        for block in blocks:
+            if str(block['id']) == str(block_id):
+                return [dict(zone) for zone in block['zones']]
+        return hierarchy.list_zones(parent_block_id=block_id)
+    except SQLAlchemyError as e:
+        current_app.logger.error(f"Error fetching zones: {str(e)}")
+        if show_flash_messages:
+            flash('Error retrieving zones from the server. Please try again later.', 'danger')
+        return []
+
+@cache_for_request
+@traced()
+def get_zone_map(show_flash_messages=True):
+    """Map the zones of the current user's umbrella to their names.
+
+    Returns:
+        dict: ``{zone_id: (zone_name, block_name)}``
+    """
+    return {
+        zone['id']: (zone['name'], block['name'])
+        for block in get_blocks_by_umbrella(show_flash_messages)
+        for zone in block['zones']
+    }
 
 def update_user_memberships(user_id, block_id=None, zone_id=None):
     """Update a user's block and zone memberships with proper umbrella association."""
@@ -136,30 +106,22 @@ def update_user_memberships(user_id, block_id=None, zone_id=None):
         return False, "No umbrella found"
 
     try:
-        # Prepare the update payload
-        payload = {
+        changes = {
             'umbrella_id': umbrella['id']
         }
         
         if block_id:
-            payload['block_id'] = block_id
+            changes['block_id'] = int(block_id)
         if zone_id:
-            payload['zone_id'] = zone_id
-
-        # Update user memberships
-        response = requests.patch(
-            f"{current_app.config['API_BASE_URL']}/api/v1/users/{user_id}",
-            params={"umbrella_id": umbrella['id']},  # Ensure umbrella_id is in query params
-            json=payload,
-            headers={"Authorization": f"Bearer {current_user.get_auth_token()}"}
-        )
+            changes['zone_id'] = int(zone_id)
 
-        if response.status_code == 200:
-            return True, "Memberships updated successfully"
-        else:
-            current_app.logger.error(f"Failed to update memberships: {response.text}")
-            return False, f"Failed to update memberships: {response.text}"
+        users.update_user(user_id, changes, approver=current_user)
+        return True, "Memberships updated successfully"
 
+    except ServiceError as e:
+        current_app.logger.error(f"Failed to update memberships: {e.message}")
+        return False, f"Failed to update memberships: {e.message}"
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error updating memberships: {str(e)}")
         return False, f"Error updating memberships: {str(e)}"
@@ -0,0 +1,103 @@
+"""
+Compare the grouped contribution stats query with the per-member loop it
+replaced.
+
+    python benchmarks/contribution_stats.py --members 2000
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.main.models import UserModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel, PaymentModel, member_blocks, member_zones
+from app.services import contributions
+from app.utils.query_counter import count_queries
+
+
+def loop_stats(block_id, zone_id=None):
+    """The former get_contribution_stats: one payment lookup per member"""
+    base_query = UserModel.query.join(UserModel.block_memberships)
+    if zone_id:
+        base_query = base_query.join(UserModel.zone_memberships)\
+            .filter(BlockModel.id == block_id, ZoneModel.id == zone_id)
+    else:
+        base_query = base_query.filter(BlockModel.id == block_id)
+
+    users = base_query.all()
+    contributed = 0
+    for user in users:
+        if PaymentModel.query.filter_by(payer_id=user.id, block_id=block_id).first() is not None:
+            contributed += 1
+    return {'contributed': contributed, 'pending': len(users) - contributed}
+
+
+def seed(members):
+    admin = UserModel(email="admin@example.com", full_name="Admin User")
+    db.session.add(admin)
+    db.session.flush()
+    umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=admin.id, initials="UM")
+    db.session.add(umbrella)
+    db.session.flush()
+    block = BlockModel(name="Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="BL")
+    db.session.add(block)
+    db.session.flush()
+    zone = ZoneModel(name="Zone", parent_block_id=block.id, created_by=admin.id)
+    db.session.add(zone)
+    db.session.flush()
+    meeting = MeetingModel(host_id=admin.id, block_id=block.id, zone_id=zone.id, organizer_id=admin.id, date=datetime.now())
+    db.session.add(meeting)
+    db.session.flush()
+
+    db.session.execute(insert(UserModel), [
+        {'full_name': f"Member {i}", 'id_number': 10000 + i, 'phone_number': f"07{i:08d}", 'fs_uniquifier': f"bench-{i}"}
+        for i in range(members)
+    ])
+    user_ids = [user_id for user_id, in db.session.query(UserModel.id).filter(UserModel.id != admin.id)]
+    db.session.execute(insert(member_blocks), [{'user_id': user_id, 'block_id': block.id} for user_id in user_ids])
+    db.session.execute(insert(member_zones), [{'user_id': user_id, 'zone_id': zone.id} for user_id in user_ids[::2]])
+    # Two out of three members have paid
+    db.session.execute(insert(PaymentModel), [
+        {'mpesa_id': f"TX{user_id}", 'account_number': meeting.unique_id, 'source_phone_number': "254700000000",
+         'amount': 100, 'transaction_status': 'completed', 'payer_id': user_id, 'block_id': block.id,
+         'meeting_id': meeting.id}
+        for user_id in user_ids if user_id % 3
+    ])
+    db.session.commit()
+    return block.id, zone.id
+
+
+def measure(label, func):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    with count_queries() as counter:
+        result = func()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:<12} {elapsed:>9.1f} ms {counter.count:>7} queries  {result['contributed']} contributed, {result['pending']} pending")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=1000)
+    options = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        block_id, zone_id = seed(options.members)
+        for scope, zone in (('block', None), ('zone', zone_id)):
+            print(f"{options.members} members, by {scope}")
+            before = measure('loop', lambda: loop_stats(block_id, zone))
+            after = measure('aggregate', lambda: contributions.contribution_stats(block_id=block_id, zone_id=zone))
+            assert (before['contributed'], before['pending']) == (after['contributed'], after['pending'])
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare request latency with the former per-request gc.collect() and RSS
+lookup against the sampled memory telemetry.
+
+    python benchmarks/request_latency.py --requests 2000 --objects 200000
+"""
+import os
+import sys
+import gc
+import time
+import argparse
+import statistics
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+from app import create_app, db
+from app.main.models import BankModel
+from app.utils.memory import reset_memory_monitor
+
+
+def per_request_collection():
+    """The before_request hook wsgi.py used to register"""
+    gc.collect()
+    psutil.Process(os.getpid()).memory_info()
+
+
+def measure(label, app, requests):
+    client = app.test_client()
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.get('/api/v1/banks/')
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<9} p50 {p50:>7.2f} ms  p99 {p99:>7.2f} ms  max {latencies[-1]:>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--objects', type=int, default=200000, help='Long-lived objects a full collection walks')
+    options = parser.parse_args()
+
+    # A worker's heap holds models, caches and templates between requests
+    heap = [{'id': i} for i in range(options.objects)]
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        db.session.add(BankModel(name="Bank", paybill_no="123456"))
+        db.session.commit()
+
+        before = create_app('testing')
+        before.config['MEMORY_SAMPLE_EVERY'] = 0
+        before.before_request(per_request_collection)
+        reset_memory_monitor()
+        measure('gc', before, options.requests)
+
+        reset_memory_monitor()
+        measure('sampled', app, options.requests)
+        db.drop_all()
+    del heap
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare the column-row listings and msgspec encoding with marshalling
+loaded models through flask_restful and ``json.dumps``.
+
+    python benchmarks/serializers.py --rows 10000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import msgspec
+from flask_restful import marshal
+from sqlalchemy import insert
+from app import create_app, db
+from app.api.serializers import get_user_fields, payment_fields, meeting_fields, block_fields, zone_fields
+from app.main.models import (
+    UserModel, RoleModel, BankModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel, PaymentModel,
+    roles_users, member_blocks, member_zones
+)
+from app.services import hierarchy, meetings, payments, users
+from app.utils.query_counter import count_queries
+
+
+def seed(rows):
+    admin = UserModel(email="admin@example.com", full_name="Admin User")
+    role = RoleModel.query.filter_by(name='Member').first() or RoleModel(name='Member')
+    bank = BankModel(name="Bank", paybill_no="123456")
+    db.session.add_all([admin, role, bank])
+    db.session.flush()
+    umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=admin.id, initials="UM")
+    db.session.add(umbrella)
+    db.session.flush()
+
+    db.session.execute(insert(BlockModel), [
+        {'name': f"Block {i}", 'parent_umbrella_id': umbrella.id, 'created_by': admin.id, 'initials': f"B{i}"}
+        for i in range(rows)
+    ])
+    block_ids = [block_id for block_id, in db.session.query(BlockModel.id)]
+    db.session.execute(insert(ZoneModel), [
+        {'name': f"Zone {i}", 'parent_block_id': block_ids[i], 'created_by': admin.id} for i in range(rows)
+    ])
+    zone_ids = [zone_id for zone_id, in db.session.query(ZoneModel.id)]
+
+    db.session.execute(insert(UserModel), [
+        {'full_name': f"Member {i}", 'id_number': 10000 + i, 'phone_number': f"07{i:08d}", 'bank_id': bank.id,
+         'acc_number': str(i), 'zone_id': zone_ids[i], 'fs_uniquifier': f"bench-{i}", 'registered_at': datetime.now()}
+        for i in range(rows)
+    ])
+    user_ids = [user_id for user_id, in db.session.query(UserModel.id).filter(UserModel.id != admin.id)]
+    db.session.execute(insert(roles_users), [{'user_id': user_id, 'role_id': role.id} for user_id in user_ids])
+    db.session.execute(insert(member_blocks), [
+        {'user_id': user_id, 'block_id': block_id} for user_id, block_id in zip(user_ids, block_ids)
+    ])
+    db.session.execute(insert(member_zones), [
+        {'user_id': user_id, 'zone_id': zone_id} for user_id, zone_id in zip(user_ids, zone_ids)
+    ])
+
+    db.session.execute(insert(MeetingModel), [
+        {'unique_id': f"M{i:08d}", 'host_id': user_ids[i], 'block_id': block_ids[i], 'zone_id': zone_ids[i],
+         'organizer_id': admin.id, 'date': datetime.now()}
+        for i in range(rows)
+    ])
+    meeting_ids = [meeting_id for meeting_id, in db.session.query(MeetingModel.id)]
+    db.session.execute(insert(PaymentModel), [
+        {'mpesa_id': f"TX{i:08d}", 'account_number': f"M{i:08d}", 'source_phone_number': "254700000000",
+         'amount': 100, 'payment_date': datetime.now(), 'transaction_status': 'completed', 'payer_id': user_ids[i],
+         'block_id': block_ids[i], 'meeting_id': meeting_ids[i], 'first_name': "Member", 'last_name': str(i)}
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def measure(label, func, encode):
+    db.session.expunge_all()
+    start = time.perf_counter()
+    with count_queries() as counter:
+        result = func()
+    serialized = (time.perf_counter() - start) * 1000
+    body = encode(result)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"{label:<9} {serialized:>9.1f} ms serialize {elapsed:>9.1f} ms with JSON {counter.count:>5} queries  "
+          f"{len(body)} bytes")
+    return result
+
+
+LISTINGS = (
+    ('users', lambda: marshal(UserModel.query.options(*users.USER_LOAD_OPTIONS).order_by(UserModel.id).all(),
+                              get_user_fields()),
+     users.list_users),
+    ('payments', lambda: marshal(PaymentModel.query.all(), payment_fields), payments.list_payments),
+    ('meetings', lambda: marshal(MeetingModel.query.all(), meeting_fields), meetings.list_meetings),
+    ('blocks', lambda: marshal(BlockModel.query.all(), block_fields), hierarchy.list_blocks),
+    ('zones', lambda: marshal(ZoneModel.query.all(), zone_fields), hierarchy.list_zones)
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    options = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        seed(options.rows)
+        encoder = msgspec.json.Encoder()
+        for name, marshalled, listing in LISTINGS:
+            print(f"{options.rows} {name}")
+            before = measure('marshal', marshalled, lambda data: json.dumps(data).encode())
+            after = measure('rows', listing, encoder.encode)
+            assert before == after
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
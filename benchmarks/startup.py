@@ -0,0 +1,60 @@
+"""
+Time how long a fresh interpreter takes to import and create the app, as
+a gunicorn worker does on boot, and count the network connections it opens.
+
+    python benchmarks/startup.py --runs 5 --config production
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a child interpreter so nothing is already imported
+BOOT = """
+import json, socket, sys, time
+connections = []
+connect = socket.socket.connect
+def counting_connect(self, address):
+    connections.append(str(address))
+    return connect(self, address)
+socket.socket.connect = counting_connect
+
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create': created - imported, 'connections': connections}))
+"""
+
+
+def boot(config_name):
+    output = subprocess.run(
+        [sys.executable, '-c', BOOT, config_name], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--config', default='production')
+    options = parser.parse_args()
+
+    runs = [boot(options.config) for _ in range(options.runs)]
+    imports = [run['import'] * 1000 for run in runs]
+    creates = [run['create'] * 1000 for run in runs]
+    totals = [i + c for i, c in zip(imports, creates)]
+    print(f"{options.runs} boots with the {options.config} config (median)")
+    print(f"import     {statistics.median(imports):>8.1f} ms")
+    print(f"create_app {statistics.median(creates):>8.1f} ms")
+    print(f"total      {statistics.median(totals):>8.1f} ms")
+    print(f"connections {sorted(set(address for run in runs for address in run['connections']))}")
+
+
+if __name__ == '__main__':
+    main()
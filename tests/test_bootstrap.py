@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from sqlalchemy import inspect
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import RoleModel, BankModel, UserModel
+from app.utils import send_sms
+from app.utils.bootstrap import ROLES
+
+
+class TestBootstrap(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def test_create_app_leaves_the_database_alone(self):
+        self.assertEqual(inspect(db.engine).get_table_names(), [])
+
+    def test_bootstrap_command(self):
+        superuser = {
+            'SUPERUSER_1_EMAIL': 'root@example.com', 'SUPERUSER_1_PASSWORD': 'secret',
+            'SUPERUSER_1_ID': '1', 'SUPERUSER_1_NAME': 'Root', 'SUPERUSER_1_PHONE': '0712345678'
+        }
+        runner = self.app.test_cli_runner()
+        with mock.patch.dict(os.environ, superuser):
+            result = runner.invoke(args=['tabpay', 'bootstrap'])
+            self.assertIn(f'Created {len(ROLES)} roles, 1 superusers and', result.output)
+            self.assertGreater(BankModel.query.count(), 0)
+            self.assertEqual([role.name for role in UserModel.query.one().roles], ['SuperUser'])
+
+            result = runner.invoke(args=['tabpay', 'bootstrap'])
+        self.assertIn('Created 0 roles, 0 superusers and 0 banks', result.output)
+        self.assertEqual(RoleModel.query.count(), len(ROLES))
+
+    def test_sms_client_is_created_on_first_use(self):
+        send_sms.reset_sms()
+        with mock.patch.object(send_sms, 'SendSMS', side_effect=ValueError("Missing credentials")) as client:
+            self.assertIsNone(send_sms.get_sms())
+        client.assert_called_once()
+        send_sms.reset_sms()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+import os
+import sys
+import json
+import hashlib
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy.exc import IntegrityError
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import (
+    PaymentModel, MpesaCallbackModel, UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel
+)
+from app.services import callbacks, payments
+
+
+def c2b_payload(trans_id="RKTQDM7W6S", trans_time="20241018120000"):
+    return {
+        "TransactionType": "Pay Bill",
+        "TransID": trans_id,
+        "TransTime": trans_time,
+        "TransAmount": "100.00",
+        "BusinessShortCode": "600638",
+        "BillRefNumber": "ABC12",
+        "MSISDN": "2547********",
+        "FirstName": "Jane"
+    }
+
+
+class TestCallbackQueue(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def test_callback_is_acknowledged_before_it_is_applied(self):
+        response = self.client.post('/api/v1/payments/confirmation', json=c2b_payload())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), {"C2BPaymentConfirmationResult": "Success"})
+
+        self.assertEqual(MpesaCallbackModel.query.filter_by(status='pending').count(), 1)
+        self.assertEqual(PaymentModel.query.count(), 0)
+
+    def test_duplicate_callbacks_are_stored_once(self):
+        for _ in range(3):
+            ack = callbacks.enqueue('confirmation', c2b_payload())
+        self.assertEqual(ack, {"C2BPaymentConfirmationResult": "Success"})
+        self.assertEqual(MpesaCallbackModel.query.count(), 1)
+
+    def test_drain_applies_callbacks_in_order(self):
+        callbacks.enqueue('validation', c2b_payload())
+        callbacks.enqueue('confirmation', c2b_payload())
+
+        self.assertEqual(callbacks.drain(), 2)
+        self.assertEqual(callbacks.drain(), 0)
+
+        payment = PaymentModel.query.filter_by(mpesa_id="RKTQDM7W6S").one()
+        self.assertEqual(payment.transaction_status, 'completed')
+        self.assertEqual(MpesaCallbackModel.query.filter_by(status='done').count(), 2)
+
+    def test_failing_callback_is_retried_then_failed(self):
+        self.app.config['MPESA_CALLBACK_MAX_ATTEMPTS'] = 2
+        try:
+            callbacks.enqueue('confirmation', c2b_payload(trans_time="not-a-date"))
+
+            callbacks.drain()
+            callback = MpesaCallbackModel.query.one()
+            self.assertEqual((callback.status, callback.attempts), ('pending', 1))
+
+            # Not retried before its backoff is up
+            self.assertGreater(callback.next_attempt_at, callbacks._now() + timedelta(seconds=20))
+            self.assertEqual(callbacks.drain(), 0)
+
+            callback.next_attempt_at = callbacks._now() - timedelta(seconds=1)
+            db.session.commit()
+            callbacks.drain()
+            db.session.refresh(callback)
+            self.assertEqual((callback.status, callback.attempts), ('failed', 2))
+            self.assertEqual(PaymentModel.query.count(), 0)
+        finally:
+            self.app.config['MPESA_CALLBACK_MAX_ATTEMPTS'] = 5
+
+    def test_stale_claims_are_reclaimed(self):
+        callbacks.enqueue('validation', c2b_payload())
+        self.assertEqual(len(callbacks.claim_batch()), 1)
+        self.assertEqual(callbacks.claim_batch(), [])
+
+        callback = MpesaCallbackModel.query.one()
+        callback.claimed_at = callback.claimed_at - timedelta(hours=1)
+        db.session.commit()
+        self.assertEqual(len(callbacks.claim_batch()), 1)
+
+    def test_confirmations_in_a_batch_are_upserted_together(self):
+        callbacks.enqueue('validation', c2b_payload("TX0"))
+        for i in range(5):
+            callbacks.enqueue('confirmation', c2b_payload(f"TX{i}"))
+
+        one_at_a_time = mock.Mock(side_effect=AssertionError("applied one at a time"))
+        with mock.patch.dict(callbacks.CALLBACK_HANDLERS, confirmation=one_at_a_time):
+            self.assertEqual(callbacks.drain(), 6)
+
+        self.assertEqual(PaymentModel.query.count(), 5)
+        self.assertEqual(PaymentModel.query.filter_by(transaction_status='completed').count(), 5)
+        self.assertEqual(MpesaCallbackModel.query.filter_by(status='done').count(), 6)
+
+    def test_bad_confirmation_does_not_block_the_batch(self):
+        callbacks.enqueue('confirmation', c2b_payload("TX1"))
+        callbacks.enqueue('confirmation', c2b_payload("TX2", trans_time="not-a-date"))
+
+        self.assertEqual(callbacks.drain(), 2)
+        self.assertEqual([p.mpesa_id for p in PaymentModel.query.all()], ["TX1"])
+        self.assertEqual(MpesaCallbackModel.query.filter_by(status='pending').count(), 1)
+
+    def test_unmatched_stk_result_is_retried(self):
+        callbacks.enqueue('stk', {"Body": {"stkCallback": {
+            "MerchantRequestID": "MR1", "CheckoutRequestID": "ws_CO_1", "ResultCode": "0", "ResultDesc": "Success",
+            "CallbackMetadata": {"Item": [{"Name": "MpesaReceiptNumber", "Value": "RCPT1"}]}
+        }}})
+        callbacks.drain()
+        callback = MpesaCallbackModel.query.one()
+        self.assertEqual((callback.status, callback.attempts), ('pending', 1))
+
+        # The push's pending payment is stored after its result arrived
+        db.session.add(PaymentModel(mpesa_id="ws_CO_1", checkout_request_id="ws_CO_1", merchant_request_id="MR1",
+                                    account_number="ABC12", source_phone_number="254700000000", amount=100,
+                                    transaction_status='pending'))
+        callback.next_attempt_at = callbacks._now()
+        db.session.commit()
+        callbacks.drain()
+
+        db.session.refresh(callback)
+        self.assertEqual(callback.status, 'done')
+        self.assertEqual(PaymentModel.query.one().mpesa_id, "RCPT1")
+
+    def test_workers_start_with_the_app(self):
+        with mock.patch.object(callbacks, 'start_workers') as start_workers:
+            app = create_app('testing')
+        start_workers.assert_called_once_with(app)
+
+    def test_retry_delay_doubles_up_to_a_limit(self):
+        self.assertEqual([callbacks.retry_delay(attempt) for attempt in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual(callbacks.retry_delay(20), callbacks.MAX_RETRY_DELAY)
+
+
+class TestConfirmationUpsert(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_member_and_meeting(self):
+        member_role = RoleModel.query.filter_by(name='Member').first()
+        if not member_role:
+            member_role = RoleModel(name='Member', description='Regular member')
+        member = UserModel(full_name="Jane Member", id_number=1, phone_number="0712345678")
+        member.roles.append(member_role)
+        db.session.add(member)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=member.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block", parent_umbrella_id=umbrella.id, created_by=member.id, initials="BL")
+        db.session.add(block)
+        db.session.flush()
+        zone = ZoneModel(name="Zone", parent_block_id=block.id, created_by=member.id)
+        db.session.add(zone)
+        db.session.flush()
+        member.block_memberships.append(block)
+        meeting = MeetingModel(host_id=member.id, block_id=block.id, zone_id=zone.id,
+                               organizer_id=member.id, date=datetime.now())
+        db.session.add(meeting)
+        db.session.commit()
+        return member, block, meeting
+
+    def test_upsert_completes_existing_payment(self):
+        member, block, meeting = self.create_member_and_meeting()
+        payments.apply_validation(c2b_payload("TX1"))
+
+        data = dict(c2b_payload("TX1"), BillRefNumber=meeting.unique_id,
+                    MSISDN=hashlib.sha256(b"254712345678").hexdigest())
+        self.assertEqual(payments.upsert_confirmations([data, data]), 1)
+
+        payment = PaymentModel.query.one()
+        self.assertEqual(payment.transaction_status, 'completed')
+        self.assertEqual((payment.payer_id, payment.block_id, payment.meeting_id), (member.id, block.id, meeting.id))
+
+    def test_upsert_many_confirmations(self):
+        items = [c2b_payload(f"TX{i}") for i in range(600)]
+        self.assertEqual(payments.upsert_confirmations(items), 600)
+        payments.upsert_confirmations(items[:10])
+        self.assertEqual(PaymentModel.query.count(), 600)
+
+    def test_fallback_without_on_conflict_support(self):
+        payments.apply_validation(c2b_payload("TX1"))
+        with mock.patch.dict(payments.UPSERT_DIALECTS, clear=True):
+            payments.upsert_confirmations([c2b_payload("TX1"), c2b_payload("TX2")])
+        self.assertEqual(PaymentModel.query.filter_by(transaction_status='completed').count(), 2)
+        self.assertEqual(PaymentModel.query.count(), 2)
+
+    def test_mpesa_id_is_unique(self):
+        payments.apply_validation(c2b_payload("TX1"))
+        db.session.add(PaymentModel(mpesa_id="TX1", account_number="A", source_phone_number="1", amount=1))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+if __name__ == '__main__':
+    unittest.main()
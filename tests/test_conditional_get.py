@@ -0,0 +1,117 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from sqlalchemy import update
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import BankModel, UserModel, UmbrellaModel, BlockModel, PaymentModel, TableVersionModel
+from app.services import versions
+from app.utils.query_counter import count_queries
+
+
+class TestConditionalGet(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        db.session.add(BankModel(name="Test Bank", paybill_no="123456"))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def version(self, table):
+        return versions.table_versions([table])[table][0]
+
+    def test_unchanged_listing_is_not_modified(self):
+        response = self.client.get('/api/v1/banks/')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+
+        with count_queries() as counter:
+            response = self.client.get('/api/v1/banks/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertFalse([statement for statement in counter.statements if 'FROM banks' in statement])
+
+        response = self.client.get('/api/v1/banks/', headers={
+            'If-Modified-Since': last_modified
+        })
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get('/api/v1/banks/').headers['ETag']
+        db.session.add(BankModel(name="Other Bank", paybill_no="654321"))
+        db.session.commit()
+
+        response = self.client.get('/api/v1/banks/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()), 2)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_filters_have_their_own_etag(self):
+        self.assertNotEqual(self.client.get('/api/v1/users/').headers['ETag'],
+                            self.client.get('/api/v1/users/?role=Member').headers['ETag'])
+
+    def test_single_items_are_not_conditional(self):
+        bank_id = BankModel.query.first().id
+        self.assertNotIn('ETag', self.client.get(f'/api/v1/banks/{bank_id}').headers)
+
+    def test_membership_and_bulk_writes_are_counted(self):
+        user = UserModel(full_name="Member", email="member@example.com")
+        db.session.add(user)
+        db.session.flush()
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=user.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block", parent_umbrella_id=umbrella.id, created_by=user.id)
+        db.session.add(block)
+        db.session.commit()
+
+        member_blocks = self.version('member_blocks')
+        user.block_memberships.append(block)
+        db.session.commit()
+        self.assertEqual(self.version('member_blocks'), member_blocks + 1)
+
+        payments = self.version('payments')
+        db.session.execute(update(PaymentModel).values(amount=1))
+        db.session.commit()
+        self.assertEqual(self.version('payments'), payments + 1)
+
+    def test_rolled_back_writes_are_not_counted(self):
+        banks = self.version('banks')
+        db.session.add(BankModel(name="Other Bank", paybill_no="654321"))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+        self.assertEqual(self.version('banks'), banks)
+        self.assertEqual(TableVersionModel.query.filter_by(table_name='mpesa_callbacks').count(), 0)
+
+    def test_write_and_version_commit_together(self):
+        banks = self.version('banks')
+        db.session.add(BankModel(name="Other Bank", paybill_no="654321"))
+        with mock.patch.object(versions, 'bump', side_effect=RuntimeError("bump failed")):
+            with self.assertRaises(RuntimeError):
+                db.session.commit()
+        db.session.rollback()
+        self.assertEqual(BankModel.query.filter_by(paybill_no="654321").count(), 0)
+        self.assertEqual(self.version('banks'), banks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,356 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel, PaymentModel
+from app.services import ServiceError, callbacks, contributions
+from app.utils.query_counter import count_queries
+
+
+class FakeMpesaClient:
+    """Records STK pushes instead of calling Daraja"""
+
+    def __init__(self, failing_numbers=()):
+        self.failing_numbers = failing_numbers
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def initiate_payment(self, amount, phone_number, bill_ref_number):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        if phone_number in self.failing_numbers:
+            raise ValueError("Invalid phone number")
+        return {
+            'ResponseCode': '0',
+            'CheckoutRequestID': f'ws_CO_{phone_number}',
+            'MerchantRequestID': f'MR_{phone_number}'
+        }
+
+
+class TestBulkContributions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app.config.update(MPESA_STK_CONCURRENCY=2, MPESA_STK_RATE_LIMIT=1000)
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_test_data(self):
+        admin = UserModel(email="admin@example.com", full_name="Admin User", is_approved=True)
+        db.session.add(admin)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Test Umbrella", location="Bomet", created_by=admin.id, initials="TU")
+        db.session.add(umbrella)
+        db.session.flush()
+
+        block = BlockModel(name="Test Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="TB")
+        db.session.add(block)
+        db.session.flush()
+
+        zone = ZoneModel(name="Test Zone", parent_block_id=block.id, created_by=admin.id)
+        other_zone = ZoneModel(name="Other Zone", parent_block_id=block.id, created_by=admin.id)
+        db.session.add_all([zone, other_zone])
+        db.session.flush()
+
+        for i in range(5):
+            member = UserModel(full_name=f"Member {i}", phone_number=f"07000000{i:02d}", id_number=1000 + i)
+            member.block_memberships.append(block)
+            member.zone_memberships.append(zone if i < 3 else other_zone)
+            db.session.add(member)
+
+        host = db.session.query(UserModel).filter_by(full_name="Member 0").first()
+        meeting = MeetingModel(host_id=host.id, block_id=block.id, zone_id=zone.id,
+                               organizer_id=admin.id, date=datetime.now() + timedelta(days=1))
+        db.session.add(meeting)
+        db.session.commit()
+
+        self.admin_id = admin.id
+        self.block_id = block.id
+        self.zone_id = zone.id
+        self.meeting = meeting
+
+    def run_job(self, mpesa, **kwargs):
+        with mock.patch.object(contributions, 'get_mpesa_client', return_value=mpesa):
+            return contributions.request_block_contributions(
+                block_id=self.block_id, amount=100, requested_by=self.admin_id, wait=True, **kwargs
+            )
+
+    def test_pushes_to_every_block_member(self):
+        mpesa = FakeMpesaClient(failing_numbers=('0700000004',))
+        job = contributions.get_job(self.run_job(mpesa)['job_id'])
+
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual((job['total'], job['sent'], job['failed']), (5, 4, 1))
+        self.assertLessEqual(mpesa.max_in_flight, 2)
+
+        pending = PaymentModel.query.filter_by(status='pending').all()
+        self.assertEqual(len(pending), 4)
+        self.assertTrue(all(p.meeting_id == self.meeting.id and p.amount == 100 for p in pending))
+        self.assertEqual(pending[0].account_number, self.meeting.unique_id)
+
+    def test_pending_payments_survive_a_failed_insert(self):
+        insert = contributions.insert
+        calls = []
+
+        def flaky_insert(model):
+            calls.append(model)
+            if len(calls) == 1:
+                raise RuntimeError("database is locked")
+            return insert(model)
+
+        with mock.patch.object(contributions, 'insert', side_effect=flaky_insert):
+            job = contributions.get_job(self.run_job(FakeMpesaClient())['job_id'])
+
+        self.assertEqual((job['status'], job['sent']), ('completed', 5))
+        self.assertEqual(PaymentModel.query.filter_by(status='pending').count(), 5)
+
+    def test_zone_limits_recipients(self):
+        job = self.run_job(FakeMpesaClient(), zone_id=self.zone_id)
+        self.assertEqual(job['total'], 3)
+
+    def test_stk_callback_completes_pending_payment(self):
+        self.run_job(FakeMpesaClient())
+        callbacks.enqueue('stk', {"Body": {"stkCallback": {
+            "MerchantRequestID": "MR_0700000001",
+            "CheckoutRequestID": "ws_CO_0700000001",
+            "ResultCode": "0",
+            "ResultDesc": "Success",
+            "CallbackMetadata": {"Item": [{"Name": "MpesaReceiptNumber", "Value": "RCPT001"}]}
+        }}})
+        self.assertEqual(callbacks.drain(), 1)
+
+        payment = PaymentModel.query.filter_by(checkout_request_id="ws_CO_0700000001").first()
+        self.assertEqual(payment.transaction_status, 'completed')
+        self.assertEqual(payment.mpesa_id, 'RCPT001')
+
+    def test_rejects_zone_outside_block(self):
+        with self.assertRaises(ServiceError) as ctx:
+            self.run_job(FakeMpesaClient(), zone_id=999)
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_api_requires_login(self):
+        response = self.client.post('/api/v1/payments/stk/bulk', json={'block_id': self.block_id, 'amount': 100})
+        self.assertEqual(response.status_code, 401)
+
+    def test_bulk_push_api_is_scoped(self):
+        job_id = self.run_job(FakeMpesaClient())['job_id']
+        headers = {'Accept': 'application/json'}
+
+        self.login(self.other_umbrella_treasurer(), 'Administrator')
+        with self.app.app_context():
+            response = self.client.post('/api/v1/payments/stk/bulk', json={'block_id': self.block_id, 'amount': 100},
+                                        headers=headers)
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get(f'/api/v1/payments/stk/bulk/{job_id}', headers=headers)
+            self.assertEqual(response.status_code, 404)
+
+        self.login(self.admin_id, 'Administrator')
+        with self.app.app_context():
+            response = self.client.get(f'/api/v1/payments/stk/bulk/{job_id}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['sent'], 5)
+
+    def test_jobs_share_one_rate_limiter(self):
+        contributions.reset_rate_limiter()
+        self.addCleanup(contributions.reset_rate_limiter)
+        self.assertIs(contributions.get_rate_limiter(5), contributions.get_rate_limiter(5))
+
+    def add_payment(self, full_name, amount, status='completed', block_id=None):
+        payer = UserModel.query.filter_by(full_name=full_name).one()
+        db.session.add(PaymentModel(
+            mpesa_id=f"TX{PaymentModel.query.count()}", account_number=self.meeting.unique_id,
+            source_phone_number=payer.phone_number, amount=amount, transaction_status=status,
+            payer_id=payer.id, block_id=block_id or self.block_id, meeting_id=self.meeting.id
+        ))
+        db.session.commit()
+
+    def test_contribution_stats(self):
+        self.add_payment("Member 0", 100)
+        self.add_payment("Member 0", 50)
+        self.add_payment("Member 3", 200)
+        self.add_payment("Member 1", 100, status='pending')
+        self.add_payment("Member 2", 100, status='failed')
+
+        with count_queries() as counter:
+            stats = contributions.contribution_stats(block_id=self.block_id)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual((stats['members'], stats['contributed'], stats['pending']), (5, 2, 3))
+        self.assertEqual(stats['total_amount'], 350)
+
+        stats = contributions.contribution_stats(block_id=self.block_id, zone_id=self.zone_id)
+        self.assertEqual((stats['members'], stats['contributed'], stats['total_amount']), (3, 1, 150))
+
+        stats = contributions.contribution_stats(meeting_id=self.meeting.id)
+        self.assertEqual((stats['members'], stats['contributed']), (5, 2))
+
+    def test_contribution_stats_needs_a_block_or_meeting(self):
+        with self.assertRaises(ServiceError):
+            contributions.contribution_stats()
+
+    def login(self, user_id, role=None):
+        user = db.session.get(UserModel, user_id)
+        user.active = True
+        if role:
+            user.roles.append(RoleModel.query.filter_by(name=role).first() or RoleModel(name=role))
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = user.fs_uniquifier
+            session['_fresh'] = True
+
+    def other_umbrella_treasurer(self):
+        treasurer = UserModel(email="other@example.com", full_name="Other Treasurer", is_approved=True)
+        db.session.add(treasurer)
+        db.session.flush()
+        db.session.add(UmbrellaModel(name="Other", location="Kericho", created_by=treasurer.id, initials="OT"))
+        db.session.commit()
+        return treasurer.id
+
+    def test_contribution_stats_api_is_scoped(self):
+        self.add_payment("Member 4", 100)
+        headers = {'Accept': 'application/json'}
+        member_id = UserModel.query.filter_by(full_name="Member 1").one().id
+
+        self.login(member_id)
+        with self.app.app_context():
+            response = self.client.get('/api/v1/payments/stats', query_string={'block_id': self.block_id},
+                                       headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.login(self.other_umbrella_treasurer(), 'Treasurer')
+        with self.app.app_context():
+            response = self.client.get('/api/v1/payments/stats', query_string={'block_id': self.block_id},
+                                       headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.login(self.admin_id, 'Treasurer')
+        with self.app.app_context():
+            response = self.client.get('/api/v1/payments/stats', query_string={'meeting_id': self.meeting.id},
+                                       headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['contributed'], 1)
+
+    def make_members(self):
+        member_role = RoleModel.query.filter_by(name='Member').first()
+        if not member_role:
+            member_role = RoleModel(name='Member', description='Regular member')
+        for member in UserModel.query.filter(UserModel.full_name.like("Member %")):
+            member.roles.append(member_role)
+        db.session.commit()
+
+    def test_member_contribution_report(self):
+        self.make_members()
+        self.add_payment("Member 1", 100)
+        self.add_payment("Member 3", 200)
+        self.add_payment("Member 3", 50)
+        self.add_payment("Member 4", 100, status='pending')
+        # Namesakes are told apart by id
+        UserModel.query.filter_by(full_name="Member 1").one().full_name = "Member 0"
+        db.session.commit()
+        member_0 = UserModel.query.filter_by(full_name="Member 0").order_by(UserModel.id).first()
+        meeting_id = self.meeting.id
+
+        with count_queries() as counter:
+            report = contributions.member_contribution_report(meeting_id=meeting_id)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual([(row['full_name'], row['amount'], row['status']) for row in report], [
+            ("Member 0", 0, 'Pending'),
+            ("Member 0", 100, 'Contributed'),
+            ("Member 2", 0, 'Pending'),
+            ("Member 3", 250, 'Contributed'),
+            ("Member 4", 0, 'Pending')
+        ])
+
+        contributed = contributions.member_contribution_report(meeting_id=meeting_id, status='Contributed')
+        self.assertEqual([row['id'] for row in contributed], [member_0.id + 1, member_0.id + 3])
+
+        in_zone = contributions.member_contribution_report(meeting_id=meeting_id, zone_id=self.zone_id,
+                                                           status='Pending')
+        self.assertEqual([row['id'] for row in in_zone], [member_0.id, member_0.id + 2])
+
+        page = contributions.member_contribution_report(meeting_id=meeting_id, member_ids=[member_0.id])
+        self.assertEqual(len(page), 1)
+
+    def test_contribution_stats_route(self):
+        self.add_payment("Member 4", 100)
+        url = f'/get_contribution_stats/{self.block_id}'
+        headers = {'Accept': 'application/json'}
+        with self.app.app_context():
+            self.assertNotEqual(self.client.get(url, headers=headers).status_code, 200)
+
+        self.login(self.other_umbrella_treasurer(), 'Treasurer')
+        with self.app.app_context():
+            self.assertEqual(self.client.get(url, headers=headers).status_code, 403)
+
+        self.login(self.admin_id, 'Treasurer')
+        with self.app.app_context():
+            response = self.client.get(url, headers=headers)
+        self.assertEqual(response.json, {'contributed': 1, 'pending': 4})
+
+    def test_member_contribution_report_api_is_scoped(self):
+        self.make_members()
+        self.add_payment("Member 1", 100)
+        headers = {'Accept': 'application/json'}
+
+        self.login(UserModel.query.filter_by(full_name="Member 1").one().id)
+        with self.app.app_context():
+            response = self.client.get('/api/v1/payments/report', headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.login(self.other_umbrella_treasurer(), 'Treasurer')
+        with self.app.app_context():
+            self.assertEqual(self.client.get('/api/v1/payments/report', headers=headers).json, [])
+            response = self.client.get('/api/v1/payments/report', query_string={'meeting_id': self.meeting.id},
+                                       headers=headers)
+        self.assertEqual(response.status_code, 403)
+
+        self.login(self.admin_id, 'Treasurer')
+        with self.app.app_context():
+            report = self.client.get('/api/v1/payments/report', headers=headers).json
+        self.assertEqual(len(report), 5)
+
+    def test_member_contribution_report_by_host(self):
+        self.make_members()
+        self.add_payment("Member 2", 100)
+        self.assertEqual(
+            contributions.member_contribution_report(host_id=self.meeting.host_id, status='Contributed')[0]['amount'], 100
+        )
+        self.assertEqual(
+            contributions.member_contribution_report(host_id=self.admin_id, status='Contributed'), []
+        )
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = contributions.RateLimiter(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import sys
+import csv
+import json
+import unittest
+from datetime import datetime
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, BankModel, PaymentModel
+from app.services import exports
+
+
+class TestExports(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def role(self, name):
+        role = RoleModel.query.filter_by(name=name).first()
+        if not role:
+            role = RoleModel(name=name)
+            db.session.add(role)
+        return role
+
+    def create_test_data(self):
+        treasurer = UserModel(email="treasurer@example.com", full_name="Treasurer", active=True)
+        treasurer.roles.append(self.role('Treasurer'))
+        db.session.add(treasurer)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=treasurer.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block A", parent_umbrella_id=umbrella.id, initials="BA")
+        other_block = BlockModel(name="Block B", parent_umbrella_id=umbrella.id, initials="BB")
+        bank = BankModel(name="Test Bank", paybill_no="123456")
+        db.session.add_all([block, other_block, bank])
+        db.session.flush()
+        zone = ZoneModel(name="Zone", parent_block_id=block.id)
+        db.session.add(zone)
+        db.session.flush()
+
+        member = UserModel(full_name="Jane, Member", id_number=1234, phone_number="0712345678",
+                           bank_id=bank.id, zone_id=zone.id)
+        member.roles.append(self.role('Member'))
+        member.block_memberships.append(block)
+        member.zone_memberships.append(zone)
+        db.session.add(member)
+        db.session.flush()
+
+        db.session.add_all([
+            PaymentModel(mpesa_id=f"TX{day:02d}", account_number="ACC", source_phone_number="254712345678",
+                         amount=100 * day, payment_date=datetime(2024, 1, day, 12), payer_id=member.id,
+                         block_id=block.id if day % 2 else other_block.id)
+            for day in range(1, 11)
+        ])
+        db.session.commit()
+        self.treasurer_uniquifier = treasurer.fs_uniquifier
+        self.block_id = block.id
+        self.umbrella_id = umbrella.id
+
+    def other_umbrella_treasurer(self):
+        treasurer = UserModel(email="other@example.com", full_name="Other Treasurer", active=True)
+        treasurer.roles.append(self.role('Treasurer'))
+        db.session.add(treasurer)
+        db.session.flush()
+        db.session.add(UmbrellaModel(name="Other", location="Kericho", created_by=treasurer.id, initials="OT"))
+        db.session.commit()
+        return treasurer.fs_uniquifier
+
+    def export(self, path, user=None, **params):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = user or self.treasurer_uniquifier
+            session['_fresh'] = True
+        with self.app.app_context():
+            return self.client.get(path, query_string=params, headers={'Accept': 'application/json'})
+
+    def test_payments_csv_by_block_and_date(self):
+        response = self.export('/api/v1/payments/export', block_id=self.block_id, start='2024-01-03', end='2024-01-07')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn('filename=payments.csv', response.headers['Content-Disposition'])
+
+        rows = list(csv.DictReader(response.get_data(as_text=True).splitlines()))
+        self.assertEqual([row['mpesa_id'] for row in rows], ["TX03", "TX05", "TX07"])
+        self.assertEqual(rows[0]['payer_full_name'], "Jane, Member")
+        self.assertEqual(rows[0]['block_name'], "Block A")
+
+    def test_payments_ndjson(self):
+        response = self.export('/api/v1/payments/export', umbrella_id=self.umbrella_id, format='ndjson')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        payments = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(payments), 10)
+        self.assertEqual(payments[-1]['amount'], 1000)
+
+    def test_members_csv(self):
+        response = self.export('/api/v1/users/export', block_id=self.block_id)
+        rows = list(csv.DictReader(response.get_data(as_text=True).splitlines()))
+        self.assertEqual([(row['full_name'], row['bank_name']) for row in rows], [("Jane, Member", "Test Bank")])
+
+    def test_exports_are_limited_to_the_callers_umbrella(self):
+        other = self.other_umbrella_treasurer()
+        for path in ('/api/v1/payments/export', '/api/v1/users/export'):
+            response = self.export(path, user=other, format='ndjson')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_data(as_text=True), '')
+
+            response = self.export(path, user=other, umbrella_id=self.umbrella_id)
+            self.assertEqual(response.status_code, 403)
+            response = self.export(path, user=other, block_id=self.block_id)
+            self.assertEqual(response.status_code, 403)
+
+    def test_export_requires_login(self):
+        response = self.client.get('/api/v1/payments/export', headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_rows_are_written_in_batches(self):
+        chunks = list(exports.stream_rows(exports.payments_query(), batch_size=3))
+        # The header with the first batch, then one chunk per batch
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(sum(chunk.count('\n') for chunk in chunks), 11)
+
+    def test_empty_export_has_a_header(self):
+        chunks = list(exports.stream_rows(exports.payments_query(meeting_id=999)))
+        self.assertEqual(''.join(chunks).splitlines(), [','.join(exports.payments_query().selected_columns.keys())])
+
+
+if __name__ == '__main__':
+    unittest.main()
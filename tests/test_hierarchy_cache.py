@@ -0,0 +1,193 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, UmbrellaModel, BlockModel, ZoneModel
+from app.services import hierarchy
+from app.utils.hierarchy_cache import LRUCache, create_hierarchy_cache
+from config import config
+from app.utils.query_counter import count_queries
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(threshold=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        cache = LRUCache(default_timeout=60)
+        with mock.patch('app.utils.hierarchy_cache.time.time', return_value=1000):
+            cache.set('a', 1)
+        with mock.patch('app.utils.hierarchy_cache.time.time', return_value=1059):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('app.utils.hierarchy_cache.time.time', return_value=1061):
+            self.assertIsNone(cache.get('a'))
+
+
+class TestSharedCache(unittest.TestCase):
+    def test_production_workers_share_invalidation(self):
+        if 'HIERARCHY_CACHE' not in os.environ:
+            self.assertEqual(config['production'].HIERARCHY_CACHE, 'file')
+
+        # Two workers on one host, each with its own cache object
+        worker_1 = create_hierarchy_cache('file')
+        worker_2 = create_hierarchy_cache('file')
+        self.addCleanup(worker_1.delete, 'test-tree')
+        worker_1.set('test-tree', {'blocks': []})
+        self.assertEqual(worker_2.get('test-tree'), {'blocks': []})
+        worker_2.delete('test-tree')
+        self.assertIsNone(worker_1.get('test-tree'))
+
+
+class TestUmbrellaTreeCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        admin = UserModel(email="admin@example.com", full_name="Admin User", active=True)
+        db.session.add(admin)
+        db.session.flush()
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=admin.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block A", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="BA")
+        db.session.add(block)
+        db.session.flush()
+        zone = ZoneModel(name="Zone A", parent_block_id=block.id, created_by=admin.id)
+        db.session.add(zone)
+        db.session.commit()
+        self.admin_id = admin.id
+        self.umbrella_id = umbrella.id
+        self.block_id = block.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def zone_names(self):
+        return {block['name']: [zone['name'] for zone in block['zones']]
+                for block in hierarchy.umbrella_tree(self.umbrella_id)['blocks']}
+
+    def test_tree_is_cached_across_requests(self):
+        self.assertEqual(self.zone_names(), {"Block A": ["Zone A"]})
+        self.assertEqual(hierarchy.user_umbrella_id(self.admin_id), self.umbrella_id)
+        with count_queries() as counter:
+            self.zone_names()
+            hierarchy.user_umbrella_id(self.admin_id)
+        self.assertEqual(counter.count, 0)
+
+    def test_creating_blocks_and_zones_invalidates_the_tree(self):
+        self.zone_names()
+        response = self.client.post('/api/v1/blocks/', json={
+            'name': "Block B", 'parent_umbrella_id': self.umbrella_id, 'created_by': self.admin_id
+        })
+        self.assertEqual(response.status_code, 201)
+        block_id = response.get_json()['id']
+        self.assertEqual(self.zone_names(), {"Block A": ["Zone A"], "Block B": []})
+
+        response = self.client.post('/api/v1/zones/', json={
+            'name': "Zone B", 'parent_block_id': block_id, 'created_by': self.admin_id
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.zone_names(), {"Block A": ["Zone A"], "Block B": ["Zone B"]})
+
+    def test_updating_and_deleting_invalidates_the_tree(self):
+        self.zone_names()
+        zone_id = ZoneModel.query.one().id
+        response = self.client.patch(f'/api/v1/zones/{zone_id}', json={
+            'name': "Zone Z", 'parent_block_id': self.block_id, 'created_by': self.admin_id
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.zone_names(), {"Block A": ["Zone Z"]})
+
+        self.assertEqual(self.client.delete(f'/api/v1/zones/{zone_id}').status_code, 200)
+        self.assertEqual(self.zone_names(), {"Block A": []})
+
+    def login(self):
+        admin = db.session.get(UserModel, self.admin_id)
+        with self.client.session_transaction() as session:
+            session['_user_id'] = admin.fs_uniquifier
+            session['_fresh'] = True
+
+    def get_tree(self, umbrella_id, **kwargs):
+        # A fresh app context per request keeps the cached login out of the next one
+        with self.app.app_context():
+            return self.client.get(f'/api/v1/umbrellas/{umbrella_id}/tree', **kwargs)
+
+    def test_tree_endpoint(self):
+        block = db.session.get(BlockModel, self.block_id)
+        zone = ZoneModel.query.one()
+        for i in range(3):
+            member = UserModel(full_name=f"Member {i}", id_number=i + 1)
+            member.block_memberships.append(block)
+            if i:
+                member.zone_memberships.append(zone)
+            db.session.add(member)
+        db.session.commit()
+
+        response = self.get_tree(self.umbrella_id, headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 401)
+        self.login()
+        with count_queries() as counter:
+            response = self.get_tree(self.umbrella_id)
+        self.assertEqual(response.status_code, 200)
+        tree = response.get_json()
+        self.assertEqual(tree['name'], "Umbrella")
+        self.assertEqual([(block['name'], block['member_count']) for block in tree['blocks']], [("Block A", 3)])
+        self.assertEqual([(zone['name'], zone['member_count']) for zone in tree['blocks'][0]['zones']],
+                         [("Zone A", 2)])
+        tree_queries = [statement for statement in counter.statements if 'FROM umbrellas' in statement and 'blocks' in statement]
+        self.assertEqual(len(tree_queries), 1)
+
+        etag = response.headers['ETag']
+        self.assertEqual(self.get_tree(self.umbrella_id, headers={'If-None-Match': etag}).status_code, 304)
+
+        hierarchy.create_zone("Zone B", self.block_id, self.admin_id)
+        response = self.get_tree(self.umbrella_id, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['blocks'][0]['zones']), 2)
+        self.assertEqual(self.get_tree(999).status_code, 403)
+
+    def test_tree_is_limited_to_the_callers_umbrella(self):
+        other = UserModel(email="other@example.com", full_name="Other User", active=True)
+        db.session.add(other)
+        db.session.flush()
+        other_umbrella = UmbrellaModel(name="Other", location="Kericho", created_by=other.id, initials="OT")
+        db.session.add(other_umbrella)
+        db.session.commit()
+        other_umbrella_id = other_umbrella.id
+
+        self.login()
+        self.assertEqual(self.get_tree(other_umbrella_id).status_code, 403)
+        self.assertEqual(self.get_tree(self.umbrella_id).status_code, 200)
+
+    def test_new_umbrella_is_found_for_its_creator(self):
+        other = UserModel(email="other@example.com", full_name="Other User")
+        db.session.add(other)
+        db.session.commit()
+        self.assertIsNone(hierarchy.user_umbrella_id(other.id))
+
+        umbrella = hierarchy.create_umbrella("Second", "Nairobi", other.id)
+        self.assertEqual(hierarchy.user_umbrella_id(other.id), umbrella['id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
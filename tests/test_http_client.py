@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.utils import http_client
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    hits = 0
+
+    def do_GET(self):
+        KeepAliveHandler.hits += 1
+        self.send_response(503 if self.path == '/unavailable' else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def do_POST(self):
+        KeepAliveHandler.hits += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(503)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'no')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        http_client.reset_http_session()
+
+    def setUp(self):
+        http_client.reset_http_session()
+        KeepAliveHandler.hits = 0
+
+    def test_session_is_shared(self):
+        with self.app.app_context():
+            self.assertIs(http_client.get_http_session(), http_client.get_http_session())
+
+    def test_connections_are_reused(self):
+        with self.app.app_context():
+            session = http_client.get_http_session()
+            for _ in range(3):
+                session.get(f'{self.base_url}/ok')
+
+        stats = http_client.pool_stats()[f'http://127.0.0.1:{self.server.server_port}']
+        self.assertEqual(stats, {'requests': 3, 'hits': 2, 'misses': 1})
+
+    def test_pool_settings_come_from_config(self):
+        self.app.config['HTTP_POOL_MAXSIZE'] = 7
+        self.app.config['HTTP_TIMEOUT'] = 4
+        try:
+            with self.app.app_context():
+                adapter = http_client.get_http_session().get_adapter('https://api.safaricom.co.ke')
+        finally:
+            self.app.config['HTTP_POOL_MAXSIZE'] = 20
+            self.app.config['HTTP_TIMEOUT'] = 30
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.timeout, 4)
+
+    def test_only_idempotent_requests_are_retried(self):
+        self.app.config['HTTP_RETRY_BACKOFF'] = 0
+        try:
+            with self.app.app_context():
+                session = http_client.get_http_session()
+                session.post(f'{self.base_url}/stk', json={'Amount': 1})
+                self.assertEqual(KeepAliveHandler.hits, 1)
+
+                session.get(f'{self.base_url}/unavailable')
+        finally:
+            self.app.config['HTTP_RETRY_BACKOFF'] = 0.5
+        self.assertEqual(KeepAliveHandler.hits, 1 + 1 + self.app.config['HTTP_MAX_RETRIES'])
+
+if __name__ == '__main__':
+    unittest.main()
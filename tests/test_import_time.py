@@ -0,0 +1,50 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative milliseconds `import app` may take; raise it per machine with TABPAY_IMPORT_BUDGET_MS
+IMPORT_BUDGET_MS = float(os.environ.get('TABPAY_IMPORT_BUDGET_MS', 1500))
+
+# Loaded on first use instead of with the app
+LAZY_MODULES = ('PIL', 'africastalking', 'flask_admin', 'psutil', 'requests')
+
+
+def import_times(statement='import app'):
+    """
+    Run ``statement`` in a fresh interpreter under ``-X importtime``.
+
+    Returns:
+        dict: Cumulative microseconds per imported module
+    """
+    # Without the M-Pesa settings, importing must not validate the config
+    env = {key: value for key, value in os.environ.items() if not key.startswith('MPESA_')}
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The first run writes bytecode caches; time the second
+        import_times()
+        cls.times = import_times()
+
+    def test_import_within_budget(self):
+        self.assertLess(self.times['app'] / 1000, IMPORT_BUDGET_MS)
+
+    def test_heavy_modules_are_lazy(self):
+        self.assertEqual([name for name in LAZY_MODULES if name in self.times], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
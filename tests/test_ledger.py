@@ -0,0 +1,201 @@
+import os
+import sys
+import hashlib
+import unittest
+from datetime import datetime
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import (
+    PaymentModel, UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel,
+    MeetingContributionSummaryModel
+)
+from app.services import callbacks, contributions, ledger, payments, users
+from app.utils.bootstrap import bootstrap
+
+
+def c2b_payload(trans_id, amount="100.00", bill_ref="ABC12", phone="254712345678", trans_time="20241018120000"):
+    return {
+        "TransactionType": "Pay Bill",
+        "TransID": trans_id,
+        "TransTime": trans_time,
+        "TransAmount": amount,
+        "BusinessShortCode": "600638",
+        "BillRefNumber": bill_ref,
+        "MSISDN": hashlib.sha256(phone.encode()).hexdigest(),
+        "FirstName": "Jane"
+    }
+
+
+class TestContributionLedger(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_test_data(self):
+        member_role = RoleModel.query.filter_by(name='Member').first()
+        if not member_role:
+            member_role = RoleModel(name='Member', description='Regular member')
+        admin = UserModel(email="admin@example.com", full_name="Admin User")
+        db.session.add(admin)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=admin.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="BL")
+        db.session.add(block)
+        db.session.flush()
+        zone = ZoneModel(name="Zone", parent_block_id=block.id, created_by=admin.id)
+        db.session.add(zone)
+        db.session.flush()
+
+        for i, phone in enumerate(("0712345678", "0712345679")):
+            member = UserModel(full_name=f"Member {i}", id_number=100 + i, phone_number=phone, zone_id=zone.id)
+            member.roles.append(member_role)
+            member.block_memberships.append(block)
+            db.session.add(member)
+        db.session.flush()
+
+        meeting = MeetingModel(host_id=admin.id, block_id=block.id, zone_id=zone.id,
+                               organizer_id=admin.id, date=datetime.now())
+        db.session.add(meeting)
+        db.session.commit()
+
+        self.block_id = block.id
+        self.zone_id = zone.id
+        self.meeting_id = meeting.id
+        self.bill_ref = meeting.unique_id
+
+    def summary(self):
+        return [
+            (row.block_id, row.zone_id, row.payment_count, row.total_amount)
+            for row in MeetingContributionSummaryModel.query.filter_by(meeting_id=self.meeting_id)
+        ]
+
+    def test_confirmed_payments_are_summed_once(self):
+        payments.apply_validation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        payments.apply_confirmation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        payments.apply_confirmation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        payments.apply_confirmation(c2b_payload("TX2", amount="50", bill_ref=self.bill_ref, phone="254712345679"))
+
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 2, 150)])
+        self.assertEqual(ledger.block_totals(self.meeting_id), {self.block_id: 150})
+
+    def test_payments_without_a_meeting_are_not_summed(self):
+        payments.apply_confirmation(c2b_payload("TX1"))
+        self.assertEqual(MeetingContributionSummaryModel.query.count(), 0)
+
+    def test_batched_confirmations_update_the_summary(self):
+        for i in range(5):
+            callbacks.enqueue('confirmation', c2b_payload(f"TX{i}", bill_ref=self.bill_ref))
+        self.assertEqual(callbacks.drain(), 5)
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 5, 500)])
+
+    def test_stk_callback_adds_completed_push(self):
+        member = UserModel.query.filter_by(full_name="Member 1").one()
+        db.session.add(PaymentModel(
+            mpesa_id="ws_CO_1", checkout_request_id="ws_CO_1", merchant_request_id="MR_1",
+            account_number=self.bill_ref, source_phone_number=member.phone_number, amount=80,
+            transaction_status='pending', payer_id=member.id, block_id=self.block_id, meeting_id=self.meeting_id
+        ))
+        db.session.commit()
+        callback = {"Body": {"stkCallback": {
+            "MerchantRequestID": "MR_1",
+            "CheckoutRequestID": "ws_CO_1",
+            "ResultCode": "0",
+            "ResultDesc": "Success",
+            "CallbackMetadata": {"Item": [{"Name": "MpesaReceiptNumber", "Value": "RCPT1"}]}
+        }}}
+
+        payments.apply_stk_callback(callback)
+        payments.apply_stk_callback(callback)
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 1, 80)])
+
+    def test_rebuild_matches_incremental_summary(self):
+        payments.apply_confirmation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        payments.apply_confirmation(c2b_payload("TX2", amount="50", bill_ref=self.bill_ref, phone="254712345679"))
+        incremental = self.summary()
+
+        MeetingContributionSummaryModel.query.delete()
+        db.session.commit()
+        self.assertEqual(ledger.rebuild_summary(), 1)
+        self.assertEqual(self.summary(), incremental)
+
+    def test_payment_edits_update_the_summary(self):
+        member = UserModel.query.filter_by(full_name="Member 0").one()
+        other_meeting = MeetingModel(host_id=member.id, block_id=self.block_id, zone_id=self.zone_id,
+                                     date=datetime.now())
+        db.session.add(other_meeting)
+        db.session.commit()
+        other_meeting_id = other_meeting.id
+
+        created = payments.create_payment({
+            'mpesa_id': "TX1", 'account_number': self.bill_ref, 'source_phone_number': member.phone_number,
+            'amount': 100, 'transaction_status': 'completed', 'payer_id': member.id,
+            'block_id': self.block_id, 'meeting_id': self.meeting_id
+        })
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 1, 100)])
+
+        payments.update_payment(created['id'], {'amount': 70})
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 1, 70)])
+
+        payments.update_payment(created['id'], {'meeting_id': other_meeting_id})
+        self.assertEqual(self.summary(), [])
+        self.assertEqual(ledger.block_totals(other_meeting_id), {self.block_id: 70})
+
+        payments.delete_payment(created['id'])
+        self.assertEqual(ledger.block_totals(other_meeting_id), {})
+
+    def test_summary_agrees_with_contribution_stats(self):
+        member = UserModel.query.filter_by(full_name="Member 0").one()
+        for mpesa_id, status in (("TX1", 'Completed'), ("TX2", 'Manual'), ("TX3", 'Pending'), ("TX4", 'FAILED')):
+            payments.create_payment({
+                'mpesa_id': mpesa_id, 'account_number': self.bill_ref, 'source_phone_number': member.phone_number,
+                'amount': 10, 'transaction_status': status, 'payer_id': member.id,
+                'block_id': self.block_id, 'meeting_id': self.meeting_id
+            })
+
+        stats = contributions.contribution_stats(block_id=self.block_id, meeting_id=self.meeting_id)
+        self.assertEqual(ledger.block_totals(self.meeting_id), {self.block_id: stats['total_amount']})
+        self.assertEqual(stats['total_amount'], 20)
+
+    def test_zone_change_moves_the_members_payments(self):
+        payments.apply_confirmation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        member = UserModel.query.filter_by(full_name="Member 0").one()
+        new_zone = ZoneModel(name="New Zone", parent_block_id=self.block_id, created_by=member.id)
+        db.session.add(new_zone)
+        db.session.commit()
+
+        users.update_user(member.id, {'zone_id': new_zone.id})
+        self.assertEqual(self.summary(), [(self.block_id, new_zone.id, 1, 100)])
+        incremental = self.summary()
+        ledger.rebuild_summary()
+        self.assertEqual(self.summary(), incremental)
+
+    def test_bootstrap_builds_an_empty_summary(self):
+        payments.apply_confirmation(c2b_payload("TX1", bill_ref=self.bill_ref))
+        MeetingContributionSummaryModel.query.delete()
+        db.session.commit()
+
+        bootstrap()
+        self.assertEqual(self.summary(), [(self.block_id, self.zone_id, 1, 100)])
+
+if __name__ == '__main__':
+    unittest.main()
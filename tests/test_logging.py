@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import logging_config
+from app.utils.logging_config import (
+    JsonFormatter, LazyJson, LazyQueueHandler, SamplingFilter, parse_sample_rates, setup_logger, stop_logging
+)
+
+
+def make_record(name='app', level=logging.INFO, msg='message', args=(), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+class CountingPayload:
+    """Counts how often the payload is serialized"""
+
+    def __init__(self):
+        self.renders = 0
+
+    def __str__(self):
+        self.renders += 1
+        return 'amount'
+
+
+class TestLoggingPipeline(unittest.TestCase):
+    def setUp(self):
+        stop_logging()
+        self.log_dir = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(logging_config, 'LOG_DIR', self.log_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.log_dir.cleanup)
+        self.addCleanup(stop_logging)
+
+    def read_log(self, name):
+        with open(os.path.join(self.log_dir.name, name)) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_setup_is_idempotent(self):
+        setup_logger()
+        setup_logger()
+        queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, LazyQueueHandler)]
+        self.assertEqual(len(queue_handlers), 1)
+
+    def test_modules_do_not_attach_their_own_handlers(self):
+        from config import ProductionConfig
+        with mock.patch.object(ProductionConfig, 'LOG_DIR', self.log_dir.name):
+            import wsgi  # noqa: F401
+        import app.utils.mpesa  # noqa: F401
+        direct = [h for h in logging.getLogger().handlers if type(h) in (logging.StreamHandler, logging.FileHandler)]
+        self.assertEqual(direct, [])
+
+    def test_log_dir_is_configurable(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            setup_logger(log_dir=log_dir)
+            logging.getLogger('app.test').warning("Written to the chosen directory")
+            stop_logging()
+            self.assertTrue(os.path.exists(os.path.join(log_dir, 'app.log')))
+        self.assertFalse(os.path.exists(os.path.join(self.log_dir.name, 'app.log')))
+
+    def test_records_are_written_as_json_from_the_listener(self):
+        setup_logger()
+        logging.getLogger('mpesa').info("Callback data: %s", LazyJson({'ResultCode': 0}), extra={'request_id': 'abc'})
+        logging.getLogger('app.test').info("Not an M-Pesa record")
+        stop_logging()
+
+        mpesa_entries = self.read_log('mpesa.log')
+        self.assertEqual(len(mpesa_entries), 1)
+        self.assertEqual(mpesa_entries[0]['logger'], 'mpesa')
+        self.assertEqual(mpesa_entries[0]['request_id'], 'abc')
+        self.assertIn('"ResultCode": 0', mpesa_entries[0]['message'])
+        messages = [entry['message'] for entry in self.read_log('app.log')]
+        self.assertIn("Not an M-Pesa record", messages)
+
+    def test_payload_is_not_rendered_on_the_calling_thread(self):
+        payload = CountingPayload()
+        record = make_record(msg="Payload: %s", args=(LazyJson(payload),))
+        handler = LazyQueueHandler(mock.Mock())
+        handler.emit(record)
+        self.assertEqual(payload.renders, 0)
+        self.assertEqual(JsonFormatter().format(record).count('amount'), 1)
+        self.assertEqual(payload.renders, 1)
+
+    def test_filtered_payload_is_never_rendered(self):
+        setup_logger(level=logging.WARNING)
+        payload = CountingPayload()
+        logging.getLogger('mpesa').info("Payload: %s", LazyJson(payload))
+        stop_logging()
+        self.assertEqual(payload.renders, 0)
+
+
+class TestSampling(unittest.TestCase):
+    def test_keeps_a_fraction_of_each_logger(self):
+        sampler = SamplingFilter({'mpesa': 0.1})
+        kept = sum(sampler.filter(make_record('mpesa.stk')) for _ in range(100))
+        self.assertEqual(kept, 10)
+        self.assertTrue(all(sampler.filter(make_record('app')) for _ in range(10)))
+
+    def test_warnings_are_always_kept(self):
+        sampler = SamplingFilter({'mpesa': 0})
+        self.assertTrue(sampler.filter(make_record('mpesa', logging.WARNING)))
+        self.assertFalse(sampler.filter(make_record('mpesa', logging.INFO)))
+
+    def test_parse_sample_rates(self):
+        self.assertEqual(parse_sample_rates('mpesa=0.1, app.services=0.5'), {'mpesa': 0.1, 'app.services': 0.5})
+        self.assertEqual(parse_sample_rates(''), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import gc
+import unittest
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel
+from app.utils.memory import MemoryMonitor, get_memory_monitor, reset_memory_monitor
+
+
+class TestMemoryMonitor(unittest.TestCase):
+    def setUp(self):
+        self.monitor = MemoryMonitor(sample_every=3, interval=0, gc_threshold_mb=1, gc_cooldown=60)
+
+    def tearDown(self):
+        self.monitor.stop()
+
+    def test_samples_every_nth_request(self):
+        for _ in range(7):
+            self.monitor.record_request()
+        self.assertEqual(self.monitor.samples, 2)
+        self.assertGreater(self.monitor.latest['rss_mb'], 0)
+        self.assertEqual(len(self.monitor.latest['gc_collections']), len(gc.get_stats()))
+
+    def test_collects_only_over_threshold_once_per_cooldown(self):
+        with mock.patch('app.utils.memory.gc.collect', return_value=0) as collect:
+            self.monitor.sample()
+            self.monitor.sample()
+        collect.assert_called_once()
+        self.assertEqual(self.monitor.forced_collections, 1)
+
+        monitor = MemoryMonitor(sample_every=0, interval=0, gc_threshold_mb=0)
+        with mock.patch('app.utils.memory.gc.collect') as collect:
+            monitor.sample()
+        monitor.stop()
+        collect.assert_not_called()
+
+    def test_gc_pauses_are_timed(self):
+        gc.collect()
+        self.assertGreater(self.monitor.gc_pause_seconds, 0)
+        self.assertIn('tabpay_gc_pause_seconds_total', self.monitor.prometheus())
+
+
+class TestMemoryTelemetryRequests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app.config['MEMORY_SAMPLE_EVERY'] = 2
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        reset_memory_monitor()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        reset_memory_monitor()
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def test_requests_do_not_force_collection(self):
+        with mock.patch('app.utils.memory.gc.collect') as collect:
+            for _ in range(4):
+                self.client.get('/api/v1/banks/')
+        collect.assert_not_called()
+        monitor = get_memory_monitor()
+        self.assertEqual((monitor.requests, monitor.samples), (4, 2))
+
+    def test_metrics_endpoint(self):
+        role = RoleModel.query.filter_by(name='SuperUser').first()
+        if not role:
+            role = RoleModel(name='SuperUser')
+        admin = UserModel(email="admin@example.com", full_name="Admin", active=True)
+        admin.roles.append(role)
+        db.session.add(admin)
+        db.session.commit()
+
+        with self.client.session_transaction() as session:
+            session['_user_id'] = admin.fs_uniquifier
+            session['_fresh'] = True
+        with self.app.app_context():
+            response = self.client.get('/api/v1/metrics/memory', query_string={'format': 'prometheus'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('tabpay_memory_rss_bytes', response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
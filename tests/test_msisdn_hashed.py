@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+import hashlib
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, MsisdnHashModel
+from app.utils.msisdn_hashed import find_user_by_hashed_msisdn, rebuild_msisdn_hashes
+
+
+def sha256(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class TestMsisdnHashIndex(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+        self.member_role = RoleModel.query.filter_by(name='Member').first()
+        if not self.member_role:
+            self.member_role = RoleModel(name='Member', description='Regular member')
+            db.session.add(self.member_role)
+            db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_member(self, phone_number, id_number=1):
+        user = UserModel(full_name="Test Member", id_number=id_number, phone_number=phone_number)
+        user.roles.append(self.member_role)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    def test_hashes_written_on_insert(self):
+        user = self.create_member("0712345678")
+        hashes = {h.msisdn_hash for h in MsisdnHashModel.query.filter_by(user_id=user.id)}
+        self.assertIn(sha256("254712345678"), hashes)
+        self.assertIn(sha256("0712345678"), hashes)
+
+    def test_find_user_by_safaricom_format(self):
+        user = self.create_member("+254712345678")
+        self.assertEqual(find_user_by_hashed_msisdn(sha256("254712345678")), user)
+
+    def test_hashes_follow_phone_number_updates(self):
+        user = self.create_member("0712345678")
+        user.phone_number = "0799999999"
+        db.session.commit()
+
+        self.assertIsNone(find_user_by_hashed_msisdn(sha256("254712345678")))
+        self.assertEqual(find_user_by_hashed_msisdn(sha256("254799999999")), user)
+
+    def test_non_members_are_not_matched(self):
+        user = UserModel(full_name="Admin", id_number=2, phone_number="0712345678")
+        db.session.add(user)
+        db.session.commit()
+        self.assertIsNone(find_user_by_hashed_msisdn(sha256("254712345678")))
+
+    def test_rebuild_backfills_missing_hashes(self):
+        user = self.create_member("0712345678")
+        MsisdnHashModel.query.delete()
+        db.session.commit()
+        self.assertIsNone(find_user_by_hashed_msisdn(sha256("254712345678")))
+
+        self.assertEqual(rebuild_msisdn_hashes(), 1)
+        self.assertEqual(find_user_by_hashed_msisdn(sha256("254712345678")), user)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sys
+import hashlib
+import unittest
+from sqlalchemy import update
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, UmbrellaModel, BlockModel, PaymentModel
+from app.services import payments
+from app.services import ServiceError
+from app.utils.phone import to_e164, backfill_phone_e164
+from app.utils.query_counter import count_queries
+
+
+class TestToE164(unittest.TestCase):
+    def test_formats(self):
+        for phone in ("0712345678", "712345678", "254712345678", "+254 712 345 678", "0712-345-678"):
+            self.assertEqual(to_e164(phone), "+254712345678")
+
+    def test_invalid_numbers(self):
+        for phone in (None, "", "12", "not a number", hashlib.sha256(b"254712345678").hexdigest()):
+            self.assertIsNone(to_e164(phone))
+
+
+class TestPaymentsByPhone(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+        member_role = RoleModel.query.filter_by(name='Member').first()
+        if not member_role:
+            member_role = RoleModel(name='Member', description='Regular member')
+        member = UserModel(full_name="Jane Member", id_number=1, phone_number="0712345678")
+        member.roles.append(member_role)
+        db.session.add(member)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=member.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name="Block", parent_umbrella_id=umbrella.id, created_by=member.id, initials="BL")
+        db.session.add(block)
+        db.session.commit()
+        self.member_id = member.id
+        self.block_id = block.id
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def add_payments(self, count, source_phone_number="254712345678"):
+        for i in range(count):
+            db.session.add(PaymentModel(
+                mpesa_id=f"TX{PaymentModel.query.count()}", account_number="BL", amount=100,
+                source_phone_number=source_phone_number, payer_id=self.member_id, block_id=self.block_id,
+                transaction_status='completed'
+            ))
+            db.session.flush()
+        db.session.commit()
+
+    def test_phone_numbers_are_normalized_on_write(self):
+        self.add_payments(1)
+        self.assertEqual(db.session.get(UserModel, self.member_id).phone_e164, "+254712345678")
+        self.assertEqual(PaymentModel.query.one().phone_e164, "+254712345678")
+
+    def test_lookup_is_one_query_in_any_format(self):
+        self.add_payments(3)
+        with count_queries() as few:
+            found = payments.list_payments_by_phone("+254 712 345 678")
+        self.add_payments(20)
+        with count_queries() as many:
+            self.assertEqual(len(payments.list_payments_by_phone("0712345678")), 23)
+
+        self.assertEqual(len(found), 3)
+        self.assertEqual(few.count, 1)
+        self.assertEqual(many.count, 1)
+        self.assertEqual((found[0]['payer_full_name'], found[0]['block_name']), ("Jane Member", "Block"))
+
+    def test_hashed_msisdn_payments_take_the_payer_number(self):
+        data = {
+            "TransID": "TX1", "TransTime": "20241018120000", "TransAmount": "100.00",
+            "BillRefNumber": "BL", "MSISDN": hashlib.sha256(b"254712345678").hexdigest()
+        }
+        payments.upsert_confirmations([data])
+        self.assertEqual(len(payments.list_payments_by_phone("0712345678")), 1)
+
+    def test_unknown_numbers(self):
+        with self.assertRaises(ServiceError) as raised:
+            payments.list_payments_by_phone("0799999999")
+        self.assertEqual(raised.exception.status_code, 404)
+        self.assertEqual(raised.exception.message, "User not found for this phone number.")
+
+        with self.assertRaises(ServiceError) as raised:
+            payments.list_payments_by_phone("0712345678")
+        self.assertEqual(raised.exception.message, "No payments found for this phone number and meeting.")
+
+    def test_backfill(self):
+        self.add_payments(3)
+        db.session.execute(update(UserModel).values(phone_e164=None))
+        db.session.execute(update(PaymentModel).values(phone_e164=None))
+        db.session.execute(update(PaymentModel).where(PaymentModel.id == 1).values(source_phone_number="hashed"))
+        db.session.commit()
+
+        self.assertEqual(backfill_phone_e164(batch_size=2), {'users': 1, 'payments': 3})
+        self.assertEqual(len(payments.list_payments_by_phone("0712345678")), 3)
+        self.assertEqual(backfill_phone_e164(), {'users': 0, 'payments': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
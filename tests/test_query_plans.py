@@ -0,0 +1,161 @@
+import os
+import re
+import sys
+import unittest
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import (
+    UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, MeetingModel, PaymentModel, member_blocks
+)
+from app.services import contributions, ledger, meetings, payments, ServiceError
+from app.utils.query_counter import count_queries
+from app.utils.schema import create_missing_indexes
+
+# Tables the hot queries must reach through an index
+INDEXED_TABLES = ('payments', 'meetings')
+FULL_SCAN = re.compile(r'\bSCAN (%s)\b' % '|'.join(INDEXED_TABLES))
+
+
+class TestHotQueryPlans(unittest.TestCase):
+    """Fail when a hot report, callback or meeting query scans a whole table"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+        db.create_all()
+        cls.seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        db.session.remove()
+        db.drop_all()
+        cls.app_context.pop()
+
+    @classmethod
+    def seed(cls, blocks=4, members_per_block=50, meetings_per_block=5):
+        member_role = RoleModel.query.filter_by(name='Member').first()
+        if not member_role:
+            member_role = RoleModel(name='Member', description='Regular member')
+            db.session.add(member_role)
+        admin = UserModel(full_name="Admin User", email="admin@example.com")
+        db.session.add(admin)
+        db.session.flush()
+        umbrella = UmbrellaModel(name="Umbrella", location="Bomet", created_by=admin.id, initials="UM")
+        db.session.add(umbrella)
+        db.session.flush()
+
+        now = datetime.now()
+        user_id = admin.id
+        payment_rows, membership_rows = [], []
+        for b in range(blocks):
+            block = BlockModel(name=f"Block {b}", parent_umbrella_id=umbrella.id, created_by=admin.id,
+                               initials=f"B{b}")
+            db.session.add(block)
+            db.session.flush()
+            zone = ZoneModel(name=f"Zone {b}", parent_block_id=block.id, created_by=admin.id)
+            db.session.add(zone)
+            db.session.flush()
+            block_meetings = []
+            for m in range(meetings_per_block):
+                meeting = MeetingModel(host_id=admin.id, organizer_id=admin.id, block_id=block.id,
+                                       zone_id=zone.id, date=now - timedelta(weeks=m))
+                db.session.add(meeting)
+                block_meetings.append(meeting)
+            db.session.flush()
+            for _ in range(members_per_block):
+                user_id += 1
+                membership_rows.append({'user_id': user_id, 'block_id': block.id})
+                for meeting in block_meetings:
+                    payment_rows.append({
+                        'mpesa_id': f"TX{len(payment_rows)}", 'account_number': meeting.unique_id,
+                        'source_phone_number': "254712345678", 'amount': 100, 'payer_id': user_id,
+                        'block_id': block.id, 'meeting_id': meeting.id, 'transaction_status': 'completed',
+                        'checkout_request_id': f"ws_CO_{len(payment_rows)}",
+                        'merchant_request_id': f"MR_{len(payment_rows)}",
+                        'payment_date': meeting.date
+                    })
+        db.session.execute(insert(UserModel), [
+            {'id': admin.id + i + 1, 'full_name': f"Member {i}", 'id_number': i + 1}
+            for i in range(user_id - admin.id)
+        ])
+        db.session.execute(insert(member_blocks), membership_rows)
+        db.session.execute(insert(PaymentModel), payment_rows)
+        db.session.commit()
+        db.session.execute(text('ANALYZE'))
+
+        cls.block_id = block.id
+        cls.zone_id = zone.id
+        cls.meeting_id = block_meetings[0].id
+        cls.organizer_id = admin.id
+        cls.payer_id = user_id
+
+    def assert_no_full_scans(self, run):
+        """Run ``run`` and EXPLAIN every statement it sends to the database."""
+        with count_queries() as counter:
+            run()
+        self.assertTrue(counter.count)
+        with db.engine.connect() as connection:
+            for statement, parameters in zip(counter.statements, counter.parameters):
+                if not any(table in statement for table in INDEXED_TABLES):
+                    continue
+                plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+                details = [row[-1] for row in plan]
+                scans = [detail for detail in details if FULL_SCAN.search(detail)
+                         and 'USING INDEX' not in detail and 'USING COVERING INDEX' not in detail]
+                self.assertEqual(scans, [], f"{statement}\n" + '\n'.join(details))
+
+    def test_indexes_exist(self):
+        self.assertEqual(create_missing_indexes(), [])
+
+    def test_payment_filters(self):
+        for key, value in (('meeting_id', self.meeting_id), ('payer_id', self.payer_id),
+                           ('block_id', self.block_id)):
+            with self.subTest(key=key):
+                self.assert_no_full_scans(lambda: payments.list_payments(**{key: value}))
+
+    def test_stk_callback(self):
+        payment = PaymentModel.query.order_by(PaymentModel.id.desc()).first()
+        callback = {"Body": {"stkCallback": {
+            "MerchantRequestID": payment.merchant_request_id,
+            "CheckoutRequestID": payment.checkout_request_id,
+            "ResultCode": "1032", "ResultDesc": "Request cancelled by user"
+        }}}
+        self.assert_no_full_scans(lambda: payments.apply_stk_callback(callback))
+        db.session.rollback()
+
+    def test_meetings_by_organizer_and_date(self):
+        now = datetime.now()
+        self.assert_no_full_scans(lambda: meetings.list_meeting_details(
+            organizer_id=self.organizer_id, start=now - timedelta(days=7), end=now
+        ))
+
+    def test_meeting_clash_check(self):
+        def schedule():
+            with self.assertRaises(ServiceError):
+                meetings.create_meeting(self.organizer_id, self.block_id, self.zone_id, self.organizer_id,
+                                        datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        self.assert_no_full_scans(schedule)
+
+    def test_contribution_meeting(self):
+        block = db.session.get(BlockModel, self.block_id)
+        self.assert_no_full_scans(lambda: contributions.find_contribution_meeting(block))
+
+    def test_contribution_reports(self):
+        self.assert_no_full_scans(lambda: contributions.contribution_stats(meeting_id=self.meeting_id))
+        self.assert_no_full_scans(lambda: contributions.contribution_stats(block_id=self.block_id))
+        self.assert_no_full_scans(lambda: contributions.member_contribution_report(meeting_id=self.meeting_id))
+        self.assert_no_full_scans(lambda: contributions.member_contribution_report(host_id=self.organizer_id))
+
+    def test_meeting_summary_rebuild(self):
+        self.assert_no_full_scans(lambda: ledger.rebuild_summary(self.meeting_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timezone, timedelta
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_restful import fields, marshal
+from app import create_app, db
+from app.api.row_serializers import RowSerializer, rfc822
+from app.api.serializers import get_user_fields, payment_fields, meeting_fields, block_fields, zone_fields
+from app.main.models import (
+    UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, BankModel, MeetingModel, PaymentModel
+)
+from app.services import hierarchy, meetings, payments, users
+
+OPTIONAL_FIELDS = {
+    "count": fields.Integer,
+    "name": fields.String(default='none'),
+    "tags": fields.List(fields.String),
+    "parent": fields.Nested({"id": fields.Integer}, allow_null=True)
+}
+
+
+class TestRowSerializers(unittest.TestCase):
+    """The column-row listings must serialize exactly as ``marshal`` does"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_test_data(self):
+        role = RoleModel.query.filter_by(name='Member').first()
+        if not role:
+            role = RoleModel(name='Member', description='Regular member')
+            db.session.add(role)
+
+        admin = UserModel(email="admin@example.com", full_name="Admin User", is_approved=True,
+                          approval_date=datetime(2024, 3, 1, 9, 30))
+        db.session.add(admin)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Test Umbrella", location="Bomet", created_by=admin.id, initials="TU")
+        db.session.add(umbrella)
+        db.session.flush()
+
+        block = BlockModel(name="Test Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="TB",
+                           chairman_id=admin.id, treasurer_id=admin.id)
+        other_block = BlockModel(name="Other Block", parent_umbrella_id=umbrella.id, initials="OB")
+        db.session.add_all([block, other_block])
+        db.session.flush()
+
+        zone = ZoneModel(name="Test Zone", parent_block_id=block.id, created_by=admin.id)
+        bank = BankModel(name="Test Bank", paybill_no="123456")
+        db.session.add_all([zone, bank])
+        db.session.flush()
+
+        member = UserModel(full_name="Jane Member", id_number=1234, phone_number="0712345678",
+                           zone_id=zone.id, bank_id=bank.id, acc_number="001")
+        member.roles.append(role)
+        member.block_memberships.append(block)
+        member.zone_memberships.append(zone)
+        # No name, bank or memberships
+        nameless = UserModel(id_number=5678)
+        db.session.add_all([member, nameless])
+        db.session.flush()
+
+        meeting = MeetingModel(unique_id="MEET01", host_id=member.id, block_id=block.id, zone_id=zone.id,
+                               organizer_id=admin.id, date=datetime(2024, 6, 1, 14, 0))
+        db.session.add(meeting)
+        db.session.flush()
+
+        db.session.add_all([
+            PaymentModel(mpesa_id="RKTQDM7W6S", account_number="MEET01", source_phone_number="254712345678",
+                         amount=100, payment_date=datetime(2024, 6, 1, 14, 5), transaction_status='completed',
+                         payer_id=member.id, block_id=block.id, meeting_id=meeting.id, bank_id=bank.id,
+                         first_name="Jane", last_name="Member", org_account_balance=1500.5,
+                         completed_at=datetime(2024, 6, 1, 14, 6)),
+            # No payer, block or customer names
+            PaymentModel(mpesa_id="RKTQDM7W6T", account_number="UNKNOWN", source_phone_number="254700000000",
+                         amount=50, payment_date=None, transaction_status=None, status=None, retry_count=None),
+            # A payer without a name
+            PaymentModel(mpesa_id="RKTQDM7W6U", account_number="MEET01", source_phone_number="254700000001",
+                         amount=20, payer_id=nameless.id, block_id=block.id, middle_name="Only")
+        ])
+        db.session.commit()
+        db.session.expunge_all()
+
+    def test_rfc822_matches_datetime_field(self):
+        field = fields.DateTime()
+        for value in (datetime(2024, 1, 7, 0, 0, 5), datetime(2024, 12, 31, 23, 59, 59, 999999),
+                      datetime(2024, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=3)))):
+            self.assertEqual(rfc822(value), field.format(value))
+
+    def test_defaults_for_missing_values(self):
+        row = {"count": None, "name": None, "tags": None, "parent": None}
+        self.assertEqual(RowSerializer(OPTIONAL_FIELDS)(row), marshal(row, OPTIONAL_FIELDS))
+
+    def test_users(self):
+        expected = marshal(UserModel.query.order_by(UserModel.id).all(), get_user_fields())
+        self.assertEqual(users.list_users(), expected)
+
+    def test_user_page(self):
+        expected = marshal(UserModel.query.order_by(UserModel.id).limit(2).all(), get_user_fields())
+        self.assertEqual(users.paginate_users(per_page=2)['items'], expected)
+
+    def test_payments(self):
+        expected = marshal(PaymentModel.query.all(), payment_fields)
+        listed = payments.list_payments()
+        self.assertEqual(listed, expected)
+        self.assertEqual([payment['payer_full_name'] for payment in listed], ["Jane Member", "Unknown", None])
+
+    def test_meetings(self):
+        self.assertEqual(meetings.list_meetings(), marshal(MeetingModel.query.all(), meeting_fields))
+
+    def test_blocks_and_zones(self):
+        self.assertEqual(hierarchy.list_blocks(), marshal(BlockModel.query.all(), block_fields))
+        self.assertEqual(hierarchy.list_zones(), marshal(ZoneModel.query.all(), zone_fields))
+
+
+if __name__ == '__main__':
+    unittest.main()
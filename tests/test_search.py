@@ -0,0 +1,127 @@
+import os
+import sys
+import unittest
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, UmbrellaModel, BlockModel, ZoneModel, PaymentModel
+from app.services import search
+from app.utils.query_counter import count_queries
+
+
+class TestSearch(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_umbrella(self, name, initials):
+        admin = UserModel(email=f"{initials.lower()}@example.com", full_name=f"{name} Admin")
+        db.session.add(admin)
+        db.session.flush()
+        umbrella = UmbrellaModel(name=name, location="Bomet", created_by=admin.id, initials=initials)
+        db.session.add(umbrella)
+        db.session.flush()
+        block = BlockModel(name=f"{name} Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials=initials)
+        db.session.add(block)
+        db.session.flush()
+        zone = ZoneModel(name=f"{name} Zone", parent_block_id=block.id, created_by=admin.id)
+        db.session.add(zone)
+        db.session.flush()
+        return umbrella, block
+
+    def add_member(self, full_name, id_number, phone_number, block):
+        member = UserModel(full_name=full_name, id_number=id_number, phone_number=phone_number)
+        member.block_memberships.append(block)
+        db.session.add(member)
+        return member
+
+    def create_test_data(self):
+        umbrella, block = self.create_umbrella("Kapkatet", "KP")
+        other_umbrella, other_block = self.create_umbrella("Litein", "LT")
+        self.add_member("Jane Chepkoech", 12345678, "0712345678", block)
+        self.add_member("Janet Kiprono", 23456789, "0723456789", block)
+        self.add_member("Jane Outsider", 34567890, "0734567890", other_block)
+        db.session.add(PaymentModel(mpesa_id="RKTQDM7W6S", account_number="ABC12", source_phone_number="0712345678",
+                                    amount=150, block_id=block.id))
+        db.session.add(PaymentModel(mpesa_id="RKTQDM7W6T", account_number="ABC12", source_phone_number="1",
+                                    amount=150, block_id=other_block.id))
+        db.session.commit()
+        self.umbrella_id = umbrella.id
+
+    def names(self, search_type, query, **kwargs):
+        found = search.search(search_type, query, self.umbrella_id, **kwargs)
+        return [getattr(item, 'full_name', None) or getattr(item, 'name', None) or item.mpesa_id
+                for item in found['items']]
+
+    def test_members_match_word_prefixes_within_umbrella(self):
+        self.assertEqual(self.names('members', 'jan'), ["Jane Chepkoech", "Janet Kiprono"])
+        self.assertEqual(self.names('members', 'jane chep'), ["Jane Chepkoech"])
+        self.assertEqual(self.names('members', 'outsider'), [])
+
+    def test_index_follows_updates(self):
+        member = UserModel.query.filter_by(full_name="Janet Kiprono").one()
+        member.full_name = "Janet Rotich"
+        db.session.commit()
+        self.assertEqual(self.names('members', 'kiprono'), [])
+        self.assertEqual(self.names('members', 'rotich'), ["Janet Rotich"])
+
+    def test_exact_id_and_phone_numbers(self):
+        self.assertEqual(self.names('members', '23456789'), ["Janet Kiprono"])
+        self.assertEqual(self.names('members', '+254 712 345 678'), ["Jane Chepkoech"])
+        self.assertEqual(self.names('members', '0734567890'), [])
+
+    def test_payments_by_receipt_and_amount(self):
+        self.assertEqual(self.names('payments', 'rktqdm7w6s'), ["RKTQDM7W6S"])
+        self.assertEqual(self.names('payments', '150'), ["RKTQDM7W6S"])
+        self.assertEqual(self.names('payments', 'RKTQ'), ["RKTQDM7W6S"])
+
+    def test_payments_by_phone_number(self):
+        for query in ('0712345678', '254712345678', '+254 712 345 678'):
+            self.assertEqual(self.names('payments', query), ["RKTQDM7W6S"])
+        self.assertEqual(self.names('payments', '0799999999'), [])
+
+    def test_blocks_and_zones(self):
+        self.assertEqual(self.names('blocks', 'kapk'), ["Kapkatet Block"])
+        self.assertEqual(self.names('zones', 'zone'), ["Kapkatet Zone"])
+
+    def test_results_are_paginated(self):
+        first = search.search('members', 'jan', self.umbrella_id, per_page=1)
+        second = search.search('members', 'jan', self.umbrella_id, page=2, per_page=1)
+        self.assertTrue(first['has_next'])
+        self.assertFalse(second['has_next'])
+        self.assertNotEqual(first['items'], second['items'])
+
+    def test_search_is_one_query(self):
+        with count_queries() as counter:
+            search.search('members', 'jane', self.umbrella_id)
+        self.assertEqual(counter.count, 1)
+
+    def test_build_index_rebuilds_existing_rows(self):
+        db.session.execute(db.text("DELETE FROM users_fts"))
+        db.session.commit()
+        self.assertEqual(search.build_index(), 'sqlite')
+        self.assertEqual(self.names('members', 'janet'), ["Janet Kiprono"])
+
+    def test_search_requires_login(self):
+        response = self.client.get('/search', query_string={'query': 'jane', 'searchType': 'members'})
+        self.assertEqual(response.status_code, 302)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sys
+import unittest
+import json
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_login import login_user
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, BankModel
+from app.services import ServiceError, hierarchy, users
+from app.utils.umbrella import get_blocks_by_umbrella, get_zones_by_block
+
+
+class TestServiceLayer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_test_data(self):
+        self.member_role = RoleModel.query.filter_by(name='Member').first()
+        if not self.member_role:
+            self.member_role = RoleModel(name='Member', description='Regular member')
+            db.session.add(self.member_role)
+
+        admin = UserModel(email="admin@example.com", full_name="Admin User", is_approved=True)
+        db.session.add(admin)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Test Umbrella", location="Bomet", created_by=admin.id, initials="TU")
+        db.session.add(umbrella)
+        db.session.flush()
+
+        block = BlockModel(name="Test Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="TB")
+        db.session.add(block)
+        db.session.flush()
+
+        zone = ZoneModel(name="Test Zone", parent_block_id=block.id, created_by=admin.id)
+        bank = BankModel(name="Test Bank", paybill_no="123456")
+        db.session.add_all([zone, bank])
+        db.session.commit()
+
+        self.admin_id = admin.id
+        self.umbrella_id = umbrella.id
+        self.block_id = block.id
+        self.zone_id = zone.id
+        self.bank_id = bank.id
+
+    def create_member(self, id_number=12345678, phone_number="0712345678"):
+        return users.create_member(
+            full_name="Jane Member",
+            id_number=id_number,
+            phone_number=phone_number,
+            zone_id=self.zone_id,
+            bank_id=self.bank_id,
+            acc_number="ACC001",
+            umbrella_id=self.umbrella_id,
+            role_id=self.member_role.id
+        )
+
+    def test_create_member_adds_memberships(self):
+        member = self.create_member()
+        self.assertEqual([b['id'] for b in member['block_memberships']], [self.block_id])
+        self.assertEqual([z['id'] for z in member['zone_memberships']], [self.zone_id])
+        self.assertEqual(member['bank_name'], "Test Bank")
+
+    def test_create_member_rejects_duplicates(self):
+        self.create_member()
+        with self.assertRaises(ServiceError) as ctx:
+            self.create_member(phone_number="0799999999")
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_service_matches_api_response(self):
+        member = self.create_member()
+        response = self.client.get(f"/api/v1/users/{member['id']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data), json.loads(json.dumps(users.get_user(member['id']))))
+
+        response = self.client.get('/api/v1/users/', query_string={'role': 'Member', 'umbrella_id': self.umbrella_id})
+        self.assertEqual(json.loads(response.data), json.loads(json.dumps(
+            users.list_users(role='Member', umbrella_id=self.umbrella_id)
+        )))
+
+    def test_update_user_without_changes_is_rejected(self):
+        member = self.create_member()
+        with self.assertRaises(ServiceError) as ctx:
+            users.update_user(member['id'], {})
+        self.assertEqual(ctx.exception.message, "No updates made to user.")
+
+    def test_dashboard_helpers_make_no_http_calls(self):
+        # A fresh app context keeps the login and request cache out of other tests
+        with self.app.app_context(), self.app.test_request_context('/settings'):
+            login_user(db.session.get(UserModel, self.admin_id))
+            with mock.patch('requests.sessions.Session.request', side_effect=AssertionError("loopback HTTP call")):
+                blocks = get_blocks_by_umbrella()
+                zones = get_zones_by_block(self.block_id)
+
+        self.assertEqual([block['name'] for block in blocks], ["Test Block"])
+        self.assertEqual([zone['name'] for zone in zones], ["Test Zone"])
+
+    def test_create_block_rejects_duplicate_name(self):
+        with self.assertRaises(ServiceError):
+            hierarchy.create_block("Test Block", self.umbrella_id, self.admin_id)
+
+if __name__ == '__main__':
+    unittest.main()
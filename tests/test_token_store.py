@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.mpesa import MpesaAuthManager, MpesaCredentials
+from app.utils.token_store import FileTokenStore, MemoryTokenStore, TokenStore, create_token_store
+
+
+class OAuthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    issued = 0
+
+    def do_GET(self):
+        OAuthHandler.issued += 1
+        time.sleep(0.1)  # Give concurrent callers time to pile up
+        body = json.dumps({'access_token': f'token-{OAuthHandler.issued}', 'expires_in': '3599'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestTokenStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), OAuthHandler)
+        cls.auth_url = f'http://127.0.0.1:{cls.server.server_port}/oauth'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        OAuthHandler.issued = 0
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.token_path = os.path.join(self.tmp_dir.name, 'token.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def create_manager(self, store):
+        """A manager per worker process, all sharing one store"""
+        credentials = MpesaCredentials(consumer_key='key', consumer_secret='secret', shortcode='174379')
+        manager = MpesaAuthManager(credentials, token_store=store)
+        manager.auth_url = self.auth_url
+        return manager
+
+    def test_workers_share_one_token(self):
+        first = self.create_manager(FileTokenStore(self.token_path))
+        second = self.create_manager(FileTokenStore(self.token_path))
+
+        self.assertEqual(first.get_access_token(), 'token-1')
+        self.assertEqual(second.get_access_token(), 'token-1')
+        self.assertEqual(OAuthHandler.issued, 1)
+
+    def test_concurrent_refresh_is_single_flight(self):
+        managers = [self.create_manager(FileTokenStore(self.token_path)) for _ in range(5)]
+        tokens = []
+        threads = [threading.Thread(target=lambda m=m: tokens.append(m.get_access_token())) for m in managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(tokens, ['token-1'] * 5)
+        self.assertEqual(OAuthHandler.issued, 1)
+
+    def test_refresh_renews_token_close_to_expiry(self):
+        store = MemoryTokenStore()
+        manager = self.create_manager(store)
+        store.set(manager.token_key, 'old-token', time.time() + 200)
+
+        self.assertEqual(manager.get_access_token(), 'old-token')
+        self.assertEqual(manager.refresh_access_token(min_ttl=300), 'token-1')
+        self.assertEqual(store.get(manager.token_key)[0], 'token-1')
+
+    def test_expired_shared_token_is_not_used(self):
+        store = MemoryTokenStore()
+        manager = self.create_manager(store)
+        store.set(manager.token_key, 'stale-token', time.time() + 10)
+
+        self.assertEqual(manager.get_access_token(), 'token-1')
+
+    def test_create_token_store(self):
+        self.assertIsInstance(create_token_store('memory'), MemoryTokenStore)
+        self.assertIsInstance(create_token_store('file', self.token_path), FileTokenStore)
+        with self.assertRaises(ValueError):
+            create_token_store('memcached://localhost')
+
+    def test_stores_must_implement_every_method(self):
+        class PartialStore(TokenStore):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+if __name__ == '__main__':
+    unittest.main()
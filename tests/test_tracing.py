@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from app import create_app, db
+from app.main.models import UserModel, RoleModel
+from app.utils import tracing
+from app.utils.http_client import create_http_session
+from app.utils.tracing import get_tracer, percentile, reset_tracer
+
+
+class TestTracing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.export_dir = tempfile.TemporaryDirectory()
+        self.export_file = os.path.join(self.export_dir.name, 'traces.jsonl')
+        self.app.config['TRACE_EXPORT_FILE'] = self.export_file
+        reset_tracer()
+        self.client = self.app.test_client()
+        db.create_all()
+
+    def tearDown(self):
+        reset_tracer()
+        self.app.config['TRACE_EXPORT_FILE'] = ''
+        self.export_dir.cleanup()
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def login_superuser(self):
+        role = RoleModel.query.filter_by(name='SuperUser').first()
+        if not role:
+            role = RoleModel(name='SuperUser')
+        admin = UserModel(email="admin@example.com", full_name="Admin", active=True)
+        admin.roles.append(role)
+        db.session.add(admin)
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = admin.fs_uniquifier
+            session['_fresh'] = True
+
+    def exported_spans(self):
+        reset_tracer()
+        with open(self.export_file) as export:
+            lines = [json.loads(line) for line in export]
+        return [span for line in lines
+                for resource in line['resourceSpans']
+                for scope in resource['scopeSpans']
+                for span in scope['spans']]
+
+    def test_request_spans_share_the_request_id(self):
+        with self.app.app_context():
+            response = self.client.get('/api/v1/banks/', headers={'X-Request-ID': 'req-42'})
+        self.assertEqual(response.headers['X-Request-ID'], 'req-42')
+
+        spans = {span['name']: span for span in self.exported_spans()}
+        root = spans['GET /api/v1/banks/']
+        resource = spans['BanksResource.get']
+        query = next(span for name, span in spans.items() if name.startswith('SQL SELECT'))
+        self.assertEqual(root['parentSpanId'], '')
+        self.assertEqual(resource['parentSpanId'], root['spanId'])
+        self.assertEqual(query['parentSpanId'], resource['spanId'])
+        self.assertEqual(len({span['traceId'] for span in spans.values()}), 1)
+        request_ids = {attribute['value']['stringValue'] for span in spans.values()
+                       for attribute in span['attributes'] if attribute['key'] == 'http.request_id'}
+        self.assertEqual(request_ids, {'req-42'})
+
+    def test_views_are_traced(self):
+        with self.app.app_context():
+            self.client.get('/')
+        self.assertIn('view main.home', [span['name'] for span in self.exported_spans()])
+
+    def test_outbound_http_calls_are_traced(self):
+        session = create_http_session()
+        response = Response()
+        response.status_code = 204
+        with self.app.test_request_context('/'):
+            self.app.preprocess_request()
+            with mock.patch.object(HTTPAdapter, 'send', return_value=response):
+                session.get('https://sandbox.safaricom.co.ke/oauth?secret=1')
+            trace = tracing.current_trace()
+            http_span = next(span for span in trace.stack + trace.spans if span['name'] == 'HTTP GET')
+        self.assertEqual(http_span['attributes']['http.url'], 'https://sandbox.safaricom.co.ke/oauth')
+        self.assertEqual(http_span['attributes']['http.status_code'], 204)
+
+    def test_perf_view_summarizes_routes(self):
+        self.login_superuser()
+        with self.app.app_context():
+            for _ in range(3):
+                self.client.get('/api/v1/banks/')
+            response = self.client.get('/admin/perf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/v1/banks/', response.get_data(as_text=True))
+        row = next(row for row in get_tracer().summary() if row['route'] == 'GET /api/v1/banks/')
+        self.assertEqual(row['requests'], 3)
+
+    def test_perf_view_shows_connection_pools(self):
+        self.login_superuser()
+        stats = {'https://sandbox.safaricom.co.ke:443': {'requests': 7, 'hits': 6, 'misses': 1}}
+        with mock.patch('app.admin.views.pool_stats', return_value=stats):
+            with self.app.app_context():
+                page = self.client.get('/admin/perf/').get_data(as_text=True)
+        self.assertIn('https://sandbox.safaricom.co.ke:443', page)
+        self.assertIn('Outbound connections', page)
+
+    def test_percentile(self):
+        ordered = list(range(1, 101))
+        self.assertEqual([percentile(ordered, p) for p in (0.5, 0.95, 0.99)], [50, 95, 99])
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import sys
+import unittest
+
+# Add the parent directory to Python path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.main.models import UserModel, RoleModel, UmbrellaModel, BlockModel, ZoneModel, BankModel
+from app.services import users
+from app.utils.query_counter import count_queries
+
+
+class TestUserListingQueries(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = create_app('testing')
+        cls.app_context = cls.app.app_context()
+        cls.app_context.push()
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        db.create_all()
+        self.create_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app_context.pop()
+
+    def create_test_data(self):
+        self.member_role = RoleModel.query.filter_by(name='Member').first()
+        if not self.member_role:
+            self.member_role = RoleModel(name='Member', description='Regular member')
+            db.session.add(self.member_role)
+
+        admin = UserModel(email="admin@example.com", full_name="Admin User", is_approved=True)
+        db.session.add(admin)
+        db.session.flush()
+
+        umbrella = UmbrellaModel(name="Test Umbrella", location="Bomet", created_by=admin.id, initials="TU")
+        db.session.add(umbrella)
+        db.session.flush()
+
+        block = BlockModel(name="Test Block", parent_umbrella_id=umbrella.id, created_by=admin.id, initials="TB")
+        db.session.add(block)
+        db.session.flush()
+
+        zone = ZoneModel(name="Test Zone", parent_block_id=block.id, created_by=admin.id)
+        bank = BankModel(name="Test Bank", paybill_no="123456")
+        db.session.add_all([zone, bank])
+        db.session.commit()
+
+        self.role_id = self.member_role.id
+        self.umbrella_id = umbrella.id
+        self.block_id = block.id
+        self.zone_id = zone.id
+        self.bank_id = bank.id
+        self.added = 0
+
+    def add_members(self, count):
+        role = db.session.get(RoleModel, self.role_id)
+        block = db.session.get(BlockModel, self.block_id)
+        zone = db.session.get(ZoneModel, self.zone_id)
+        for i in range(self.added, self.added + count):
+            member = UserModel(full_name=f"Member {i}", id_number=1000 + i, phone_number=f"0700{i:06d}",
+                               zone_id=self.zone_id, bank_id=self.bank_id, acc_number=str(i))
+            member.roles.append(role)
+            member.block_memberships.append(block)
+            member.zone_memberships.append(zone)
+            db.session.add(member)
+        db.session.commit()
+        self.added += count
+
+    def queries_for(self, listing, members):
+        self.add_members(members)
+        # Start from an empty identity map so nothing is served from memory
+        db.session.expunge_all()
+        with count_queries() as counter:
+            result = listing()
+        return counter.count, result
+
+    def assert_constant_queries(self, listing):
+        few, result = self.queries_for(listing, 10)
+        self.assertGreaterEqual(len(result), 10)
+        many, result = self.queries_for(listing, 40)
+        self.assertGreaterEqual(len(result), 50)
+        self.assertEqual(few, many)
+        return many
+
+    def test_list_all_users(self):
+        queries = self.assert_constant_queries(users.list_users)
+        self.assertLessEqual(queries, 8)
+
+    def test_list_users_by_role(self):
+        self.assert_constant_queries(lambda: users.list_users(role='Member'))
+
+    def test_list_users_by_role_and_zone(self):
+        self.assert_constant_queries(lambda: users.list_users(role='Member', zone_id=self.zone_id))
+
+    def test_list_users_by_role_and_umbrella(self):
+        self.assert_constant_queries(lambda: users.list_users(role='Member', umbrella_id=self.umbrella_id))
+
+    def test_users_endpoint(self):
+        def listing():
+            response = self.client.get('/api/v1/users/', query_string={'role': 'Member'})
+            self.assertEqual(response.status_code, 200)
+            return response.get_json()
+        self.assert_constant_queries(listing)
+
+    def test_cursor_pages_cover_every_member_once(self):
+        self.add_members(12)
+        seen, cursor = [], None
+        while True:
+            page = users.paginate_users(role='Member', umbrella_id=self.umbrella_id, per_page=5, cursor=cursor)
+            self.assertEqual(page['total'], 12)
+            seen += [user['id'] for user in page['items']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_page_number_matches_cursor(self):
+        self.add_members(12)
+        first = users.paginate_users(role='Member', per_page=5)
+        by_cursor = users.paginate_users(role='Member', per_page=5, cursor=first['next_cursor'])
+        by_number = users.paginate_users(role='Member', per_page=5, page=2)
+        self.assertEqual(by_cursor['items'], by_number['items'])
+
+    def test_paginated_listing_queries_are_constant(self):
+        self.assert_constant_queries(
+            lambda: users.paginate_users(role='Member', umbrella_id=self.umbrella_id, per_page=100)['items']
+        )
+
+    def test_users_endpoint_pagination(self):
+        self.add_members(7)
+        response = self.client.get('/api/v1/users/', query_string={'role': 'Member', 'per_page': 5})
+        body = response.get_json()
+        self.assertEqual((len(body['items']), body['total']), (5, 7))
+        self.assertIn(f"cursor={body['next_cursor']}", body['next'])
+
+        body = self.client.get(body['next']).get_json()
+        self.assertEqual(len(body['items']), 2)
+        self.assertIsNone(body['next_cursor'])
+        self.assertIsNone(body['next'])
+
+    def test_users_endpoint_rejects_bad_cursor(self):
+        response = self.client.get('/api/v1/users/', query_string={'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_listing_includes_related_names(self):
+        self.add_members(1)
+        user = users.list_users(role='Member')[0]
+        self.assertEqual(user['bank_name'], "Test Bank")
+        self.assertEqual([block['name'] for block in user['block_memberships']], ["Test Block"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,6 @@
 import os
 import sys
-import gc
 import logging
-import psutil
 from flask_wtf.csrf import CSRFError
 from dotenv import load_dotenv
 
@@ -15,22 +13,9 @@ load_dotenv(env_path)
 
 from app import create_app
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/var/log/gunicorn/error.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Handlers are attached to the root logger by create_app (app/utils/logging_config.py)
 logger = logging.getLogger(__name__)
 
-def log_memory_usage():
-    process = psutil.Process(os.getpid())
-    mem_info = process.memory_info()
-    logger.info(f'Memory usage: {mem_info.rss / 1024 / 1024:.2f} MB')
-
 try:
     # Ensure DATABASE_URL environment variable is set for production
     if 'DATABASE_URL' not in os.environ:
@@ -39,11 +24,7 @@ try:
     # Create the application
     app = create_app('production')
     
-    # Add memory logging to before_request
-    @app.before_request
-    def before_request():
-        gc.collect()  # Force garbage collection
-        log_memory_usage()
+    # Memory usage is sampled by app/utils/memory.py, see MEMORY_SAMPLE_EVERY
     
     # Add error handlers
     @app.errorhandler(500)